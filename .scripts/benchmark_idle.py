@@ -0,0 +1,77 @@
+"""
+Compare the memory and idle CPU usage of the GUI and headless modes.
+
+Each mode is started, left idle without a client for a warm up period and then
+sampled. Memory and CPU are summed over the whole process tree, so the web
+server process spawned by the GUI mode is included.
+
+Usage: pipenv run benchmark-idle [seconds] [--headless-only]
+"""
+import subprocess
+import sys
+import time
+
+import psutil
+
+WARM_UP = 10.0
+
+MODES = {
+    "gui": [sys.executable, "main.py"],
+    "headless": [sys.executable, "headless.py"],
+}
+
+
+def process_tree(process: psutil.Process) -> list[psutil.Process]:
+    """Get a process and all of its children."""
+    try:
+        return [process, *process.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return []
+
+
+def measure(command: list[str], duration: float) -> tuple[float, float]:
+    """
+    Start a command and sample its process tree while it is idle.
+
+    Returns:
+        tuple[float, float]: Resident memory in MiB and CPU usage in percent of one core
+    """
+    process = psutil.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        time.sleep(WARM_UP)
+
+        processes = process_tree(process)
+        cpu_times = {child.pid: sum(child.cpu_times()[:2]) for child in processes}
+
+        start = time.monotonic()
+        time.sleep(duration)
+        elapsed = time.monotonic() - start
+
+        cpu_time = 0.0
+        memory = 0
+        for child in process_tree(process):
+            with child.oneshot():
+                cpu_time += sum(child.cpu_times()[:2]) - cpu_times.get(child.pid, 0.0)
+                memory += child.memory_info().rss
+
+        return memory / 1024 ** 2, cpu_time / elapsed * 100
+
+    finally:
+        for child in reversed(process_tree(process)):
+            child.terminate()
+
+        psutil.wait_procs(process_tree(process), timeout=10)
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 and not sys.argv[1].startswith("--") else 30.0
+    modes = ["headless"] if "--headless-only" in sys.argv else list(MODES)
+
+    for mode in modes:
+        memory, cpu = measure(MODES[mode], duration)
+        print(f"{mode:<10} {memory:7.1f} MiB  {cpu:5.1f}% CPU at idle")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Compare the message throughput of `mimic.Pipeable.Channel` with pickled messages.
+
+A child process sends log messages as fast as it can and this process receives
+them, like the web server process and the GUI. Messages are sent through:
+- pickle - A `Pipe` with every message pickled and sent on its own, as the web
+  server did before `Channel`
+- channel - A `Channel` that sends every message on its own
+- batched - A `Channel` that sends 64 messages per batch
+
+The round trip time of requests answered by the child process is measured too.
+
+Usage: pipenv run benchmark-ipc [message count]
+"""
+import logging
+import os
+import sys
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from statistics import median
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Pipeable import Channel, CommandMessage, LogMessage  # noqa: E402
+
+PAYLOAD = "GET /stats - 192.168.1.20"
+REQUESTS = 2000
+REPEATS = 3
+
+
+class PickledLogMessage:
+    """A log message as it was sent before `Channel`, pickled as a whole."""
+
+    def __init__(self, payload: str, level: int = logging.INFO):
+        self.payload = payload
+        self.level = level
+
+
+def send_pickled(connection: Connection, message_count: int):
+    connection.recv()
+    for _ in range(message_count):
+        connection.send(PickledLogMessage(PAYLOAD, logging.DEBUG))
+
+    connection.send(None)
+
+
+def send_channel(connection: Connection, message_count: int, batch_size: int):
+    channel = Channel(connection, batch_size)
+    connection.recv_bytes()
+
+    for _ in range(message_count):
+        channel.send(LogMessage(PAYLOAD, logging.DEBUG))
+
+    channel.send(CommandMessage("done"))
+    channel.flush()
+
+
+def answer_requests(connection: Connection):
+    channel = Channel(connection)
+    channel.on_request("ping", lambda params: params)
+
+    # @NOTE The child holds a copy of the other end of the pipe when forked,
+    # so closing it in the parent never raises `EOFError` here
+    while len(channel.receive()) == 0:
+        pass
+
+
+def measure_pickled(message_count: int) -> float:
+    """Receive the messages of `send_pickled`, returns messages per second."""
+    connection, child_connection = Pipe()
+    process = Process(target=send_pickled, args=(child_connection, message_count))
+    process.start()
+
+    start = perf_counter()
+    connection.send("go")
+
+    received = 0
+    while connection.recv() is not None:
+        received += 1
+
+    elapsed = perf_counter() - start
+    process.join()
+
+    assert received == message_count
+    return message_count / elapsed
+
+
+def measure_channel(message_count: int, batch_size: int) -> float:
+    """Receive the messages of `send_channel`, returns messages per second."""
+    connection, child_connection = Pipe()
+    process = Process(target=send_channel, args=(child_connection, message_count, batch_size))
+    process.start()
+
+    channel = Channel(connection)
+    start = perf_counter()
+    connection.send_bytes(b"go")
+
+    received = 0
+    done = False
+    while not done:
+        for message in channel.receive():
+            if isinstance(message, CommandMessage):
+                done = True
+            else:
+                received += 1
+
+    elapsed = perf_counter() - start
+    process.join()
+
+    assert received == message_count
+    return message_count / elapsed
+
+
+def measure_requests() -> float:
+    """Send requests to `answer_requests` one after another, returns the median round trip time in microseconds."""
+    connection, child_connection = Pipe()
+    process = Process(target=answer_requests, args=(child_connection,))
+    process.start()
+
+    channel = Channel(connection)
+    round_trips = []
+    for index in range(REQUESTS):
+        start = perf_counter()
+        future = channel.request("ping", index)
+        while not future.done():
+            channel.receive()
+
+        assert future.result() == index
+        round_trips.append(perf_counter() - start)
+
+    channel.send(CommandMessage("stop"))
+    channel.close()
+    process.join()
+
+    return median(round_trips) * 1_000_000
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    runs = {
+        "pickle": lambda: measure_pickled(message_count),
+        "channel": lambda: measure_channel(message_count, 1),
+        "batched": lambda: measure_channel(message_count, 64),
+    }
+
+    baseline = None
+    for name, run in runs.items():
+        rate = max(run() for _ in range(REPEATS))
+        baseline = baseline or rate
+        print(f"{name:<8} {rate:12,.0f} messages/s  {rate / baseline:5.1f}x")
+
+    print(f"request round trip {measure_requests():.0f} us (median of {REQUESTS})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Measure the CPU cost of every additional WebRTC viewer of the relay.
+
+A synthetic VP8 clip is encoded once and fed to an `EncodedRelay` at 30 fps,
+as if it was received from the client. Viewers run in a separate process, so
+the CPU time measured for this process is only what the server spends on
+packetizing and sending the relayed frames.
+
+Usage: pipenv run benchmark-relay [seconds per run]
+"""
+import asyncio
+import os
+import sys
+from fractions import Fraction
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from time import process_time
+
+import av
+import numpy as np
+from aiortc import RTCPeerConnection, RTCRtpSender, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError
+from av import VideoFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Media.Relay import EncodedRelay  # noqa: E402
+
+WIDTH = 1280
+HEIGHT = 720
+FPS = 30
+VIEWER_COUNTS = (0, 1, 2, 4, 8)
+
+
+def encode_clip(frame_count: int) -> list[bytes]:
+    """Encode a moving gradient as VP8 with a keyframe every second."""
+    encoder = av.CodecContext.create("libvpx", "w")
+    encoder.width = WIDTH
+    encoder.height = HEIGHT
+    encoder.pix_fmt = "yuv420p"
+    encoder.time_base = Fraction(1, FPS)
+    encoder.bit_rate = 2_500_000
+    encoder.options = {"g": str(FPS), "deadline": "realtime"}
+
+    x = np.arange(WIDTH, dtype=np.uint16)
+    y = np.arange(HEIGHT, dtype=np.uint16)[:, None]
+
+    packets = []
+    for index in range(frame_count):
+        image = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        image[..., 0] = (x + index * 4) % 256
+        image[..., 1] = (y + index * 2) % 256
+        image[..., 2] = ((x + y) // 4 + index) % 256
+
+        frame = VideoFrame.from_ndarray(image, format="rgb24").reformat(format="yuv420p")
+        frame.pts = index
+        packets.extend(bytes(packet) for packet in encoder.encode(frame))
+
+    packets.extend(bytes(packet) for packet in encoder.encode(None))
+    return packets
+
+
+async def run_viewers(pipe: Connection, count: int):
+    """Connect viewers to the relay and count the frames they receive until told to stop."""
+    pcs = []
+    frames = [0] * count
+
+    for index in range(count):
+        pc = RTCPeerConnection()
+        pc.addTransceiver("video", direction="recvonly")
+
+        @pc.on("track")
+        def on_track(track, index=index):
+            async def consume():
+                try:
+                    while True:
+                        await track.recv()
+                        frames[index] += 1
+                except MediaStreamError:
+                    pass
+
+            asyncio.ensure_future(consume())
+
+        await pc.setLocalDescription(await pc.createOffer())
+        pcs.append(pc)
+
+    loop = asyncio.get_event_loop()
+    pipe.send([pc.localDescription.sdp for pc in pcs])
+    answers = await loop.run_in_executor(None, pipe.recv)
+    for pc, sdp in zip(pcs, answers):
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=sdp, type="answer"))
+
+    await loop.run_in_executor(None, pipe.recv)
+    pipe.send(frames)
+
+    for pc in pcs:
+        await pc.close()
+
+
+def viewer_process(pipe: Connection, count: int):
+    """Entry point of the viewer process."""
+    asyncio.run(run_viewers(pipe, count))
+
+
+async def measure(packets: list[bytes], viewer_count: int, duration: float) -> tuple[float, list[int]]:
+    """
+    Relay the clip to a number of viewers.
+
+    Returns:
+        tuple[float, list[int]]: CPU time of this process in milliseconds per second, and frames received per viewer
+    """
+    loop = asyncio.get_event_loop()
+    relay = EncodedRelay(max_viewers=viewer_count)
+
+    pipe, child_pipe = Pipe()
+    process = Process(target=viewer_process, args=(child_pipe, viewer_count), daemon=True)
+    process.start()
+
+    frame_index = 0
+
+    async def feed(seconds: float):
+        nonlocal frame_index
+        for _ in range(int(seconds * FPS)):
+            relay.forward("video/VP8", packets[frame_index % len(packets)], frame_index * 90000 // FPS)
+            frame_index += 1
+            await asyncio.sleep(1 / FPS)
+
+    # The relay only accepts viewers once it has seen the codec of the stream
+    relay.forward("video/VP8", packets[0], 0)
+
+    pcs = []
+    offers = await loop.run_in_executor(None, pipe.recv)
+    answers = []
+    for sdp in offers:
+        pc = RTCPeerConnection()
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=sdp, type="offer"))
+        pc.addTrack(relay.subscribe())
+
+        codecs = [codec for codec in RTCRtpSender.getCapabilities("video").codecs
+                  if codec.mimeType.lower() in ("video/vp8", "video/rtx")]
+        for transceiver in pc.getTransceivers():
+            transceiver.setCodecPreferences(codecs)
+
+        await pc.setLocalDescription(await pc.createAnswer())
+        answers.append(pc.localDescription.sdp)
+        pcs.append(pc)
+
+    pipe.send(answers)
+
+    # Let the connections establish before measuring
+    await feed(2.0)
+
+    start = process_time()
+    await feed(duration)
+    cpu_time = process_time() - start
+
+    pipe.send("stop")
+    frames = await loop.run_in_executor(None, pipe.recv)
+    process.join()
+
+    for pc in pcs:
+        await pc.close()
+
+    return cpu_time * 1000 / duration, frames
+
+
+async def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+
+    print(f"Encoding {FPS * 2} frames at {WIDTH}x{HEIGHT}...")
+    packets = encode_clip(FPS * 2)
+    bitrate = sum(len(packet) for packet in packets) * 8 / 2 / 1000
+    print(f"Stream is {bitrate:.0f} kbit/s")
+
+    baseline = None
+    for viewer_count in VIEWER_COUNTS:
+        cpu_time, frames = await measure(packets, viewer_count, duration)
+
+        if baseline is None:
+            baseline = cpu_time
+            print(f"{viewer_count} viewers: {cpu_time:.1f} ms CPU per second")
+        else:
+            per_viewer = (cpu_time - baseline) / viewer_count
+            print(f"{viewer_count} viewers: {cpu_time:.1f} ms CPU per second, "
+                  f"{per_viewer:.1f} ms per viewer, frames received {min(frames)}-{max(frames)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
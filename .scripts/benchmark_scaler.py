@@ -0,0 +1,112 @@
+"""
+Compare the conversion cost and output quality of every scaler interpolation.
+
+A smooth, band-limited test image is rendered at the input size, converted to
+yuv420p as a decoder would output it, and scaled to the output size with each
+interpolation. Quality is the PSNR of the luma of the scaled image against the
+same test image rendered directly at the output size, so it only measures the
+error introduced by scaling. The chroma subsampling of the input costs every
+interpolation the same.
+
+Usage: pipenv run benchmark-scaler [frame count]
+"""
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+from av import VideoFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Media.Scaler import INTERPOLATIONS, Scaler  # noqa: E402
+
+# (input size, output size), the output sizes are the content sizes of the
+# camera profiles in `fit` mode
+SIZES = (
+    ((640, 480), (960, 720)),
+    ((1280, 720), (1280, 720)),
+    ((1280, 720), (1920, 1080)),
+    ((1920, 1080), (1280, 720)),
+    ((1920, 1080), (640, 360)),
+)
+
+# Frequencies of the test image in cycles per image width or height, at most
+# a quarter of the Nyquist frequency of the smallest size so every size can
+# represent it
+_WAVES = (
+    # Channel, horizontal and vertical frequency, amplitude, phase
+    (0, 3, 2, 40, 0.0),
+    (0, 17, 0, 20, 1.0),
+    (0, 0, 23, 15, 2.0),
+    (0, 31, 29, 12, 0.5),
+    (1, 5, 7, 45, 0.3),
+    (1, 41, 13, 20, 1.7),
+    (1, 11, 37, 15, 2.4),
+    (2, 2, 9, 50, 0.9),
+    (2, 23, 31, 18, 0.1),
+    (2, 43, 3, 12, 2.9),
+)
+
+
+def test_image(width: int, height: int) -> np.ndarray:
+    """Render the test image at a size, sampled at the center of every pixel."""
+    u = (np.arange(width) + 0.5) / width
+    v = ((np.arange(height) + 0.5) / height)[:, None]
+
+    image = np.full((height, width, 3), 128.0)
+    for channel, fx, fy, amplitude, phase in _WAVES:
+        image[..., channel] += amplitude * np.sin(2 * np.pi * (fx * u + fy * v) + phase)
+
+    return np.clip(np.round(image), 0, 255).astype(np.uint8)
+
+
+def luma(image: np.ndarray) -> np.ndarray:
+    """BT.601 luma of an RGB image."""
+    return image[..., :3].astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+
+
+def psnr(image: np.ndarray, reference: np.ndarray) -> float:
+    error = np.mean((luma(image) - luma(reference)) ** 2)
+    return float("inf") if error == 0 else 10 * np.log10(255 ** 2 / error)
+
+
+def measure(source: VideoFrame, size: tuple[int, int], interpolation: str, frame_count: int) -> tuple[float, float]:
+    """
+    Scale a frame repeatedly.
+
+    Returns:
+        tuple[float, float]: Milliseconds per frame and PSNR of the output in dB
+    """
+    scaler = Scaler("rgba")
+    width, height = size
+
+    # Warm up the filter graph and its frame pool
+    for _ in range(5):
+        scaler.scale(source, width, height, interpolation)
+
+    start = perf_counter()
+    for _ in range(frame_count):
+        scaled = scaler.scale(source, width, height, interpolation)
+        del scaled
+    elapsed = perf_counter() - start
+
+    image = scaler.scale(source, width, height, interpolation).to_ndarray()
+    return elapsed * 1000 / frame_count, psnr(image, test_image(width, height))
+
+
+def main():
+    frame_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    print(f"{'input':>10} {'output':>10}  " + "  ".join(f"{interpolation:>16}" for interpolation in INTERPOLATIONS))
+    for (input_width, input_height), size in SIZES:
+        source = VideoFrame.from_ndarray(test_image(input_width, input_height), format="rgb24")
+        source = source.reformat(format="yuv420p")
+
+        results = [measure(source, size, interpolation, frame_count) for interpolation in INTERPOLATIONS]
+        print(f"{input_width:>4}x{input_height:<5} {size[0]:>4}x{size[1]:<5} "
+              + "  ".join(f"{cost:5.2f}ms {quality:5.1f}dB" for cost, quality in results))
+
+
+if __name__ == "__main__":
+    main()
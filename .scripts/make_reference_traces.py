@@ -0,0 +1,153 @@
+"""
+Generate the reference frame traces in `.scripts/traces`.
+
+The traces are synthetic so that they can be regenerated and shared: a moving
+test pattern encoded with VP8 as a phone would send it, with arrival times
+jittered around the frame interval the way they arrive over a network. Every
+trace is generated from a fixed seed, single threaded, so the same versions of
+PyAV and libvpx produce the same files. Replay them with `pipenv run replay`.
+
+Usage: pipenv run make-reference-traces
+"""
+import os
+import sys
+from fractions import Fraction
+from typing import Any, Iterator, NamedTuple, Optional
+
+import av
+import numpy as np
+from av import VideoFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Media.FrameTrace import (DECODED, ENCODED, TRACE_EXTENSION, TraceFrame, decoded_trace_frame,  # noqa: E402
+                                    write_frame_trace)
+
+OUTPUT_DIRECTORY = os.path.join(os.path.dirname(__file__), "traces")
+
+_FPS = 30
+_RTP_CLOCK_RATE = 90000
+
+# Standard deviation of the arrival times around the frame interval, and the
+# share of frames that arrive late in a burst with the next frame
+_JITTER = 0.15
+_BURST_SHARE = 0.05
+
+
+class ReferenceTrace(NamedTuple):
+    name: str
+    kind: str
+    width: int
+    height: int
+    frames: int
+    # Camera profile and scale mode of the header, and the client metadata
+    profile: str
+    scale_mode: str
+    metadata: Optional[dict[str, Any]]
+    seed: int
+
+
+TRACES = (
+    # Landscape phone stream scaled up to the default profile
+    ReferenceTrace("vp8-640x360-720p-fit", ENCODED, 640, 360, 90, "720p", "fit",
+                   {"width": 640, "height": 360, "framerate": _FPS, "orientation": 0, "facingMode": "environment"}, 1),
+    # Portrait stream from a front facing camera, rotated and mirrored
+    ReferenceTrace("vp8-360x640-720p-fill-portrait", ENCODED, 360, 640, 90, "720p", "fill",
+                   {"width": 360, "height": 640, "framerate": _FPS, "orientation": 90, "facingMode": "user"}, 2),
+    # Decoded planes, replayed without a decoder
+    ReferenceTrace("yuv-176x144-480p-stretch", DECODED, 176, 144, 20, "480p", "stretch", None, 3),
+)
+
+
+def test_pattern(width: int, height: int, index: int) -> np.ndarray:
+    """Render a frame of a moving test pattern as RGB."""
+    u = np.arange(width) / width
+    v = (np.arange(height) / height)[:, None]
+    phase = index / _FPS
+
+    image = np.empty((height, width, 3))
+    image[..., 0] = 128 + 80 * np.sin(2 * np.pi * (3 * u + phase))
+    image[..., 1] = 128 + 80 * np.sin(2 * np.pi * (2 * v - phase / 2))
+    image[..., 2] = 128 + 60 * np.sin(2 * np.pi * (4 * (u + v) + phase / 3))
+
+    # A square moving across the frame, so the encoder has motion to follow
+    size = min(width, height) // 4
+    x = int((width - size) * (0.5 + 0.5 * np.sin(2 * np.pi * phase / 3)))
+    y = int((height - size) * (0.5 + 0.5 * np.cos(2 * np.pi * phase / 3)))
+    image[y:y + size, x:x + size] = (240, 240, 240)
+
+    return np.round(image).astype(np.uint8)
+
+
+def arrival_times(frame_count: int, rng: np.random.Generator) -> Iterator[int]:
+    """Jittered arrival times in nanoseconds since the first frame, never going backwards."""
+    interval_ns = 1_000_000_000 / _FPS
+    previous_ns = 0
+    for index in range(frame_count):
+        due_ns = index * interval_ns * (1 + rng.normal(0, _JITTER / 4))
+        if index > 0 and rng.random() < _BURST_SHARE:
+            due_ns += interval_ns
+        due_ns += rng.normal(0, _JITTER) * interval_ns
+
+        previous_ns = max(previous_ns, int(due_ns)) if index > 0 else 0
+        yield previous_ns
+
+
+def frames(trace: ReferenceTrace) -> Iterator[TraceFrame]:
+    rng = np.random.default_rng(trace.seed)
+    pictures = (VideoFrame.from_ndarray(test_pattern(trace.width, trace.height, index), format="rgb24")
+                .reformat(format="yuv420p") for index in range(trace.frames))
+    timestamps = (index * _RTP_CLOCK_RATE // _FPS for index in range(trace.frames))
+
+    if trace.kind == DECODED:
+        for arrival_ns, timestamp, picture in zip(arrival_times(trace.frames, rng), timestamps, pictures):
+            picture.pts = timestamp
+            picture.time_base = Fraction(1, _RTP_CLOCK_RATE)
+            yield decoded_trace_frame(arrival_ns, picture)
+        return
+
+    encoder = av.CodecContext.create("libvpx", "w")
+    encoder.width = trace.width
+    encoder.height = trace.height
+    encoder.pix_fmt = "yuv420p"
+    encoder.framerate = _FPS
+    encoder.bit_rate = 400_000
+    # Keyframes every two seconds like a browser that is asked for them, and
+    # a single thread so the output does not depend on the machine
+    encoder.gop_size = 2 * _FPS
+    encoder.options = {"threads": "1", "deadline": "good", "cpu-used": "5", "lag-in-frames": "0"}
+
+    packets = []
+    for index, picture in enumerate(pictures):
+        picture.pts = index
+        packets.extend(encoder.encode(picture))
+    packets.extend(encoder.encode(None))
+
+    for arrival_ns, timestamp, packet in zip(arrival_times(trace.frames, rng), timestamps, packets):
+        yield TraceFrame(arrival_ns, timestamp, 0, 0, bytes(packet))
+
+
+def main():
+    os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+
+    for trace in TRACES:
+        header = {
+            "kind": trace.kind,
+            "session": None,
+            "profile": trace.profile,
+            "scale_mode": trace.scale_mode,
+            "mirror_user_facing": trace.metadata is not None and trace.metadata.get("facingMode") == "user",
+            "scaler_preset": "bicubic",
+            "metadata": trace.metadata,
+            "synthetic": True,
+        }
+        if trace.kind == ENCODED:
+            header["codec"] = "video/VP8"
+
+        path = os.path.join(OUTPUT_DIRECTORY, f"{trace.name}.{TRACE_EXTENSION}")
+        write_frame_trace(path, header, frames(trace))
+        print(f"{path}: {os.path.getsize(path) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Stream and filter the structured web server logs, including compressed rotations.
+
+Reads `logs/webserver.jsonl` in Local AppData and its rotations unless files are
+given. Matching records are printed as JSON lines, as tab separated columns of
+`--fields`, or summarized per numeric field with `--summary`.
+
+Usage: pipenv run logs [files...] [--session ID] [--level DEBUG] [--since 2021-06-01T12:00]
+                       [--where key=value] [--grep text] [--fields ts,rtt_ms,fps] [--summary rtt_ms]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Logging.Reader import log_files, read_records  # noqa: E402
+from mimic.Utils.AppData import resolve_local_app_data  # noqa: E402
+from mimic.Utils.Statistics import RollingQuantiles  # noqa: E402
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Parse seconds since the epoch or an ISO 8601 local time."""
+    if value is None:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_where(conditions: list[str]) -> dict[str, Any]:
+    """Parse `key=value` conditions, values are JSON if they can be parsed as JSON and strings otherwise."""
+    where = {}
+    for condition in conditions:
+        key, _, value = condition.partition("=")
+        try:
+            where[key] = json.loads(value)
+        except json.JSONDecodeError:
+            where[key] = value
+
+    return where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream and filter structured Mimic logs.")
+    parser.add_argument("files", nargs="*", help="log files, defaults to logs/webserver.jsonl and its rotations")
+    parser.add_argument("--level", help="minimum level, e.g. INFO")
+    parser.add_argument("--since", help="seconds since the epoch or ISO 8601 local time")
+    parser.add_argument("--until", help="seconds since the epoch or ISO 8601 local time")
+    parser.add_argument("--session", help="session id")
+    parser.add_argument("--where", action="append", default=[], help="exact field value as key=value")
+    parser.add_argument("--grep", help="text the message contains")
+    parser.add_argument("--fields", help="comma separated fields to print as tab separated columns")
+    parser.add_argument("--summary", action="append", default=[], help="summarize a numeric field")
+    args = parser.parse_args()
+
+    files = args.files
+    if len(files) == 0:
+        files = log_files(resolve_local_app_data("logs", "webserver.jsonl"))
+
+    records = read_records(files, min_level=args.level, since=parse_time(args.since), until=parse_time(args.until),
+                           session=args.session, where=parse_where(args.where), contains=args.grep)
+
+    if len(args.summary) > 0:
+        values: dict[str, list[float]] = {field: [] for field in args.summary}
+        for record in records:
+            for field, field_values in values.items():
+                value = record.get(field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    field_values.append(value)
+
+        for field, field_values in values.items():
+            if len(field_values) == 0:
+                print(f"{field}: no values")
+                continue
+
+            quantiles = RollingQuantiles(capacity=len(field_values))
+            for value in field_values:
+                quantiles.add(value)
+
+            summary = quantiles.summary(0.5, 0.99)
+            print(f"{field}: count {summary['count']}, min {min(field_values):.3f}, p50 {summary['p50']}, "
+                  f"p99 {summary['p99']}, max {max(field_values):.3f}")
+        return
+
+    fields = args.fields.split(",") if args.fields is not None else None
+    try:
+        for record in records:
+            if fields is None:
+                print(json.dumps(record, ensure_ascii=False))
+            else:
+                print("\t".join("" if record.get(field) is None else str(record.get(field)) for field in fields))
+    except BrokenPipeError:
+        # Output piped into `head` or similar
+        sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Replay a frame trace through the conversion and sink path of the web server.
+
+The frames of a trace, see `mimic.Media.FrameTrace`, are decoded if they were
+captured encoded and sent to a `CameraOutput` with the null sink, configured
+with the profile, scale mode and client metadata of the capture. Frames are
+replayed as fast as possible by default, or at the pace they arrived.
+
+The result includes a digest of every converted image, the commit of the tree
+and the versions the frames were converted with, so results can be saved with
+`--output` and compared across commits with `--compare`. The scaler preset
+defaults to the preset of the capture, or bicubic if it was `auto`, since the
+automatic preset depends on the speed of the machine.
+
+Usage: pipenv run replay <trace> [--realtime] [--preset PRESET] [--json] [--output FILE] [--compare FILE]
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+from time import perf_counter_ns, sleep
+from typing import Any, Iterator, Optional
+
+import av
+import numpy as np
+from av import VideoFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Media.CameraOutput import CAMERA_PROFILES, CameraOutput, NullCamera  # noqa: E402
+from mimic.Media.FrameTrace import DECODED, ENCODED, decoded_video_frame, read_frame_trace  # noqa: E402
+from mimic.Media.FrameTransform import FIT, SCALE_MODES  # noqa: E402
+from mimic.Media.Scaler import AUTO, BICUBIC, SCALER_PRESETS, Scaler  # noqa: E402
+from mimic.MetaData import MetaData  # noqa: E402
+from mimic.Utils.Statistics import RollingQuantiles  # noqa: E402
+from mimic.Utils.Tracing import Tracer  # noqa: E402
+
+# Decoders of the codecs aiortc receives, by RTP mime type
+_DECODERS = {
+    "video/VP8": "vp8",
+    "video/H264": "h264",
+}
+
+# Relative change of a timing before `--compare` marks it
+_REGRESSION_THRESHOLD = 0.1
+
+
+def git_commit() -> Optional[str]:
+    """Get the commit of the tree, with a `-dirty` suffix if it has changes."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def decoded_frames(
+    header: dict[str, Any],
+    frames: Iterator,
+    decode_ms: RollingQuantiles
+) -> Iterator[tuple[int, VideoFrame]]:
+    """
+    Turn the frames of a trace into decoded frames with their arrival time.
+
+    Raises:
+        ValueError: The codec of an encoded trace is not supported
+    """
+    if header["kind"] == DECODED:
+        for frame in frames:
+            yield frame.arrival_ns, decoded_video_frame(frame)
+        return
+
+    codec = _DECODERS.get(header.get("codec", ""))
+    if codec is None:
+        raise ValueError(f"Unsupported codec `{header.get('codec')}`, expected one of {list(_DECODERS)}")
+
+    decoder = av.CodecContext.create(codec, "r")
+    for frame in frames:
+        start_ns = perf_counter_ns()
+        try:
+            pictures = decoder.decode(av.Packet(frame.data))
+        except av.FFmpegError:
+            # aiortc drops frames it cannot decode as well
+            continue
+        decode_ms.add((perf_counter_ns() - start_ns) / 1_000_000)
+
+        for picture in pictures:
+            picture.pts = frame.pts
+            yield frame.arrival_ns, picture
+
+
+def replay(path: str, realtime: bool, preset: Optional[str]) -> dict[str, Any]:
+    """
+    Replay a trace.
+
+    Returns:
+        dict[str, Any]: Replay result
+    """
+    header, frames = read_frame_trace(path)
+
+    profile = CAMERA_PROFILES[header.get("profile") or "720p"]
+    scale_mode = header.get("scale_mode") if header.get("scale_mode") in SCALE_MODES else FIT
+    if preset is None:
+        preset = header.get("scaler_preset") if header.get("scaler_preset") in SCALER_PRESETS else BICUBIC
+        preset = BICUBIC if preset == AUTO else preset
+
+    tracer = Tracer()
+    output = CameraOutput(profile, NullCamera(profile.width, profile.height, profile.fps), scale_mode=scale_mode,
+                          mirror_user_facing=bool(header.get("mirror_user_facing")), scaler=Scaler("rgba"),
+                          tracer=tracer, scaler_preset=preset)
+    output.update_metadata(MetaData(json.dumps(header["metadata"])) if header.get("metadata") else None)
+
+    decode_ms = RollingQuantiles(capacity=100_000)
+    convert_ms = RollingQuantiles(capacity=100_000)
+    late_ms = RollingQuantiles(capacity=100_000)
+    images = hashlib.sha256()
+    frame_count = 0
+
+    start_ns = perf_counter_ns()
+    for arrival_ns, frame in decoded_frames(header, frames, decode_ms):
+        if realtime:
+            wait_ns = arrival_ns - (perf_counter_ns() - start_ns)
+            if wait_ns > 0:
+                sleep(wait_ns / 1_000_000_000)
+
+        # The same call `show_frame` makes for every frame it receives
+        convert_start_ns = perf_counter_ns()
+        output.send_frame(frame)
+        convert_end_ns = perf_counter_ns()
+
+        convert_ms.add((convert_end_ns - convert_start_ns) / 1_000_000)
+        if realtime:
+            late_ms.add(max(0, convert_end_ns - start_ns - arrival_ns) / 1_000_000)
+
+        images.update(np.ascontiguousarray(output.latest_image).data)
+        frame_count += 1
+
+    elapsed = (perf_counter_ns() - start_ns) / 1_000_000_000
+
+    return {
+        "trace": os.path.basename(path),
+        "trace_sha256": file_digest(path),
+        "commit": git_commit(),
+        "versions": {"python": platform.python_version(), "av": av.__version__, "numpy": np.__version__},
+        "kind": header["kind"],
+        "codec": header.get("codec"),
+        "profile": profile.name,
+        "scale_mode": scale_mode,
+        "scaler_preset": preset,
+        "realtime": realtime,
+        "frames": frame_count,
+        "seconds": round(elapsed, 3),
+        "fps": round(frame_count / elapsed, 1) if elapsed > 0 else None,
+        "decode_ms": decode_ms.summary(0.5, 0.99) if header["kind"] == ENCODED else None,
+        "convert_ms": convert_ms.summary(0.5, 0.99),
+        "late_ms": late_ms.summary(0.5, 0.99) if realtime else None,
+        "stages_ms": tracer.take_stage_timings(),
+        "images_sha256": images.hexdigest(),
+    }
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any]):
+    """Print the changes of a result against a baseline result of the same trace."""
+    print(f"\nCompared to {baseline.get('commit')}:")
+    if baseline.get("trace_sha256") != result["trace_sha256"]:
+        print("  Warning: the baseline was replayed from a different trace")
+    if baseline.get("realtime") != result["realtime"]:
+        print("  Warning: only one of the replays was in real time, frame rates are not comparable")
+
+    same_images = baseline.get("images_sha256") == result["images_sha256"]
+    print(f"  images      {'identical' if same_images else 'CHANGED'}")
+    if not same_images and baseline.get("versions") != result["versions"]:
+        print(f"  versions    {baseline.get('versions')} -> {result['versions']}")
+
+    rows = [
+        (f"{name} {quantile}", (baseline.get(name) or {}).get(quantile), (result.get(name) or {}).get(quantile))
+        for name in ("decode_ms", "convert_ms") for quantile in ("p50", "p99")
+    ]
+    rows.extend((f"stage {name}", baseline.get("stages_ms", {}).get(name), value)
+                for name, value in result["stages_ms"].items())
+    if baseline.get("realtime") == result["realtime"]:
+        rows.append(("fps", baseline.get("fps"), result["fps"]))
+
+    for name, before, after in rows:
+        if before is None or after is None:
+            continue
+
+        change = (after - before) / before if before else 0.0
+        lower_is_better = name != "fps"
+        regression = change > _REGRESSION_THRESHOLD if lower_is_better else change < -_REGRESSION_THRESHOLD
+        print(f"  {name:<20} {before:>9.3f} -> {after:>9.3f} {change:+7.1%}{'  REGRESSION' if regression else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a frame trace through the frame conversion.")
+    parser.add_argument("trace", help="trace file captured with /debug/capture/start")
+    parser.add_argument("--realtime", action="store_true", help="replay frames at the pace they arrived")
+    parser.add_argument("--preset", choices=SCALER_PRESETS, help="scaler preset, defaults to the preset of the capture")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--output", help="save the result as JSON, e.g. as a baseline for --compare")
+    parser.add_argument("--compare", help="result of an earlier replay of the same trace")
+    args = parser.parse_args()
+
+    result = replay(args.trace, args.realtime, args.preset)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['trace']} ({result['kind']}, {result['codec'] or 'yuv420p'}) -> {result['profile']} "
+              f"{result['scale_mode']} {result['scaler_preset']} at {result['commit']}")
+        print(f"  {result['frames']} frames in {result['seconds']:.2f}s, {result['fps']} fps")
+        for name in ("decode_ms", "convert_ms", "late_ms"):
+            if result[name] is not None:
+                print(f"  {name:<11} p50 {result[name]['p50']}  p99 {result[name]['p99']}")
+        print(f"  stages      {result['stages_ms']}")
+        print(f"  images      {result['images_sha256']}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(result, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
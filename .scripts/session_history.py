@@ -0,0 +1,88 @@
+"""
+Query the history of past streaming sessions.
+
+`recent` lists the most recent sessions, `trends` aggregates the sessions of
+every day to spot when performance started to degrade. Reads `history.sqlite3`
+in Local AppData unless a database is given.
+
+Usage: pipenv run history [recent|trends] [--since 7] [--limit 20] [--json] [--database path]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from time import time
+from typing import Any, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mimic.Utils.AppData import resolve_local_app_data  # noqa: E402
+from mimic.Utils.History import daily_trends, recent_sessions  # noqa: E402
+
+RECENT_COLUMNS = ("started_at", "duration_s", "end_reason", "fps_avg", "fps_p1", "rtt_p50_ms", "rtt_p99_ms",
+                  "frame_delay_p99_ms", "packets_lost", "width", "height", "codec")
+TREND_COLUMNS = ("day", "sessions", "duration_s", "fps_avg", "fps_p1_worst", "rtt_p50_ms", "rtt_p99_ms_worst",
+                 "frame_delay_p50_ms", "frame_delay_p99_ms_worst", "packets_lost")
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    """Parse a number of days ago or an ISO 8601 local time."""
+    if value is None:
+        return None
+
+    try:
+        return time() - float(value) * 24 * 60 * 60
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def format_value(column: str, value: Any) -> str:
+    if value is None:
+        return "-"
+    if column == "started_at":
+        return datetime.fromtimestamp(value).isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+def print_table(rows: list[dict[str, Any]], columns: tuple[str, ...]):
+    cells = [[format_value(column, row.get(column)) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(row[index]) for row in cells]) for index, column in enumerate(columns)]
+
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the history of past Mimic sessions.")
+    parser.add_argument("view", nargs="?", choices=("recent", "trends"), default="recent")
+    parser.add_argument("--since", help="number of days ago or ISO 8601 local time")
+    parser.add_argument("--limit", type=int, default=20, help="maximum number of recent sessions")
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON lines")
+    parser.add_argument("--database", default=None, help="defaults to history.sqlite3 in Local AppData")
+    args = parser.parse_args()
+
+    database = args.database or resolve_local_app_data("history.sqlite3")
+    if not os.path.exists(database):
+        print(f"No session history at {database}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.view == "trends":
+        rows, columns = daily_trends(database, since=parse_since(args.since)), TREND_COLUMNS
+    else:
+        rows, columns = recent_sessions(database, since=parse_since(args.since), limit=args.limit), RECENT_COLUMNS
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+    elif len(rows) == 0:
+        print("No sessions")
+    else:
+        print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
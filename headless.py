@@ -0,0 +1,165 @@
+"""
+Run the Mimic web server headless, without the GUI, tray icon or Windows APIs.
+
+The web server runs in this process and logs to stdout and a rotating log
+file. Nothing is imported from the GUI or tray icon, so the server runs on
+hosts without a display and on Linux when frames are sent to the `null` sink.
+
+>>> python headless.py --host 0.0.0.0 --port 8443 --sink null
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+from threading import Event
+from typing import Any, Optional
+
+from mimic.Logging.AsyncLoggingHandler import rotating_log_handler
+from mimic.Logging.Formatter import LOG_EXTENSIONS, LOG_FORMATS, log_formatter
+from mimic.Media.CameraOutput import CAMERA_SINK, NULL_SINK, SINKS
+from mimic.Pipeable import LogMessage, Message
+from mimic.Utils.AppData import (initialize_local_app_data,
+                                 mkdir_local_app_data, resolve_local_app_data)
+from mimic.Utils.Config import Config
+from mimic.Utils.EventLoop import LOOP_IMPLEMENTATIONS, new_event_loop
+from mimic.WebServer import start_web_server
+
+_LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+class _LoggingSink:
+    """Log the messages of the web server directly instead of sending them through a pipe."""
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def send(self, message: Message) -> None:
+        """Log a `LogMessage`, other messages have no consumer when running headless."""
+        if isinstance(message, LogMessage):
+            self._logger.log(message.level, message.payload, extra={"fields": message.fields})
+
+    def flush(self) -> None:
+        """Messages are logged as they are sent."""
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (Optional[list[str]], optional): Arguments without the program name. Defaults to `sys.argv`.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Run the Mimic web server without the GUI or tray icon.")
+    parser.add_argument("--host", default=None,
+                        help="address to bind to, defaults to the address of the active network device")
+    parser.add_argument("--port", type=int, default=8080, help="port to bind to, defaults to 8080")
+    parser.add_argument("--sink", choices=SINKS, default=CAMERA_SINK if sys.platform == "win32" else NULL_SINK,
+                        help="where frames are sent, defaults to the virtual camera on Windows and null elsewhere")
+    parser.add_argument("--loop", choices=LOOP_IMPLEMENTATIONS, default=None,
+                        help="event loop implementation, defaults to `event_loop` of the config")
+    parser.add_argument("--log-level", choices=_LOG_LEVELS, default="INFO", help="level logged to stdout")
+    parser.add_argument("--log-file", default=None,
+                        help="file logged to at DEBUG level, defaults to logs/webserver.log in Local AppData, "
+                             "or logs/webserver.jsonl for JSON lines")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default=None,
+                        help="format of the log file, defaults to `log_format` of the config")
+
+    return parser.parse_args(argv)
+
+
+def configure_logging(
+    log_level: str,
+    log_file: Optional[str],
+    log_format: Optional[str],
+    config: Config
+) -> logging.Logger:
+    """
+    Log the web server to stdout and a rotating log file.
+
+    Args:
+        log_level (str): Level logged to stdout
+        log_file (Optional[str]): Log file, `None` for `logs/webserver.log` in Local AppData
+        log_format (Optional[str]): Format of the log file, `None` for `log_format` of the config
+        config (Config): Configuration of the log rotation
+
+    Returns:
+        logging.Logger: Web server logger
+    """
+    logger = logging.getLogger("mimic.webserver")
+    logger.setLevel(logging.DEBUG)
+
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(log_formatter)
+    stdout_handler.setLevel(log_level)
+    logger.addHandler(stdout_handler)
+
+    log_format = log_format or config.get("log_format")
+    if log_file is None:
+        mkdir_local_app_data("logs")
+        log_file = str(resolve_local_app_data("logs", f"webserver.{LOG_EXTENSIONS.get(log_format, 'log')}"))
+
+    file_handler = rotating_log_handler(log_file, log_format, max_bytes=int(config.get("log_max_bytes")),
+                                        backup_count=int(config.get("log_backup_count")),
+                                        compress=bool(config.get("log_compress")))
+    file_handler.setLevel(logging.DEBUG)
+    logger.addHandler(file_handler)
+
+    return logger
+
+
+async def run(args: argparse.Namespace, logger: logging.Logger) -> None:
+    """
+    Run the web server until SIGINT or SIGTERM is received.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+        logger (logging.Logger): Web server logger
+    """
+    stop_event = Event()
+
+    def on_signal(*_: Any) -> None:
+        logger.info("Stopping...")
+        stop_event.set()
+
+    loop = asyncio.get_event_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, on_signal)
+        except NotImplementedError:
+            # Windows event loops do not support signal handlers
+            signal.signal(signal_number, on_signal)
+
+    await start_web_server(stop_event, _LoggingSink(logger), host=args.host, port=args.port, sink=args.sink,
+                           handle_signals=False)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Mimic headless entrypoint."""
+    args = parse_args(argv)
+
+    initialize_local_app_data()
+    config = Config(resolve_local_app_data("config.json"))
+    logger = configure_logging(args.log_level, args.log_file, args.log_format, config)
+
+    implementation = args.loop or config.get("event_loop")
+    loop, implementation = new_event_loop(implementation)
+    logger.debug(f"Using {implementation} event loop")
+
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(run(args, logger))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    logging.shutdown()
+
+
+if __name__ == "__main__":
+    main()
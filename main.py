@@ -24,12 +24,13 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import logging
 import multiprocessing
 import os
-from multiprocessing import Event, Pipe, Process
+from multiprocessing import Event
 from os import environ, mkdir
 from signal import SIGINT, SIGTERM, signal
 from sys import stdout
 from time import sleep
 from types import FrameType
+from typing import Optional
 
 from win32api import GetLastError
 from win32event import CreateMutex
@@ -37,26 +38,29 @@ from winerror import ERROR_ALREADY_EXISTS
 
 from mimic.Constants import SLEEP_INTERVAL
 from mimic.GUI.GUI import GUI
-from mimic.Logging.AsyncLoggingHandler import AsyncRotatingFileHanlder
-from mimic.Logging.Formatter import log_formatter
+from mimic.Logging.AsyncLoggingHandler import rotating_log_handler
+from mimic.Logging.Formatter import LOG_EXTENSIONS, log_formatter
 from mimic.Logging.TkinterLoggingHandler import TkinterTextHandler
-from mimic.Pipeable import LogMessage, StringMessage
+from mimic.Media.Thumbnail import ThumbnailBuffer
+from mimic.Pipeable import CommandMessage, LogMessage
+from mimic.Supervisor import ServerSupervisor
 from mimic.TrayIcon import TrayIcon
 from mimic.Utils.AppData import (initialize_local_app_data,
                                  mkdir_local_app_data, resolve_local_app_data)
+from mimic.Utils.Config import Config
 from mimic.Utils.Profiler import profile
 from mimic.WebServer import webserver_thread_runner
 
 stop_event = Event()
 
 
-def stop_handler(signal_number: int, frame: FrameType) -> None:
+def stop_handler(signal_number: int, frame: Optional[FrameType]) -> None:
     """
     Handle stop signal events.
 
     Args:
         signal_number (int): Signal number that originated the signal
-        frame (FrameType): Current stack frame when signal was raised
+        frame (Optional[FrameType]): Current stack frame when signal was raised
     """
     stop_event.set()
 
@@ -72,12 +76,10 @@ def main() -> None:
                          hover_text="Mimic", stop_event=stop_event)
     tray_icon.run()
 
-    webserver_pipe, remote_webserver_pipe = Pipe()
-    server_process = Process(target=webserver_thread_runner, args=(
-        stop_event, remote_webserver_pipe))
-    server_process.start()
-
-    gui = GUI()
+    # The web server writes the thumbnail of the main window to shared memory
+    config = Config(resolve_local_app_data("config.json"))
+    thumbnail = ThumbnailBuffer.create(int(config.get("thumbnail_max_size")))
+    gui = GUI(thumbnail, thumbnail_fps=float(config.get("thumbnail_fps")))
 
     @gui.on('quit')
     def on_gui_quit():
@@ -96,8 +98,11 @@ def main() -> None:
     )
     webserver_logger.addHandler(_webserver_stdout_handler)
 
-    _webserver_file_handler = AsyncRotatingFileHanlder(resolve_local_app_data("logs", "webserver.log"))
-    _webserver_file_handler.setFormatter(log_formatter)
+    log_format = config.get("log_format")
+    _webserver_file_handler = rotating_log_handler(
+        str(resolve_local_app_data("logs", f"webserver.{LOG_EXTENSIONS.get(log_format, 'log')}")), log_format,
+        max_bytes=int(config.get("log_max_bytes")), backup_count=int(config.get("log_backup_count")),
+        compress=bool(config.get("log_compress")))
     _webserver_file_handler.setLevel(logging.DEBUG)
     webserver_logger.addHandler(_webserver_file_handler)
 
@@ -112,27 +117,33 @@ def main() -> None:
 
     webserver_logger.setLevel(logging.DEBUG)
 
+    # The web server runs in a child process that is restarted when it crashes
+    # or hangs
+    supervisor = ServerSupervisor(webserver_thread_runner, stop_event, webserver_logger,
+                                  target_args=(thumbnail.name,))
+    supervisor.start()
+
     # Main loop
     while True:
         if stop_event.is_set():
             break
 
         # Get data from web server
-        if webserver_pipe.poll():
-            data = webserver_pipe.recv()
-
-            if data.isType(LogMessage):
-                webserver_logger.log(data.level, data.payload)
+        for message in supervisor.poll():
+            if isinstance(message, LogMessage):
+                webserver_logger.log(message.level, message.payload, extra={"fields": message.fields})
 
         # Get data from tray icon
-        if tray_icon.pipe.poll():
-            message: StringMessage = tray_icon.pipe.recv()
+        while tray_icon.pipe.poll():
+            for message in tray_icon.pipe.receive():
+                if not isinstance(message, CommandMessage):
+                    continue
 
-            if message == "show_debug_logs":
-                gui.debug_log_window.show()
+                if message.name == "show_debug_logs":
+                    gui.debug_log_window.show()
 
-            if message == "show_qr_code":
-                gui.main_window.show()
+                if message.name == "show_qr_code":
+                    gui.main_window.show()
 
         # Update GUI
         gui.update_idletasks()
@@ -140,8 +151,9 @@ def main() -> None:
 
         sleep(SLEEP_INTERVAL)
 
-    server_process.join()
+    supervisor.stop()
     tray_icon.join()
+    thumbnail.close()
 
 
 if __name__ == "__main__":
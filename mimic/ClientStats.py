@@ -0,0 +1,89 @@
+"""
+Statistics of the video sender reported by the client.
+
+The client samples `RTCPeerConnection.getStats()` every second and sends a
+summary over the `stats` data channel. Browsers do not report every value, so
+every field is optional.
+
+Raises:
+    ValueError: The message is not a JSON object
+"""
+import json
+from typing import Any, Optional
+
+# Keys of the client message and the snake case names they are stored as
+_FIELDS = {
+    "fps": "fps",
+    "captureFps": "capture_fps",
+    "qualityLimitation": "quality_limitation",
+    "framesEncoded": "frames_encoded",
+    "framesDropped": "frames_dropped",
+    "bitrateKbps": "bitrate_kbps",
+    "encodeMs": "encode_ms",
+    "width": "width",
+    "height": "height",
+    "rttMs": "rtt_ms",
+}
+
+
+class ClientStats:
+    """Statistics of the video sender reported by the client."""
+
+    def __init__(self, json_str: str):
+        """
+        Parse a client stats message to an object.
+
+        Args:
+            json_str (str): JSON object as a string
+
+        Raises:
+            ValueError: The message is not a JSON object
+        """
+        json_obj = json.loads(json_str)
+        if not isinstance(json_obj, dict):
+            raise ValueError("Client stats must be a JSON object.")
+
+        # Frames encoded per second and frames captured per second
+        self.fps: Optional[float] = _number(json_obj.get("fps"))
+        self.capture_fps: Optional[float] = _number(json_obj.get("captureFps"))
+
+        # Why the encoder lowers the resolution or frame rate, `none`, `cpu`,
+        # `bandwidth` or `other`
+        self.quality_limitation: Optional[str] = json_obj.get("qualityLimitation")
+
+        # Frames encoded since the stream started, and frames captured but not
+        # encoded
+        self.frames_encoded: Optional[float] = _number(json_obj.get("framesEncoded"))
+        self.frames_dropped: Optional[float] = _number(json_obj.get("framesDropped"))
+
+        # Outbound bitrate and average encode time per frame since the previous
+        # sample
+        self.bitrate_kbps: Optional[float] = _number(json_obj.get("bitrateKbps"))
+        self.encode_ms: Optional[float] = _number(json_obj.get("encodeMs"))
+
+        # Size of the encoded frames
+        self.width: Optional[float] = _number(json_obj.get("width"))
+        self.height: Optional[float] = _number(json_obj.get("height"))
+
+        # Round trip time measured by the client from RTCP receiver reports
+        self.rtt_ms: Optional[float] = _number(json_obj.get("rttMs"))
+
+    def as_dict(self, prefix: str = "") -> dict[str, Any]:
+        """
+        Get the statistics as a JSON serializable dict.
+
+        Args:
+            prefix (str, optional): Prepended to every key, e.g. `client_`. Defaults to "".
+
+        Returns:
+            dict[str, Any]: Statistics by snake case name
+        """
+        return {f"{prefix}{name}": getattr(self, name) for name in _FIELDS.values()}
+
+
+def _number(value: Any) -> Optional[float]:
+    """Round a reported number, anything else is not reported."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+
+    return round(value, 3)
@@ -6,7 +6,7 @@ from mimic.GUI.AbstractTkinterWindow import AbstractTkinterWindow
 from mimic.Pipeable import Pipeable
 
 
-class DebugLogWindow(AbstractTkinterWindow, Pipeable):
+class DebugLogWindow(AbstractTkinterWindow, Pipeable):  # type: ignore[misc]
     """Mimic debug window that shows the current logs."""
 
     def __init__(self, master: tk.Tk):
@@ -1,23 +1,36 @@
 """Main GUI entrypoint."""
 import tkinter as tk
+from typing import Optional
+
+from PIL import Image, ImageTk
 
 from mimic.EventEmitter import EventEmitter
 from mimic.GUI.DebugLogWindow import DebugLogWindow
 from mimic.GUI.MainWindow import MainWindow
-from PIL import Image, ImageTk
+from mimic.Media.Thumbnail import ThumbnailBuffer
 
 
 class GUI(tk.Tk, EventEmitter):
     """Main Tkinter user interface instance."""
 
-    def __init__(self):
-        """Initialize main Tkinter user interface instance."""
+    def __init__(self, thumbnail: Optional[ThumbnailBuffer] = None, thumbnail_fps: float = 4.0):
+        """
+        Initialize main Tkinter user interface instance.
+
+        Args:
+            thumbnail (Optional[ThumbnailBuffer], optional): Thumbnail of the virtual camera shown in the main
+                                                             window. Defaults to None.
+            thumbnail_fps (float, optional): Refresh rate of the thumbnail. Defaults to 4.0.
+        """
         super().__init__()
 
+        self.thumbnail = thumbnail
+        self.thumbnail_fps = thumbnail_fps
+
         # TkInter photoimage only supports PPM PGM image formats
         # Using ImageTk and Image from PIL gets around this
         mimic_logo = ImageTk.PhotoImage(Image.open("./assets/favicon.ico"))
-        self.iconphoto(True, mimic_logo)
+        self.iconphoto(True, mimic_logo)  # type: ignore[arg-type]
 
         self.create_windows()
 
@@ -30,4 +43,4 @@ class GUI(tk.Tk, EventEmitter):
     def create_windows(self):
         """Initialize all child windows."""
         self.debug_log_window = DebugLogWindow(self)
-        self.main_window = MainWindow(self)
+        self.main_window = MainWindow(self, self.thumbnail, self.thumbnail_fps)
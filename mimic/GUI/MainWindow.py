@@ -1,18 +1,21 @@
 """Mimic main window."""
 import tkinter as tk
+from typing import Optional
 
 from mimic.EventEmitter import EventEmitter
 from mimic.GUI.AbstractTkinterWindow import AbstractTkinterWindow
 from mimic.GUI.Widgets.QRCode import QRCodeImage
+from mimic.GUI.Widgets.ThumbnailImage import ThumbnailImage
+from mimic.Media.Thumbnail import ThumbnailBuffer
 from mimic.Utils.Host import resolve_host
 
 
-class MainWindow(AbstractTkinterWindow, EventEmitter):
+class MainWindow(AbstractTkinterWindow, EventEmitter):  # type: ignore[misc]
     """Mimic main window."""
 
     widgets: list[tk.Widget] = []
 
-    def __init__(self, master: tk.Tk):
+    def __init__(self, master: tk.Tk, thumbnail: Optional[ThumbnailBuffer] = None, thumbnail_fps: float = 4.0):
         """
         Attaches main window to the main Tkinter instance.
 
@@ -22,10 +25,15 @@ class MainWindow(AbstractTkinterWindow, EventEmitter):
 
         Args:
             master (tk.Tk): Master Tkinter instance
+            thumbnail (Optional[ThumbnailBuffer], optional): Thumbnail of the virtual camera written by the web
+                                                             server, shown under the QR code. Defaults to None.
+            thumbnail_fps (float, optional): Refresh rate of the thumbnail. Defaults to 4.0.
         """
         super().__init__(master)
 
         self.master = master
+        self.thumbnail = thumbnail
+        self.thumbnail_fps = thumbnail_fps
         self.title("Mimic")
         self.hide()
         
@@ -39,3 +47,7 @@ class MainWindow(AbstractTkinterWindow, EventEmitter):
         """Register widgets to window."""
         qr_code = QRCodeImage(self, f"https://{resolve_host()}:8080")
         qr_code.pack()
+
+        if self.thumbnail is not None:
+            thumbnail = ThumbnailImage(self, self.thumbnail, fps=self.thumbnail_fps)
+            thumbnail.pack(pady=(0, 8))
@@ -0,0 +1,81 @@
+"""
+Live thumbnail of the virtual camera for Tkinter.
+
+The thumbnail is read from a `mimic.Media.Thumbnail.ThumbnailBuffer` that the
+web server writes to. It is only refreshed while its window is mapped, and the
+buffer is paused while the window is hidden or minimized, so the server stops
+downscaling frames for it as well.
+
+>>> root = tk.Tk()
+>>> thumbnail = ThumbnailImage(root, ThumbnailBuffer.create())
+>>> thumbnail.pack()
+"""
+import tkinter as tk
+from typing import Optional
+
+from PIL import Image, ImageTk
+
+from mimic.Media.Thumbnail import ThumbnailBuffer
+
+
+class ThumbnailImage(tk.Label):
+    """Tkinter widget that renders the thumbnail of the virtual camera while its window is visible."""
+
+    def __init__(self, parent, buffer: ThumbnailBuffer, fps: float = 4.0):
+        """
+        Tkinter widget that renders the thumbnail of the virtual camera while its window is visible.
+
+        Args:
+            parent (tk.Frame): Tkinter parent frame
+            buffer (ThumbnailBuffer): Buffer created by this process that the web server writes to
+            fps (float, optional): Times per second the buffer is checked for a new thumbnail. Defaults to 4.0.
+        """
+        super().__init__(parent, text="Waiting for the camera", width=buffer.max_width // 8)
+
+        self.buffer = buffer
+        self.interval = max(1, round(1000 / fps))
+
+        self._sequence = 0
+        self._refresh_job: Optional[str] = None
+
+        # @NOTE The image must be referenced from Python, Tkinter does not keep
+        # a reference to it and would render it transparent
+        self.img: Optional[ImageTk.PhotoImage] = None
+
+        window = self.winfo_toplevel()
+        window.bind("<Map>", self._on_map, add="+")
+        window.bind("<Unmap>", self._on_unmap, add="+")
+
+    def _on_map(self, event: tk.Event):
+        # Events of the widgets inside the window are bound to the window too
+        if event.widget is not self.winfo_toplevel() or self._refresh_job is not None:
+            return
+
+        self.buffer.paused = False
+        self._refresh()
+
+    def _on_unmap(self, event: tk.Event):
+        if event.widget is not self.winfo_toplevel():
+            return
+
+        self.buffer.paused = True
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+
+    def _refresh(self):
+        """Show the latest thumbnail and check again after `interval` milliseconds."""
+        thumbnail = self.buffer.read(self._sequence)
+        if thumbnail is not None:
+            self._sequence, width, height, pixels = thumbnail
+            image = Image.frombuffer("RGB", (width, height), pixels, "raw", "RGB", 0, 1)
+
+            # The photo image is updated in place unless the size changed,
+            # e.g. when the phone is rotated
+            if self.img is not None and (self.img.width(), self.img.height()) == (width, height):
+                self.img.paste(image)
+            else:
+                self.img = ImageTk.PhotoImage(image)
+                self.config(image=self.img, text="", width=0)
+
+        self._refresh_job = self.after(self.interval, self._refresh)
@@ -8,13 +8,26 @@ Logs are written to disk without blocking the main thread.
 >>> asyncHandler = AsyncLoggingHandler("myLogFile.log")
 >>> my_logger.addHandler(asyncHandler)
 >>> my_logger.info("This will be logged to myLogFile.log without blocking the main thread")
+
+Rotated files can be compressed with gzip. Files are rotated and compressed on
+the thread that writes the logs, so the threads that log are never blocked.
 """
+import gzip
+import os
+import shutil
 from abc import ABC
-from logging import FileHandler, LogRecord
+from logging import FileHandler, Handler, LogRecord
 from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
 from queue import Queue
 from threading import Thread
 
+from mimic.Logging.Formatter import JSON, JsonLinesFormatter, log_formatter
+
+# Size of the log file before it is rotated, and the number of rotated files
+# that are kept
+_MAX_BYTES = 5 * 1024 * 1024
+_BACKUP_COUNT = 5
+
 
 class _AsyncHandler(ABC, object):
     """
@@ -35,7 +48,7 @@ class _AsyncHandler(ABC, object):
         Spawn a file logging handler on a separate thread and estabslish communication
         with the main thread.
         """
-        super(_AsyncHandler, self).__init__(*args, *kwargs)
+        super(_AsyncHandler, self).__init__(*args, **kwargs)
         self.__queue = Queue(-1)
         self.__thread = Thread(target=self.__loop)
         self.__thread.daemon = True
@@ -76,10 +89,60 @@ class AsyncFileHandler(_AsyncHandler, FileHandler):
 class AsyncRotatingFileHanlder(_AsyncHandler, RotatingFileHandler):
     """Non-blocking alternative to `RotatingFileHandler`."""
 
-    pass
+    def __init__(self, *args, compress: bool = False, **kwargs):
+        """
+        Spawn rotating file logging handler.
+
+        Args:
+            compress (bool, optional): Compress rotated files with gzip, they are named `<file>.<n>.gz`.
+                                       Defaults to False.
+        """
+        super().__init__(*args, **kwargs)
+
+        if compress:
+            self.namer = _gzip_namer
+            self.rotator = _gzip_rotator
 
 
 class AsyncTimedRotatingFileHandler(_AsyncHandler, TimedRotatingFileHandler):
     """Non-blocking alternative to `TimedRotatingFileHandler`."""
 
     pass
+
+
+def _gzip_namer(name: str) -> str:
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source: str, destination: str):
+    """Compress the log file that is being rotated, runs on the writer thread."""
+    with open(source, "rb") as source_file, gzip.open(destination, "wb") as destination_file:
+        shutil.copyfileobj(source_file, destination_file)
+
+    os.remove(source)
+
+
+def rotating_log_handler(
+    path: str,
+    format: str,
+    max_bytes: int = _MAX_BYTES,
+    backup_count: int = _BACKUP_COUNT,
+    compress: bool = True
+) -> Handler:
+    """
+    Create a non-blocking rotating file handler for a log format.
+
+    Args:
+        path (str): Path of the log file, see `mimic.Logging.Formatter.LOG_EXTENSIONS`
+        format (str): One of `mimic.Logging.Formatter.LOG_FORMATS`
+        max_bytes (int, optional): Size of the log file before it is rotated. Defaults to 5 MiB.
+        backup_count (int, optional): Number of rotated files that are kept. Defaults to 5.
+        compress (bool, optional): Compress rotated files with gzip. Defaults to True.
+
+    Returns:
+        Handler: Handler with the formatter of the log format
+    """
+    handler = AsyncRotatingFileHanlder(path, maxBytes=max_bytes, backupCount=backup_count, compress=compress)
+    handler.setFormatter(JsonLinesFormatter() if format == JSON else log_formatter)
+
+    return handler
@@ -1,6 +1,61 @@
-"""Standard formatter for logging."""
+"""
+Standard formatters for logging.
+
+Log files are written either as text with `log_formatter`, or as JSON lines
+with `JsonLinesFormatter`, one object per record with typed fields that can be
+filtered without parsing the message, see `mimic.Logging.Reader`.
+"""
+import json
 import logging
 
+TEXT = "text"
+JSON = "json"
+LOG_FORMATS = (TEXT, JSON)
+
+# File extension of each log format
+LOG_EXTENSIONS = {TEXT: "log", JSON: "jsonl"}
+
 log_formatter = logging.Formatter(
     "[%(asctime)s] %(levelname)s - %(message)s", "%Y-%m-%d %H:%M:%S"
 )
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Format records as single line JSON objects.
+
+    Every object has the keys `ts` (seconds since the epoch), `level`, `logger`
+    and `msg`. The structured fields passed as `extra={"fields": {...}}`, e.g.
+    the session id, round trip time, fps and stage timings of the web server,
+    are added as top level keys next to them.
+
+    >>> logger.debug("Latency 12.0ms", extra={"fields": {"rtt_ms": 12.0}})
+    {"ts":1622548800.123,"level":"DEBUG","logger":"mimic.webserver","msg":"Latency 12.0ms","rtt_ms":12.0}
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format a record as a JSON object without line breaks.
+
+        Args:
+            record (logging.LogRecord): Record to format
+
+        Returns:
+            str: JSON object
+        """
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+
+        fields = getattr(record, "fields", None)
+        if fields:
+            for key, value in fields.items():
+                entry.setdefault(key, value)
+
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str)
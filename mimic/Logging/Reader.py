@@ -0,0 +1,142 @@
+"""
+Stream and filter JSON lines logs, including their gzip compressed rotations.
+
+Files are read line by line and never loaded as a whole. Filters on exact field
+values are first matched against the raw line, so lines that cannot match are
+skipped without being parsed as JSON. Lines that are not JSON, e.g. from the
+text log format, are skipped.
+
+>>> for record in read_records(log_files("logs/webserver.jsonl"), session="1f2e3d4c", min_level="DEBUG"):
+>>>     print(record["ts"], record.get("rtt_ms"))
+"""
+import gzip
+import json
+import logging
+import os
+import re
+from typing import IO, Any, Iterable, Iterator, Optional, Union
+
+_ROTATED_FILE = re.compile(r"\.(\d+)(\.gz)?$")
+
+
+def log_files(path: Union[str, os.PathLike[str]]) -> list[str]:
+    """
+    Find a log file and its rotations, oldest first.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Path of the current log file, e.g. `logs/webserver.jsonl`
+
+    Returns:
+        list[str]: Existing rotations from the oldest to `path` itself
+    """
+    path = os.fspath(path)
+    directory, name = os.path.split(path)
+
+    rotations = []
+    for file_name in os.listdir(directory or "."):
+        if not file_name.startswith(f"{name}."):
+            continue
+
+        match = _ROTATED_FILE.search(file_name[len(name):])
+        if match is not None and match.start() == 0:
+            rotations.append((int(match.group(1)), os.path.join(directory, file_name)))
+
+    files = [file for _, file in sorted(rotations, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+
+    return files
+
+
+def open_log(path: Union[str, os.PathLike[str]]) -> IO[str]:
+    """
+    Open a log file for reading, decompressing it if it is gzip compressed.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Log file
+
+    Returns:
+        IO[str]: Text stream of the log file
+    """
+    if os.fspath(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def _level_number(name: str) -> int:
+    """Numeric value of a level name, 0 for unknown names."""
+    level = logging.getLevelName(name.upper())
+    return level if isinstance(level, int) else 0
+
+
+def _raw_fragment(key: str, value: Any) -> str:
+    """Get the text of a field as it appears in a line written by `JsonLinesFormatter`."""
+    return f"{json.dumps(key, ensure_ascii=False)}:{json.dumps(value, separators=(',', ':'), ensure_ascii=False)}"
+
+
+def read_records(
+    files: Iterable[Union[str, os.PathLike[str]]],
+    min_level: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    session: Optional[str] = None,
+    where: Optional[dict[str, Any]] = None,
+    contains: Optional[str] = None
+) -> Iterator[dict[str, Any]]:
+    """
+    Stream the records of log files that match every filter.
+
+    Args:
+        files (Iterable[Union[str, os.PathLike[str]]]): Log files in the order they are read, see `log_files`
+        min_level (Optional[str], optional): Skip records below this level, e.g. `INFO`. Defaults to None.
+        since (Optional[float], optional): Skip records before this time in seconds since the epoch.
+                                           Defaults to None.
+        until (Optional[float], optional): Skip records after this time in seconds since the epoch.
+                                           Defaults to None.
+        session (Optional[str], optional): Only records of this web server session. Defaults to None.
+        where (Optional[dict[str, Any]], optional): Only records whose fields have these exact values.
+                                                    Defaults to None.
+        contains (Optional[str], optional): Only records whose message contains this text. Defaults to None.
+
+    Yields:
+        dict[str, Any]: Matching records
+    """
+    exact = dict(where or {})
+    if session is not None:
+        exact["session"] = session
+
+    fragments = [_raw_fragment(key, value) for key, value in exact.items()]
+    if contains is not None:
+        # The message as it appears in the line, with its quotes escaped
+        fragments.append(json.dumps(contains, ensure_ascii=False)[1:-1])
+    level_number = _level_number(min_level) if min_level is not None else None
+
+    for file in files:
+        with open_log(file) as stream:
+            for line in stream:
+                if any(fragment not in line for fragment in fragments):
+                    continue
+
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if not isinstance(record, dict):
+                    continue
+
+                if any(record.get(key) != value for key, value in exact.items()):
+                    continue
+
+                if contains is not None and contains not in record.get("msg", ""):
+                    continue
+
+                timestamp = record.get("ts", 0.0)
+                if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                    continue
+
+                if level_number is not None and _level_number(record.get("level", "NOTSET")) < level_number:
+                    continue
+
+                yield record
@@ -0,0 +1,224 @@
+"""
+Inspect encoded video frames without decoding them.
+
+Only the few header fields that are needed to mux encoded frames into a
+container are read: whether a frame is a keyframe and the size of the picture.
+
+Supported codecs:
+- VP8 - Frames as depayloaded from RTP, see RFC 6386 section 9.1
+- H.264 - Access units in Annex B format (start code prefixed NAL units)
+"""
+from typing import Iterator, Optional
+
+VP8 = "vp8"
+H264 = "h264"
+
+_H264_NAL_IDR = 5
+_H264_NAL_SPS = 7
+
+# Profiles whose sequence parameter set contains chroma format and scaling
+# list fields, see ITU-T H.264 section 7.3.2.1.1
+_H264_HIGH_PROFILES = (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135)
+
+
+def codec_name(mime_type: str) -> Optional[str]:
+    """
+    Get the codec name of an RTP mime type.
+
+    Args:
+        mime_type (str): Mime type of the RTP codec, e.g. `video/VP8`
+
+    Returns:
+        Optional[str]: `VP8`, `H264` or `None` if the codec is not supported
+    """
+    name = mime_type.split("/")[-1].lower()
+    return name if name in (VP8, H264) else None
+
+
+def _h264_nal_units(data: bytes) -> Iterator[bytes]:
+    """
+    Split an Annex B access unit into NAL units.
+
+    Args:
+        data (bytes): Access unit
+
+    Yields:
+        bytes: NAL unit without its start code
+    """
+    start = data.find(b"\x00\x00\x01")
+    while start != -1:
+        start += 3
+        end = data.find(b"\x00\x00\x01", start)
+        nal_end = len(data) if end == -1 else end
+
+        # Four byte start codes leave a trailing zero on the previous unit
+        while nal_end > start and data[nal_end - 1] == 0 and end != -1:
+            nal_end -= 1
+
+        if nal_end > start:
+            yield data[start:nal_end]
+
+        start = end
+
+
+def is_keyframe(codec: str, data: bytes) -> bool:
+    """
+    Whether an encoded frame can be decoded without any previous frame.
+
+    Args:
+        codec (str): `VP8` or `H264`
+        data (bytes): Encoded frame
+
+    Returns:
+        bool: The frame is a keyframe
+    """
+    if len(data) == 0:
+        return False
+
+    if codec == VP8:
+        # The lowest bit of the frame tag is 0 for keyframes
+        return data[0] & 0x01 == 0
+
+    if codec == H264:
+        return any(nal[0] & 0x1F in (_H264_NAL_IDR, _H264_NAL_SPS) for nal in _h264_nal_units(data))
+
+    return False
+
+
+class _BitReader:
+    """Read bits and Exp-Golomb codes from an H.264 RBSP."""
+
+    def __init__(self, data: bytes):
+        # Remove emulation prevention bytes (0x000003 -> 0x0000)
+        self._data = data.replace(b"\x00\x00\x03", b"\x00\x00")
+        self._position = 0
+
+    def bit(self) -> int:
+        byte = self._data[self._position >> 3]
+        value = (byte >> (7 - (self._position & 7))) & 1
+        self._position += 1
+        return value
+
+    def bits(self, count: int) -> int:
+        value = 0
+        for _ in range(count):
+            value = (value << 1) | self.bit()
+        return value
+
+    def unsigned(self) -> int:
+        leading_zeros = 0
+        while self.bit() == 0:
+            leading_zeros += 1
+        return (1 << leading_zeros) - 1 + self.bits(leading_zeros)
+
+    def signed(self) -> int:
+        value = self.unsigned()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def _h264_sps_size(sps: bytes) -> tuple[int, int]:
+    """
+    Read the picture size from an H.264 sequence parameter set.
+
+    Args:
+        sps (bytes): SPS NAL unit including its header byte
+
+    Returns:
+        tuple[int, int]: Width and height in pixels after cropping
+    """
+    reader = _BitReader(sps[1:])
+
+    profile_idc = reader.bits(8)
+    reader.bits(16)  # constraint flags and level_idc
+    reader.unsigned()  # seq_parameter_set_id
+
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    if profile_idc in _H264_HIGH_PROFILES:
+        chroma_format_idc = reader.unsigned()
+        if chroma_format_idc == 3:
+            separate_colour_plane = reader.bit()
+        reader.unsigned()  # bit_depth_luma_minus8
+        reader.unsigned()  # bit_depth_chroma_minus8
+        reader.bit()  # qpprime_y_zero_transform_bypass_flag
+
+        if reader.bit():  # seq_scaling_matrix_present_flag
+            for index in range(8 if chroma_format_idc != 3 else 12):
+                if reader.bit():  # seq_scaling_list_present_flag
+                    size = 16 if index < 6 else 64
+                    last_scale = next_scale = 8
+                    for _ in range(size):
+                        if next_scale != 0:
+                            next_scale = (last_scale + reader.signed() + 256) % 256
+                        last_scale = next_scale if next_scale != 0 else last_scale
+
+    reader.unsigned()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = reader.unsigned()
+    if pic_order_cnt_type == 0:
+        reader.unsigned()  # log2_max_pic_order_cnt_lsb_minus4
+    elif pic_order_cnt_type == 1:
+        reader.bit()  # delta_pic_order_always_zero_flag
+        reader.signed()  # offset_for_non_ref_pic
+        reader.signed()  # offset_for_top_to_bottom_field
+        for _ in range(reader.unsigned()):
+            reader.signed()  # offset_for_ref_frame
+
+    reader.unsigned()  # max_num_ref_frames
+    reader.bit()  # gaps_in_frame_num_value_allowed_flag
+
+    width_in_macroblocks = reader.unsigned() + 1
+    height_in_map_units = reader.unsigned() + 1
+    frame_mbs_only = reader.bit()
+    if not frame_mbs_only:
+        reader.bit()  # mb_adaptive_frame_field_flag
+    reader.bit()  # direct_8x8_inference_flag
+
+    width = width_in_macroblocks * 16
+    height = height_in_map_units * 16 * (2 - frame_mbs_only)
+
+    if reader.bit():  # frame_cropping_flag
+        left, right, top, bottom = (reader.unsigned() for _ in range(4))
+
+        # Cropping is in units of chroma samples, see ITU-T H.264 table 6-1
+        chroma_array_type = 0 if separate_colour_plane else chroma_format_idc
+        sub_width, sub_height = {1: (2, 2), 2: (2, 1)}.get(chroma_array_type, (1, 1))
+        crop_unit_x = sub_width
+        crop_unit_y = sub_height * (2 - frame_mbs_only)
+
+        width -= (left + right) * crop_unit_x
+        height -= (top + bottom) * crop_unit_y
+
+    return width, height
+
+
+def frame_size(codec: str, data: bytes) -> Optional[tuple[int, int]]:
+    """
+    Read the picture size from a keyframe.
+
+    Args:
+        codec (str): `VP8` or `H264`
+        data (bytes): Encoded keyframe
+
+    Returns:
+        Optional[tuple[int, int]]: Width and height, `None` if the frame does
+                                   not carry the picture size
+    """
+    if codec == VP8:
+        # Keyframes have a 3 byte frame tag, a 3 byte start code and then the
+        # 14 bit width and height
+        if not is_keyframe(codec, data) or len(data) < 10 or data[3:6] != b"\x9d\x01\x2a":
+            return None
+
+        width = (data[6] | (data[7] << 8)) & 0x3FFF
+        height = (data[8] | (data[9] << 8)) & 0x3FFF
+        return width, height
+
+    if codec == H264:
+        for nal in _h264_nal_units(data):
+            if nal[0] & 0x1F == _H264_NAL_SPS:
+                try:
+                    return _h264_sps_size(nal)
+                except IndexError:
+                    return None
+
+    return None
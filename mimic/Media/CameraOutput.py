@@ -0,0 +1,316 @@
+"""
+Output of frames to the virtual camera for a single camera profile.
+
+Frames are sent to a sink:
+- camera - The pyvirtualcam virtual camera, Windows only
+- null - Frames are converted and discarded, for headless hosts that only
+  record, relay or preview the stream
+
+A `CameraOutput` bundles everything that depends on the output profile: the
+virtual camera, the frame transform and its buffers, and the placeholder frame
+shown while no client is connected. Changing the profile at runtime means
+opening a new `CameraOutput` in the background and replacing the old one
+between two frames.
+"""
+import os
+from time import sleep
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional, Union
+
+import numpy as np
+from av import VideoFrame
+from PIL import Image
+
+from mimic.Media.FrameTransform import FIT, FrameTransform
+from mimic.Media.Scaler import BICUBIC, Scaler
+from mimic.MetaData import MetaData
+from mimic.Utils.Tracing import Tracer
+
+ASSETS_ROOT = "assets"
+
+if TYPE_CHECKING:
+    from pyvirtualcam.camera import _WindowsCamera
+
+CAMERA_SINK = "camera"
+NULL_SINK = "null"
+SINKS = (CAMERA_SINK, NULL_SINK)
+
+# Share of the frame interval scaling a frame may take before the `AUTO`
+# scaler preset steps down, the rest is left for decoding and sending
+_SCALE_BUDGET = 0.5
+
+_CAMERA_DELAY = 0
+_CAMERA_BUSY_ERROR = 'error starting virtual camera output'
+
+
+class CameraProfile(NamedTuple):
+    """Output size and frame rate of the virtual camera."""
+
+    name: str
+    width: int
+    height: int
+    fps: int
+
+
+CAMERA_PROFILES = {
+    profile.name: profile for profile in (
+        CameraProfile("480p", 640, 480, 30),
+        CameraProfile("720p", 1280, 720, 30),
+        CameraProfile("1080p", 1920, 1080, 30),
+    )
+}
+
+# Placeholder frames are expensive to scale, keep one per output size so
+# switching back to a profile is instant
+_placeholder_cache: dict[tuple[int, int], np.ndarray] = {}
+
+# Directory the scaled placeholder frames are persisted to, so a restarted
+# server process loads them instead of scaling them again
+_placeholder_directory: Optional[str] = None
+
+
+def persist_placeholder_frames(directory: Optional[str]):
+    """
+    Persist scaled placeholder frames to a directory, or stop persisting them.
+
+    Args:
+        directory (Optional[str]): Existing directory, `None` to only keep them in memory
+    """
+    global _placeholder_directory
+    _placeholder_directory = directory
+
+
+def placeholder_frame(width: int, height: int) -> np.ndarray:
+    """
+    Get the "no camera" placeholder image scaled to an output size.
+
+    Args:
+        width (int): Output width
+        height (int): Output height
+
+    Returns:
+        np.ndarray: RGBA image, shared between callers and must not be modified
+    """
+    key = (width, height)
+
+    if key not in _placeholder_cache:
+        source = os.path.join(ASSETS_ROOT, "no_camera.bmp")
+
+        # Persisted frames are named after the modification time of the
+        # source image so that changing it invalidates them
+        persisted = None
+        if _placeholder_directory is not None:
+            persisted = os.path.join(_placeholder_directory,
+                                     f"no_camera_{width}x{height}_{os.stat(source).st_mtime_ns}.npy")
+
+        image = None
+        if persisted is not None and os.path.exists(persisted):
+            try:
+                image = np.load(persisted)
+            except (OSError, ValueError):
+                image = None
+
+        if image is None or image.shape != (height, width, 4):
+            bitmap = Image.open(source).convert('RGB')
+            frame = VideoFrame.from_ndarray(np.asanyarray(bitmap, dtype=np.uint8), format="rgb24").reformat(
+                width=width, height=height, format='rgba')
+            image = frame.to_ndarray()
+
+            if persisted is not None:
+                try:
+                    np.save(persisted, image)
+                except OSError:
+                    pass
+
+        image.setflags(write=False)
+        _placeholder_cache[key] = image
+
+    return _placeholder_cache[key]
+
+
+def capture_constraints(profile: CameraProfile) -> dict:
+    """
+    Get the `getUserMedia` constraints the client should capture with for a profile.
+
+    The constraints are ideal values so that clients whose camera does not
+    support the exact size still capture at the closest size available.
+
+    Args:
+        profile (CameraProfile): Output profile
+
+    Returns:
+        dict: MediaStreamConstraints as a JSON serializable dict
+    """
+    return {
+        "audio": False,
+        "video": {
+            "width": {"ideal": profile.width},
+            "height": {"ideal": profile.height},
+            "frameRate": {"ideal": profile.fps},
+        },
+    }
+
+
+class NullCamera:
+    """Sink that discards every frame, has the same interface as the virtual camera."""
+
+    def __init__(self, width: int, height: int, fps: int):
+        """
+        Create new instance of `NullCamera`.
+
+        Args:
+            width (int): Frame width
+            height (int): Frame height
+            fps (int): Frame rate
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+    def send(self, frame: np.ndarray):
+        """Discard a frame."""
+
+    def close(self):
+        """Nothing to release."""
+
+
+Camera = Union["_WindowsCamera", NullCamera]
+
+
+def acquire_camera(
+    profile: CameraProfile,
+    retry_count: int,
+    retry_interval: float,
+    on_retry: Optional[Callable[[int], None]] = None,
+    sink: str = CAMERA_SINK,
+    backoff: float = 1.0
+) -> Camera:
+    """
+    Acquire the virtual camera, retrying while the camera is busy.
+
+    @NOTE Blocks, should be run on a worker thread when called from the event loop.
+
+    Args:
+        profile (CameraProfile): Output profile to open the camera with
+        retry_count (int): Maximum number of attempts
+        retry_interval (float): Seconds to wait after the first failed attempt
+        on_retry (Optional[Callable[[int], None]], optional): Called with the attempt number after a
+                                                              failed attempt. Defaults to None.
+        sink (str, optional): `CAMERA_SINK` or `NULL_SINK`. Defaults to CAMERA_SINK.
+        backoff (float, optional): Factor the wait grows by after every further failed attempt. Defaults to 1.0.
+
+    Raises:
+        RuntimeError: The camera could not be acquired
+
+    Returns:
+        Camera: Acquired virtual camera
+    """
+    if sink == NULL_SINK:
+        return NullCamera(profile.width, profile.height, profile.fps)
+
+    # Only available on Windows, imported here so headless hosts can run
+    # without it
+    import pyvirtualcam
+
+    for attempt in range(1, retry_count + 1):
+        try:
+            return pyvirtualcam.Camera(profile.width, profile.height, profile.fps, _CAMERA_DELAY)
+
+        except RuntimeError as error:
+            if error.args[0] != _CAMERA_BUSY_ERROR:
+                raise error
+
+            if attempt < retry_count:
+                if on_retry is not None:
+                    on_retry(attempt)
+
+                sleep(retry_interval * backoff ** (attempt - 1))
+
+    raise RuntimeError("Failed to acquire camera.")
+
+
+class CameraOutput:
+    """Virtual camera, frame transform and placeholder of one camera profile."""
+
+    def __init__(
+        self,
+        profile: CameraProfile,
+        camera: Camera,
+        scale_mode: str = FIT,
+        mirror_user_facing: bool = False,
+        scaler: Optional[Scaler] = None,
+        tracer: Optional[Tracer] = None,
+        scaler_preset: str = BICUBIC
+    ):
+        """
+        Create new instance of `CameraOutput`.
+
+        Args:
+            profile (CameraProfile): Output profile
+            camera (Camera): Virtual camera opened with the profile
+            scale_mode (str, optional): Scale mode of the frame transform. Defaults to FIT.
+            mirror_user_facing (bool, optional): Flip frames from front facing cameras. Defaults to False.
+            scaler (Optional[Scaler], optional): Scaler shared between outputs. Defaults to a new scaler.
+            tracer (Optional[Tracer], optional): Records the time spent converting and sending frames. Defaults to None.
+            scaler_preset (str, optional): One of `mimic.Media.Scaler.SCALER_PRESETS`. Defaults to BICUBIC.
+        """
+        self.profile = profile
+        self.camera = camera
+
+        self._tracer = tracer if tracer is not None else Tracer(enabled=False)
+        self.transform = FrameTransform(profile.width, profile.height, format="rgba", mode=scale_mode,
+                                        mirror_user_facing=mirror_user_facing, scaler=scaler, tracer=self._tracer,
+                                        scaler_preset=scaler_preset, frame_budget=_SCALE_BUDGET / profile.fps)
+        self.placeholder = placeholder_frame(profile.width, profile.height)
+
+        # Number of frames sent to the camera and the last one of them, kept
+        # until the next frame is sent so it can be read for snapshots
+        self.frame_count = 0
+        self._latest_image: Optional[np.ndarray] = None
+
+    @property
+    def latest_image(self) -> Optional[np.ndarray]:
+        """
+        Last frame sent to the camera, `None` if no frame has been sent yet.
+
+        @NOTE The buffer is reused after the next frame is sent, copy it
+        before yielding to the event loop.
+        """
+        return self._latest_image
+
+    def send_frame(self, frame: VideoFrame):
+        """
+        Convert a decoded frame and paint it to the camera.
+
+        Args:
+            frame (VideoFrame): Decoded frame from the client
+        """
+        image = self.transform.convert(frame)
+
+        try:
+            with self._tracer.span("send"):
+                self.camera.send(image)
+        finally:
+            # The camera copies the frame into its own buffer, so the buffer
+            # of the previous frame can be reused for the next frame
+            previous_image, self._latest_image = self._latest_image, image
+            self.frame_count += 1
+
+            if previous_image is not None:
+                self.transform.release(previous_image)
+
+    def send_placeholder(self):
+        """Paint the placeholder image to the camera."""
+        self.camera.send(self.placeholder)
+
+    def update_metadata(self, metadata: Optional[MetaData]):
+        """
+        Update the orientation and camera information reported by the client.
+
+        Args:
+            metadata (Optional[MetaData]): Latest metadata, `None` when a new session starts
+        """
+        self.transform.update_metadata(metadata)
+
+    def close(self):
+        """Release the virtual camera."""
+        self.camera.close()
@@ -0,0 +1,351 @@
+"""
+Capture the incoming frames of a session into a compact trace file and read them back.
+
+A trace records every frame with its arrival time, either encoded as it was
+handed to the decoder (`ENCODED`) or decoded as the planes of its yuv420p
+picture (`DECODED`). Replaying a trace, see `.scripts/replay_trace.py`, feeds
+the frames through the same conversion and sink path as the server without a
+phone or a network, so performance regressions can be reproduced.
+
+Frames are copied on the event loop and written by a background thread, and
+frames are dropped instead of blocking while the writer is behind.
+
+File format, little endian:
+- Header - Magic `MMTR`, format version (u8), length of the header JSON (u32)
+  and the header JSON: kind, codec, camera profile, scale mode and the client
+  metadata at the start of the capture
+- One record per frame - Arrival time in nanoseconds since the first frame
+  (u64), pts (i64), width and height (u16, 0 for encoded frames), payload
+  length (u32) and payload. Decoded payloads are the Y, U and V planes without
+  padding, compressed with zlib
+
+>>> trace = FrameTraceWriter(resolve_local_app_data("traces", "session.mtrace"), DECODED, {"profile": "720p"})
+>>> trace.start()
+>>> trace.submit_decoded(frame)
+>>> trace.stop()
+>>> header, frames = read_frame_trace(resolve_local_app_data("traces", "session.mtrace"))
+"""
+import json
+import os
+import queue
+import struct
+import zlib
+from fractions import Fraction
+from threading import Thread
+from time import perf_counter_ns
+from typing import (Any, BinaryIO, Iterable, Iterator, NamedTuple, Optional,
+                    Union)
+
+import numpy as np
+from av import VideoFrame
+
+ENCODED = "encoded"
+DECODED = "decoded"
+TRACE_KINDS = (ENCODED, DECODED)
+
+TRACE_EXTENSION = "mtrace"
+
+_MAGIC = b"MMTR"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBI")
+_RECORD = struct.Struct("<QqHHI")
+
+# Fast compression, decoded planes of camera frames compress well even at the
+# lowest level and the writer must keep up with the frame rate
+_COMPRESSION_LEVEL = 1
+
+# Time base of the pts of decoded frames, the RTP clock rate of video
+_TIME_BASE = Fraction(1, 90000)
+
+
+class TraceFrame(NamedTuple):
+    """A single frame of a trace."""
+
+    # Nanoseconds since the first frame of the trace arrived
+    arrival_ns: int
+    # RTP timestamp of encoded frames, pts of decoded frames in 1/90000s
+    pts: int
+    # Picture size of decoded frames, 0 for encoded frames
+    width: int
+    height: int
+    # Encoded frame, or the zlib compressed planes of a decoded frame
+    data: bytes
+
+
+def decoded_video_frame(frame: TraceFrame) -> VideoFrame:
+    """
+    Restore the picture of a decoded trace frame.
+
+    Args:
+        frame (TraceFrame): Frame of a `DECODED` trace
+
+    Returns:
+        VideoFrame: yuv420p frame with the pts it arrived with
+    """
+    planes = np.frombuffer(zlib.decompress(frame.data), dtype=np.uint8)
+    video_frame = VideoFrame.from_ndarray(planes.reshape(frame.height * 3 // 2, frame.width), format="yuv420p")
+    video_frame.pts = frame.pts
+    video_frame.time_base = _TIME_BASE
+
+    return video_frame
+
+
+def decoded_trace_frame(arrival_ns: int, frame: VideoFrame) -> TraceFrame:
+    """
+    Store the picture of a decoded frame as a trace frame.
+
+    Args:
+        arrival_ns (int): Nanoseconds since the first frame of the trace arrived
+        frame (VideoFrame): Decoded frame
+
+    Returns:
+        TraceFrame: Frame for a `DECODED` trace
+    """
+    if frame.format.name != "yuv420p":
+        frame = frame.reformat(format="yuv420p")
+
+    pts = round(frame.pts * frame.time_base / _TIME_BASE) if frame.pts is not None and frame.time_base else 0
+    return TraceFrame(arrival_ns, pts, frame.width, frame.height,
+                      zlib.compress(frame.to_ndarray().tobytes(), _COMPRESSION_LEVEL))
+
+
+def write_frame_trace(path: Union[str, os.PathLike[str]], header: dict[str, Any], frames: Iterable[TraceFrame]):
+    """
+    Write a complete trace, e.g. a synthetic trace.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Trace file, overwritten if it exists
+        header (dict[str, Any]): Header of the trace, must include its `kind`
+        frames (Iterable[TraceFrame]): Frames in order of arrival
+    """
+    with open(path, "wb") as file:
+        _write_header(file, header)
+        for frame in frames:
+            _write_record(file, frame)
+
+
+def _write_header(file: BinaryIO, header: dict[str, Any]):
+    data = json.dumps(header).encode()
+    file.write(_HEADER.pack(_MAGIC, _VERSION, len(data)))
+    file.write(data)
+
+
+def _write_record(file: BinaryIO, frame: TraceFrame) -> int:
+    """Write a frame, returns the bytes written."""
+    file.write(_RECORD.pack(frame.arrival_ns, frame.pts, frame.width, frame.height, len(frame.data)))
+    file.write(frame.data)
+    return _RECORD.size + len(frame.data)
+
+
+def read_frame_trace(path: Union[str, os.PathLike[str]]) -> tuple[dict[str, Any], Iterator[TraceFrame]]:
+    """
+    Open a trace file.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Trace file
+
+    Raises:
+        ValueError: The file is not a trace, or of an unsupported version
+
+    Returns:
+        tuple[dict[str, Any], Iterator[TraceFrame]]: Header and the frames, read lazily
+    """
+    file = open(path, "rb")
+    try:
+        magic, version, header_length = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a version {_VERSION} frame trace")
+
+        header = json.loads(file.read(header_length))
+    except (struct.error, ValueError):
+        file.close()
+        raise
+
+    def frames() -> Iterator[TraceFrame]:
+        with file:
+            while True:
+                record = file.read(_RECORD.size)
+                if len(record) < _RECORD.size:
+                    return
+
+                arrival_ns, pts, width, height, length = _RECORD.unpack(record)
+                data = file.read(length)
+                if len(data) < length:
+                    # The capture was cut off mid record
+                    return
+
+                yield TraceFrame(arrival_ns, pts, width, height, data)
+
+    return header, frames()
+
+
+class FrameTraceWriter:
+    """Write the incoming frames of a session to a trace file on a background thread."""
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike[str]],
+        kind: str,
+        header: Optional[dict[str, Any]] = None,
+        max_frames: int = 1800,
+        queue_size: int = 64
+    ):
+        """
+        Create new instance of `FrameTraceWriter`.
+
+        Args:
+            path (Union[str, os.PathLike[str]]): Trace file, overwritten if it exists
+            kind (str): `ENCODED` or `DECODED`
+            header (Optional[dict[str, Any]], optional): Written to the header of the trace, e.g. the camera
+                                                          profile. Defaults to None.
+            max_frames (int, optional): Frames after which further frames are ignored. Defaults to 1800.
+            queue_size (int, optional): Frames that may be waiting for the writer before frames are dropped.
+                                        Defaults to 64.
+
+        Raises:
+            ValueError: Unknown kind
+        """
+        if kind not in TRACE_KINDS:
+            raise ValueError(f"Unknown trace kind `{kind}`, expected one of {list(TRACE_KINDS)}")
+
+        self.path = str(path)
+        self.kind = kind
+        self.header = {**(header or {}), "kind": kind}
+        self.max_frames = max_frames
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[Thread] = None
+        self._running = False
+        self._first_arrival_ns: Optional[int] = None
+
+        self.frames = 0
+        self.bytes_written = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether frames are being captured."""
+        return self._running
+
+    def start(self):
+        """Write the header and start the writer thread."""
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = Thread(target=self._write_loop, name="FrameTraceWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop capturing and close the trace file.
+
+        @NOTE Blocks until queued frames are written, should be run on a worker
+        thread when called from the event loop.
+        """
+        if self._thread is None:
+            return
+
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit_encoded(self, mime_type: str, data: bytes, timestamp: int):
+        """
+        Queue an encoded frame, without blocking. Has the signature of `mimic.Media.ReceiverTap.EncodedFrameListener`.
+
+        Args:
+            mime_type (str): Mime type of the RTP codec, e.g. `video/VP8`
+            data (bytes): Encoded frame
+            timestamp (int): RTP timestamp of the frame
+        """
+        if self.kind != ENCODED:
+            return
+
+        if "codec" not in self.header:
+            self.header["codec"] = mime_type
+
+        self._submit(timestamp, 0, 0, data)
+
+    def submit_decoded(self, frame: VideoFrame):
+        """
+        Queue a decoded frame, without blocking.
+
+        Args:
+            frame (VideoFrame): Decoded frame from the client
+        """
+        if self.kind != DECODED or not self._running:
+            return
+
+        # Decoders output yuv420p, `to_ndarray` copies its planes without the
+        # padding of their line sizes
+        if frame.format.name != "yuv420p":
+            frame = frame.reformat(format="yuv420p")
+
+        pts = round(frame.pts * frame.time_base / _TIME_BASE) if frame.pts is not None and frame.time_base else 0
+        self._submit(pts, frame.width, frame.height, frame.to_ndarray())
+
+    def stats(self) -> dict:
+        """
+        Get the capture counters.
+
+        Returns:
+            dict: Whether the capture is running, its file and kind, frames and bytes written and frames dropped
+        """
+        return {
+            "running": self._running,
+            "file": self.path,
+            "kind": self.kind,
+            "frames": self.frames,
+            "bytes": self.bytes_written,
+            "dropped": self.dropped,
+        }
+
+    def _submit(self, pts: int, width: int, height: int, payload: Union[bytes, np.ndarray]):
+        """Queue a frame with its arrival time, stopping the capture once it is full."""
+        if not self._running:
+            return
+
+        arrival_ns = perf_counter_ns()
+        if self._first_arrival_ns is None:
+            self._first_arrival_ns = arrival_ns
+
+        if self.frames + self._queue.qsize() >= self.max_frames:
+            self._running = False
+            return
+
+        try:
+            self._queue.put_nowait((arrival_ns - self._first_arrival_ns, pts, width, height, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        """
+        Write the header and every queued frame until `stop` is called.
+
+        @NOTE Should *not* be called directly, this runs on the writer thread.
+        """
+        file: Optional[BinaryIO] = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+
+                # The codec of encoded traces is only known from the first
+                # frame, so the header is written with it
+                if file is None:
+                    file = open(self.path, "wb")
+                    _write_header(file, self.header)
+
+                arrival_ns, pts, width, height, payload = item
+                data = zlib.compress(payload.tobytes(), _COMPRESSION_LEVEL) if width != 0 else payload
+
+                self.bytes_written += _write_record(file, TraceFrame(arrival_ns, pts, width, height, data))
+                self.frames += 1
+        except OSError:
+            self._running = False
+        finally:
+            if file is not None:
+                file.close()
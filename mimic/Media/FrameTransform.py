@@ -0,0 +1,390 @@
+"""
+Convert decoded video frames to the format of the virtual camera.
+
+Orientation, cropping, aspect-ratio-preserving scaling and letterboxing are
+fused so that each frame is only scaled and color converted once:
+
+1. The crop region, rotation and mirror are applied to the YUV planes of the
+   source frame using strided views, and copied once into a reusable staging
+   frame. This step is skipped when the source frame can be used as is.
+2. The cropped frame is scaled, converted to the output format and padded with
+   letterbox bars by a single `Scaler` filter graph, with the interpolation of
+   the output's `ScalerPreset`. Cropping happens first so that fewer pixels are
+   scaled, and swscale writes straight into the padded output frame.
+
+The output frames come from the frame pool of the filter graph. Converted
+images are views of those frames and must be released once the sink has
+consumed them so their buffers can be reused for the next frame.
+
+>>> transform = FrameTransform(1280, 720, mode=FIT)
+>>> transform.update_metadata(MetaData(json_str))
+>>> image = transform.convert(frame)
+>>> cam.send(image)
+>>> transform.release(image)
+"""
+from time import perf_counter
+from typing import NamedTuple, Optional
+
+import numpy as np
+from av import VideoFrame
+
+from mimic.Media.Scaler import BICUBIC, FAST_BILINEAR, Scaler, ScalerPreset
+from mimic.MetaData import MetaData
+from mimic.Utils.Tracing import Tracer
+
+# Scale the whole frame to fit inside of the output, adding letterbox bars
+FIT = "fit"
+
+# Scale the frame to cover the whole output, cropping the edges
+FILL = "fill"
+
+# Scale the frame to the output size, ignoring the aspect ratio
+STRETCH = "stretch"
+
+SCALE_MODES = (FIT, FILL, STRETCH)
+
+# Number of bytes per pixel of the supported packed output formats
+_CHANNELS = {"rgba": 4, "bgra": 4, "rgb24": 3, "bgr24": 3}
+
+# Planar formats whose planes can be cropped and rotated directly
+_PLANAR_FORMATS = ("yuv420p", "yuvj420p")
+
+
+class Geometry(NamedTuple):
+    """How a source frame is mapped onto the output."""
+
+    # Region of the source frame that is visible in the output, as x, y, width, height
+    crop: tuple[int, int, int, int]
+
+    # Clockwise rotation in degrees, one of 0, 90, 180 or 270
+    rotation: int
+
+    # Whether the output is flipped horizontally
+    mirror: bool
+
+    # Region of the output the scaled frame is written to, as x, y, width, height
+    content: tuple[int, int, int, int]
+
+
+def _even(value: float) -> int:
+    """Round to the nearest even integer, chroma planes are half the size of the luma plane."""
+    return max(2, int(round(value / 2)) * 2)
+
+
+def compute_geometry(
+    source_width: int,
+    source_height: int,
+    output_width: int,
+    output_height: int,
+    rotation: int = 0,
+    mirror: bool = False,
+    mode: str = FIT
+) -> Geometry:
+    """
+    Compute the crop region and output placement of a frame.
+
+    Args:
+        source_width (int): Width of the source frame
+        source_height (int): Height of the source frame
+        output_width (int): Width of the output
+        output_height (int): Height of the output
+        rotation (int, optional): Clockwise rotation in degrees. Defaults to 0.
+        mirror (bool, optional): Flip the output horizontally. Defaults to False.
+        mode (str, optional): One of `FIT`, `FILL` or `STRETCH`. Defaults to FIT.
+
+    Raises:
+        ValueError: Unknown scale mode or rotation
+
+    Returns:
+        Geometry: Crop region and output placement
+    """
+    if mode not in SCALE_MODES:
+        raise ValueError(f"Unknown scale mode `{mode}`")
+
+    if rotation not in (0, 90, 180, 270):
+        raise ValueError(f"Rotation must be a multiple of 90 degrees, got {rotation}")
+
+    is_sideways = rotation in (90, 270)
+    rotated_width, rotated_height = (source_height, source_width) if is_sideways else (source_width, source_height)
+
+    full_crop = (0, 0, source_width, source_height)
+    full_output = (0, 0, output_width, output_height)
+
+    if mode == STRETCH:
+        return Geometry(full_crop, rotation, mirror, full_output)
+
+    if mode == FIT:
+        scale = min(output_width / rotated_width, output_height / rotated_height)
+        content_width = min(output_width, _even(rotated_width * scale))
+        content_height = min(output_height, _even(rotated_height * scale))
+        content = ((output_width - content_width) // 2, (output_height - content_height) // 2,
+                   content_width, content_height)
+
+        return Geometry(full_crop, rotation, mirror, content)
+
+    # Only the part of the rotated frame that covers the output is kept
+    scale = max(output_width / rotated_width, output_height / rotated_height)
+    visible_width = min(rotated_width, _even(output_width / scale))
+    visible_height = min(rotated_height, _even(output_height / scale))
+
+    if is_sideways:
+        visible_width, visible_height = visible_height, visible_width
+
+    crop_x = (source_width - visible_width) // 2 // 2 * 2
+    crop_y = (source_height - visible_height) // 2 // 2 * 2
+
+    return Geometry((crop_x, crop_y, visible_width, visible_height), rotation, mirror, full_output)
+
+
+def _plane_view(frame: VideoFrame, index: int) -> np.ndarray:
+    """
+    Get a writable 2d view of a plane of a frame, without the line padding.
+
+    Args:
+        frame (VideoFrame): Frame in a planar format
+        index (int): Index of the plane
+
+    Returns:
+        np.ndarray: View of the plane
+    """
+    plane = frame.planes[index]
+    view = np.frombuffer(memoryview(plane), dtype=np.uint8).reshape(plane.height, plane.line_size)
+
+    return view[:, :plane.width]
+
+
+class FrameTransform:
+    """
+    Convert decoded frames to a fixed output size and format.
+
+    The returned images are backed by reused buffers and must be passed to
+    `release` once they have been consumed.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        format: str = "rgba",
+        mode: str = FIT,
+        mirror_user_facing: bool = False,
+        scaler: Optional[Scaler] = None,
+        tracer: Optional[Tracer] = None,
+        scaler_preset: str = BICUBIC,
+        frame_budget: float = 1 / 60
+    ):
+        """
+        Create new instance of `FrameTransform`.
+
+        Args:
+            width (int): Output width
+            height (int): Output height
+            format (str, optional): Packed output pixel format. Defaults to "rgba".
+            mode (str, optional): One of `FIT`, `FILL` or `STRETCH`. Defaults to FIT.
+            mirror_user_facing (bool, optional): Flip frames from front facing cameras. Defaults to False.
+            scaler (Optional[Scaler], optional): Scaler with the same output format. Defaults to a new scaler.
+            tracer (Optional[Tracer], optional): Records the time spent in each step. Defaults to None.
+            scaler_preset (str, optional): One of `mimic.Media.Scaler.SCALER_PRESETS`. Defaults to BICUBIC.
+            frame_budget (float, optional): Seconds scaling a frame may take before the `AUTO` scaler preset
+                                            steps down. Defaults to 1/60.
+
+        Raises:
+            ValueError: Unsupported output format, unknown scale mode or unknown scaler preset
+        """
+        if format not in _CHANNELS:
+            raise ValueError(f"Unsupported output format `{format}`")
+
+        if mode not in SCALE_MODES:
+            raise ValueError(f"Unknown scale mode `{mode}`")
+
+        self.width = width
+        self.height = height
+        self.format = format
+        self.mode = mode
+        self.mirror_user_facing = mirror_user_facing
+
+        self._scaler = scaler if scaler is not None else Scaler(format)
+        self.scaler_preset = ScalerPreset(scaler_preset, frame_budget)
+        self._tracer = tracer if tracer is not None else Tracer(enabled=False)
+        self._metadata: Optional[MetaData] = None
+
+        self._geometry_key: Optional[tuple] = None
+        self._geometry: Optional[Geometry] = None
+        self._staging_frame: Optional[VideoFrame] = None
+
+        # Converts frames that are not in a planar format before they are
+        # cropped, created on the first such frame
+        self._planar_scaler: Optional[Scaler] = None
+
+        # Images that have been handed out, keyed by `id`, along with the
+        # frame that owns their buffer
+        self._in_flight: dict[int, VideoFrame] = {}
+
+    def update_metadata(self, metadata: Optional[MetaData]):
+        """
+        Update the orientation and camera information reported by the client.
+
+        Args:
+            metadata (Optional[MetaData]): Latest metadata, `None` when a new session starts
+        """
+        self._metadata = metadata
+
+    def orientation(self, frame: VideoFrame) -> tuple[int, bool]:
+        """
+        Find the rotation and mirror to apply to a frame.
+
+        Most browsers rotate frames before they are encoded. Browsers that
+        instead signal the rotation out of band (iOS Safari) send frames whose
+        aspect ratio does not match the upright size the client reported. Those
+        frames are rotated by the client's screen angle.
+
+        Args:
+            frame (VideoFrame): Decoded source frame
+
+        Returns:
+            tuple[int, bool]: Clockwise rotation in degrees and whether to mirror
+        """
+        metadata = self._metadata
+        if metadata is None:
+            return 0, False
+
+        rotation = 0
+        is_frame_portrait = frame.height > frame.width
+        is_upright_portrait = metadata.height > metadata.width
+        if is_frame_portrait != is_upright_portrait:
+            rotation = 270 if metadata.orientation in (180, 270) else 90
+
+        mirror = self.mirror_user_facing and metadata.facing_mode == "user"
+
+        return rotation, mirror
+
+    def geometry(self, frame: VideoFrame) -> Geometry:
+        """
+        Get the geometry of a frame, recomputed only when the frame size or orientation changes.
+
+        Args:
+            frame (VideoFrame): Decoded source frame
+
+        Returns:
+            Geometry: Crop region and output placement
+        """
+        rotation, mirror = self.orientation(frame)
+        key = (frame.width, frame.height, frame.format.name, rotation, mirror, self.mode)
+
+        if key != self._geometry_key or self._geometry is None:
+            self._geometry = compute_geometry(
+                frame.width, frame.height, self.width, self.height, rotation, mirror, self.mode)
+            self._geometry_key = key
+            self._staging_frame = None
+
+        return self._geometry
+
+    def convert(self, frame: VideoFrame) -> np.ndarray:
+        """
+        Convert a frame to the output size and format.
+
+        Args:
+            frame (VideoFrame): Decoded source frame
+
+        Returns:
+            np.ndarray: Output image of shape (height, width, channels), must be
+                        passed to `release` once it has been consumed
+        """
+        geometry = self.geometry(frame)
+
+        with self._tracer.span("crop"):
+            source = self._crop(frame, geometry)
+
+        x, y, content_width, content_height = geometry.content
+        pad = None
+        if (content_width, content_height) != (self.width, self.height):
+            pad = (self.width, self.height, x, y)
+
+        with self._tracer.span("reformat"):
+            start = perf_counter()
+            scaled = self._scaler.scale(
+                source, content_width, content_height, self.scaler_preset.interpolation, pad)
+            self.scaler_preset.record(perf_counter() - start)
+
+        # The image is a view of the scaled frame, which is kept alive until
+        # the image is released
+        with self._tracer.span("to_ndarray"):
+            image = scaled.to_ndarray()
+
+        self._in_flight[id(image)] = scaled
+        return image
+
+    def release(self, image: np.ndarray):
+        """
+        Release an image returned by `convert` so its buffer can be reused.
+
+        Args:
+            image (np.ndarray): Image returned by `convert`
+        """
+        self._in_flight.pop(id(image), None)
+
+    def stats(self) -> dict:
+        """
+        Get the buffer reuse counters as a JSON serializable dict.
+
+        Returns:
+            dict: Hits and misses of the scaler's frame pool and, once frames in other formats were received, of
+                  the frame pool of their planar conversion
+        """
+        return {
+            "scaler": self._scaler.stats(),
+            "planar": self._planar_scaler.stats() if self._planar_scaler is not None else None,
+        }
+
+    def _crop(self, frame: VideoFrame, geometry: Geometry) -> VideoFrame:
+        """
+        Apply the crop region, rotation and mirror of a geometry.
+
+        Args:
+            frame (VideoFrame): Decoded source frame
+            geometry (Geometry): Geometry of the frame
+
+        Returns:
+            VideoFrame: The source frame if nothing needs to be done, otherwise
+                        the reused staging frame
+        """
+        crop_x, crop_y, crop_width, crop_height = geometry.crop
+        is_full_frame = geometry.crop == (0, 0, frame.width, frame.height)
+
+        if is_full_frame and geometry.rotation == 0 and not geometry.mirror:
+            return frame
+
+        # Converted through a filter graph, whose frames are reused, rather
+        # than `reformat`, which allocates a new frame every time
+        if frame.format.name not in _PLANAR_FORMATS:
+            if self._planar_scaler is None:
+                self._planar_scaler = Scaler(_PLANAR_FORMATS[0])
+
+            frame = self._planar_scaler.scale(frame, frame.width, frame.height, FAST_BILINEAR)
+
+        is_sideways = geometry.rotation in (90, 270)
+        staging_width, staging_height = (crop_height, crop_width) if is_sideways else (crop_width, crop_height)
+
+        # The staging frame is consumed by the scaler before `convert`
+        # returns, so a single frame is reused for every frame
+        if self._staging_frame is None:
+            self._staging_frame = VideoFrame(staging_width, staging_height, frame.format.name)
+
+        for index in range(len(frame.planes)):
+            # Chroma planes are subsampled by 2 in both directions
+            shift = 0 if index == 0 else 1
+            region = _plane_view(frame, index)[
+                crop_y >> shift:(crop_y + crop_height) >> shift,
+                crop_x >> shift:(crop_x + crop_width) >> shift
+            ]
+
+            if geometry.rotation != 0:
+                region = np.rot90(region, k=-geometry.rotation // 90)
+
+            if geometry.mirror:
+                region = region[:, ::-1]
+
+            destination = _plane_view(self._staging_frame, index)
+            destination[:region.shape[0], :region.shape[1]] = region
+
+        return self._staging_frame
@@ -0,0 +1,131 @@
+"""
+Latency profiles of the receive path, trading smoothness for delay.
+
+Mimic feeds a live camera, so a frame that arrives late is usually better
+dropped than shown. A profile sets two things:
+- Jitter buffer depth - Packets the jitter buffer of the video receiver holds.
+  Frames behind a lost packet wait in the buffer for its retransmission until
+  the buffer is full, so a shallow buffer gives up on lost packets sooner and a
+  deep buffer rides out longer network hiccups, and fits larger keyframes
+- Maximum frame age - Decoded frames that are older than this when they come
+  out of the decoder are dropped before they are converted for the camera,
+  which saves the scaling cost of frames that would only add delay
+
+The age of a frame is estimated like the frame delay of the latency
+measurements, see `mimic.Utils.Time.FrameDelayEstimator`, but when the frame
+is decoded rather than when it was sent to the camera.
+
+>>> profile = LATENCY_PROFILES["low"]
+>>> resize_jitter_buffer(receiver, profile.jitter_buffer_packets)
+>>> stale_frames = StaleFrameFilter(profile.max_frame_age_ms)
+>>> if not stale_frames.is_stale(frame, monotonic_timestamp(), clock_offset.round_trip_time):
+...     camera_output.send_frame(frame)
+"""
+from typing import NamedTuple, Optional
+
+from av import VideoFrame
+
+from mimic.Utils.Statistics import RollingQuantiles
+from mimic.Utils.Time import FrameDelayEstimator
+
+
+class LatencyProfile(NamedTuple):
+    """Jitter buffer depth and frame age limit of the receive path."""
+
+    name: str
+    # Packets the jitter buffer holds, a power of 2. Keyframes with more
+    # packets can never be completed
+    jitter_buffer_packets: int
+    # Milliseconds after capture above which decoded frames are dropped,
+    # `None` to never drop frames
+    max_frame_age_ms: Optional[float]
+
+
+LATENCY_PROFILES = {
+    profile.name: profile for profile in (
+        # @NOTE 64 packets fit keyframes of about 75 KB, enough for 720p at the
+        # bitrates browsers send but not for 1080p
+        LatencyProfile("low", 64, 150),
+        # The jitter buffer depth aiortc uses on its own
+        LatencyProfile("balanced", 128, 400),
+        LatencyProfile("smooth", 256, None),
+    )
+}
+
+
+class StaleFrameFilter:
+    """Decide which decoded frames are too old to be sent to the camera."""
+
+    def __init__(self, max_age_ms: Optional[float]):
+        """
+        Create new instance of `StaleFrameFilter`.
+
+        Args:
+            max_age_ms (Optional[float]): Milliseconds after capture above which frames are stale, `None` to never
+                                          drop frames
+        """
+        self.max_age_ms = max_age_ms
+
+        # Every decoded frame is added, including dropped frames, so that a
+        # lasting increase of the delay moves the baseline instead of dropping
+        # every frame from then on
+        self._estimator = FrameDelayEstimator()
+        self._last_shown_at: Optional[float] = None
+
+        self.frames = 0
+        self.dropped = 0
+        self.ages = RollingQuantiles()
+
+    def is_stale(self, frame: VideoFrame, now: float, round_trip_time: Optional[float]) -> bool:
+        """
+        Note a decoded frame and decide whether it should be dropped.
+
+        A frame is never dropped when the previous frame was shown more than
+        the maximum age ago, so the camera keeps moving while every frame is
+        late.
+
+        Args:
+            frame (VideoFrame): Decoded frame as it was received from the track
+            now (float): Monotonic timestamp in milliseconds
+            round_trip_time (Optional[float]): Smallest recent round trip time in milliseconds
+
+        Returns:
+            bool: The frame is stale and should be dropped
+        """
+        self.frames += 1
+
+        age = None
+        if frame.pts is not None and frame.time_base is not None:
+            age = self._estimator.add(float(frame.pts * frame.time_base) * 1000, now, round_trip_time)
+            if age is not None:
+                self.ages.add(age)
+
+        if (self.max_age_ms is not None and age is not None and age > self.max_age_ms
+                and self._last_shown_at is not None and now - self._last_shown_at < self.max_age_ms):
+            self.dropped += 1
+            return True
+
+        self._last_shown_at = now
+        return False
+
+    def reset(self):
+        """Discard the frames of the previous stream, should be called when a new stream starts."""
+        self._estimator.reset()
+        self._last_shown_at = None
+        self.frames = 0
+        self.dropped = 0
+        self.ages.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the filter.
+
+        Returns:
+            dict: Maximum age, frames seen and dropped, and quantiles of the frame age in milliseconds
+        """
+        return {
+            "max_age_ms": self.max_age_ms,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "age_ms": self.ages.summary(),
+        }
@@ -0,0 +1,147 @@
+"""
+Live MJPEG preview of the frames sent to the virtual camera.
+
+Frames are downscaled and JPEG encoded once, at most at the preview frame rate,
+and the encoded image is broadcast to every viewer. Each viewer has its own
+small queue: a viewer that cannot keep up skips frames, and neither the encoder
+nor the frames sent to the camera ever wait on a viewer.
+"""
+import asyncio
+from time import monotonic
+from typing import Hashable, Optional
+
+import numpy as np
+
+from mimic.Media.Snapshot import JPEG, encode_image
+
+# Multipart boundary between the JPEG images of the preview stream
+PREVIEW_BOUNDARY = "frame"
+
+
+class PreviewBroadcaster:
+    """Encode frames for the MJPEG preview and fan them out to the viewers."""
+
+    def __init__(self, fps: float = 10.0, max_width: int = 640, quality: int = 70, queue_size: int = 2):
+        """
+        Create new instance of `PreviewBroadcaster`.
+
+        Args:
+            fps (float, optional): Maximum frame rate of the preview. Defaults to 10.0.
+            max_width (int, optional): Maximum width of the preview, 0 to never downscale. Defaults to 640.
+            quality (int, optional): JPEG quality from 1 to 100. Defaults to 70.
+            queue_size (int, optional): Encoded frames buffered per viewer before the oldest is
+                                        skipped. Defaults to 2.
+        """
+        self.fps = fps
+        self.max_width = max_width
+        self.quality = quality
+        self.queue_size = queue_size
+
+        self._viewers: set[asyncio.Queue] = set()
+        self._last_key: Optional[Hashable] = None
+        self._last_encode_time = 0.0
+        self._latest: Optional[bytes] = None
+        self._is_encoding = False
+
+        # Frames are copied here before being encoded on a worker thread, at
+        # most one frame is encoded at a time so a single buffer is enough
+        self._staging: Optional[np.ndarray] = None
+
+        self.encodes = 0
+        self.skipped = 0
+
+    @property
+    def viewer_count(self) -> int:
+        """Get the number of connected viewers."""
+        return len(self._viewers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Add a viewer, the latest preview frame is queued for it right away.
+
+        Returns:
+            asyncio.Queue: Queue the viewer receives JPEG images from, `None` when the stream ends
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._latest is not None:
+            queue.put_nowait(self._latest)
+
+        self._viewers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """
+        Remove a viewer.
+
+        Args:
+            queue (asyncio.Queue): Queue returned by `subscribe`
+        """
+        self._viewers.discard(queue)
+
+    def close(self):
+        """End the stream of every viewer, a `None` is queued in place of the next image."""
+        for queue in self._viewers:
+            if queue.full():
+                queue.get_nowait()
+
+            queue.put_nowait(None)
+
+        self._viewers.clear()
+
+    def offer(self, key: Hashable, image: np.ndarray):
+        """
+        Offer a frame to the preview, it is encoded if a viewer is waiting for the next frame.
+
+        Returns immediately. The frame is skipped when nobody is watching, when
+        it is the same frame as the previous one, when the preview frame rate
+        would be exceeded or while the previous frame is still being encoded.
+
+        @NOTE Must be called from the event loop, `image` is copied before
+        returning so its buffer may be reused afterwards.
+
+        Args:
+            key (Hashable): Identifies the frame, e.g. its sequence number
+            image (np.ndarray): RGBA image of the frame
+        """
+        if len(self._viewers) == 0 or self._is_encoding or key == self._last_key:
+            return
+
+        now = monotonic()
+        if now - self._last_encode_time < 1 / self.fps:
+            return
+
+        if self._staging is None or self._staging.shape != image.shape:
+            self._staging = np.empty_like(image)
+
+        np.copyto(self._staging, image)
+
+        self._last_key = key
+        self._last_encode_time = now
+        self._is_encoding = True
+        asyncio.ensure_future(self._encode(self._staging))
+
+    def stats(self) -> dict:
+        """
+        Get the preview counters as a JSON serializable dict.
+
+        Returns:
+            dict: Connected viewers, frames encoded and frames skipped by slow viewers
+        """
+        return {"viewers": len(self._viewers), "encodes": self.encodes, "skipped": self.skipped}
+
+    async def _encode(self, image: np.ndarray):
+        try:
+            data = await asyncio.get_event_loop().run_in_executor(
+                None, encode_image, image, JPEG, self.max_width, self.quality)
+        finally:
+            self._is_encoding = False
+
+        self.encodes += 1
+        self._latest = data
+
+        for queue in self._viewers:
+            if queue.full():
+                queue.get_nowait()
+                self.skipped += 1
+
+            queue.put_nowait(data)
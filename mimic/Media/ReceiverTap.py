@@ -0,0 +1,257 @@
+"""
+Access to the encoded frames of an aiortc RTP receiver.
+
+aiortc only exposes decoded frames through the received track. Encoded frames
+are copied off the receiver as they are handed to its decoder thread, and the
+decoder is fed exactly as before. Listeners are called on the event loop from
+the receiver's RTP handler, so they must never block.
+
+The receiver's jitter buffer holds every packet after a lost packet until the
+loss is repaired or the buffer overflows, including a keyframe that was
+requested because of the loss. `skip_to_keyframe` drops the packets in front of
+the first buffered keyframe so it can be decoded right away, and the depth of the
+buffer is set with `resize_jitter_buffer`.
+"""
+import asyncio
+from struct import pack
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from aiortc import RTCRtpReceiver
+from aiortc.codecs.h264 import h264_depayload
+from aiortc.codecs.vpx import VpxPayloadDescriptor
+from aiortc.rtp import RtcpPsfbPacket
+
+from mimic.Media.Bitstream import H264, VP8, codec_name, frame_size
+
+# Payload-specific feedback format of a full intra request, RFC 5104, aiortc
+# only sends picture loss indications
+_RTCP_PSFB_FIR = 4
+
+_H264_NAL_SPS = 7
+_H264_NAL_STAP_A = 24
+
+# Called with the mime type of the codec, the encoded frame and its RTP
+# timestamp
+EncodedFrameListener = Callable[[str, bytes, int], None]
+
+
+class JitterBufferDepth(NamedTuple):
+    """Packets held by the jitter buffer of an RTP receiver."""
+
+    # Packets in the buffer, and the packets it can hold
+    packets: int
+    capacity: int
+    # Milliseconds between the RTP timestamps of the oldest and newest packet
+    span_ms: float
+
+
+def keyframe_size(codec: Optional[str], payload: bytes) -> Optional[tuple[int, int]]:
+    """
+    Read the picture size from the first packet of a keyframe.
+
+    Args:
+        codec (Optional[str]): `VP8` or `H264`
+        payload (bytes): Payload of an RTP packet
+
+    Returns:
+        Optional[tuple[int, int]]: Width and height, `None` if the packet does not start a keyframe
+    """
+    try:
+        if codec == VP8:
+            descriptor, data = VpxPayloadDescriptor.parse(payload)
+            if not descriptor.partition_start or descriptor.partition_id != 0:
+                return None
+            return frame_size(VP8, data)
+
+        if codec == H264 and len(payload) > 3:
+            # Keyframes start with the sequence parameter set, either on its
+            # own or as the first unit of an aggregation packet
+            nal_type = payload[0] & 0x1F
+            if nal_type == _H264_NAL_STAP_A:
+                nal_type = payload[3] & 0x1F
+            if nal_type != _H264_NAL_SPS:
+                return None
+            return frame_size(H264, h264_depayload(payload))
+    except ValueError:
+        return None
+
+    return None
+
+
+def tap_encoded_frames(receiver: RTCRtpReceiver, listener: EncodedFrameListener) -> bool:
+    """
+    Call a listener with every encoded frame an RTP receiver hands to its decoder.
+
+    Args:
+        receiver (RTCRtpReceiver): Receiver of the video track
+        listener (EncodedFrameListener): Called with the mime type, data and RTP timestamp of every frame
+
+    Returns:
+        bool: The receiver could be tapped, `False` if this version of aiortc is not supported
+    """
+    decoder_queue = getattr(receiver, "_RTCRtpReceiver__decoder_queue", None)
+    if decoder_queue is None:
+        return False
+
+    put = decoder_queue.put
+
+    def tapped_put(item, *args, **kwargs):
+        if item is not None:
+            codec, encoded_frame = item
+            listener(codec.mimeType, encoded_frame.data, encoded_frame.timestamp)
+
+        put(item, *args, **kwargs)
+
+    decoder_queue.put = tapped_put
+    return True
+
+
+def request_keyframe(receiver: RTCRtpReceiver, ssrcs: Optional[Iterable[int]] = None) -> bool:
+    """
+    Ask the sender of an RTP receiver for a keyframe with an RTCP picture loss indication.
+
+    Args:
+        receiver (RTCRtpReceiver): Receiver of the video track
+        ssrcs (Optional[Iterable[int]], optional): Streams to request a keyframe of. Defaults to every active
+                                                   stream of the receiver.
+
+    Returns:
+        bool: A request was sent, `False` if no stream is active or this version of aiortc is not supported
+    """
+    send_pli = getattr(receiver, "_send_rtcp_pli", None)
+    active_ssrcs = getattr(receiver, "_RTCRtpReceiver__active_ssrc", None)
+    if send_pli is None or not active_ssrcs:
+        return False
+
+    for ssrc in list(ssrcs if ssrcs is not None else active_ssrcs):
+        asyncio.ensure_future(send_pli(ssrc))
+
+    return True
+
+
+def request_full_intra(receiver: RTCRtpReceiver, sequence_number: int, ssrcs: Optional[Iterable[int]] = None) -> bool:
+    """
+    Ask the sender of an RTP receiver for a keyframe with an RTCP full intra request.
+
+    Senders may ignore picture loss indications that follow each other
+    closely, a full intra request must be answered with a keyframe.
+
+    Args:
+        receiver (RTCRtpReceiver): Receiver of the video track
+        sequence_number (int): Command sequence number, incremented for every new request so the sender can
+                               tell it from a repetition
+        ssrcs (Optional[Iterable[int]], optional): Streams to request a keyframe of. Defaults to every active
+                                                   stream of the receiver.
+
+    Returns:
+        bool: A request was sent, `False` if no stream is active or this version of aiortc is not supported
+    """
+    send_rtcp = getattr(receiver, "_send_rtcp", None)
+    rtcp_ssrc = getattr(receiver, "_RTCRtpReceiver__rtcp_ssrc", None)
+    active_ssrcs = getattr(receiver, "_RTCRtpReceiver__active_ssrc", None)
+    if send_rtcp is None or rtcp_ssrc is None or not active_ssrcs:
+        return False
+
+    # One entry per stream, the media source of the packet itself is unused
+    fci = b"".join(pack("!LB3x", ssrc, sequence_number % 256)
+                   for ssrc in list(ssrcs if ssrcs is not None else active_ssrcs))
+    asyncio.ensure_future(send_rtcp(RtcpPsfbPacket(fmt=_RTCP_PSFB_FIR, ssrc=rtcp_ssrc, media_ssrc=0, fci=fci)))
+
+    return True
+
+
+def skip_to_keyframe(receiver: RTCRtpReceiver) -> bool:
+    """
+    Drop the packets the jitter buffer of an RTP receiver holds in front of the first keyframe after a lost packet.
+
+    Frames that reference a lost packet cannot be decoded anyway, dropping them
+    lets the keyframe through as soon as it is complete instead of once the
+    buffer overflows.
+
+    Args:
+        receiver (RTCRtpReceiver): Receiver of the video track
+
+    Returns:
+        bool: Packets were dropped, `False` if no packet is missing in front of a keyframe or this version of
+              aiortc is not supported
+    """
+    jitter_buffer = getattr(receiver, "_RTCRtpReceiver__jitter_buffer", None)
+    codecs = getattr(receiver, "_RTCRtpReceiver__codecs", None)
+    packets = getattr(jitter_buffer, "_packets", None)
+    origin = getattr(jitter_buffer, "_origin", None)
+    if jitter_buffer is None or not hasattr(jitter_buffer, "remove") \
+            or codecs is None or packets is None or origin is None:
+        return False
+
+    missing = False
+    for count in range(len(packets)):
+        packet = packets[(origin + count) % len(packets)]
+        if packet is None:
+            missing = True
+            continue
+
+        codec = codecs.get(packet.payload_type)
+        if missing and codec is not None and keyframe_size(codec_name(codec.mimeType), packet.payload) is not None:
+            jitter_buffer.remove(count)
+            return True
+
+    return False
+
+
+def resize_jitter_buffer(receiver: RTCRtpReceiver, capacity: int) -> bool:
+    """
+    Set the number of packets the jitter buffer of an RTP receiver holds, before any packet is received.
+
+    The buffer is resized in place, so filters installed on it keep working.
+
+    Args:
+        receiver (RTCRtpReceiver): Receiver of the video track
+        capacity (int): Packets the buffer holds, a power of 2
+
+    Raises:
+        ValueError: The capacity is not a power of 2
+
+    Returns:
+        bool: The buffer was resized, `False` if packets were already received or this version of aiortc is not
+              supported
+    """
+    if capacity <= 0 or capacity & (capacity - 1) != 0:
+        raise ValueError(f"Jitter buffer capacity must be a power of 2, got {capacity}")
+
+    jitter_buffer = getattr(receiver, "_RTCRtpReceiver__jitter_buffer", None)
+    if jitter_buffer is None or not hasattr(jitter_buffer, "_capacity") or not hasattr(jitter_buffer, "_packets") \
+            or getattr(jitter_buffer, "_origin", None) is not None:
+        return False
+
+    jitter_buffer._capacity = capacity
+    jitter_buffer._packets = [None] * capacity
+    return True
+
+
+def jitter_buffer_depth(receiver: RTCRtpReceiver) -> Optional[JitterBufferDepth]:
+    """
+    Count the packets the jitter buffer of an RTP receiver holds.
+
+    Args:
+        receiver (RTCRtpReceiver): Receiver of the video track
+
+    Returns:
+        Optional[JitterBufferDepth]: Depth of the buffer, `None` if this version of aiortc is not supported
+    """
+    jitter_buffer = getattr(receiver, "_RTCRtpReceiver__jitter_buffer", None)
+    codecs = getattr(receiver, "_RTCRtpReceiver__codecs", None)
+    packets = getattr(jitter_buffer, "_packets", None)
+    if codecs is None or packets is None:
+        return None
+
+    # Packets in order of their sequence number, starting at the oldest
+    origin = getattr(jitter_buffer, "_origin", None) or 0
+    buffered = [packet for packet in (packets[(origin + count) % len(packets)] for count in range(len(packets)))
+                if packet is not None]
+
+    span_ms = 0.0
+    codec = codecs.get(buffered[0].payload_type) if len(buffered) != 0 else None
+    if codec is not None and codec.clockRate:
+        span_ms = ((buffered[-1].timestamp - buffered[0].timestamp) & 0xFFFFFFFF) * 1000 / codec.clockRate
+
+    return JitterBufferDepth(len(buffered), len(packets), span_ms)
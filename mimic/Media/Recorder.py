@@ -0,0 +1,312 @@
+"""
+Record the incoming video stream without decoding or transcoding it.
+
+Encoded frames are copied off the RTP receiver as they are handed to the
+decoder, see `mimic.Media.ReceiverTap`, and muxed into a container on a
+separate writer thread, so recording costs a queue insert on the media path
+and never waits on the disk.
+
+Recordings are split into segments that start on a keyframe, a new segment is
+started when the picture size changes, and the oldest segments are deleted
+once the recordings use more than the allowed disk space.
+
+Containers:
+- VP8 - WebM
+- H.264 - Matroska, which stays playable if the process is killed mid segment
+"""
+import os
+import queue
+from datetime import datetime
+from fractions import Fraction
+from threading import Thread
+from typing import Any, Optional, Union
+
+import av
+from aiortc import RTCRtpReceiver
+from av.error import FFmpegError
+from av.video.stream import VideoStream
+
+from mimic.Media.Bitstream import (H264, VP8, codec_name, frame_size,
+                                   is_keyframe)
+from mimic.Media.ReceiverTap import tap_encoded_frames
+
+# RTP video clock rate, see RFC 3551 section 5
+RTP_CLOCK_RATE = 90000
+_RTP_TIME_BASE = Fraction(1, RTP_CLOCK_RATE)
+
+_CONTAINERS = {
+    VP8: ("webm", "webm"),
+    H264: ("matroska", "mkv"),
+}
+
+_FILE_PREFIX = "session-"
+
+
+class _Segment:
+    """Container file that encoded frames of a single codec are muxed into."""
+
+    def __init__(self, path: str, codec: str, width: int, height: int, start_timestamp: int):
+        container_format, _ = _CONTAINERS[codec]
+
+        self.path = path
+        self.size = (width, height)
+        self.start_timestamp = start_timestamp
+        self.elapsed = 0
+        self._last_timestamp = start_timestamp
+        self._last_pts = -1
+
+        self._container: Any = av.open(path, mode="w", format=container_format)
+        self._stream = self._container.add_stream(codec, rate=30)
+        assert isinstance(self._stream, VideoStream)
+        self._stream.time_base = _RTP_TIME_BASE
+
+        # The container header is written before the first packet, it needs the
+        # picture size which is only known from the keyframe
+        self._stream.codec_context.width = width
+        self._stream.codec_context.height = height
+
+    def write(self, data: bytes, timestamp: int):
+        """
+        Mux an encoded frame.
+
+        Args:
+            data (bytes): Encoded frame
+            timestamp (int): RTP timestamp of the frame
+        """
+        # RTP timestamps are 32 bit and wrap around after ~13 hours
+        delta = (timestamp - self._last_timestamp) & 0xFFFFFFFF
+        if delta >= 0x80000000:
+            delta -= 0x100000000
+
+        self._last_timestamp = timestamp
+        self.elapsed += delta
+
+        # Reordered or duplicate timestamps would be rejected by the muxer
+        pts = max(self.elapsed, self._last_pts + 1)
+        self._last_pts = pts
+
+        packet = av.Packet(data)
+        packet.stream = self._stream
+        # The muxer changes the stream time base when the header is written,
+        # timestamps are always in RTP clock units
+        packet.time_base = _RTP_TIME_BASE
+        packet.pts = pts
+        packet.dts = pts
+
+        self._container.mux(packet)
+
+    def close(self):
+        """Write the container trailer and close the file."""
+        self._container.close()
+
+
+class PassthroughRecorder:
+    """Mux the encoded frames of an RTP receiver into rotating container files."""
+
+    def __init__(
+        self,
+        directory: Union[str, os.PathLike[str]],
+        segment_duration: float = 300.0,
+        max_disk_usage: int = 2 * 1024 ** 3,
+        queue_size: int = 256
+    ):
+        """
+        Create new instance of `PassthroughRecorder`.
+
+        Args:
+            directory (Union[str, os.PathLike[str]]): Directory the segments are written to, must exist
+            segment_duration (float, optional): Seconds after which a new segment is started on the next
+                                                keyframe. Defaults to 300.0.
+            max_disk_usage (int, optional): Bytes the segments in `directory` may use before the oldest
+                                            are deleted. Defaults to 2 GiB.
+            queue_size (int, optional): Encoded frames that may be waiting for the writer before frames
+                                        are dropped. Defaults to 256.
+        """
+        self.directory = str(directory)
+        self.segment_duration = segment_duration
+        self.max_disk_usage = max_disk_usage
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[Thread] = None
+        self._running = False
+
+        self._segment: Optional[_Segment] = None
+        self._segment_codec: Optional[str] = None
+        self._waiting_for_keyframe = True
+
+        self.segments = 0
+        self.frames = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.deleted = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the writer thread is running."""
+        return self._running
+
+    def start(self):
+        """Start the writer thread."""
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = Thread(target=self._write_loop, name="PassthroughRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the writer thread and close the current segment.
+
+        @NOTE Blocks until queued frames are written, should be run on a worker
+        thread when called from the event loop.
+        """
+        if not self._running or self._thread is None:
+            return
+
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def tap(self, receiver: RTCRtpReceiver) -> bool:
+        """
+        Record every encoded frame an RTP receiver hands to its decoder.
+
+        Args:
+            receiver (RTCRtpReceiver): Receiver of the video track
+
+        Returns:
+            bool: The receiver could be tapped
+        """
+        return tap_encoded_frames(receiver, self.submit)
+
+    def submit(self, mime_type: str, data: bytes, timestamp: int):
+        """
+        Queue an encoded frame to be written, without blocking.
+
+        Frames are dropped while the writer is behind. The writer then waits
+        for the next keyframe so that segments never contain undecodable frames.
+
+        Args:
+            mime_type (str): Mime type of the RTP codec, e.g. `video/VP8`
+            data (bytes): Encoded frame
+            timestamp (int): RTP timestamp of the frame
+        """
+        if not self._running:
+            return
+
+        try:
+            self._queue.put_nowait((mime_type, data, timestamp))
+        except queue.Full:
+            self.dropped += 1
+            self._waiting_for_keyframe = True
+
+    def stats(self) -> dict:
+        """
+        Get the recording counters.
+
+        Returns:
+            dict: Segments started, frames and bytes written, frames dropped and segments deleted
+        """
+        return {
+            "running": self._running,
+            "segment": self._segment.path if self._segment is not None else None,
+            "segments": self.segments,
+            "frames": self.frames,
+            "bytes": self.bytes_written,
+            "dropped": self.dropped,
+            "deleted": self.deleted,
+        }
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            mime_type, data, timestamp = item
+            codec = codec_name(mime_type)
+            if codec is None:
+                continue
+
+            try:
+                self._write(codec, data, timestamp)
+            except (FFmpegError, OSError, ValueError):
+                # A corrupt frame or a full disk must never stop the stream,
+                # start over with a new segment on the next keyframe
+                self._close_segment()
+                self._waiting_for_keyframe = True
+
+        self._close_segment()
+
+    def _write(self, codec: str, data: bytes, timestamp: int):
+        keyframe = is_keyframe(codec, data)
+
+        if self._segment is not None and keyframe:
+            segment_elapsed = ((timestamp - self._segment.start_timestamp) & 0xFFFFFFFF) / RTP_CLOCK_RATE
+            # A simulcast layer switch changes the picture size on a keyframe
+            if codec != self._segment_codec or segment_elapsed >= self.segment_duration \
+                    or frame_size(codec, data) not in (None, self._segment.size):
+                self._close_segment()
+
+        if self._waiting_for_keyframe or self._segment is None:
+            if not keyframe:
+                return
+
+            self._waiting_for_keyframe = False
+
+        if self._segment is None:
+            size = frame_size(codec, data)
+            if size is None:
+                return
+
+            self._open_segment(codec, size, timestamp)
+
+        assert self._segment is not None
+        self._segment.write(data, timestamp)
+        self.frames += 1
+        self.bytes_written += len(data)
+
+    def _open_segment(self, codec: str, size: tuple[int, int], timestamp: int):
+        self._enforce_disk_usage()
+
+        _, extension = _CONTAINERS[codec]
+        file_name = f"{_FILE_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.{extension}"
+
+        self._segment = _Segment(os.path.join(self.directory, file_name), codec, *size, timestamp)
+        self._segment_codec = codec
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+
+        try:
+            self._segment.close()
+        except OSError:
+            pass
+
+        self._segment = None
+        self._segment_codec = None
+
+    def _enforce_disk_usage(self):
+        """Delete the oldest segments until the recordings fit in `max_disk_usage`."""
+        segments = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.startswith(_FILE_PREFIX):
+                stat = entry.stat()
+                segments.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in segments)
+        for _, size, path in sorted(segments):
+            if total_size <= self.max_disk_usage:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            total_size -= size
+            self.deleted += 1
@@ -0,0 +1,279 @@
+"""
+Forward the incoming video stream to WebRTC viewers without re-encoding it.
+
+The encoded frames of the incoming track are tapped off its RTP receiver, see
+`mimic.Media.ReceiverTap`, and handed to one `RelayTrack` per viewer. aiortc
+packetizes encoded packets returned by a track as they are, so forwarding a
+frame costs a queue insert and RTP packetization per viewer, and the frames
+are never decoded or encoded for viewers.
+
+Every viewer has its own bounded queue. A viewer that falls behind drops its
+queued frames and resumes on the next keyframe, which is requested from the
+sender, so a slow viewer never holds back the other viewers or the camera.
+
+Sending encoded packets requires aiortc 1.4 or newer, older versions only
+send decoded frames, see `supports_encoded_tracks`.
+"""
+import asyncio
+from fractions import Fraction
+from time import monotonic
+from typing import Optional
+
+import av
+from aiortc import MediaStreamTrack, RTCRtpReceiver
+from aiortc.codecs.base import Encoder
+from aiortc.mediastreams import MediaStreamError
+
+from mimic.Media.Bitstream import codec_name, is_keyframe
+from mimic.Media.ReceiverTap import request_keyframe, tap_encoded_frames
+
+_RTP_TIME_BASE = Fraction(1, 90000)
+
+# Seconds between keyframe requests to the sender, viewers joining at the same
+# time share a single keyframe
+_KEYFRAME_REQUEST_INTERVAL = 1.0
+
+
+def supports_encoded_tracks() -> bool:
+    """
+    Check whether aiortc sends the encoded packets returned by a track without encoding them again.
+
+    Returns:
+        bool: aiortc packetizes `av.Packet`s returned by a track, added in aiortc 1.4
+    """
+    # Encoders of aiortc versions that can send packets also packetize them
+    return hasattr(Encoder, "pack")
+
+
+class RelayTrack(MediaStreamTrack):
+    """Track of a single viewer that returns the encoded frames of the incoming stream."""
+
+    kind = "video"
+
+    def __init__(self, relay: "EncodedRelay", queue_size: int):
+        """
+        Create new instance of `RelayTrack`, use `EncodedRelay.subscribe` instead.
+
+        Args:
+            relay (EncodedRelay): Relay the frames are received from
+            queue_size (int): Frames buffered before the viewer is considered too slow
+        """
+        super().__init__()
+
+        self._relay = relay
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+        # Viewers can only start decoding on a keyframe
+        self._waiting_for_keyframe = True
+
+        self.frames = 0
+        self.dropped = 0
+
+    async def recv(self) -> av.Packet:
+        """
+        Receive the next encoded frame.
+
+        Raises:
+            MediaStreamError: The incoming stream or this track ended
+
+        Returns:
+            av.Packet: Encoded frame with its RTP timestamp as presentation timestamp
+        """
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        item = await self._queue.get()
+        if item is None:
+            self.stop()
+            raise MediaStreamError
+
+        data, timestamp = item
+        packet = av.Packet(data)
+        packet.pts = timestamp
+        packet.time_base = _RTP_TIME_BASE
+
+        return packet
+
+    def stop(self):
+        """End the track and unsubscribe it from the relay."""
+        super().stop()
+        self._relay.unsubscribe(self)
+
+    def push(self, data: bytes, timestamp: int, keyframe: bool):
+        """
+        Queue an encoded frame for the viewer without blocking.
+
+        Args:
+            data (bytes): Encoded frame
+            timestamp (int): RTP timestamp of the frame
+            keyframe (bool): The frame can be decoded without any previous frame
+        """
+        if self._waiting_for_keyframe:
+            if not keyframe:
+                self._relay.request_keyframe()
+                return
+
+            self._waiting_for_keyframe = False
+
+        if self._queue.full():
+            # Every queued frame depends on the frames before it, so the
+            # viewer has to start over from the next keyframe
+            self.dropped += self._queue.qsize() + 1
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+            self._waiting_for_keyframe = True
+            self._relay.request_keyframe()
+            return
+
+        self._queue.put_nowait((data, timestamp))
+        self.frames += 1
+
+    def end(self):
+        """End the track once the queued frames have been sent."""
+        if self._queue.full():
+            self._queue.get_nowait()
+
+        self._queue.put_nowait(None)
+
+
+class EncodedRelay:
+    """Fan out the encoded frames of the incoming video track to viewer tracks."""
+
+    def __init__(self, max_viewers: int = 4, queue_size: int = 30):
+        """
+        Create new instance of `EncodedRelay`.
+
+        Args:
+            max_viewers (int, optional): Maximum number of viewers. Defaults to 4.
+            queue_size (int, optional): Frames buffered per viewer before the viewer skips to the next
+                                        keyframe. Defaults to 30.
+        """
+        self.max_viewers = max_viewers
+        self.queue_size = queue_size
+
+        self._receiver: Optional[RTCRtpReceiver] = None
+        self._tracks: set[RelayTrack] = set()
+        self._last_keyframe_request = 0.0
+
+        # Mime type of the incoming codec, known once the first frame arrives
+        self.mime_type: Optional[str] = None
+
+        self.keyframe_requests = 0
+
+    @property
+    def is_live(self) -> bool:
+        """Whether frames are being received that can be relayed."""
+        return self.mime_type is not None
+
+    @property
+    def viewer_count(self) -> int:
+        """Get the number of subscribed viewers."""
+        return len(self._tracks)
+
+    def attach(self, receiver: RTCRtpReceiver) -> bool:
+        """
+        Relay the encoded frames of an RTP receiver, replacing the previous receiver.
+
+        Args:
+            receiver (RTCRtpReceiver): Receiver of the incoming video track
+
+        Returns:
+            bool: The receiver could be tapped and aiortc can send its frames to viewers
+        """
+        self.detach()
+        if not supports_encoded_tracks():
+            return False
+
+        def on_frame(mime_type: str, data: bytes, timestamp: int):
+            # The tap cannot be removed, frames of a detached receiver are ignored
+            if receiver is self._receiver:
+                self.forward(mime_type, data, timestamp)
+
+        if not tap_encoded_frames(receiver, on_frame):
+            return False
+
+        self._receiver = receiver
+        return True
+
+    def detach(self):
+        """Stop relaying and end the track of every viewer."""
+        self._receiver = None
+        self.mime_type = None
+
+        for track in self._tracks.copy():
+            track.end()
+
+    def subscribe(self) -> RelayTrack:
+        """
+        Add a viewer.
+
+        Raises:
+            RuntimeError: No stream is being received or the maximum number of viewers is reached
+
+        Returns:
+            RelayTrack: Track to send to the viewer, starts on the next keyframe
+        """
+        if not self.is_live:
+            raise RuntimeError("No stream to relay.")
+
+        if len(self._tracks) >= self.max_viewers:
+            raise RuntimeError(f"Maximum number of viewers ({self.max_viewers}) reached.")
+
+        track = RelayTrack(self, self.queue_size)
+        self._tracks.add(track)
+        self.request_keyframe()
+
+        return track
+
+    def unsubscribe(self, track: RelayTrack):
+        """
+        Remove a viewer.
+
+        Args:
+            track (RelayTrack): Track returned by `subscribe`
+        """
+        self._tracks.discard(track)
+
+    def request_keyframe(self):
+        """Ask the sender for a keyframe, at most once every `_KEYFRAME_REQUEST_INTERVAL` seconds."""
+        now = monotonic()
+        if self._receiver is None or now - self._last_keyframe_request < _KEYFRAME_REQUEST_INTERVAL:
+            return
+
+        self._last_keyframe_request = now
+        if request_keyframe(self._receiver):
+            self.keyframe_requests += 1
+
+    def stats(self) -> dict:
+        """
+        Get the relay counters as a JSON serializable dict.
+
+        Returns:
+            dict: Codec, keyframe requests and frames sent and dropped per viewer
+        """
+        return {
+            "codec": self.mime_type,
+            "keyframe_requests": self.keyframe_requests,
+            "viewers": [{"frames": track.frames, "dropped": track.dropped} for track in self._tracks],
+        }
+
+    def forward(self, mime_type: str, data: bytes, timestamp: int):
+        """
+        Queue an encoded frame for every viewer, called for every frame of the attached receiver.
+
+        Args:
+            mime_type (str): Mime type of the RTP codec, e.g. `video/VP8`
+            data (bytes): Encoded frame
+            timestamp (int): RTP timestamp of the frame
+        """
+        self.mime_type = mime_type
+
+        if len(self._tracks) == 0:
+            return
+
+        codec = codec_name(mime_type)
+        keyframe = codec is not None and is_keyframe(codec, data)
+
+        for track in self._tracks:
+            track.push(data, timestamp, keyframe)
@@ -0,0 +1,283 @@
+"""
+Scale and color convert video frames without allocating a new frame each time.
+
+`VideoReformatter.reformat` allocates a new output frame for every call. The
+scale filter of libavfilter instead takes its output frames from a frame pool
+that belongs to the filter graph, and a frame returns to that pool as soon as
+the last reference to it is dropped. As long as frames are released once they
+have been consumed, the same few buffers are reused for every frame.
+
+Letterbox bars are added by a pad filter in the same graph, so swscale writes
+the scaled image straight into a frame of the full output size and the image
+is never copied again.
+
+Interpolations, from the fastest to the highest quality:
+- fast_bilinear - Bilinear without full chroma interpolation
+- bilinear
+- bicubic - The swscale default
+- area - Averages the source pixels covered by each output pixel, close to
+  bicubic quality when downscaling at a fraction of the cost
+- lanczos
+
+A `ScalerPreset` picks the interpolation of an output. In `AUTO` mode it steps
+down to a faster interpolation while converting a frame takes longer than the
+frame budget, and back up once there is plenty of headroom.
+
+>>> scaler = Scaler("rgba")
+>>> scaled = scaler.scale(frame, 960, 720, interpolation=BILINEAR, pad=(1280, 720, 160, 0))
+>>> cam.send(scaled.to_ndarray())
+>>> del scaled
+"""
+from fractions import Fraction
+from typing import Callable, Optional
+
+from av import VideoFrame
+from av.filter import Graph
+
+# Time base of the buffer source, the filter graph does not depend on it
+_TIME_BASE = Fraction(1, 90000)
+
+FAST_BILINEAR = "fast_bilinear"
+BILINEAR = "bilinear"
+BICUBIC = "bicubic"
+AREA = "area"
+LANCZOS = "lanczos"
+INTERPOLATIONS = (FAST_BILINEAR, BILINEAR, BICUBIC, AREA, LANCZOS)
+
+AUTO = "auto"
+SCALER_PRESETS = (AUTO, *INTERPOLATIONS)
+
+
+class Scaler:
+    """Scale and color convert frames through a libavfilter graph."""
+
+    def __init__(self, format: str = "rgba"):
+        """
+        Create new instance of `Scaler`.
+
+        Args:
+            format (str, optional): Output pixel format. Defaults to "rgba".
+        """
+        self.format = format
+
+        self._graph: Optional[Graph] = None
+        self._graph_key: Optional[tuple] = None
+
+        # Addresses of every output buffer handed out by the current graph,
+        # a buffer that has been seen before came from the frame pool
+        self._buffers: set[int] = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def scale(
+        self,
+        frame: VideoFrame,
+        width: int,
+        height: int,
+        interpolation: str = BICUBIC,
+        pad: Optional[tuple[int, int, int, int]] = None
+    ) -> VideoFrame:
+        """
+        Scale a frame and convert it to the output format.
+
+        Args:
+            frame (VideoFrame): Source frame
+            width (int): Width to scale the frame to
+            height (int): Height to scale the frame to
+            interpolation (str, optional): One of `INTERPOLATIONS`. Defaults to BICUBIC.
+            pad (Optional[tuple[int, int, int, int]], optional): Width and height of the output and position x, y
+                                                                 of the scaled frame on it, the rest of the output
+                                                                 is opaque black. Defaults to no padding.
+
+        Returns:
+            VideoFrame: Scaled frame, its buffer is reused once every reference to it is dropped
+        """
+        key = (frame.width, frame.height, frame.format.name, width, height, interpolation, pad)
+        if key != self._graph_key or self._graph is None:
+            self._configure(frame, width, height, interpolation, pad)
+            self._graph_key = key
+
+        assert self._graph is not None
+        self._graph.push(frame)
+        scaled = self._graph.pull()
+        assert isinstance(scaled, VideoFrame)
+
+        buffer = scaled.planes[0].buffer_ptr
+        if buffer in self._buffers:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._buffers.add(buffer)
+
+        return scaled
+
+    def stats(self) -> dict:
+        """
+        Get the frame pool counters as a JSON serializable dict.
+
+        Returns:
+            dict: Number of output frames that reused a buffer (hits) and that needed a new buffer (misses)
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _configure(
+        self,
+        frame: VideoFrame,
+        width: int,
+        height: int,
+        interpolation: str,
+        pad: Optional[tuple[int, int, int, int]]
+    ):
+        """
+        Build a new filter graph for frames of the size and format of `frame`.
+
+        Args:
+            frame (VideoFrame): Frame whose size and format will be pushed to the graph
+            width (int): Width to scale the frame to
+            height (int): Height to scale the frame to
+            interpolation (str): One of `INTERPOLATIONS`
+            pad (Optional[tuple[int, int, int, int]]): Output size and position of the scaled frame, see `scale`
+
+        Raises:
+            ValueError: Unknown interpolation
+        """
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation `{interpolation}`")
+
+        graph = Graph()
+        source = graph.add_buffer(width=frame.width, height=frame.height,
+                                  format=frame.format, time_base=_TIME_BASE)
+        scale = graph.add("scale", f"{width}:{height}:flags={interpolation}")
+        pixel_format = graph.add("format", self.format)
+        sink = graph.add("buffersink")
+
+        source.link_to(scale)
+        if pad is None:
+            scale.link_to(pixel_format)
+        else:
+            # The pad filter hands the scale filter a region of its own output
+            # frame to write into, so only the bars are drawn on top
+            padding = graph.add("pad", "{}:{}:{}:{}:color=black".format(*pad))
+            scale.link_to(padding)
+            padding.link_to(pixel_format)
+
+        pixel_format.link_to(sink)
+        graph.configure()
+
+        self._graph = graph
+        self._buffers.clear()
+
+
+# Interpolations `AUTO` steps through, from the highest quality to the fastest
+_AUTO_LADDER = (BICUBIC, BILINEAR, FAST_BILINEAR)
+
+# Frames whose conversion time is averaged before stepping down
+_AUTO_WINDOW = 30
+
+# Frames after a step before stepping back up, and the share of the frame
+# budget the conversion must stay under to step back up
+_AUTO_STEP_UP_DELAY = 300
+_AUTO_STEP_UP_HEADROOM = 0.5
+
+
+class ScalerPreset:
+    """Interpolation of an output, either fixed or stepped down while frames take too long to convert."""
+
+    def __init__(self, preset: str = AUTO, frame_budget: float = 1 / 60):
+        """
+        Create new instance of `ScalerPreset`.
+
+        Args:
+            preset (str, optional): One of `SCALER_PRESETS`. Defaults to AUTO.
+            frame_budget (float, optional): Seconds the conversion of a frame may take before `AUTO` steps down.
+                                            Defaults to 1/60.
+
+        Raises:
+            ValueError: Unknown preset
+        """
+        self.frame_budget = frame_budget
+
+        # Called with the new interpolation whenever `AUTO` steps
+        self.on_change: Optional[Callable[[str], None]] = None
+
+        self.step_downs = 0
+        self.step_ups = 0
+
+        # Average conversion time of the last full window in seconds
+        self.average: Optional[float] = None
+
+        self.preset = preset
+
+    @property
+    def preset(self) -> str:
+        """One of `SCALER_PRESETS`."""
+        return self._preset
+
+    @preset.setter
+    def preset(self, preset: str):
+        if preset not in SCALER_PRESETS:
+            raise ValueError(f"Unknown scaler preset `{preset}`, expected one of {list(SCALER_PRESETS)}")
+
+        self._preset = preset
+        self._level = 0
+        self._frames_since_step = 0
+        self._window_total = 0.0
+        self._window_count = 0
+
+    @property
+    def interpolation(self) -> str:
+        """Interpolation to scale the next frame with."""
+        return _AUTO_LADDER[self._level] if self._preset == AUTO else self._preset
+
+    def record(self, duration: float):
+        """
+        Record how long converting a frame took, called for every frame.
+
+        Args:
+            duration (float): Seconds spent scaling the frame
+        """
+        self._window_total += duration
+        self._window_count += 1
+        self._frames_since_step += 1
+
+        if self._window_count < _AUTO_WINDOW:
+            return
+
+        self.average = self._window_total / self._window_count
+        self._window_total = 0.0
+        self._window_count = 0
+
+        if self._preset != AUTO:
+            return
+
+        if self.average > self.frame_budget and self._level < len(_AUTO_LADDER) - 1:
+            self._step(1)
+            self.step_downs += 1
+        elif (self._level > 0 and self._frames_since_step >= _AUTO_STEP_UP_DELAY
+              and self.average < self.frame_budget * _AUTO_STEP_UP_HEADROOM):
+            self._step(-1)
+            self.step_ups += 1
+
+    def stats(self) -> dict:
+        """
+        Get the preset and conversion time as a JSON serializable dict.
+
+        Returns:
+            dict: Preset, current interpolation, average conversion time, frame budget and number of steps
+        """
+        return {
+            "preset": self._preset,
+            "interpolation": self.interpolation,
+            "conversion_ms": round(self.average * 1000, 3) if self.average is not None else None,
+            "frame_budget_ms": round(self.frame_budget * 1000, 3),
+            "step_downs": self.step_downs,
+            "step_ups": self.step_ups,
+        }
+
+    def _step(self, direction: int):
+        self._level += direction
+        self._frames_since_step = 0
+
+        if self.on_change is not None:
+            self.on_change(self.interpolation)
@@ -0,0 +1,423 @@
+"""
+Receive simulcast from the client and decode a single layer of it.
+
+The client encodes its camera at several sizes and sends every layer as its
+own RTP stream, identified by its RTP stream id (`rid`). aiortc neither
+negotiates simulcast nor tells the streams apart, every packet of every layer
+would end up in the same jitter buffer. `offered_layers` reads the layers from
+the offer, `accept_simulcast` adds them to the answer, and `SimulcastSelector`
+sits in front of the jitter buffer of the video receiver:
+
+- Every packet still reaches the receiver, so its reports and bandwidth
+  estimate cover every layer and the client keeps sending all of them
+- Only packets of the active layer reach the NACK generator and the jitter
+  buffer, so a single layer is ever reassembled and decoded
+- A switch requests a keyframe of the new layer and keeps forwarding the
+  current layer until that keyframe arrives. Sequence numbers and timestamps
+  of the new layer are rewritten to continue those of the previous layer, so
+  the decoder sees one stream whose size changes on a keyframe, without
+  renegotiating
+
+The layer is chosen by `SimulcastSelector.update`, the smallest layer that is
+at least as large as the output is preferred and one layer lower is taken for
+every step down while the server is short of CPU.
+
+>>> layers = offered_layers(offer.sdp)
+>>> selector = SimulcastSelector(layers)
+>>> selector.attach(receiver)
+>>> answer_sdp = accept_simulcast(answer.sdp, layers)
+>>> selector.update(max_size=720, load=0.4)
+"""
+import asyncio
+from time import monotonic
+from typing import Any, Callable, NamedTuple, Optional
+
+from aiortc import RTCRtpReceiver
+from aiortc.codecs import is_rtx
+from aiortc.rtcrtpparameters import (RTCRtpHeaderExtensionParameters,
+                                     RTCRtpParameters)
+from aiortc.rtp import RtpPacket
+
+from mimic.Media.Bitstream import codec_name
+from mimic.Media.ReceiverTap import keyframe_size
+
+RID_URI = "urn:ietf:params:rtp-hdrext:sdes:rtp-stream-id"
+REPAIRED_RID_URI = "urn:ietf:params:rtp-hdrext:sdes:repaired-rtp-stream-id"
+
+# Seconds without packets after which a layer is considered paused by the
+# client, e.g. when its bandwidth estimate drops
+_LAYER_TIMEOUT = 1.0
+
+# Seconds between keyframe requests to a layer that is being switched to
+_KEYFRAME_REQUEST_INTERVAL = 1.0
+
+# Load, the conversion time of a frame relative to its budget, above which the
+# selector steps down a layer and below which it steps back up, and the
+# seconds to wait after a step before the next one
+_HIGH_LOAD = 1.0
+_LOW_LOAD = 0.5
+_STEP_DOWN_DELAY = 2.0
+_STEP_UP_DELAY = 10.0
+
+
+class SimulcastOffer(NamedTuple):
+    """Simulcast layers of the video section of an offer."""
+
+    mid: str
+    # Value of the `a=simulcast` attribute without its direction, e.g. `f;h;q`
+    layers: str
+    rids: list[str]
+    # Ids of the RTP stream id header extensions by URI
+    extensions: dict[str, int]
+
+
+def _media_sections(sdp: str) -> list[list[str]]:
+    """Split an SDP into the session section followed by one list of lines per media section."""
+    sections: list[list[str]] = [[]]
+    for line in sdp.splitlines():
+        if line.startswith("m="):
+            sections.append([])
+        sections[-1].append(line)
+
+    return sections
+
+
+def offered_layers(sdp: str) -> Optional[SimulcastOffer]:
+    """
+    Read the simulcast layers the client offers to send.
+
+    Args:
+        sdp (str): SDP of the offer
+
+    Returns:
+        Optional[SimulcastOffer]: Layers of the first video section, `None` if it does not offer simulcast with
+                                  RTP stream ids
+    """
+    for section in _media_sections(sdp)[1:]:
+        if not section[0].startswith("m=video"):
+            continue
+
+        mid: Optional[str] = None
+        layers: Optional[str] = None
+        rids: list[str] = []
+        extensions: dict[str, int] = {}
+
+        for line in section:
+            if line.startswith("a=mid:"):
+                mid = line[len("a=mid:"):].strip()
+            elif line.startswith("a=rid:"):
+                fields = line[len("a=rid:"):].split()
+                if len(fields) >= 2 and fields[1] == "send":
+                    rids.append(fields[0])
+            elif line.startswith("a=simulcast:"):
+                fields = line[len("a=simulcast:"):].split()
+                for direction, value in zip(fields[::2], fields[1::2]):
+                    if direction == "send":
+                        layers = value
+            elif line.startswith("a=extmap:"):
+                fields = line[len("a=extmap:"):].split()
+                if len(fields) >= 2 and fields[1] in (RID_URI, REPAIRED_RID_URI):
+                    extensions[fields[1]] = int(fields[0].split("/")[0])
+
+        if mid is None or layers is None or len(rids) == 0 or RID_URI not in extensions:
+            return None
+
+        return SimulcastOffer(mid, layers, rids, extensions)
+
+    return None
+
+
+def accept_simulcast(sdp: str, offer: SimulcastOffer) -> str:
+    """
+    Add the offered simulcast layers to an answer created by aiortc.
+
+    Args:
+        sdp (str): SDP of the answer
+        offer (SimulcastOffer): Layers of the offer
+
+    Returns:
+        str: SDP of the answer that receives every layer
+    """
+    sections = _media_sections(sdp)
+    for section in sections[1:]:
+        if f"a=mid:{offer.mid}" not in section:
+            continue
+
+        extmaps = [index for index, line in enumerate(section) if line.startswith("a=extmap:")]
+        position = extmaps[-1] + 1 if extmaps else len(section)
+        section[position:position] = [f"a=extmap:{extension_id} {uri}" for uri, extension_id in
+                                      offer.extensions.items() if not any(uri in line for line in section)]
+
+        section.extend(f"a=rid:{rid} recv" for rid in offer.rids)
+        section.append(f"a=simulcast:recv {offer.layers}")
+
+    return "\r\n".join(line for section in sections for line in section) + "\r\n"
+
+
+class _Layer:
+    """A single simulcast layer as it is received."""
+
+    __slots__ = ("rid", "ssrc", "size", "packets", "last_packet_at")
+
+    def __init__(self, rid: str, ssrc: int):
+        self.rid = rid
+        self.ssrc = ssrc
+        # Picture size of the latest keyframe
+        self.size: Optional[tuple[int, int]] = None
+        self.packets = 0
+        self.last_packet_at = 0.0
+
+
+class SimulcastSelector:
+    """Forward a single simulcast layer to the decoder of a receiver and switch layers on keyframes."""
+
+    def __init__(self, offer: SimulcastOffer):
+        """
+        Create new instance of `SimulcastSelector`, the first offered layer is forwarded until `update` is called.
+
+        Args:
+            offer (SimulcastOffer): Layers of the offer
+        """
+        self.offer = offer
+
+        # Called with the RTP stream id and picture size of a layer once it is
+        # forwarded
+        self.on_switch: Optional[Callable[[str, Optional[tuple[int, int]]], None]] = None
+
+        self.switches = 0
+        self.keyframe_requests = 0
+
+        # Layers below the preferred layer while the server is short of CPU,
+        # and the latest load the selector was updated with
+        self.step_down = 0
+        self.load: Optional[float] = None
+        self._last_step = monotonic()
+
+        self._layers: dict[str, _Layer] = {}
+        self._layers_by_ssrc: dict[int, _Layer] = {}
+        self._active: Optional[_Layer] = None
+        self._target_rid: str = offer.rids[0]
+        self._last_keyframe_request = 0.0
+
+        # Offsets added to the sequence numbers and timestamps of the active
+        # layer, and the rewritten values of its newest forwarded packet
+        self._sequence_offset = 0
+        self._timestamp_offset = 0
+        self._last_sequence_number: Optional[int] = None
+        self._last_timestamp = 0
+        self._last_forwarded_at = 0.0
+
+        # Set by `attach`, the NACK generator of the receiver is reset on
+        # every switch so the jump in sequence numbers is not NACKed
+        self._receiver: Optional[RTCRtpReceiver] = None
+        self._nack_generator: Optional[Any] = None
+
+    @property
+    def active(self) -> Optional[str]:
+        """RTP stream id of the layer that is decoded, `None` until its first keyframe arrived."""
+        return self._active.rid if self._active is not None else None
+
+    @property
+    def active_ssrc(self) -> Optional[int]:
+        """SSRC of the layer that is decoded, `None` until its first keyframe arrived."""
+        return self._active.ssrc if self._active is not None else None
+
+    @property
+    def target(self) -> str:
+        """RTP stream id of the layer that is decoded once its next keyframe arrives."""
+        return self._target_rid
+
+    def attach(self, receiver: RTCRtpReceiver) -> bool:
+        """
+        Filter the packets of an RTP receiver before any packet is received.
+
+        Args:
+            receiver (RTCRtpReceiver): Receiver of the video track
+
+        Returns:
+            bool: The receiver could be filtered, `False` if this version of aiortc is not supported
+        """
+        handle_rtp_packet = getattr(receiver, "_handle_rtp_packet", None)
+        codecs = getattr(receiver, "_RTCRtpReceiver__codecs", None)
+        rtx_ssrcs = getattr(receiver, "_RTCRtpReceiver__rtx_ssrc", None)
+        jitter_buffer = getattr(receiver, "_RTCRtpReceiver__jitter_buffer", None)
+        nack_generator = getattr(receiver, "_RTCRtpReceiver__nack_generator", None)
+        extensions_map = getattr(receiver.transport, "_rtp_header_extensions_map", None)
+        if handle_rtp_packet is None or codecs is None or rtx_ssrcs is None or jitter_buffer is None \
+                or extensions_map is None or not hasattr(receiver, "_send_rtcp_pli"):
+            return False
+
+        # aiortc only parses the header extensions it negotiated itself
+        extensions_map.configure(RTCRtpParameters(headerExtensions=[
+            RTCRtpHeaderExtensionParameters(id=extension_id, uri=uri)
+            for uri, extension_id in self.offer.extensions.items()]))
+
+        async def filtered_handle_rtp_packet(packet: RtpPacket, arrival_time_ms: int) -> None:
+            codec = codecs.get(packet.payload_type)
+            if codec is not None and is_rtx(codec):
+                self._map_retransmissions(packet, rtx_ssrcs)
+            elif codec is not None:
+                self._receive(packet, codec_name(codec.mimeType), codec.clockRate)
+
+            await handle_rtp_packet(packet, arrival_time_ms=arrival_time_ms)
+
+        add_to_jitter_buffer = jitter_buffer.add
+
+        def filtered_add_to_jitter_buffer(packet: RtpPacket):
+            if self._active is None or packet.ssrc != self._active.ssrc:
+                return False, None
+
+            self._rewrite(packet)
+            return add_to_jitter_buffer(packet)
+
+        setattr(receiver, "_handle_rtp_packet", filtered_handle_rtp_packet)
+        jitter_buffer.add = filtered_add_to_jitter_buffer
+
+        if nack_generator is not None:
+            add_to_nack_generator = nack_generator.add
+
+            def filtered_add_to_nack_generator(packet: RtpPacket) -> bool:
+                if self._active is None or packet.ssrc != self._active.ssrc:
+                    return False
+
+                return add_to_nack_generator(packet)
+
+            nack_generator.add = filtered_add_to_nack_generator
+
+        self._receiver = receiver
+        self._nack_generator = nack_generator
+        return True
+
+    def update(self, max_size: int, load: Optional[float] = None) -> None:
+        """
+        Choose the layer to decode, called about once a second.
+
+        Args:
+            max_size (int): Short side of the output in pixels, larger layers are not needed
+            load (Optional[float], optional): Conversion time of a frame relative to its budget, `None` if not
+                                              measured yet. Defaults to None.
+        """
+        now = monotonic()
+        self.load = load
+
+        if load is not None:
+            if load > _HIGH_LOAD and now - self._last_step >= _STEP_DOWN_DELAY \
+                    and self.step_down < len(self._layers) - 1:
+                self.step_down += 1
+                self._last_step = now
+            elif load < _LOW_LOAD and self.step_down > 0 and now - self._last_step >= _STEP_UP_DELAY:
+                self.step_down -= 1
+                self._last_step = now
+
+        # Short side and layer, from the smallest layer on. Layers the client
+        # paused are skipped
+        layers = sorted(((min(layer.size), layer) for layer in self._layers.values()
+                         if layer.size is not None and now - layer.last_packet_at < _LAYER_TIMEOUT),
+                        key=lambda item: item[0])
+        if len(layers) == 0:
+            return
+
+        preferred = next((index for index, (short_side, _) in enumerate(layers) if short_side >= max_size),
+                         len(layers) - 1)
+        _, target = layers[max(0, preferred - self.step_down)]
+        if target.rid != self._target_rid:
+            self._target_rid = target.rid
+            self._last_keyframe_request = 0.0
+
+    def stats(self) -> dict:
+        """
+        Get the layers and switches as a JSON serializable dict.
+
+        Returns:
+            dict: Active and target layer, switches, keyframe requests, CPU step downs and the size and packets
+                  of every layer
+        """
+        now = monotonic()
+        return {
+            "active": self.active,
+            "target": self._target_rid,
+            "switches": self.switches,
+            "keyframe_requests": self.keyframe_requests,
+            "step_down": self.step_down,
+            "load": round(self.load, 3) if self.load is not None else None,
+            "layers": {
+                layer.rid: {
+                    "width": layer.size[0] if layer.size is not None else None,
+                    "height": layer.size[1] if layer.size is not None else None,
+                    "packets": layer.packets,
+                    "paused": now - layer.last_packet_at >= _LAYER_TIMEOUT,
+                } for layer in self._layers.values()
+            },
+        }
+
+    def _receive(self, packet: RtpPacket, codec: Optional[str], clock_rate: int):
+        """Track the layer of a media packet and switch to it on a keyframe if it is the target."""
+        layer = self._layers_by_ssrc.get(packet.ssrc)
+        if layer is None:
+            # Only the first packets of a stream carry its id, streams of
+            # clients without stream ids are told apart by their SSRC
+            rid = packet.extensions.rtp_stream_id or str(packet.ssrc)
+            layer = _Layer(rid, packet.ssrc)
+            self._layers[rid] = layer
+            self._layers_by_ssrc[packet.ssrc] = layer
+
+        now = monotonic()
+        layer.packets += 1
+        layer.last_packet_at = now
+
+        size = keyframe_size(codec, packet.payload)
+        if size is not None:
+            layer.size = size
+
+        if layer.rid != self._target_rid or layer is self._active:
+            return
+
+        if size is not None:
+            self._switch(layer, packet, clock_rate, now)
+        elif self._receiver is not None and now - self._last_keyframe_request >= _KEYFRAME_REQUEST_INTERVAL:
+            self._last_keyframe_request = now
+            self.keyframe_requests += 1
+            asyncio.ensure_future(self._receiver._send_rtcp_pli(layer.ssrc))
+
+    def _map_retransmissions(self, packet: RtpPacket, rtx_ssrcs: dict[int, int]):
+        """Tell the receiver which layer a retransmission stream repairs, they are not signaled in the offer."""
+        if packet.ssrc in rtx_ssrcs:
+            return
+
+        layer = self._layers.get(packet.extensions.repaired_rtp_stream_id or "")
+        if layer is not None:
+            rtx_ssrcs[packet.ssrc] = layer.ssrc
+
+    def _switch(self, layer: _Layer, packet: RtpPacket, clock_rate: int, now: float):
+        """Forward a layer from the first packet of its keyframe on."""
+        # The keyframe continues the sequence of the previous layer, its
+        # timestamp advances by the time since the last forwarded packet
+        if self._last_sequence_number is not None:
+            elapsed = max(1, round((now - self._last_forwarded_at) * clock_rate))
+            self._sequence_offset = (self._last_sequence_number + 1 - packet.sequence_number) & 0xFFFF
+            self._timestamp_offset = (self._last_timestamp + elapsed - packet.timestamp) & 0xFFFFFFFF
+
+        if self._active is not None:
+            self.switches += 1
+
+        self._active = layer
+
+        # Losses are tracked by sequence number of a single stream
+        if self._nack_generator is not None:
+            self._nack_generator.max_seq = None
+            self._nack_generator.missing.clear()
+
+        if self.on_switch is not None:
+            self.on_switch(layer.rid, layer.size)
+
+    def _rewrite(self, packet: RtpPacket):
+        """Continue the sequence numbers and timestamps of the previous layers."""
+        packet.sequence_number = (packet.sequence_number + self._sequence_offset) & 0xFFFF
+        packet.timestamp = (packet.timestamp + self._timestamp_offset) & 0xFFFFFFFF
+
+        # Retransmitted and reordered packets are older than the newest one
+        if self._last_sequence_number is None \
+                or (packet.sequence_number - self._last_sequence_number) & 0xFFFF < 0x8000:
+            self._last_sequence_number = packet.sequence_number
+            self._last_timestamp = packet.timestamp
+            self._last_forwarded_at = monotonic()
@@ -0,0 +1,145 @@
+"""
+Still images of the frames sent to the virtual camera.
+
+Frames are only encoded when a snapshot is requested and the encoded image is
+cached until the next frame is sent, so any number of clients polling for
+snapshots share a single encode per frame. Encoding runs on a worker thread.
+"""
+import asyncio
+from io import BytesIO
+from typing import Hashable, Optional
+
+import numpy as np
+from PIL import Image
+
+JPEG = "jpeg"
+PNG = "png"
+WEBP = "webp"
+
+# Content type of every supported snapshot format
+SNAPSHOT_FORMATS = {
+    JPEG: "image/jpeg",
+    PNG: "image/png",
+    WEBP: "image/webp",
+}
+
+
+def encode_image(image: np.ndarray, format: str, max_width: int = 0, quality: int = 85) -> bytes:
+    """
+    Encode an RGBA image, downscaling it first if it is wider than `max_width`.
+
+    Args:
+        image (np.ndarray): RGBA image
+        format (str): `JPEG`, `PNG` or `WEBP`
+        max_width (int, optional): Maximum width of the encoded image, the aspect ratio is kept. 0 to
+                                   never downscale. Defaults to 0.
+        quality (int, optional): JPEG and WebP quality from 1 to 100. Defaults to 85.
+
+    Raises:
+        ValueError: Unsupported format
+
+    Returns:
+        bytes: Encoded image
+    """
+    if format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unsupported snapshot format `{format}`")
+
+    # The mode is taken from the shape of the image, 4 channels are RGBA
+    picture = Image.fromarray(image)
+
+    if max_width > 0 and picture.width > max_width:
+        height = max(1, round(picture.height * max_width / picture.width))
+        picture = picture.resize((max_width, height), Image.Resampling.BILINEAR)
+
+    buffer = BytesIO()
+    if format == JPEG:
+        picture.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    elif format == WEBP:
+        picture.save(buffer, format="WEBP", quality=quality)
+    else:
+        # The default compression level is several times slower for little gain
+        picture.save(buffer, format="PNG", compress_level=3)
+
+    return buffer.getvalue()
+
+
+class SnapshotCache:
+    """Encode the latest frame at most once per format, shared between concurrent requests."""
+
+    def __init__(self, max_width: int = 0, quality: int = 85):
+        """
+        Create new instance of `SnapshotCache`.
+
+        Args:
+            max_width (int, optional): Maximum width of snapshots, 0 to never downscale. Defaults to 0.
+            quality (int, optional): JPEG and WebP quality from 1 to 100. Defaults to 85.
+        """
+        self.max_width = max_width
+        self.quality = quality
+
+        # Only the images of the latest frame are kept
+        self._latest_key: Optional[Hashable] = None
+        self._images: dict[str, bytes] = {}
+        self._pending: dict[str, asyncio.Future] = {}
+
+        self.encodes = 0
+        self.hits = 0
+        self.shared = 0
+
+    async def get(self, key: Hashable, image: np.ndarray, format: str) -> bytes:
+        """
+        Get the encoded image of a frame, encoding it if it has not been encoded yet.
+
+        @NOTE Must be called from the event loop that sends frames to the
+        camera, `image` is copied before the next frame can overwrite it.
+
+        Args:
+            key (Hashable): Identifies the frame, e.g. its sequence number
+            image (np.ndarray): RGBA image of the frame
+            format (str): `JPEG`, `PNG` or `WEBP`
+
+        Returns:
+            bytes: Encoded image
+        """
+        if key != self._latest_key:
+            self._latest_key = key
+            self._images.clear()
+            self._pending.clear()
+
+        if format in self._images:
+            self.hits += 1
+            return self._images[format]
+
+        pending = self._pending.get(format)
+        if pending is not None:
+            self.shared += 1
+        else:
+            self.encodes += 1
+            # `ensure_future` returns the future of the executor as is, it
+            # only narrows the type
+            pending = asyncio.ensure_future(asyncio.get_event_loop().run_in_executor(
+                None, encode_image, np.array(image, copy=True), format, self.max_width, self.quality))
+            pending.add_done_callback(lambda future: self._store(key, format, future))
+            self._pending[format] = pending
+
+        # Shielded so a client that disconnects does not cancel the encode
+        # other clients are waiting on
+        return await asyncio.shield(pending)
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters as a JSON serializable dict.
+
+        Returns:
+            dict: Number of encodes, snapshots served from the cache (hits) and snapshots that waited on
+                  an encode started by another request (shared)
+        """
+        return {"encodes": self.encodes, "hits": self.hits, "shared": self.shared}
+
+    def _store(self, key: Hashable, format: str, future: asyncio.Future):
+        if key != self._latest_key:
+            return
+
+        self._pending.pop(format, None)
+        if not future.cancelled() and future.exception() is None:
+            self._images[format] = future.result()
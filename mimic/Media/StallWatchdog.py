@@ -0,0 +1,242 @@
+"""
+Detect stalls of an incoming video track and request keyframes to recover.
+
+When packets are lost the decoder is either starved, because the jitter buffer
+never completes a frame, or fails to decode frames that reference a lost frame.
+Either way the camera freezes until the sender happens to send a keyframe. The
+watchdog notices both:
+- Stall - No frame was shown for `stall_timeout` seconds
+- Decode error - A frame handed to the decoder never came out of it. Decoded
+  frames carry the RTP timestamp of their encoded frame as pts, so every
+  encoded frame older than a decoded frame did not decode
+
+and asks the sender for a keyframe right away instead of waiting for the next
+periodic one. Requests are picture loss indications, at most one every
+`request_interval` seconds; after `fir_after` requests that were not answered
+with a frame, full intra requests are sent instead, which senders may not
+ignore. While stalled, the watchdog also lets the receiver skip the frames that
+wait for a lost packet, see `mimic.Media.ReceiverTap.skip_to_keyframe`, so the
+requested keyframe is decoded as soon as it arrives.
+
+Every stall is measured twice once a frame is shown again: the freeze the
+camera showed, from the last frame before the stall, and the time to recover,
+from the first keyframe request.
+
+>>> watchdog = StallWatchdog(lambda full_intra: request_keyframe(receiver))
+>>> watchdog.start(asyncio.get_event_loop())
+>>> tap_encoded_frames(receiver, watchdog.on_encoded_frame)
+>>> watchdog.on_frame(frame)
+>>> watchdog.stop()
+"""
+import asyncio
+from collections import deque
+from time import monotonic
+from typing import Callable, Optional
+
+from av import VideoFrame
+
+from mimic.Utils.Statistics import RollingQuantiles
+
+# Encoded frames waiting for their decoded frame that are kept, older frames
+# are forgotten if nothing is decoded for a while
+_MAX_PENDING = 64
+
+
+class StallWatchdog:
+    """Watch the frames of a single video track and request keyframes when it stalls."""
+
+    def __init__(
+        self,
+        request_keyframe: Callable[[bool], bool],
+        stall_timeout: float = 0.3,
+        request_interval: float = 0.5,
+        fir_after: int = 2,
+        check_interval: float = 0.05,
+        skip_to_keyframe: Optional[Callable[[], bool]] = None
+    ):
+        """
+        Create new instance of `StallWatchdog`.
+
+        Args:
+            request_keyframe (Callable[[bool], bool]): Sends a keyframe request, a full intra request if called
+                                                       with `True`. Returns whether a request was sent
+            stall_timeout (float, optional): Seconds without a frame after which the track is stalled.
+                                             Defaults to 0.3.
+            request_interval (float, optional): Minimum seconds between two keyframe requests. Defaults to 0.5.
+            fir_after (int, optional): Unanswered picture loss indications after which full intra requests are sent.
+                                       Defaults to 2.
+            check_interval (float, optional): Seconds between two checks for a stall. Defaults to 0.05.
+            skip_to_keyframe (Optional[Callable[[], bool]], optional): Drops buffered frames in front of a
+                                                                       keyframe, called on every check while
+                                                                       stalled. Returns whether frames were
+                                                                       dropped. Defaults to None.
+        """
+        self.request_keyframe = request_keyframe
+        self.stall_timeout = stall_timeout
+        self.request_interval = request_interval
+        self.fir_after = fir_after
+        self.check_interval = check_interval
+        self.skip_to_keyframe = skip_to_keyframe
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # RTP timestamps of encoded frames handed to the decoder, oldest first,
+        # until their decoded frame is shown
+        self._pending: deque[int] = deque(maxlen=_MAX_PENDING)
+
+        # Monotonic time of the last shown frame, and of the last frame before
+        # the current stall and the first keyframe request of it. `None` while
+        # the track is not stalled
+        self._last_frame_at: Optional[float] = None
+        self._stalled_at: Optional[float] = None
+        self._first_request_at: Optional[float] = None
+        self._last_request_at = 0.0
+        self._unanswered_requests = 0
+
+        self.stalls = 0
+        self.decode_errors = 0
+        self.pli_requests = 0
+        self.fir_requests = 0
+        self.keyframe_skips = 0
+        self.freeze = RollingQuantiles(capacity=100)
+        self.recovery = RollingQuantiles(capacity=100)
+        self.last_freeze: Optional[float] = None
+        self.last_recovery: Optional[float] = None
+
+        # Called on the event loop with the freeze and the time to recover in
+        # seconds every time the track recovers from a stall, the time to
+        # recover is `None` if no keyframe was requested
+        self.on_recover: Optional[Callable[[float, Optional[float]], None]] = None
+
+    @property
+    def stalled(self) -> bool:
+        """Whether the track is currently stalled."""
+        return self._stalled_at is not None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """
+        Start checking for stalls, the first frame is waited for without a timeout.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): Loop the checks run on
+        """
+        if self._timer is not None:
+            return
+
+        self._loop = loop
+        self._timer = loop.call_later(self.check_interval, self._check)
+
+    def stop(self):
+        """Stop checking for stalls."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def on_encoded_frame(self, mime_type: str, data: bytes, timestamp: int):
+        """
+        Note an encoded frame that was handed to the decoder.
+
+        Has the signature of `mimic.Media.ReceiverTap.EncodedFrameListener`.
+
+        Args:
+            mime_type (str): Mime type of the RTP codec
+            data (bytes): Encoded frame
+            timestamp (int): RTP timestamp of the frame
+        """
+        self._pending.append(timestamp)
+
+    def on_frame(self, frame: VideoFrame):
+        """
+        Note a decoded frame that was shown.
+
+        Args:
+            frame (VideoFrame): Decoded frame from the track
+        """
+        now = monotonic()
+
+        # Encoded frames that were handed to the decoder before this frame
+        # and never came out of it failed to decode
+        if frame.pts is not None and frame.pts in self._pending:
+            while self._pending[0] != frame.pts:
+                self._pending.popleft()
+                self._on_decode_error(now)
+            self._pending.popleft()
+
+        if self._stalled_at is not None:
+            freeze = now - self._stalled_at
+            recovery = now - self._first_request_at if self._first_request_at is not None else None
+
+            self.freeze.add(freeze * 1000)
+            self.last_freeze = freeze
+            if recovery is not None:
+                self.recovery.add(recovery * 1000)
+                self.last_recovery = recovery
+
+            self._stalled_at = None
+            self._first_request_at = None
+
+            if self.on_recover is not None:
+                self.on_recover(freeze, recovery)
+
+        self._last_frame_at = now
+        self._unanswered_requests = 0
+
+    def stats(self) -> dict:
+        """
+        Get the stall counters as a JSON serializable dict.
+
+        Returns:
+            dict: Whether the track is stalled, stalls, decode errors, keyframe requests and skips, and
+                  quantiles of the freeze and time to recover in milliseconds
+        """
+        return {
+            "stalled": self.stalled,
+            "stalls": self.stalls,
+            "decode_errors": self.decode_errors,
+            "keyframe_requests": {"pli": self.pli_requests, "fir": self.fir_requests},
+            "keyframe_skips": self.keyframe_skips,
+            "freeze_ms": self.freeze.summary(0.5, 0.99),
+            "recover_ms": self.recovery.summary(0.5, 0.99),
+            "last_freeze_ms": round(self.last_freeze * 1000, 1) if self.last_freeze is not None else None,
+            "last_recover_ms": round(self.last_recovery * 1000, 1) if self.last_recovery is not None else None,
+        }
+
+    def _on_decode_error(self, now: float):
+        self.decode_errors += 1
+        self._request(now)
+
+    def _check(self):
+        now = monotonic()
+
+        if self._last_frame_at is not None and now - self._last_frame_at >= self.stall_timeout:
+            if self._stalled_at is None:
+                self._stalled_at = self._last_frame_at
+                self.stalls += 1
+
+            self._request(now)
+
+            if self.skip_to_keyframe is not None and self.skip_to_keyframe():
+                self.keyframe_skips += 1
+
+        if self._loop is not None:
+            self._timer = self._loop.call_later(self.check_interval, self._check)
+
+    def _request(self, now: float):
+        """Request a keyframe unless one was requested less than `request_interval` seconds ago."""
+        if now - self._last_request_at < self.request_interval:
+            return
+
+        full_intra = self._unanswered_requests >= self.fir_after
+        if not self.request_keyframe(full_intra):
+            return
+
+        self._last_request_at = now
+        self._unanswered_requests += 1
+        if self._stalled_at is not None and self._first_request_at is None:
+            self._first_request_at = now
+
+        if full_intra:
+            self.fir_requests += 1
+        else:
+            self.pli_requests += 1
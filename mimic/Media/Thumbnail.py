@@ -0,0 +1,264 @@
+"""
+Low rate thumbnail of the frames sent to the virtual camera, shared with the GUI process.
+
+The thumbnail lives in a block of shared memory that the GUI process creates
+and the web server process attaches to by name, so frames never travel through
+the pipe between them. The server downscales a frame at most `fps` times per
+second and only while the GUI has not paused the thumbnail, e.g. because its
+window is hidden, so the thumbnail costs nothing while nobody looks at it.
+
+Layout of the shared memory, little endian:
+- Header - Sequence number (u32), maximum width and height (u16), width and
+  height of the current thumbnail (u16) and whether the reader paused the
+  thumbnail (u8), padded to `_HEADER_SIZE` bytes
+- Pixels - RGB rows of the current thumbnail without padding
+
+The sequence number is odd while the writer is writing. A reader discards a
+thumbnail if the sequence number was odd or changed while it was copied.
+
+>>> thumbnail = ThumbnailBuffer.create(240)                  # GUI process
+>>> writer = ThumbnailWriter(ThumbnailBuffer.attach(thumbnail.name), fps=4)  # server process
+>>> writer.offer(frame_number, image)
+>>> sequence, width, height, pixels = thumbnail.read(last_sequence)
+"""
+import asyncio
+import struct
+from multiprocessing import shared_memory
+from time import monotonic
+from typing import Hashable, Optional
+
+import numpy as np
+from PIL import Image
+
+_HEADER = struct.Struct("<IHHHHB")
+_HEADER_SIZE = 16
+_PAUSED_OFFSET = 12
+
+
+class ThumbnailBuffer:
+    """A single thumbnail in shared memory, written by one process and read by another."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        """
+        Wrap shared memory that holds a thumbnail, use `create` or `attach` instead.
+
+        Args:
+            memory (shared_memory.SharedMemory): Shared memory of the thumbnail
+            owner (bool): Whether this process created the memory and unlinks it on close
+        """
+        assert memory.buf is not None, "Shared memory of the thumbnail is closed"
+
+        self._memory = memory
+        self._buf = memory.buf
+        self._owner = owner
+
+        _, self.max_width, self.max_height, _, _, _ = _HEADER.unpack_from(self._buf)
+
+    @classmethod
+    def create(cls, max_size: int = 240) -> "ThumbnailBuffer":
+        """
+        Allocate the shared memory of a thumbnail, the thumbnail starts paused.
+
+        Args:
+            max_size (int, optional): Largest width and height of the thumbnail, the same for both so portrait
+                                      frames fit as well. Defaults to 240.
+
+        Returns:
+            ThumbnailBuffer: Buffer owned by this process
+        """
+        memory = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + max_size * max_size * 3)
+        assert memory.buf is not None, "Shared memory of the thumbnail is closed"
+
+        _HEADER.pack_into(memory.buf, 0, 0, max_size, max_size, 0, 0, 1)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ThumbnailBuffer":
+        """
+        Open the shared memory of a thumbnail created by another process.
+
+        Args:
+            name (str): `name` of the buffer in the creating process
+
+        Raises:
+            FileNotFoundError: No shared memory with this name exists
+
+        Returns:
+            ThumbnailBuffer: Buffer that is closed, but not unlinked, by this process
+        """
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        """Name other processes attach to the buffer with."""
+        return self._memory.name
+
+    @property
+    def paused(self) -> bool:
+        """Whether the reader does not need new thumbnails."""
+        return self._buf[_PAUSED_OFFSET] != 0
+
+    @paused.setter
+    def paused(self, paused: bool):
+        struct.pack_into("<B", self._buf, _PAUSED_OFFSET, int(paused))
+
+    def write(self, image: np.ndarray):
+        """
+        Replace the thumbnail.
+
+        Args:
+            image (np.ndarray): RGB image no larger than `max_width` by `max_height`
+
+        Raises:
+            ValueError: The image is too large
+        """
+        height, width = image.shape[:2]
+        if width > self.max_width or height > self.max_height:
+            raise ValueError(f"Thumbnail of {width}x{height} does not fit {self.max_width}x{self.max_height}")
+
+        buf = self._buf
+        sequence = _HEADER.unpack_from(buf)[0]
+
+        # Odd while writing, see the module docstring
+        struct.pack_into("<I", buf, 0, (sequence + 1) & 0xFFFFFFFF)
+        pixels: np.ndarray = np.ndarray((height, width, 3), dtype=np.uint8, buffer=buf, offset=_HEADER_SIZE)
+        np.copyto(pixels, image)
+        struct.pack_into("<HH", buf, 8, width, height)
+        struct.pack_into("<I", buf, 0, (sequence + 2) & 0xFFFFFFFF)
+
+    def read(self, last_sequence: int = 0) -> Optional[tuple[int, int, int, bytes]]:
+        """
+        Copy the thumbnail if it changed.
+
+        Args:
+            last_sequence (int, optional): Sequence number of the previously read thumbnail. Defaults to 0.
+
+        Returns:
+            Optional[tuple[int, int, int, bytes]]: Sequence number, width, height and RGB pixels, `None` if there
+                                                   is no new thumbnail or it is being written
+        """
+        buf = self._buf
+        sequence, _, _, width, height, _ = _HEADER.unpack_from(buf)
+        if sequence == last_sequence or sequence % 2 == 1 or width == 0 or height == 0:
+            return None
+
+        pixels = bytes(buf[_HEADER_SIZE:_HEADER_SIZE + width * height * 3])
+        if _HEADER.unpack_from(buf)[0] != sequence:
+            return None
+
+        return sequence, width, height, pixels
+
+    def close(self):
+        """Close the buffer in this process, and free the shared memory if this process created it."""
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+class ThumbnailWriter:
+    """Downscale frames sent to the camera into a `ThumbnailBuffer` at a low frame rate."""
+
+    def __init__(self, buffer: ThumbnailBuffer, fps: float = 4.0):
+        """
+        Create new instance of `ThumbnailWriter`.
+
+        Args:
+            buffer (ThumbnailBuffer): Buffer attached in the server process
+            fps (float, optional): Maximum thumbnails per second. Defaults to 4.0.
+        """
+        self.buffer = buffer
+        self.fps = fps
+
+        self._last_key: Optional[Hashable] = None
+        self._last_write_time = 0.0
+        self._is_writing = False
+        self._closed = False
+
+        # Frames are decimated into this buffer on the event loop before being
+        # scaled on a worker thread, at most one frame is scaled at a time
+        self._staging: Optional[np.ndarray] = None
+
+        self.writes = 0
+
+    def offer(self, key: Hashable, image: np.ndarray):
+        """
+        Offer a frame to the thumbnail, it is downscaled and written if the thumbnail is due.
+
+        Returns immediately. The frame is skipped while the reader paused the
+        thumbnail, when it is the same frame as the previous one, when the
+        thumbnail frame rate would be exceeded or while the previous frame is
+        still being scaled.
+
+        @NOTE Must be called from the event loop, `image` is copied before
+        returning so its buffer may be reused afterwards.
+
+        Args:
+            key (Hashable): Identifies the frame, e.g. its sequence number
+            image (np.ndarray): RGBA image of the frame
+        """
+        if self._closed or self._is_writing or key == self._last_key or self.buffer.paused:
+            return
+
+        now = monotonic()
+        if now - self._last_write_time < 1 / self.fps:
+            return
+
+        # Only every n-th pixel is copied, down to twice the thumbnail size,
+        # which keeps the copy on the event loop small and leaves enough
+        # pixels to scale the thumbnail from smoothly
+        height, width = image.shape[:2]
+        step = max(1, min(width // (2 * self.buffer.max_width), height // (2 * self.buffer.max_height)))
+        decimated = image[::step, ::step, :3]
+
+        if self._staging is None or self._staging.shape != decimated.shape:
+            self._staging = np.empty_like(decimated)
+
+        np.copyto(self._staging, decimated)
+
+        self._last_key = key
+        self._last_write_time = now
+        self._is_writing = True
+        asyncio.ensure_future(self._write(self._staging, width, height))
+
+    def close(self):
+        """Stop writing thumbnails and close the buffer in this process once the last thumbnail is written."""
+        self._closed = True
+        if not self._is_writing:
+            self.buffer.close()
+
+    def stats(self) -> dict:
+        """
+        Get the thumbnail counters as a JSON serializable dict.
+
+        Returns:
+            dict: Whether the reader paused the thumbnail and the thumbnails written
+        """
+        return {"paused": self.buffer.paused, "writes": self.writes}
+
+    async def _write(self, image: np.ndarray, width: int, height: int):
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self._scale_and_write, image, width, height)
+        finally:
+            self._is_writing = False
+
+            # The buffer cannot be closed while it is being written to
+            if self._closed:
+                self.buffer.close()
+
+        self.writes += 1
+
+    def _scale_and_write(self, image: np.ndarray, width: int, height: int):
+        """
+        Scale a decimated frame to the thumbnail size, keeping the aspect ratio of the original frame.
+
+        @NOTE Runs on a worker thread.
+        """
+        scale = min(self.buffer.max_width / width, self.buffer.max_height / height, 1.0)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        # The mode is taken from the shape of the image, 3 channels are RGB
+        picture = Image.fromarray(image)
+        if picture.size != size:
+            picture = picture.resize(size, Image.Resampling.BILINEAR)
+
+        self.buffer.write(np.asarray(picture))
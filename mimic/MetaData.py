@@ -5,6 +5,7 @@ Raises:
     KeyError: A required key is missing from the JSON string
 """
 import json
+from typing import Optional
 
 
 class MetaData:
@@ -33,3 +34,10 @@ class MetaData:
         if 'framerate' not in json_obj:
             raise KeyError("Required key `framerate` not in metadata.")
         self.framerate: int = json_obj['framerate']
+
+        # Angle of the client's screen in degrees, one of 0, 90, 180 or 270
+        self.orientation: int = int(json_obj.get('orientation', 0)) % 360
+
+        # `user` for front facing cameras, `environment` for rear facing
+        # cameras. Not all browsers report it
+        self.facing_mode: Optional[str] = json_obj.get('facingMode')
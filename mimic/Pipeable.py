@@ -1,84 +1,529 @@
-"""Helpers to establish duplex communication between processes."""
+"""
+Helpers to establish duplex communication between processes.
 
+Messages are typed schemas with `__slots__`, the type of every field is taken
+from the annotation of its slot. They are encoded with `struct` instead of
+being pickled, and many messages are sent as a single batch per write to the
+pipe, see `Channel`.
+
+Wire format of a batch, all integers little endian:
+- For every message, its `TYPE_ID` as an unsigned byte followed by its fields
+  in slot order. `int` fields are 64-bit, `float` fields are doubles and `bool`
+  fields are a single byte. `str`, `bytes` and every other field, which is
+  encoded as JSON, are an unsigned 32-bit length followed by the data
+
+Channels are duplex, either end can send a `RequestMessage` and the other end
+answers it with a `ResponseMessage` from the handler registered for the method.
+
+>>> channel = Channel(connection)
+>>> channel.on_request("stats", lambda params: collect_stats())
+>>> channel.send(LogMessage("Server started"))
+>>> channel.flush()
+>>>
+>>> # On the other end of the pipe
+>>> stats = other_channel.request("stats").result(timeout=1)
+"""
+
+import asyncio
+import inspect
+import json
 import logging
+import struct
 from abc import ABC
+from concurrent.futures import Future
+from itertools import count
 from multiprocessing import Pipe
 from multiprocessing.connection import Connection
-from typing import Any
+from threading import Lock
+from typing import Any, Callable, ClassVar, Optional, Protocol
 
+# Struct codes of fixed size fields
+_FIXED_FIELDS: dict[type, str] = {
+    int: "q",
+    float: "d",
+    bool: "?",
+}
 
-class Pipeable(ABC):
-    """
-    Allows for inter-process communication (IPC) from a class.
+# Variable size fields are prefixed with their length
+_STR = "s"
+_BYTES = "y"
+_JSON = "j"
 
-    @NOTE This class should be inheritted from and not used directly.
+
+class Message:
     """
+    The base of every message sent through a `Channel`.
 
-    # Parent pipe, should only be used outside of the class
-    pipe: Connection
+    Subclasses declare their fields as `__slots__` with an annotation for every
+    slot, and a unique `TYPE_ID` between 0 and 255.
 
-    # Child pipe, should only be used inside of the class
-    _pipe: Connection
+    >>> class TemperatureMessage(Message):
+    >>>     TYPE_ID = 42
+    >>>     __slots__ = ("sensor", "celsius")
+    >>>     sensor: str
+    >>>     celsius: float
+    """
 
-    def __init__(self):
-        """Establish a duplex IPC channel."""
-        self.pipe, self._pipe = Pipe()
+    __slots__: tuple[str, ...] = ()
 
+    TYPE_ID: ClassVar[int]
 
-class _abstractMessage(ABC):
-    """
-    The base to build messages to send through a pipe.
+    # Schema compiled from the slots and their annotations
+    _header: ClassVar[struct.Struct]
+    _fields: ClassVar[tuple[tuple[str, str], ...]]
 
-    All messages sent through a Pipeable pipe should be inherited from this type.
+    # Message types by `TYPE_ID`
+    _types: ClassVar[dict[int, type["Message"]]] = {}
 
-    @NOTE This class should be inheritted from and not used directly.
-    """
+    def __init_subclass__(cls):
+        """Compile the schema of a message type from its slots and register its `TYPE_ID`."""
+        super().__init_subclass__()
 
-    def __init__(self, payload: Any):
-        self.payload = payload
+        if cls.TYPE_ID in Message._types:
+            raise ValueError(f"Message type id {cls.TYPE_ID} of `{cls.__name__}` is already used by "
+                             f"`{Message._types[cls.TYPE_ID].__name__}`")
 
-    def isType(self, classDeclaration: type) -> bool:
-        """
-        Whether the type of message is a certain type.
+        annotations = cls.__dict__.get("__annotations__", {})
 
-        Useful for determining which type of message before handling.
+        fields = []
+        header = "<B"
+        for name in cls.__slots__:
+            annotation = annotations[name]
+            if annotation in _FIXED_FIELDS:
+                fields.append((name, _FIXED_FIELDS[annotation]))
+                header += _FIXED_FIELDS[annotation]
+            else:
+                fields.append((name, _STR if annotation is str else _BYTES if annotation is bytes else _JSON))
+                header += "I"
 
-        >>> if myPipeableClass.pipe.poll():
-        >>>     message = myPipeableClass.pipe.recv():
-        >>>     if message.typeOf(StringMessage):
-        >>>         print(message.payload)
+        cls._fields = tuple(fields)
+        cls._header = struct.Struct(header)
+        Message._types[cls.TYPE_ID] = cls
 
-        Args: classDeclaration (type): Comparison type
+    def encode(self) -> bytes:
+        """
+        Encode the message including its type id.
 
-        Returns: bool: Whether the type of message is same as the comparison
-            type
+        Returns:
+            bytes: Encoded message
         """
-        return self.__class__.__name__ == classDeclaration.__name__
+        values = []
+        variable = []
+        for name, kind in self._fields:
+            value = getattr(self, name)
 
+            if kind == _STR:
+                value = value.encode("utf-8")
+            elif kind == _JSON:
+                value = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            elif kind != _BYTES:
+                values.append(value)
+                continue
 
-class StringMessage(_abstractMessage):
-    """A Pipeable message of type `str`."""
+            values.append(len(value))
+            variable.append(value)
 
-    def __init__(self, payload: str):
+        return self._header.pack(self.TYPE_ID, *values) + b"".join(variable)
+
+    @staticmethod
+    def decode(data: memoryview, offset: int = 0) -> tuple["Message", int]:
         """
-        Create a message of type `str`.
+        Decode the message at an offset of a batch.
 
         Args:
-            payload (str): [description]
+            data (memoryview): Encoded batch
+            offset (int, optional): Offset of the message. Defaults to 0.
+
+        Raises:
+            ValueError: Unknown message type
+
+        Returns:
+            tuple[Message, int]: Decoded message and the offset of the next message
         """
-        super().__init__(payload)
+        cls = Message._types.get(data[offset])
+        if cls is None:
+            raise ValueError(f"Unknown message type id {data[offset]}")
+
+        values = cls._header.unpack_from(data, offset)
+        offset += cls._header.size
+
+        message = cls.__new__(cls)
+        for (name, kind), value in zip(cls._fields, values[1:]):
+            if kind in (_STR, _BYTES, _JSON):
+                # The header holds the length of variable size fields
+                raw = data[offset:offset + value]
+                offset += value
+
+                if kind == _STR:
+                    value = str(raw, "utf-8")
+                elif kind == _BYTES:
+                    value = bytes(raw)
+                else:
+                    value = json.loads(str(raw, "utf-8"))
+
+            setattr(message, name, value)
 
+        return message, offset
 
-class LogMessage(_abstractMessage):
-    """A Pipeable message to send logging information."""
+    def __repr__(self) -> str:
+        """Show the type and fields of the message."""
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
 
-    def __init__(self, payload: str, level: int = logging.INFO):
+
+class LogMessage(Message):
+    """A message to send logging information."""
+
+    TYPE_ID = 1
+
+    __slots__ = ("payload", "level", "fields")
+    payload: str
+    level: int
+    fields: Optional[dict[str, Any]]
+
+    def __init__(self, payload: str, level: int = logging.INFO, fields: Optional[dict[str, Any]] = None):
         """
         Create a message to send logging information.
 
         Args:
             payload (str): Log message
             level (int, optional): Logging level. Defaults to logging.INFO.
+            fields (Optional[dict[str, Any]], optional): JSON serializable structured fields, written by the
+                                                         structured log format. Defaults to None.
         """
         self.payload = payload
         self.level = level
+        self.fields = fields
+
+
+class CommandMessage(Message):
+    """A message that asks the receiver to perform an action without a response, e.g. a tray icon click."""
+
+    TYPE_ID = 2
+
+    __slots__ = ("name",)
+    name: str
+
+    def __init__(self, name: str):
+        """
+        Create a command message.
+
+        Args:
+            name (str): Name of the command
+        """
+        self.name = name
+
+
+class RequestMessage(Message):
+    """A request that is answered with a `ResponseMessage`, see `Channel.request`."""
+
+    TYPE_ID = 3
+
+    __slots__ = ("request_id", "method", "params")
+    request_id: int
+    method: str
+    params: Any
+
+    def __init__(self, request_id: int, method: str, params: Any = None):
+        """
+        Create a request message.
+
+        Args:
+            request_id (int): Identifier of the request, unique per channel
+            method (str): Name of the handler on the other end
+            params (Any, optional): JSON serializable parameters. Defaults to None.
+        """
+        self.request_id = request_id
+        self.method = method
+        self.params = params
+
+
+class ResponseMessage(Message):
+    """The answer to a `RequestMessage`."""
+
+    TYPE_ID = 4
+
+    __slots__ = ("request_id", "ok", "result")
+    request_id: int
+    ok: bool
+    result: Any
+
+    def __init__(self, request_id: int, ok: bool, result: Any = None):
+        """
+        Create a response message.
+
+        Args:
+            request_id (int): Identifier of the request that is answered
+            ok (bool): Whether the request succeeded
+            result (Any, optional): JSON serializable result, or the error message if the request failed.
+                                    Defaults to None.
+        """
+        self.request_id = request_id
+        self.ok = ok
+        self.result = result
+
+
+class RequestError(Exception):
+    """The other end of a channel failed to handle a request."""
+
+
+RequestHandler = Callable[[Any], Any]
+
+
+class MessageSink(Protocol):
+    """
+    Anything messages can be sent to, a `Channel` or a replacement for it.
+
+    Allows the web server to run in the same process as its consumer, e.g.
+    when running headless, without setting up a pipe.
+    """
+
+    def send(self, message: Message) -> None:
+        """Send a message, it may be buffered until `flush` is called."""
+
+    def flush(self) -> None:
+        """Send the buffered messages."""
+
+
+class Channel:
+    """
+    Duplex, batched message channel over a pipe connection.
+
+    Sent messages are buffered and written as a single batch when `flush` is
+    called or `batch_size` messages are buffered. Channels are thread safe.
+    """
+
+    def __init__(self, connection: Connection, batch_size: int = 64):
+        """
+        Create new instance of `Channel`.
+
+        Args:
+            connection (Connection): End of a pipe, the other end must be wrapped in a `Channel` too
+            batch_size (int, optional): Messages buffered before they are sent without waiting for `flush`,
+                                        1 to send every message immediately. Defaults to 64.
+        """
+        self.connection = connection
+        self.batch_size = batch_size
+
+        # Guards the buffer and the pending requests, it is never held while
+        # writing to the pipe so that senders do not wait on a full pipe
+        self._lock = Lock()
+        self._buffer: list[bytes] = []
+
+        # Held while a batch is taken from the buffer and written, keeps
+        # batches in order and writes whole
+        self._send_lock = Lock()
+
+        self._request_ids = count()
+        self._pending: dict[int, Future] = {}
+        self._handlers: dict[str, RequestHandler] = {}
+
+    @classmethod
+    def pair(cls, batch_size: int = 64) -> tuple["Channel", "Channel"]:
+        """
+        Create both ends of a new pipe.
+
+        Args:
+            batch_size (int, optional): See `Channel`. Defaults to 64.
+
+        Returns:
+            tuple[Channel, Channel]: Both ends of the pipe
+        """
+        a, b = Pipe()
+        return cls(a, batch_size), cls(b, batch_size)
+
+    def send(self, message: Message) -> None:
+        """
+        Buffer a message, the buffer is sent once it holds `batch_size` messages.
+
+        Args:
+            message (Message): Message to send
+        """
+        data = message.encode()
+
+        with self._lock:
+            self._buffer.append(data)
+            is_full = len(self._buffer) >= self.batch_size
+
+        if is_full:
+            self._flush()
+
+    def flush(self) -> None:
+        """Send every buffered message as a single batch."""
+        self._flush()
+
+    def poll(self, timeout: float = 0.0) -> bool:
+        """
+        Whether a batch can be received.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a batch. Defaults to 0.0.
+
+        Returns:
+            bool: A batch can be received without blocking
+        """
+        return self.connection.poll(timeout)
+
+    def receive(self) -> list[Message]:
+        """
+        Receive the next batch, blocking until one arrives.
+
+        Responses complete their request and requests are answered by their
+        handler, neither is returned. Handlers that return an awaitable must be
+        called on a running event loop.
+
+        Raises:
+            EOFError: The other end was closed
+
+        Returns:
+            list[Message]: Every other message of the batch
+        """
+        data = memoryview(self.connection.recv_bytes())
+
+        messages = []
+        offset = 0
+        while offset < len(data):
+            message, offset = Message.decode(data, offset)
+
+            if isinstance(message, ResponseMessage):
+                self._complete(message)
+            elif isinstance(message, RequestMessage):
+                self._handle(message)
+            else:
+                messages.append(message)
+
+        return messages
+
+    def request(self, method: str, params: Any = None) -> Future:
+        """
+        Send a request to the other end, it is sent immediately.
+
+        The returned future completes once the response has been received by
+        `receive` on this end, so this end must keep receiving.
+
+        Args:
+            method (str): Name of the handler on the other end
+            params (Any, optional): JSON serializable parameters. Defaults to None.
+
+        Returns:
+            Future: Result of the handler, fails with `RequestError` if the handler raised
+        """
+        future: Future = Future()
+
+        with self._lock:
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            self._buffer.append(RequestMessage(request_id, method, params).encode())
+
+        self._flush()
+        return future
+
+    def on_request(self, method: str, handler: RequestHandler) -> None:
+        """
+        Answer the requests of a method from the other end.
+
+        Args:
+            method (str): Name of the method
+            handler (RequestHandler): Called with the parameters of the request, returns the JSON serializable
+                                      result or an awaitable of it
+        """
+        self._handlers[method] = handler
+
+    def close(self) -> None:
+        """Send the buffered messages, close the pipe and fail every pending request."""
+        try:
+            self.flush()
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+        self.connection.close()
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for future in pending.values():
+            future.set_exception(EOFError("Channel closed."))
+
+    def _flush(self) -> None:
+        """Send the buffer, `_lock` must not be held."""
+        with self._send_lock:
+            with self._lock:
+                if len(self._buffer) == 0:
+                    return
+
+                data = b"".join(self._buffer)
+                self._buffer.clear()
+
+            self.connection.send_bytes(data)
+
+    def _complete(self, response: ResponseMessage) -> None:
+        with self._lock:
+            future = self._pending.pop(response.request_id, None)
+
+        if future is None:
+            return
+
+        if response.ok:
+            future.set_result(response.result)
+        else:
+            future.set_exception(RequestError(response.result))
+
+    def _handle(self, request: RequestMessage) -> None:
+        handler = self._handlers.get(request.method)
+        if handler is None:
+            self._respond(ResponseMessage(request.request_id, False, f"Unknown method `{request.method}`"))
+            return
+
+        try:
+            result = handler(request.params)
+        except Exception as e:
+            self._respond(ResponseMessage(request.request_id, False, f"{type(e).__name__}: {e}"))
+            return
+
+        if not inspect.isawaitable(result):
+            self._respond(ResponseMessage(request.request_id, True, result))
+            return
+
+        def on_done(task: "asyncio.Future[Any]"):
+            if task.cancelled():
+                self._respond(ResponseMessage(request.request_id, False, "Request was cancelled"))
+            elif task.exception() is not None:
+                e = task.exception()
+                self._respond(ResponseMessage(request.request_id, False, f"{type(e).__name__}: {e}"))
+            else:
+                self._respond(ResponseMessage(request.request_id, True, task.result()))
+
+        asyncio.ensure_future(result).add_done_callback(on_done)
+
+    def _respond(self, response: ResponseMessage) -> None:
+        """Send a response immediately, the other end is waiting for it."""
+        # A result that cannot be encoded fails the request instead of
+        # raising out of `receive` on this end
+        try:
+            data = response.encode()
+        except Exception as e:
+            data = ResponseMessage(response.request_id, False, f"{type(e).__name__}: {e}").encode()
+
+        with self._lock:
+            self._buffer.append(data)
+
+        self._flush()
+
+
+class Pipeable(ABC):
+    """
+    Allows for inter-process communication (IPC) from a class.
+
+    @NOTE This class should be inheritted from and not used directly.
+    """
+
+    # Parent channel, should only be used outside of the class
+    pipe: Channel
+
+    # Child channel, should only be used inside of the class, messages are
+    # sent immediately
+    _pipe: Channel
+
+    def __init__(self):
+        """Establish a duplex IPC channel."""
+        self.pipe, self._pipe = Channel.pair(batch_size=1)
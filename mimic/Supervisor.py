@@ -0,0 +1,273 @@
+"""
+Run the web server in a child process and restart it when it dies or hangs.
+
+The supervisor owns the server process and the `Channel` to it. The server is
+considered alive while it answers the `health` requests that are sent every
+`health_interval` seconds; it answers them from its main loop, so a blocked
+event loop stops answering as well. The answer is whether every startup step
+of the server is ready. A server that exits while the app is not stopping,
+stops answering, or does not become ready in time is replaced by a new process.
+
+The first restart after a healthy run is immediate, consecutive restarts back
+off exponentially so a server that crashes on startup does not spin. Once the
+new process reports that it is ready, the time since the failure was detected
+is reported as the recovery time.
+
+>>> supervisor = ServerSupervisor(webserver_thread_runner, stop_event, logger)
+>>> supervisor.start()
+>>> while not stop_event.is_set():
+>>>     for message in supervisor.poll():
+>>>         ...
+>>> supervisor.stop()
+"""
+import logging
+from concurrent.futures import Future
+from multiprocessing import Pipe, Process
+from multiprocessing.synchronize import Event
+from time import monotonic
+from typing import Any, Callable, Optional
+
+from mimic.Pipeable import Channel, Message
+
+# Seconds between `health` requests until the server is ready, short so that
+# the recovery time is not rounded up to the health interval
+_STARTUP_HEALTH_INTERVAL = 0.05
+
+
+class ServerSupervisor:
+    """Keep the web server process running and report its restarts."""
+
+    def __init__(
+        self,
+        target: Callable[..., Any],
+        stop_event: Event,
+        logger: logging.Logger,
+        health_interval: float = 1.0,
+        hang_timeout: float = 10.0,
+        startup_timeout: float = 60.0,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        stable_after: float = 60.0,
+        target_args: tuple = ()
+    ):
+        """
+        Create new instance of `ServerSupervisor`.
+
+        Args:
+            target (Callable[..., Any]): Server process entrypoint, called with `stop_event` and its pipe connection
+            stop_event (Event): Set when the app stops, the server is not restarted after it is set
+            logger (logging.Logger): Logger for restarts and recoveries
+            health_interval (float, optional): Seconds between `health` requests. Defaults to 1.0.
+            hang_timeout (float, optional): Seconds a running server may leave a `health` request unanswered.
+                                            Defaults to 10.0.
+            startup_timeout (float, optional): Seconds a new server may take to become ready, e.g. while it
+                                               retries to acquire the camera. Defaults to 60.0.
+            min_backoff (float, optional): Seconds before the second consecutive restart, doubled for every
+                                           further restart. Defaults to 0.5.
+            max_backoff (float, optional): Maximum seconds between restarts. Defaults to 30.0.
+            stable_after (float, optional): Seconds a server must run before its failure counts as a first
+                                            failure again. Defaults to 60.0.
+            target_args (tuple, optional): Arguments passed to every server process after its pipe connection.
+                                           Defaults to ().
+        """
+        self.target = target
+        self.stop_event = stop_event
+        self.logger = logger
+        self.health_interval = health_interval
+        self.hang_timeout = hang_timeout
+        self.startup_timeout = startup_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.target_args = target_args
+
+        self.process: Optional[Process] = None
+        self.channel: Optional[Channel] = None
+
+        # Monotonic times the process was started, reported that it is ready,
+        # was last sent a health request and last answered one
+        self._started_at = 0.0
+        self._ready_at: Optional[float] = None
+        self._health: Optional[Future] = None
+        self._health_sent_at = 0.0
+        self._health_answered_at = 0.0
+
+        # Monotonic time the current outage was detected and the restart is
+        # due, both `None` while the server is running
+        self._failed_at: Optional[float] = None
+        self._restart_at: Optional[float] = None
+        self._consecutive_failures = 0
+
+        self.restarts = 0
+        self.crashes = 0
+        self.hangs = 0
+        self.last_failure: Optional[str] = None
+        self.last_recovery_ms: Optional[float] = None
+
+    def start(self):
+        """Start the server process."""
+        self._spawn()
+
+    def poll(self) -> list[Message]:
+        """
+        Receive the messages of the server, check its health and restart it if needed. Never blocks.
+
+        Returns:
+            list[Message]: Received messages that are not requests or responses
+        """
+        messages: list[Message] = []
+        if self.channel is not None:
+            try:
+                while self.channel.poll():
+                    messages.extend(self.channel.receive())
+            except (BrokenPipeError, EOFError, OSError):
+                # The process is gone, detected below
+                pass
+
+        if self.stop_event.is_set():
+            return messages
+
+        now = monotonic()
+        if self._restart_at is not None:
+            if now >= self._restart_at:
+                self._spawn()
+            return messages
+
+        if self.process is None or not self.process.is_alive():
+            self.crashes += 1
+            self._fail(f"exited with code {self.process.exitcode if self.process is not None else None}", now)
+            return messages
+
+        if self._health is not None and self._health.done():
+            ready = self._health.exception() is None and self._health.result() is True
+            self._health = None
+            self._health_answered_at = now
+            if ready and self._ready_at is None:
+                self._on_ready(now)
+        elif self._health is not None and now - self._health_sent_at > self.hang_timeout:
+            self.hangs += 1
+            self._fail(f"did not respond for {now - self._health_sent_at:.1f}s", now)
+            return messages
+
+        if self._ready_at is None and now - self._started_at > self.startup_timeout:
+            self.hangs += 1
+            self._fail(f"was not ready after {now - self._started_at:.1f}s", now)
+            return messages
+
+        interval = self.health_interval if self._ready_at is not None else _STARTUP_HEALTH_INTERVAL
+        if self.channel is None:
+            return messages
+
+        if self._health is None and now - self._health_answered_at >= interval:
+            try:
+                self._health = self.channel.request("health")
+                self._health_sent_at = now
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+
+        return messages
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Wait for the server to stop after `stop_event` was set, terminating it if it does not.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a graceful shutdown. Defaults to 10.0.
+        """
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.logger.warning("Web server did not stop, terminating it")
+                self._kill()
+
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+
+    def stats(self) -> dict:
+        """
+        Get the restart counters as a JSON serializable dict.
+
+        Returns:
+            dict: Restarts, crashes and hangs, the last failure and the last recovery time
+        """
+        return {
+            "restarts": self.restarts,
+            "crashes": self.crashes,
+            "hangs": self.hangs,
+            "last_failure": self.last_failure,
+            "last_recovery_ms": self.last_recovery_ms,
+        }
+
+    def _spawn(self):
+        """Start a new server process with a new pipe."""
+        connection, remote_connection = Pipe()
+        self.process = Process(target=self.target, args=(self.stop_event, remote_connection, *self.target_args))
+        self.process.start()
+
+        # The child has its own handle, closing ours lets the pipe report EOF
+        # as soon as the child exits
+        remote_connection.close()
+
+        self.channel = Channel(connection)
+        self._started_at = monotonic()
+        self._ready_at = None
+        self._health = None
+        self._health_answered_at = 0.0
+        self._restart_at = None
+
+    def _on_ready(self, now: float):
+        """Note that the server reported that it is ready for the first time."""
+        self._ready_at = now
+        if self._failed_at is None:
+            return
+
+        self.last_recovery_ms = round((now - self._failed_at) * 1000, 1)
+        self._failed_at = None
+        self.logger.info(f"Web server recovered in {self.last_recovery_ms:.0f}ms, "
+                         f"{self.restarts} restart(s) since start")
+
+        # The new process starts with empty stats
+        if self.channel is None:
+            return
+
+        try:
+            self.channel.request("supervisor/stats", self.stats())
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+    def _fail(self, reason: str, now: float):
+        """Stop the failed process and schedule its restart."""
+        self.last_failure = reason
+        if self._failed_at is None:
+            self._failed_at = now
+
+        if self._ready_at is not None and now - self._ready_at >= self.stable_after:
+            self._consecutive_failures = 0
+
+        delay = 0.0 if self._consecutive_failures == 0 else min(
+            self.min_backoff * 2 ** (self._consecutive_failures - 1), self.max_backoff)
+        self._consecutive_failures += 1
+
+        self.logger.error(f"Web server {reason}, restarting in {delay:.1f}s")
+
+        self._kill()
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+
+        self.restarts += 1
+        self._restart_at = now + delay
+
+    def _kill(self):
+        """Terminate the process, killing it if it does not exit."""
+        if self.process is None:
+            return
+
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
+
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
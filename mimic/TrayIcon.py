@@ -1,12 +1,14 @@
 """Mimic's system tray icon."""
-from threading import Event, Thread
+from multiprocessing import Event as create_event
+from multiprocessing.synchronize import Event
+from threading import Thread
 from time import sleep
 from typing import Callable, Optional
 
 from infi.systray import SysTrayIcon
 
 from mimic.Constants import SLEEP_INTERVAL
-from mimic.Pipeable import Pipeable
+from mimic.Pipeable import CommandMessage, Pipeable
 
 
 class TrayIcon(Pipeable):
@@ -29,7 +31,12 @@ class TrayIcon(Pipeable):
     _icon_image: str
     _hover_text: str
 
-    def __init__(self, icon_image: str = "icon.ico", hover_text: str = "Hover text", stop_event: Event = Event()):
+    def __init__(
+        self,
+        icon_image: str = "icon.ico",
+        hover_text: str = "Hover text",
+        stop_event: Event = create_event()
+    ):
         """
         Initialize system tray icon.
 
@@ -46,8 +53,8 @@ class TrayIcon(Pipeable):
         self._hover_text = hover_text
 
         self._menu_options = [
-            ("Show QR code", None, lambda icon: self._pipe.send("show_qr_code")),
-            ("Show debug logs", None, lambda icon: self._pipe.send("show_debug_logs"))
+            ("Show QR code", None, lambda icon: self._pipe.send(CommandMessage("show_qr_code"))),
+            ("Show debug logs", None, lambda icon: self._pipe.send(CommandMessage("show_debug_logs")))
         ]
 
     def run(self):
@@ -1,4 +1,9 @@
-"""Operations pertaining to windows AppData paths."""
+"""
+Operations pertaining to windows AppData paths.
+
+On platforms without Local AppData, e.g. when running headless on Linux, the
+XDG data directory is used instead.
+"""
 import os
 from pathlib import Path
 from typing import Optional, Union
@@ -45,7 +50,10 @@ def resolve_local_app_data(*path: StrPath, application_name: str = __APPLICATION
     Returns:
         StrPath: Absolute path to file or directory in Local AppData
     """
+    root = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_DATA_HOME') or os.path.expanduser(
+        os.path.join('~', '.local', 'share'))
+
     if len(path) == 0:
-        return os.path.join(os.environ['LOCALAPPDATA'], application_name)
+        return os.path.join(root, application_name)
 
-    return os.path.join(os.environ['LOCALAPPDATA'], application_name, *path)
+    return os.path.join(root, application_name, *path)
@@ -0,0 +1,54 @@
+"""
+Read the timestamp pattern drawn by the calibration client.
+
+When `app.js` is opened with `?calibrate`, the client streams a generated
+canvas instead of the camera. The canvas has a band across the top that
+encodes the client's `performance.now()` at the time the frame was drawn as
+`PATTERN_BITS` black (0) and white (1) blocks, most significant bit first.
+
+Because the pattern carries the capture time, the true glass-to-glass delay
+can be measured once the offset between the client and server clocks is known.
+
+@NOTE The constants must be kept in sync with `app.js`.
+"""
+from typing import Optional
+
+import numpy as np
+from av import VideoFrame
+
+PATTERN_BITS = 32
+
+# Height of the pattern band relative to the height of the canvas
+PATTERN_BAND_HEIGHT = 40 / 480
+
+_LUMA_THRESHOLD = 128
+
+
+def read_timestamp_pattern(frame: VideoFrame) -> Optional[int]:
+    """
+    Read the timestamp encoded in the top band of a calibration frame.
+
+    Only a single row of the luma plane is read, the frame is not converted.
+
+    Args:
+        frame (VideoFrame): Decoded frame in a planar YUV format
+
+    Returns:
+        Optional[int]: Client timestamp in milliseconds, `None` if the frame is
+                       not in a planar YUV format
+    """
+    if not frame.format.name.startswith("yuv"):
+        return None
+
+    plane = frame.planes[0]
+    row_index = int(frame.height * PATTERN_BAND_HEIGHT / 2)
+    row = np.frombuffer(memoryview(plane), dtype=np.uint8, count=frame.width, offset=row_index * plane.line_size)
+
+    # Sample the center of each block, the edges are blurred by the encoder
+    columns = ((np.arange(PATTERN_BITS) + 0.5) * frame.width / PATTERN_BITS).astype(np.intp)
+
+    value = 0
+    for bit in row[columns] >= _LUMA_THRESHOLD:
+        value = (value << 1) | int(bit)
+
+    return value
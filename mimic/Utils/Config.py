@@ -0,0 +1,184 @@
+"""
+Persisted configuration stored as JSON in Local AppData.
+
+Unknown keys in the file are ignored and missing keys fall back to their
+defaults, so the file can be edited by hand and survives upgrades.
+
+>>> config = Config(resolve_local_app_data("config.json"))
+>>> config.get("camera_profile")
+'720p'
+>>> config.set("camera_profile", "1080p")
+>>> config.save()
+"""
+import json
+import os
+from copy import deepcopy
+from typing import Any, Union
+
+_DEFAULTS: dict[str, Any] = {
+    # Name of the output profile of the virtual camera, see
+    # `mimic.Media.CameraOutput.CAMERA_PROFILES`
+    "camera_profile": "720p",
+
+    # How frames whose aspect ratio differs from the camera profile are scaled,
+    # see `mimic.Media.FrameTransform`
+    "scale_mode": "fit",
+
+    # Whether frames from front facing cameras are flipped horizontally
+    "mirror_user_facing": False,
+
+    # Interpolation used to scale frames for the camera, see
+    # `mimic.Media.Scaler.SCALER_PRESETS`
+    "scaler_preset": "auto",
+
+    # Scaler presets of individual camera profiles by profile name, override
+    # `scaler_preset`
+    "scaler_preset_per_profile": {},
+
+    # Whether the incoming video is recorded to `recordings` in Local AppData,
+    # see `mimic.Media.Recorder`
+    "recording": False,
+
+    # Seconds after which recordings are split into a new file
+    "recording_segment_duration": 300,
+
+    # Megabytes recordings may use before the oldest are deleted
+    "recording_max_disk_usage_mb": 2048,
+
+    # Snapshots wider than this are downscaled, 0 to never downscale, see
+    # `mimic.Media.Snapshot`
+    "snapshot_max_width": 0,
+
+    # JPEG and WebP quality of snapshots from 1 to 100
+    "snapshot_quality": 85,
+
+    # Maximum frame rate, maximum width and JPEG quality of the MJPEG preview,
+    # see `mimic.Media.Preview`
+    "preview_fps": 10,
+    "preview_max_width": 640,
+    "preview_quality": 70,
+
+    # Frame rate and largest side of the thumbnail in the main window, see
+    # `mimic.Media.Thumbnail`
+    "thumbnail_fps": 4,
+    "thumbnail_max_size": 240,
+
+    # Let the client send its camera at several sizes and decode the one that
+    # fits the camera profile and CPU headroom, see `mimic.Media.Simulcast`
+    "simulcast": True,
+
+    # Milliseconds without a decoded frame after which the video is stalled
+    # and a keyframe is requested, and the minimum time between two keyframe
+    # requests, see `mimic.Media.StallWatchdog`
+    "stall_timeout_ms": 300,
+    "keyframe_request_interval_ms": 500,
+
+    # Jitter buffer depth and frame age limit of the receive path, `low`,
+    # `balanced` or `smooth`, see `mimic.Media.LatencyProfile`
+    "latency_profile": "balanced",
+
+    # Maximum number of WebRTC viewers of the incoming stream, see
+    # `mimic.Media.Relay`
+    "relay_max_viewers": 4,
+
+    # Event loop implementation of the web server, see `mimic.Utils.EventLoop`
+    "event_loop": "auto",
+
+    # Milliseconds a callback may block the event loop before its stack is
+    # logged
+    "loop_lag_threshold_ms": 50,
+
+    # Seconds between two samples of the resident memory of the web server,
+    # and megabytes of growth since startup after which a warning is logged,
+    # see `mimic.Utils.Memory`
+    "memory_sample_interval": 60,
+    "memory_growth_warning_mb": 256,
+
+    # Whether allocations of the web server are traced from startup, costs
+    # memory and CPU, tracing can also be started at runtime
+    "memory_tracing": False,
+
+    # Format of the web server log file, `text` or `json` for JSON lines with
+    # structured fields, see `mimic.Logging.Formatter`
+    "log_format": "text",
+
+    # Size in bytes of the log file before it is rotated, number of rotated
+    # files that are kept and whether they are compressed with gzip
+    "log_max_bytes": 5242880,
+    "log_backup_count": 5,
+    "log_compress": True,
+}
+
+
+class Config:
+    """Persisted configuration stored as a JSON object."""
+
+    def __init__(self, path: Union[str, os.PathLike[str]]):
+        """
+        Load the configuration, creating it from the defaults if the file does not exist.
+
+        Args:
+            path (Union[str, os.PathLike[str]]): Path to the JSON file
+        """
+        self.path = path
+        self._values = deepcopy(_DEFAULTS)
+
+        try:
+            with open(path, "r") as file:
+                stored = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = {}
+
+        if isinstance(stored, dict):
+            for key, value in stored.items():
+                if key in _DEFAULTS:
+                    self._values[key] = value
+
+    def get(self, key: str) -> Any:
+        """
+        Get a configuration value.
+
+        Args:
+            key (str): Name of the value
+
+        Raises:
+            KeyError: Unknown configuration key
+
+        Returns:
+            Any: Current value
+        """
+        return self._values[key]
+
+    def set(self, key: str, value: Any):
+        """
+        Set a configuration value, it is not persisted until `save` is called.
+
+        Args:
+            key (str): Name of the value
+            value (Any): New JSON serializable value
+
+        Raises:
+            KeyError: Unknown configuration key
+        """
+        if key not in _DEFAULTS:
+            raise KeyError(f"Unknown configuration key `{key}`")
+
+        self._values[key] = value
+
+    def as_dict(self) -> dict[str, Any]:
+        """Get a copy of every configuration value."""
+        return deepcopy(self._values)
+
+    def save(self):
+        """
+        Write the configuration to disk.
+
+        The file is replaced atomically so a crash while saving never leaves a
+        partially written file behind.
+        """
+        temporary_path = f"{self.path}.tmp"
+
+        with open(temporary_path, "w") as file:
+            json.dump(self._values, file, indent=4)
+
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,228 @@
+"""
+Selectable event loop implementation and event loop lag monitoring.
+
+Loop implementations:
+- auto - uvloop if it is installed, otherwise asyncio
+- asyncio - The standard library event loop
+- uvloop - uvloop, not available on Windows
+
+The `LoopLagMonitor` measures how late the event loop runs a callback that is
+scheduled at a fixed interval. While the loop is blocked for longer than the
+threshold, a watchdog thread captures the stack of the loop thread and the
+running task, so the handler that blocks the media path can be identified.
+
+>>> monitor = LoopLagMonitor(threshold=0.05)
+>>> monitor.start(asyncio.get_event_loop())
+>>> monitor.stats()["lag_ms"]
+{'count': 40, 'p50': 0.2, 'p99': 1.3, 'p99.9': 1.3}
+"""
+import asyncio
+import sys
+import traceback
+from collections import deque
+from threading import Event, Thread, get_ident
+from time import perf_counter
+from typing import Callable, NamedTuple, Optional
+
+from mimic.Utils.Statistics import RollingQuantiles
+
+AUTO = "auto"
+ASYNCIO = "asyncio"
+UVLOOP = "uvloop"
+LOOP_IMPLEMENTATIONS = (AUTO, ASYNCIO, UVLOOP)
+
+# Frames of the blocked stack that are kept, innermost last
+_STACK_DEPTH = 12
+
+
+def new_event_loop(implementation: str = AUTO) -> tuple[asyncio.AbstractEventLoop, str]:
+    """
+    Create an event loop of a given implementation.
+
+    Args:
+        implementation (str, optional): `AUTO`, `ASYNCIO` or `UVLOOP`. Defaults to AUTO.
+
+    Raises:
+        ValueError: Unknown implementation
+        RuntimeError: uvloop was requested but is not installed
+
+    Returns:
+        tuple[asyncio.AbstractEventLoop, str]: New event loop and the name of its implementation
+    """
+    if implementation not in LOOP_IMPLEMENTATIONS:
+        raise ValueError(f"Unknown event loop implementation `{implementation}`")
+
+    if implementation in (AUTO, UVLOOP):
+        try:
+            import uvloop
+            return uvloop.new_event_loop(), UVLOOP
+        except ImportError:
+            if implementation == UVLOOP:
+                raise RuntimeError("uvloop is not installed.")
+
+    return asyncio.new_event_loop(), ASYNCIO
+
+
+class BlockedCallback(NamedTuple):
+    """A callback that blocked the event loop for longer than the threshold."""
+
+    # Seconds the loop was blocked for
+    duration: float
+
+    # Name of the coroutine of the task that was running, `None` for plain
+    # callbacks
+    task: Optional[str]
+
+    # Stack of the loop thread while it was blocked, innermost frame last
+    stack: list[str]
+
+    def describe(self) -> str:
+        """Describe where the loop was blocked in a single line."""
+        location = self.stack[-1].strip().splitlines()[0] if len(self.stack) > 0 else "unknown location"
+        return f"{self.task or 'callback'} at {location}"
+
+
+class LoopLagMonitor:
+    """Measure event loop scheduling delay and capture the callbacks that block the loop."""
+
+    def __init__(self, interval: float = 0.025, threshold: float = 0.05, history: int = 20):
+        """
+        Create new instance of `LoopLagMonitor`.
+
+        Args:
+            interval (float, optional): Seconds between two measurements. Defaults to 0.025.
+            threshold (float, optional): Seconds the loop may be blocked before the blocking callback is
+                                         captured. Defaults to 0.05.
+            history (int, optional): Number of blocked callbacks that are kept. Defaults to 20.
+        """
+        self.interval = interval
+        self.threshold = threshold
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[Thread] = None
+        self._stop = Event()
+
+        self._expected = 0.0
+        self._last_tick = 0.0
+
+        # Stack captured by the watchdog while the loop is blocked, completed
+        # with the total duration once the loop runs again
+        self._pending: Optional[tuple[Optional[str], list[str]]] = None
+
+        self.lag = RollingQuantiles()
+        self.max_lag = 0.0
+        self.blocked: deque[BlockedCallback] = deque(maxlen=history)
+
+        # Called on the event loop with every blocked callback
+        self.on_blocked: Optional[Callable[[BlockedCallback], None]] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the monitor is running."""
+        return self._timer is not None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """
+        Start measuring, must be called from the thread that runs the loop.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): Loop to monitor
+        """
+        if self.running:
+            return
+
+        self._loop = loop
+        self._loop_thread = get_ident()
+        self._stop.clear()
+
+        self._last_tick = perf_counter()
+        self._expected = self._last_tick + self.interval
+        self._timer = loop.call_later(self.interval, self._tick)
+
+        self._watchdog = Thread(target=self._watch, name="LoopLagMonitor", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        """Stop measuring."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    def stats(self) -> dict:
+        """
+        Get the loop lag as a JSON serializable dict.
+
+        Returns:
+            dict: Lag quantiles and maximum in milliseconds, and the most recent blocked callbacks
+        """
+        return {
+            "lag_ms": self.lag.summary(0.5, 0.99, 0.999),
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "blocked": [
+                {"duration_ms": round(blocked.duration * 1000, 3), "task": blocked.task, "stack": blocked.stack}
+                for blocked in self.blocked
+            ],
+        }
+
+    def _tick(self):
+        now = perf_counter()
+        lag = max(0.0, now - self._expected)
+
+        self.lag.add(lag * 1000)
+        self.max_lag = max(self.max_lag, lag)
+
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            task, stack = pending
+            blocked = BlockedCallback(now - self._last_tick, task, stack)
+            self.blocked.append(blocked)
+
+            if self.on_blocked is not None:
+                self.on_blocked(blocked)
+
+        self._last_tick = now
+        self._expected = now + self.interval
+
+        if self._loop is not None and not self._stop.is_set():
+            self._timer = self._loop.call_later(self.interval, self._tick)
+
+    def _watch(self):
+        """Capture the stack of the loop thread while the loop is blocked, runs on its own thread."""
+        stalled_since = None
+
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            if perf_counter() - last_tick < self.interval + self.threshold:
+                continue
+
+            # Capture every stall only once
+            if stalled_since == last_tick or self._loop_thread is None:
+                continue
+
+            stalled_since = last_tick
+
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+
+            stack = traceback.format_stack(frame)[-_STACK_DEPTH:]
+            self._pending = (self._current_task_name(), stack)
+
+    def _current_task_name(self) -> Optional[str]:
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            return None
+
+        if task is None:
+            return None
+
+        coroutine = task.get_coro()
+        return getattr(coroutine, "__qualname__", None) or task.get_name()
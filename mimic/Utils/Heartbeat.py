@@ -0,0 +1,216 @@
+"""
+Heartbeat pings and stale connection deadlines of every session on a single timer.
+
+Each session is due for its next ping `ping_interval` seconds after its last
+heartbeat and expires `timeout` seconds after it. Sessions are kept in a
+hashed timer wheel, a ring of slots of `resolution` seconds that each hold the
+sessions whose next deadline falls into them. A heartbeat moves its session to
+a later slot in place, so rearming is O(1) and creates no task or timer. The
+wheel is driven by a single `loop.call_at` timer that is only armed for the
+next slot that holds a session.
+
+>>> heartbeats = HeartbeatScheduler(ping_interval=1.0, timeout=5.0)
+>>> heartbeats.add(pc, send_ping, on_timeout=close_connection)
+>>> heartbeats.beat(pc)  # Whenever the session replies to a ping
+"""
+import asyncio
+import inspect
+from math import ceil
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Session:
+    """Deadlines of a single session, filed into the slot of the earliest one."""
+
+    __slots__ = ("key", "send_ping", "on_timeout", "ping_at", "expires_at", "slot")
+
+    def __init__(self, key: Hashable, send_ping: Callable[[], Any], on_timeout: Callable[[], Any]):
+        self.key = key
+        self.send_ping = send_ping
+        self.on_timeout = on_timeout
+
+        # Loop time the next ping is sent, `None` once it was sent and no
+        # heartbeat has been received since
+        self.ping_at: Optional[float] = None
+        self.expires_at = 0.0
+
+        # Index of the slot the session is filed in
+        self.slot: Optional[int] = None
+
+    @property
+    def deadline(self) -> float:
+        return self.expires_at if self.ping_at is None else min(self.ping_at, self.expires_at)
+
+
+class HeartbeatScheduler:
+    """Send heartbeat pings and expire stale sessions on a single timer wheel."""
+
+    def __init__(self, ping_interval: float = 1.0, timeout: float = 5.0, resolution: float = 0.05):
+        """
+        Create new instance of `HeartbeatScheduler`.
+
+        Args:
+            ping_interval (float, optional): Seconds after a heartbeat until the next ping is sent. Defaults to 1.0.
+            timeout (float, optional): Seconds without a heartbeat until a session expires. Defaults to 5.0.
+            resolution (float, optional): Seconds per slot of the wheel, deadlines fire up to this late.
+                                          Defaults to 0.05.
+        """
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.resolution = resolution
+
+        # One full turn of the wheel covers the timeout, so a session is only
+        # visited when one of its deadlines is due
+        self._slots: list[set[_Session]] = [set() for _ in range(ceil(timeout / resolution) + 1)]
+        self._sessions: dict[Hashable, _Session] = {}
+
+        # Next tick to process and the tick the timer is armed for
+        self._tick = 0
+        self._armed_tick: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+        self.pings = 0
+        self.timeouts = 0
+
+    @property
+    def session_count(self) -> int:
+        """Get the number of sessions."""
+        return len(self._sessions)
+
+    def add(self, key: Hashable, send_ping: Callable[[], Any], on_timeout: Callable[[], Any]):
+        """
+        Add a session, replacing the session of the same key, and count it as a heartbeat.
+
+        Args:
+            key (Hashable): Identifies the session, e.g. its peer connection
+            send_ping (Callable[[], Any]): Sends a ping to the session
+            on_timeout (Callable[[], Any]): Called when the session expires, may return an awaitable
+        """
+        self.remove(key)
+
+        session = _Session(key, send_ping, on_timeout)
+        self._sessions[key] = session
+        self.beat(key)
+
+    def beat(self, key: Hashable) -> bool:
+        """
+        Push back the expiry of a session and schedule its next ping.
+
+        Args:
+            key (Hashable): Key the session was added with
+
+        Returns:
+            bool: Whether the session exists
+        """
+        session = self._sessions.get(key)
+        if session is None:
+            return False
+
+        now = asyncio.get_event_loop().time()
+        session.ping_at = now + self.ping_interval
+        session.expires_at = now + self.timeout
+        self._file(session)
+
+        return True
+
+    def remove(self, key: Hashable):
+        """
+        Remove a session without calling its timeout callback.
+
+        Args:
+            key (Hashable): Key the session was added with
+        """
+        session = self._sessions.pop(key, None)
+        if session is not None and session.slot is not None:
+            self._slots[session.slot].discard(session)
+
+    def close(self):
+        """Remove every session and stop the timer."""
+        self._sessions.clear()
+        for slot in self._slots:
+            slot.clear()
+
+        if self._handle is not None:
+            self._handle.cancel()
+
+        self._handle = None
+        self._armed_tick = None
+
+    def stats(self) -> dict:
+        """
+        Get the heartbeat counters as a JSON serializable dict.
+
+        Returns:
+            dict: Number of sessions, pings sent and sessions expired
+        """
+        return {"sessions": len(self._sessions), "pings": self.pings, "timeouts": self.timeouts}
+
+    def _file(self, session: _Session):
+        """Move a session to the slot of its next deadline and arm the timer for it if needed."""
+        tick = ceil(session.deadline / self.resolution)
+        slot = tick % len(self._slots)
+
+        if session.slot != slot:
+            if session.slot is not None:
+                self._slots[session.slot].discard(session)
+
+            self._slots[slot].add(session)
+            session.slot = slot
+
+        if self._armed_tick is None or tick < self._armed_tick:
+            self._arm(tick)
+
+    def _arm(self, tick: int):
+        if self._handle is not None:
+            self._handle.cancel()
+        else:
+            # The wheel was idle, nothing before now is left to process
+            self._tick = int(asyncio.get_event_loop().time() / self.resolution)
+
+        self._armed_tick = tick
+        self._handle = asyncio.get_event_loop().call_at(tick * self.resolution, self._run)
+
+    def _run(self):
+        """Process every slot up to now and arm the timer for the next slot that holds a session."""
+        self._handle = None
+        self._armed_tick = None
+
+        now = asyncio.get_event_loop().time()
+        current = int(now / self.resolution)
+
+        # After the loop was blocked for longer than a turn, every slot is
+        # processed once
+        first = max(self._tick, current - len(self._slots) + 1)
+        for tick in range(first, current + 1):
+            for session in list(self._slots[tick % len(self._slots)]):
+                self._fire(session, now)
+
+        self._tick = current + 1
+
+        for tick in range(self._tick, self._tick + len(self._slots)):
+            if len(self._slots[tick % len(self._slots)]) > 0:
+                if self._armed_tick is None or tick < self._armed_tick:
+                    self._arm(tick)
+                break
+
+    def _fire(self, session: _Session, now: float):
+        if self._sessions.get(session.key) is not session:
+            return
+
+        if session.expires_at <= now:
+            self.remove(session.key)
+            self.timeouts += 1
+
+            result = session.on_timeout()
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+            return
+
+        if session.ping_at is not None and session.ping_at <= now:
+            session.ping_at = None
+            self.pings += 1
+            session.send_ping()
+
+            # The ping callback may have removed or rearmed the session
+            if self._sessions.get(session.key) is session:
+                self._file(session)
@@ -0,0 +1,234 @@
+"""
+Persistent summaries of past streaming sessions in a local SQLite database.
+
+Every session that ends is summarized in a single row, so the performance of
+a session can be looked up long after its log lines have rotated away. Rows
+are written by a background thread that commits everything that queued up
+since its last write in one transaction, so recording a session never blocks
+the event loop on disk I/O.
+
+>>> history = SessionHistory(resolve_local_app_data("history.sqlite3"))
+>>> history.record(summary)
+>>> history.close()
+>>> recent_sessions(resolve_local_app_data("history.sqlite3"), limit=10)
+"""
+import os
+import sqlite3
+from contextlib import closing
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any, NamedTuple, Optional, Union
+
+# Maximum number of sessions written in a single transaction
+_MAX_BATCH_SIZE = 64
+
+
+class SessionSummary(NamedTuple):
+    """Performance summary of a single streaming session."""
+
+    session_id: str
+    # Seconds since the epoch the session started, and its length in seconds
+    started_at: float
+    duration_s: float
+    # `closed`, `failed`, `timeout` or `shutdown`
+    end_reason: str
+    frames: int
+    fps_avg: Optional[float]
+    fps_p1: Optional[float]
+    fps_p99: Optional[float]
+    rtt_p50_ms: Optional[float]
+    rtt_p99_ms: Optional[float]
+    frame_delay_p50_ms: Optional[float]
+    frame_delay_p99_ms: Optional[float]
+    packets_lost: Optional[int]
+    recorder_dropped: int
+    # Size of the received frames, and the camera profile they were sent to
+    width: Optional[int]
+    height: Optional[int]
+    profile: Optional[str]
+    codec: Optional[str]
+
+
+_COLUMN_TYPES = {int: "INTEGER", float: "REAL", str: "TEXT"}
+
+
+def _column_type(annotation: Any) -> str:
+    """Get the SQLite type of a `SessionSummary` field."""
+    for python_type, column_type in _COLUMN_TYPES.items():
+        if annotation is python_type or annotation == Optional[python_type]:
+            return column_type
+
+    raise TypeError(f"Unsupported column type {annotation}")
+
+
+_CREATE_TABLE = "CREATE TABLE IF NOT EXISTS sessions ({}, PRIMARY KEY (session_id, started_at))".format(
+    ", ".join(f"{name} {_column_type(annotation)}" for name, annotation in SessionSummary.__annotations__.items()))
+_INSERT = "INSERT OR REPLACE INTO sessions ({}) VALUES ({})".format(
+    ", ".join(SessionSummary._fields), ", ".join("?" for _ in SessionSummary._fields))
+
+
+def connect(path: Union[str, os.PathLike[str]]) -> sqlite3.Connection:
+    """
+    Open the history database and create its table if needed.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Database file
+
+    Returns:
+        sqlite3.Connection: Connection whose rows can be read by column name
+    """
+    connection = sqlite3.connect(os.fspath(path))
+    connection.row_factory = sqlite3.Row
+    connection.execute(_CREATE_TABLE)
+    connection.execute("CREATE INDEX IF NOT EXISTS sessions_started_at ON sessions (started_at)")
+
+    return connection
+
+
+class SessionHistory:
+    """Write session summaries to the history database on a background thread."""
+
+    def __init__(self, path: Union[str, os.PathLike[str]]):
+        """
+        Create new instance of `SessionHistory` and start its writer thread.
+
+        Args:
+            path (Union[str, os.PathLike[str]]): Database file, created if it does not exist
+        """
+        self.path = path
+        self.written = 0
+        self.errors = 0
+
+        # Summaries to write, `None` stops the writer
+        self._queue: Queue[Optional[SessionSummary]] = Queue()
+        self._thread = Thread(target=self._loop, name="SessionHistory", daemon=True)
+        self._thread.start()
+
+    def record(self, summary: SessionSummary):
+        """
+        Queue a session summary to be written. Returns immediately.
+
+        Args:
+            summary (SessionSummary): Summary of a session that ended
+        """
+        self._queue.put(summary)
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Write the queued summaries and stop the writer thread.
+
+        Args:
+            timeout (Optional[float], optional): Seconds to wait for the writes. Defaults to None.
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        """
+        Get the write counters as a JSON serializable dict.
+
+        Returns:
+            dict: Sessions written and failed writes
+        """
+        return {"written": self.written, "errors": self.errors}
+
+    def _loop(self):
+        """
+        Write the summaries in batches until `close` is called.
+
+        @NOTE Should *not* be called directly, this runs on the writer thread.
+        """
+        connection: Optional[sqlite3.Connection] = None
+        running = True
+
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < _MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            summaries = [summary for summary in batch if summary is not None]
+            running = len(summaries) == len(batch)
+
+            if len(summaries) == 0:
+                continue
+
+            try:
+                if connection is None:
+                    connection = connect(self.path)
+
+                with connection:
+                    connection.executemany(_INSERT, summaries)
+                self.written += len(summaries)
+            except sqlite3.Error:
+                self.errors += len(summaries)
+
+        if connection is not None:
+            connection.close()
+
+
+def recent_sessions(path: Union[str, os.PathLike[str]], since: Optional[float] = None,
+                    limit: int = 20) -> list[dict[str, Any]]:
+    """
+    Get the most recent sessions, newest first.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Database file
+        since (Optional[float], optional): Only sessions that started after this time in seconds since the epoch.
+                                           Defaults to None.
+        limit (int, optional): Maximum number of sessions. Defaults to 20.
+
+    Returns:
+        list[dict[str, Any]]: Session summaries by column name
+    """
+    with closing(connect(path)) as connection:
+        rows = connection.execute(
+            "SELECT * FROM sessions WHERE started_at >= ? ORDER BY started_at DESC LIMIT ?",
+            (since or 0.0, limit)).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def daily_trends(path: Union[str, os.PathLike[str]], since: Optional[float] = None) -> list[dict[str, Any]]:
+    """
+    Aggregate the sessions of every local calendar day, oldest first.
+
+    Quantiles of different sessions cannot be combined exactly, so the daily
+    values are the averages of the per-session quantiles weighted by duration,
+    and the worst session of the day.
+
+    Args:
+        path (Union[str, os.PathLike[str]]): Database file
+        since (Optional[float], optional): Only sessions that started after this time in seconds since the epoch.
+                                           Defaults to None.
+
+    Returns:
+        list[dict[str, Any]]: Sessions, total duration, frame rates, round trip times, frame delays and drops
+                              per day
+    """
+    with closing(connect(path)) as connection:
+        rows = connection.execute("""
+            SELECT
+                date(started_at, 'unixepoch', 'localtime') AS day,
+                COUNT(*) AS sessions,
+                ROUND(SUM(duration_s), 1) AS duration_s,
+                ROUND(SUM(frames) / NULLIF(SUM(duration_s), 0), 2) AS fps_avg,
+                MIN(fps_p1) AS fps_p1_worst,
+                ROUND(SUM(rtt_p50_ms * duration_s)
+                      / NULLIF(SUM(CASE WHEN rtt_p50_ms IS NOT NULL THEN duration_s END), 0), 3) AS rtt_p50_ms,
+                MAX(rtt_p99_ms) AS rtt_p99_ms_worst,
+                ROUND(SUM(frame_delay_p50_ms * duration_s)
+                      / NULLIF(SUM(CASE WHEN frame_delay_p50_ms IS NOT NULL THEN duration_s END), 0), 3)
+                    AS frame_delay_p50_ms,
+                MAX(frame_delay_p99_ms) AS frame_delay_p99_ms_worst,
+                SUM(packets_lost) AS packets_lost,
+                SUM(recorder_dropped) AS recorder_dropped
+            FROM sessions
+            WHERE started_at >= ?
+            GROUP BY day
+            ORDER BY day
+        """, (since or 0.0,)).fetchall()
+
+    return [dict(row) for row in rows]
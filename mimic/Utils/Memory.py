@@ -0,0 +1,346 @@
+"""
+Memory instrumentation for long running server processes.
+
+`MemoryMonitor` samples the resident memory of the process on the event loop,
+together with cheap gauges such as the number of open peer connections, and
+reports how fast it grows. Allocation tracing with `tracemalloc` can be started
+at runtime; every snapshot is written to a directory together with the
+allocations that grew the most since the previous snapshot. Counting the live
+instances of the classes that are suspected to leak walks the whole heap, so it
+is only done on demand.
+
+>>> memory = MemoryMonitor(interval=60, gauges=lambda: {"peer_connections": len(pcs)})
+>>> memory.start(asyncio.get_event_loop())
+>>> memory.start_tracing()
+>>> memory.snapshot(resolve_local_app_data("memory"))
+>>> count_live_objects({"RTCPeerConnection": RTCPeerConnection})
+"""
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from time import monotonic
+from typing import Callable, NamedTuple, Optional, Union
+
+# Allocations listed in the text report of a snapshot
+_REPORT_LIMIT = 50
+
+# Seconds the kept samples must span before the growth per hour is reported,
+# growth measured over a shorter time is dominated by startup and by sessions
+# starting
+_MIN_GROWTH_SPAN = 600
+
+
+class MemorySample(NamedTuple):
+    """Memory of the process at one point in time."""
+
+    # Monotonic time of the sample
+    time: float
+    # Resident memory in bytes, `None` if the platform does not report it
+    rss: Optional[int]
+    # Bytes allocated by Python while tracing, `None` while not tracing
+    traced: Optional[int]
+
+
+def resident_memory() -> Optional[int]:
+    """
+    Get the resident memory of the current process, the working set on Windows.
+
+    Returns:
+        Optional[int]: Resident memory in bytes, `None` if the platform does not report it
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+
+        return counters.WorkingSetSize
+
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def count_live_objects(types: dict[str, type]) -> dict[str, int]:
+    """
+    Count the live instances of classes, including instances that are only kept alive by reference cycles.
+
+    @NOTE Walks every object tracked by the garbage collector and blocks for
+    tens of milliseconds on a large heap, should only be called on demand.
+
+    Args:
+        types (dict[str, type]): Classes by the name they are reported as
+
+    Returns:
+        dict[str, int]: Number of live instances by name
+    """
+    counts = dict.fromkeys(types, 0)
+
+    # Names by exact type, `isinstance` checks of abstract base classes are
+    # too slow to run for every object on the heap
+    names_by_type: dict[type, list[str]] = {}
+    for obj in gc.get_objects():
+        obj_type = type(obj)
+        names = names_by_type.get(obj_type)
+        if names is None:
+            names = names_by_type[obj_type] = [name for name, cls in types.items() if issubclass(obj_type, cls)]
+
+        for name in names:
+            counts[name] += 1
+
+    return counts
+
+
+class MemoryMonitor:
+    """Sample the memory of the process and trace allocations on demand."""
+
+    def __init__(
+        self,
+        interval: float = 60.0,
+        history: int = 1440,
+        gauges: Optional[Callable[[], dict[str, int]]] = None,
+        growth_warning: int = 256 * 1024 ** 2
+    ):
+        """
+        Create new instance of `MemoryMonitor`.
+
+        Args:
+            interval (float, optional): Seconds between two samples. Defaults to 60.0.
+            history (int, optional): Number of samples that are kept, a day at the default interval.
+                                     Defaults to 1440.
+            gauges (Optional[Callable[[], dict[str, int]]], optional): Cheap counts sampled with the memory, e.g.
+                                                                       open peer connections. Defaults to None.
+            growth_warning (int, optional): Bytes of growth over the first sample after which `on_growth` is
+                                            called, and again for every further multiple. 0 to never call it.
+                                            Defaults to 256 MiB.
+        """
+        self.interval = interval
+        self.gauges = gauges
+        self.growth_warning = growth_warning
+
+        self.samples: deque[MemorySample] = deque(maxlen=history)
+        self.peak_rss: Optional[int] = None
+        self.last_gauges: dict[str, int] = {}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._baseline_rss: Optional[int] = None
+        self._warned_growth = 0
+
+        # Snapshot the next snapshot is compared to, and the number of
+        # snapshots written since tracing started
+        self._previous_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.snapshots = 0
+
+        # Called on the event loop with the resident memory and its growth in
+        # bytes once growth crosses another multiple of `growth_warning`
+        self.on_growth: Optional[Callable[[int, int], None]] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether memory is being sampled."""
+        return self._timer is not None
+
+    @property
+    def tracing(self) -> bool:
+        """Whether allocations are being traced."""
+        return tracemalloc.is_tracing()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """
+        Take the first sample and start sampling every `interval` seconds.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): Loop the samples are taken on
+        """
+        if self.running:
+            return
+
+        self._loop = loop
+        self._tick()
+
+    def stop(self):
+        """Stop sampling and tracing."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self.stop_tracing()
+
+    def sample(self) -> MemorySample:
+        """
+        Take a sample now, in addition to the periodic samples.
+
+        Returns:
+            MemorySample: New sample
+        """
+        rss = resident_memory()
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        memory_sample = MemorySample(monotonic(), rss, traced)
+        self.samples.append(memory_sample)
+
+        if self.gauges is not None:
+            self.last_gauges = self.gauges()
+
+        if rss is not None:
+            self.peak_rss = rss if self.peak_rss is None else max(self.peak_rss, rss)
+            if self._baseline_rss is None:
+                self._baseline_rss = rss
+
+            growth = rss - self._baseline_rss
+            if self.growth_warning > 0 and growth >= self._warned_growth + self.growth_warning:
+                self._warned_growth = growth // self.growth_warning * self.growth_warning
+                if self.on_growth is not None:
+                    self.on_growth(rss, growth)
+
+        return memory_sample
+
+    def start_tracing(self, frames: int = 10):
+        """
+        Start tracing allocations, only allocations made from now on are traced.
+
+        Args:
+            frames (int, optional): Frames of the stack stored per allocation, more frames cost more memory.
+                                    Defaults to 10.
+
+        Raises:
+            RuntimeError: Allocations are already being traced
+        """
+        if tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is already running.")
+
+        tracemalloc.start(frames)
+        self._previous_snapshot = None
+        self.snapshots = 0
+
+    def stop_tracing(self):
+        """Stop tracing allocations and discard the traces."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        self._previous_snapshot = None
+
+    def snapshot(self, directory: Union[str, os.PathLike[str]]) -> tuple[str, str]:
+        """
+        Write a snapshot of the traced allocations and a report of what grew since the previous snapshot.
+
+        The report lists the largest allocations by line, the lines whose
+        allocations changed the most and the stack of the largest growth.
+
+        @NOTE Blocks for as long as it takes to copy every trace, should be run
+        on a worker thread when called from the event loop.
+
+        Args:
+            directory (Union[str, os.PathLike[str]]): Directory the files are written to
+
+        Raises:
+            RuntimeError: Allocations are not being traced
+
+        Returns:
+            tuple[str, str]: Snapshot file, which can be loaded with `tracemalloc.Snapshot.load`, and report file
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is not running.")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+        name = f"memory-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.snapshots}"
+        snapshot_file = os.path.join(directory, f"{name}.snapshot")
+        report_file = os.path.join(directory, f"{name}.txt")
+
+        snapshot.dump(snapshot_file)
+
+        with open(report_file, "w") as file:
+            current, peak = tracemalloc.get_traced_memory()
+            file.write(f"Traced {current / 1024 ** 2:.1f} MiB, peak {peak / 1024 ** 2:.1f} MiB\n\n")
+
+            file.write(f"Largest {_REPORT_LIMIT} allocations by line:\n")
+            for stat in snapshot.statistics("lineno")[:_REPORT_LIMIT]:
+                file.write(f"{stat}\n")
+
+            if self._previous_snapshot is not None:
+                file.write(f"\nLargest {_REPORT_LIMIT} changes since the previous snapshot by line:\n")
+                for diff in snapshot.compare_to(self._previous_snapshot, "lineno")[:_REPORT_LIMIT]:
+                    file.write(f"{diff}\n")
+
+                # The full stack of the single largest growth is usually
+                # enough to find who holds on to the memory
+                growth = snapshot.compare_to(self._previous_snapshot, "traceback")
+                if len(growth) != 0 and growth[0].size_diff > 0:
+                    file.write(f"\nStack of the largest growth, {growth[0].size_diff / 1024:+.1f} KiB:\n")
+                    file.write("\n".join(growth[0].traceback.format()) + "\n")
+
+        self._previous_snapshot = snapshot
+        self.snapshots += 1
+
+        return snapshot_file, report_file
+
+    def stats(self) -> dict:
+        """
+        Get the memory usage as a JSON serializable dict.
+
+        Returns:
+            dict: Current, peak and initial resident memory and the growth per hour over the kept samples in MiB,
+                  traced memory while tracing, and the latest gauges
+        """
+        def mebibytes(value: Optional[float]) -> Optional[float]:
+            return round(value / 1024 ** 2, 1) if value is not None else None
+
+        latest = self.samples[-1] if len(self.samples) != 0 else None
+
+        # Growth over the kept samples rather than since startup, so a leak
+        # that started recently is not averaged away
+        growth_per_hour = None
+        measured = [(sample.time, sample.rss) for sample in self.samples if sample.rss is not None]
+        if len(measured) >= 2:
+            (first_time, first_rss), (last_time, last_rss) = measured[0], measured[-1]
+            if last_time - first_time >= _MIN_GROWTH_SPAN:
+                growth_per_hour = (last_rss - first_rss) / (last_time - first_time) * 3600
+
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+
+        return {
+            "rss_mb": mebibytes(latest.rss if latest is not None else None),
+            "peak_rss_mb": mebibytes(self.peak_rss),
+            "initial_rss_mb": mebibytes(self._baseline_rss),
+            "growth_mb_per_hour": mebibytes(growth_per_hour),
+            "tracing": traced is not None,
+            "traced_mb": mebibytes(traced[0]) if traced is not None else None,
+            "traced_peak_mb": mebibytes(traced[1]) if traced is not None else None,
+            "snapshots": self.snapshots,
+            "gauges": self.last_gauges,
+        }
+
+    def _tick(self):
+        self.sample()
+
+        if self._loop is not None:
+            self._timer = self._loop.call_later(self.interval, self._tick)
@@ -1,7 +1,20 @@
+"""
+Profiling helpers.
+
+`profile` runs a function to completion under cProfile. `SamplingProfiler`
+can be started and stopped at runtime and periodically samples the call stack
+of every thread in the current process.
+"""
 import cProfile
 import pstats
+import sys
+from collections import Counter
 from os import PathLike
-from typing import Any, Callable, Union
+from threading import Event, Thread, get_ident
+from types import FrameType
+from typing import Any, Callable, Optional, Union
+
+_DEFAULT_SAMPLE_INTERVAL = 0.005
 
 
 def profile(
@@ -21,3 +34,127 @@ def profile(
         stats.print_stats()
 
     print(f"Profile written to {text_output_file} and {profiler_output_file}")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the call stacks of all threads.
+
+    Unlike cProfile, the profiled code is not instrumented so the profiler can
+    be attached to an already running process and left running with little
+    overhead. Samples are aggregated into the collapsed stack format
+    ("frame;frame;frame count") that is understood by speedscope and
+    flamegraph.pl.
+
+    >>> profiler = SamplingProfiler()
+    >>> profiler.start()
+    >>> do_some_work()
+    >>> profiler.stop()
+    >>> profiler.write("webserver.folded")
+    """
+
+    def __init__(self, interval: float = _DEFAULT_SAMPLE_INTERVAL):
+        """
+        Create a new sampling profiler.
+
+        Args:
+            interval (float, optional): Seconds between samples. Defaults to _DEFAULT_SAMPLE_INTERVAL.
+        """
+        self._interval = interval
+        self._samples: Counter[str] = Counter()
+        self._sample_count = 0
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the profiler is currently sampling."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def sample_count(self) -> int:
+        """Get the number of samples taken since the profiler was last started."""
+        return self._sample_count
+
+    def start(self):
+        """
+        Discard previous samples and start sampling on a background thread.
+
+        Raises:
+            RuntimeError: The profiler is already running
+        """
+        if self.running:
+            raise RuntimeError("Sampling profiler is already running")
+
+        self._samples.clear()
+        self._sample_count = 0
+        self._stop_event.clear()
+
+        self._thread = Thread(target=self._loop, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> int:
+        """
+        Stop sampling.
+
+        Returns:
+            int: Number of samples that were taken
+        """
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        return self._sample_count
+
+    def write(self, output_file: Union[str, PathLike[str]]):
+        """
+        Write the aggregated samples in collapsed stack format.
+
+        Args:
+            output_file (Union[str, PathLike[str]]): Path to write the profile to
+        """
+        with open(output_file, 'w') as file:
+            for stack, count in self._samples.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def _loop(self):
+        """
+        Sample all threads until the profiler is stopped.
+
+        @NOTE Should *not* be called directly, this runs on the profiler thread.
+        """
+        own_ident = get_ident()
+
+        while not self._stop_event.wait(self._interval):
+            for thread_ident, frame in sys._current_frames().items():
+                if thread_ident == own_ident:
+                    continue
+
+                self._samples[self._collapse(thread_ident, frame)] += 1
+
+            self._sample_count += 1
+
+    @staticmethod
+    def _collapse(thread_ident: int, frame: Optional[FrameType]) -> str:
+        """
+        Convert a stack to a single line, outermost frame first.
+
+        Args:
+            thread_ident (int): Identifier of the thread that owns the stack
+            frame (Optional[FrameType]): Innermost frame of the stack
+
+        Returns:
+            str: Frames separated by semicolons
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        stack.append(f"thread-{thread_ident}")
+        stack.reverse()
+
+        return ";".join(stack)
@@ -4,6 +4,7 @@ import os
 
 from OpenSSL import crypto
 
+from mimic.Utils.AppData import StrPath
 from mimic.Utils.Host import resolve_host
 
 _COMMON_NAME = resolve_host()
@@ -13,15 +14,15 @@ _VALIDITY_START_IN_SECONDS = 0
 _VALIDITY_END_IN_SECONDS = 10 * 365 * 24 * 60 * 60
 
 
-def generate_ssl_certs(cert_file: str, key_file: str):
+def generate_ssl_certs(cert_file: StrPath, key_file: StrPath):
     """
     Generate SSL certificate and private key using RSA 4096 and SHA 512.
 
     Results are written out to files.
 
     Args:
-        cert_file (str): Path to write certificate to
-        key_file (str): Path to write private key to
+        cert_file (StrPath): Path to write certificate to
+        key_file (StrPath): Path to write private key to
     """
     key = crypto.PKey()
     key.generate_key(crypto.TYPE_RSA, 4096)
@@ -47,13 +48,13 @@ def generate_ssl_certs(cert_file: str, key_file: str):
             crypto.FILETYPE_PEM, key).decode('utf-8'))
 
 
-def ssl_certs_generated(cert_file: str, key_file: str) -> bool:
+def ssl_certs_generated(cert_file: StrPath, key_file: StrPath) -> bool:
     """
     If the certificate and key files are generated.
 
     Args:
-        cert_file (str): Path to certificate file
-        key_file (str): Path to key file
+        cert_file (StrPath): Path to certificate file
+        key_file (StrPath): Path to key file
 
     Returns:
         bool: Both certificate and key file exist
@@ -61,12 +62,12 @@ def ssl_certs_generated(cert_file: str, key_file: str) -> bool:
     return os.path.exists(cert_file) and os.path.exists(key_file)
 
 
-def _make_dirs(file_name: str):
+def _make_dirs(file_name: StrPath):
     """
     Recursively make directories for a file.
 
     Args:
-        file_name (str): Path to file
+        file_name (StrPath): Path to file
     """
     if not os.path.exists(os.path.dirname(file_name)):
         try:
@@ -0,0 +1,178 @@
+"""
+Readiness and timeline of startup steps that run concurrently.
+
+Each step is an awaitable run as its own task. Its state moves from `pending`
+to `running` to either `ready` or `failed`, and the time it took is recorded as
+a span that can be exported in the Chrome trace event format, see
+`mimic.Utils.Tracing`. The server is ready once every required step is ready.
+
+>>> startup = StartupTimeline()
+>>> certificates = startup.run_in_thread("certificates", load_certificates)
+>>> startup.run("bind", bind(certificates))
+>>> startup.run("camera", acquire_camera())
+>>> await startup.wait()
+>>> startup.stats()
+"""
+import asyncio
+from time import perf_counter_ns
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from mimic.Utils.Tracing import Tracer
+
+T = TypeVar("T")
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class _Step:
+    """State and timing of a single startup step."""
+
+    __slots__ = ("name", "required", "state", "start_ns", "end_ns", "error")
+
+    def __init__(self, name: str, required: bool):
+        self.name = name
+        self.required = required
+        self.state = PENDING
+        self.start_ns: Optional[int] = None
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+
+class StartupTimeline:
+    """Run startup steps concurrently and track their readiness."""
+
+    def __init__(self):
+        """Create new instance of `StartupTimeline`, startup is timed from now."""
+        self.start_ns = perf_counter_ns()
+        self.ready_ns: Optional[int] = None
+
+        self._steps: dict[str, _Step] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._tracer = Tracer(capacity=256)
+        self._tracer.record("startup", self.start_ns, self.start_ns)
+
+    @property
+    def ready(self) -> bool:
+        """Whether every required step is ready."""
+        return all(step.state == READY for step in self._steps.values() if step.required)
+
+    @property
+    def failed(self) -> Optional[str]:
+        """Name and error of the first required step that failed, `None` if none failed."""
+        for step in self._steps.values():
+            if step.required and step.state == FAILED:
+                return f"{step.name}: {step.error}"
+
+        return None
+
+    def run(self, name: str, awaitable: Awaitable[T], required: bool = True) -> "asyncio.Task[T]":
+        """
+        Run a step as a task.
+
+        Args:
+            name (str): Name of the step in the readiness state and the timeline
+            awaitable (Awaitable[T]): Step, may await the tasks of other steps it depends on
+            required (bool, optional): The server is not ready until the step is ready. Defaults to True.
+
+        Returns:
+            asyncio.Task[T]: Task of the step, other steps can await it for its result
+        """
+        step = _Step(name, required)
+        self._steps[name] = step
+
+        async def run_step() -> T:
+            step.state = RUNNING
+            step.start_ns = perf_counter_ns()
+            try:
+                result = await awaitable
+            except BaseException as error:
+                step.state = FAILED
+                step.error = str(error) or type(error).__name__
+                raise
+            else:
+                step.state = READY
+                return result
+            finally:
+                step.end_ns = perf_counter_ns()
+                self._tracer.record(f"startup/{name}", step.start_ns, step.end_ns)
+
+                if self.ready_ns is None and self.ready:
+                    self.ready_ns = step.end_ns
+
+        task = asyncio.get_event_loop().create_task(run_step())
+        self._tasks.append(task)
+        return task
+
+    def run_in_thread(self, name: str, function: Callable[..., T], *args: Any,
+                      required: bool = True) -> "asyncio.Task[T]":
+        """
+        Run a blocking step on a worker thread.
+
+        Args:
+            name (str): Name of the step in the readiness state and the timeline
+            function (Callable[..., T]): Blocking function of the step
+            *args (Any): Arguments of `function`
+            required (bool, optional): The server is not ready until the step is ready. Defaults to True.
+
+        Returns:
+            asyncio.Task[T]: Task of the step, other steps can await it for its result
+        """
+        async def run_blocking() -> T:
+            return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+
+        return self.run(name, run_blocking(), required=required)
+
+    async def wait(self) -> None:
+        """
+        Wait for every step to finish.
+
+        Raises:
+            BaseException: Error of the first step that failed
+        """
+        # Every error is retrieved so that failed steps are not reported again
+        # as unhandled by the event loop
+        results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def cancel(self) -> None:
+        """Cancel the steps that have not finished."""
+        for task in self._tasks:
+            task.cancel()
+
+    def stats(self) -> dict:
+        """
+        Get the readiness state and timeline as a JSON serializable dict.
+
+        Returns:
+            dict: Whether the server is ready, milliseconds until it was, and the state, start and duration of
+                  every step in milliseconds since startup began
+        """
+        def milliseconds(ns: Optional[int]) -> Optional[float]:
+            return round((ns - self.start_ns) / 1_000_000, 3) if ns is not None else None
+
+        steps: dict[str, Any] = {}
+        for step in self._steps.values():
+            steps[step.name] = {
+                "state": step.state,
+                "required": step.required,
+                "start_ms": milliseconds(step.start_ns),
+                "duration_ms": round((step.end_ns - step.start_ns) / 1_000_000, 3)
+                if step.start_ns is not None and step.end_ns is not None else None,
+                "error": step.error,
+            }
+
+        return {"ready": self.ready, "ready_ms": milliseconds(self.ready_ns), "steps": steps}
+
+    def chrome_trace(self) -> dict:
+        """
+        Convert the timeline to the Chrome trace event format.
+
+        Returns:
+            dict: Trace object with a complete ("X") event per finished step
+        """
+        return self._tracer.chrome_trace()
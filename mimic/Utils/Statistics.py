@@ -0,0 +1,99 @@
+"""Utility classes for summarizing streams of measurements."""
+from collections import deque
+from math import ceil
+from typing import Optional, Sequence
+
+
+def _nearest_rank(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Find a quantile of already sorted values using the nearest-rank method.
+
+    Args:
+        sorted_values (Sequence[float]): Non-empty, sorted values
+        q (float): Quantile between 0 and 1
+
+    Returns:
+        float: Value of the quantile
+    """
+    index = min(len(sorted_values), max(1, ceil(q * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+class RollingQuantiles:
+    """
+    Quantiles over the most recent measurements.
+
+    Only the last `capacity` measurements are kept, older measurements are
+    discarded as new ones are added.
+
+    >>> frame_delay = RollingQuantiles()
+    >>> frame_delay.add(33.3)
+    >>> frame_delay.summary()
+    {'count': 1, 'p50': 33.3, 'p99': 33.3}
+    """
+
+    def __init__(self, capacity: int = 1000):
+        """
+        Create new instance of `RollingQuantiles`.
+
+        Args:
+            capacity (int, optional): Number of measurements to keep. Defaults to 1000.
+        """
+        self._values: deque[float] = deque(maxlen=capacity)
+
+    def add(self, value: float):
+        """
+        Add a measurement.
+
+        Args:
+            value (float): New measurement
+        """
+        self._values.append(value)
+
+    def clear(self):
+        """Discard all measurements."""
+        self._values.clear()
+
+    def __len__(self) -> int:
+        """Get the number of measurements currently kept."""
+        return len(self._values)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Find a quantile using the nearest-rank method.
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            Optional[float]: Value of the quantile, `None` if there are no measurements
+        """
+        if len(self._values) == 0:
+            return None
+
+        return _nearest_rank(sorted(self._values), q)
+
+    def summary(self, *quantiles: float) -> dict:
+        """
+        Summarize the measurements as a JSON serializable dict.
+
+        Args:
+            quantiles (float): Quantiles to include. Defaults to the median and 99th percentile
+
+        Returns:
+            dict: Number of measurements and each quantile keyed as `p<percentile>`
+        """
+        if len(quantiles) == 0:
+            quantiles = (0.5, 0.99)
+
+        values = sorted(self._values)
+        summary: dict = {"count": len(values)}
+
+        for q in quantiles:
+            key = f"p{q * 100:g}"
+            if len(values) == 0:
+                summary[key] = None
+            else:
+                summary[key] = round(_nearest_rank(values, q), 3)
+
+        return summary
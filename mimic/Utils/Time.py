@@ -1,53 +1,157 @@
 """Utility functions for time."""
-import asyncio
-from threading import Timer
-from time import time
-from typing import Callable
+from collections import deque
+from time import perf_counter
+from typing import Optional
 
-from pyee import AsyncIOEventEmitter
 
+def monotonic_timestamp() -> float:
+    """
+    Get number of milliseconds from a monotonic clock.
 
-def timestamp() -> int:
-    """Get number of milliseconds from epoch."""
-    return int(time() * 1000)
+    Unlike `time.time`, the clock is not affected by system clock updates. Only
+    differences between monotonic timestamps taken in the same process are
+    meaningful.
+    """
+    return perf_counter() * 1000
 
 
-def latency(previous_timestamp: int) -> int:
-    """Find the current latency in milliseconds from a previous timestamp."""
-    return timestamp() - previous_timestamp
+class ClockOffsetEstimator:
+    """
+    NTP-style estimate of the offset between a remote clock and the local clock.
 
+    Each sample is a ping exchange:
+    - t0 - Local time the ping was sent
+    - t1 - Remote time the ping was received
+    - t2 - Remote time the reply was sent
+    - t3 - Local time the reply was received
 
-class RollingTimeout:
+    Of the last `window` samples, the sample with the smallest round trip time
+    is the least affected by queuing delays and is used as the estimate.
     """
-    Function is executed after some interval.
 
-    If `rollback` is invoked before expiration, the timer will be reset back to the original interval.
+    def __init__(self, window: int = 8):
+        """
+        Create new instance of `ClockOffsetEstimator`.
+
+        Args:
+            window (int, optional): Number of recent samples to choose the estimate from. Defaults to 8.
+        """
+        self._samples: deque[tuple[float, float]] = deque(maxlen=window)
+
+    def add_sample(self, t0: float, t1: float, t2: float, t3: float) -> float:
+        """
+        Add a ping exchange.
+
+        Args:
+            t0 (float): Local time the ping was sent in milliseconds
+            t1 (float): Remote time the ping was received in milliseconds
+            t2 (float): Remote time the reply was sent in milliseconds
+            t3 (float): Local time the reply was received in milliseconds
+
+        Returns:
+            float: Round trip time of the exchange in milliseconds, excluding
+                   the time spent by the remote
+        """
+        round_trip_time = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self._samples.append((round_trip_time, offset))
+
+        return round_trip_time
+
+    def reset(self):
+        """Discard all samples."""
+        self._samples.clear()
+
+    @property
+    def offset(self) -> Optional[float]:
+        """Remote clock minus local clock in milliseconds, `None` before the first sample."""
+        if len(self._samples) == 0:
+            return None
+
+        return min(self._samples)[1]
+
+    @property
+    def round_trip_time(self) -> Optional[float]:
+        """Smallest recent round trip time in milliseconds, `None` before the first sample."""
+        if len(self._samples) == 0:
+            return None
+
+        return min(self._samples)[0]
+
+    def to_local_time(self, remote_time: float) -> Optional[float]:
+        """
+        Convert a remote timestamp to the local clock.
+
+        Args:
+            remote_time (float): Remote timestamp in milliseconds
+
+        Returns:
+            Optional[float]: Local timestamp in milliseconds, `None` before the first sample
+        """
+        offset = self.offset
+        if offset is None:
+            return None
+
+        return remote_time - offset
+
+
+class FrameDelayEstimator:
+    """
+    Estimate the capture-to-output delay of frames from their media timestamps.
+
+    The media timestamps (pts) of a stream advance with the capture clock of the
+    sender but start at an arbitrary value. The difference between when a frame
+    is output and its media timestamp is therefore the delay of the frame plus
+    an unknown constant. The frame with the smallest difference over the recent
+    window is assumed to have been delayed only by the one-way network delay,
+    half of the smallest round trip time, and every other frame is measured
+    against it.
     """
 
-    def __init__(self, interval: float, callback: Callable):
+    def __init__(self, window: int = 300):
         """
-        Create new instance of `RollingTimeout`.
+        Create new instance of `FrameDelayEstimator`.
 
         Args:
-            interval (int): How long to wait before callback is executed (in seconds)
-            callback (Callable): Funtion that is executed when the timer expires
+            window (int, optional): Number of recent frames to find the least delayed frame in. Defaults to 300.
         """
-        self._interval = interval
-        self._callback = callback
+        self._window = window
+        self._index = 0
+
+        # Monotonic deque of (index, transit), the front is always the minimum
+        # of the window
+        self._minimum: deque[tuple[int, float]] = deque()
+
+    def add(self, media_time: float, output_time: float, round_trip_time: Optional[float]) -> Optional[float]:
+        """
+        Add an output frame.
+
+        Args:
+            media_time (float): Media timestamp of the frame in milliseconds
+            output_time (float): Local monotonic time the frame was output in milliseconds
+            round_trip_time (Optional[float]): Smallest recent round trip time in milliseconds
+
+        Returns:
+            Optional[float]: Estimated capture-to-output delay in milliseconds,
+                             `None` if the round trip time is not known yet
+        """
+        transit = output_time - media_time
+
+        while len(self._minimum) > 0 and self._minimum[-1][1] >= transit:
+            self._minimum.pop()
+        self._minimum.append((self._index, transit))
+
+        while self._minimum[0][0] <= self._index - self._window:
+            self._minimum.popleft()
 
-    async def _job(self):
-        await asyncio.sleep(self._interval)
-        await self._callback()
+        self._index += 1
 
-    def start(self):
-        """Start the timer."""
-        self._task = asyncio.ensure_future(self._job())
+        if round_trip_time is None:
+            return None
 
-    def rollback(self):
-        """Reset the expiration of the timer to the original interval."""
-        self._task.cancel()
-        self.start()
+        return transit - self._minimum[0][1] + round_trip_time / 2
 
-    def stop(self):
-        """Stop the timer."""
-        self._task.cancel()
+    def reset(self):
+        """Discard all frames, should be called when a new stream starts."""
+        self._index = 0
+        self._minimum.clear()
@@ -0,0 +1,169 @@
+"""
+Lightweight timing spans that can be dumped as a Chrome trace.
+
+Spans are recorded into a fixed size ring buffer so tracing can be left on in
+the media path without growing memory. The recorded spans can be written out
+in the Chrome trace event format and opened with `chrome://tracing`,
+https://ui.perfetto.dev or https://www.speedscope.app.
+
+>>> tracer = Tracer()
+>>> with tracer.span("reformat"):
+>>>     frame = frame.reformat(width=1280, height=720)
+>>> tracer.dump_chrome_trace("trace.json")
+"""
+import json
+import os
+from collections import deque
+from threading import get_ident
+from time import perf_counter_ns
+from typing import Union
+
+_DEFAULT_CAPACITY = 100_000
+
+
+class _Span:
+    """Context manager that records a single span into a `Tracer`."""
+
+    __slots__ = ("_tracer", "_name", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self._tracer = tracer
+        self._name = name
+        self._start = 0
+
+    def __enter__(self):
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tracer.record(self._name, self._start, perf_counter_ns())
+
+
+class _NullSpan:
+    """Context manager that does nothing, used when tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Record named timing spans into a bounded ring buffer.
+
+    Once `capacity` spans have been recorded, the oldest spans are discarded.
+    """
+
+    def __init__(self, capacity: int = _DEFAULT_CAPACITY, enabled: bool = True):
+        """
+        Create a new tracer.
+
+        Args:
+            capacity (int, optional): Maximum number of spans kept in memory. Defaults to _DEFAULT_CAPACITY.
+            enabled (bool, optional): Whether spans are recorded. Defaults to True.
+        """
+        self.enabled = enabled
+        self._spans: deque[tuple[str, int, int, int]] = deque(maxlen=capacity)
+
+        # Number of spans and their total duration in nanoseconds per name
+        # since `take_stage_timings` was last called
+        self._totals: dict[str, list[int]] = {}
+
+    def span(self, name: str) -> Union[_Span, _NullSpan]:
+        """
+        Time the body of a `with` block.
+
+        Args:
+            name (str): Name of the span, typically the name of the stage being timed
+
+        Returns:
+            Union[_Span, _NullSpan]: Context manager that records the span on exit
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+
+        return _Span(self, name)
+
+    def record(self, name: str, start_ns: int, end_ns: int):
+        """
+        Record a span that has already been timed.
+
+        Args:
+            name (str): Name of the span
+            start_ns (int): Start of the span from `time.perf_counter_ns`
+            end_ns (int): End of the span from `time.perf_counter_ns`
+        """
+        if self.enabled:
+            self._spans.append((name, start_ns, end_ns, get_ident()))
+
+            totals = self._totals.get(name)
+            if totals is None:
+                self._totals[name] = [1, end_ns - start_ns]
+            else:
+                totals[0] += 1
+                totals[1] += end_ns - start_ns
+
+    def take_stage_timings(self) -> dict[str, float]:
+        """
+        Get the average duration of each span name since the last call.
+
+        Returns:
+            dict[str, float]: Average duration in milliseconds by span name
+        """
+        totals, self._totals = self._totals, {}
+        return {name: round(total_ns / count / 1_000_000, 3) for name, (count, total_ns) in totals.items()}
+
+    def clear(self):
+        """Discard all recorded spans."""
+        self._spans.clear()
+
+    def __len__(self) -> int:
+        """Get the number of spans currently held in the buffer."""
+        return len(self._spans)
+
+    def chrome_trace(self) -> dict:
+        """
+        Convert the recorded spans to the Chrome trace event format.
+
+        Returns:
+            dict: Trace object with complete ("X") events in microseconds
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": "mimic",
+                "ph": "X",
+                "ts": start_ns / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, start_ns, end_ns, tid in list(self._spans)
+        ]
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump_chrome_trace(self, output_file: Union[str, os.PathLike[str]]) -> int:
+        """
+        Write the recorded spans to a Chrome trace file.
+
+        Args:
+            output_file (Union[str, os.PathLike[str]]): Path to write the trace to
+
+        Returns:
+            int: Number of spans written
+        """
+        trace = self.chrome_trace()
+
+        with open(output_file, "w") as file:
+            json.dump(trace, file)
+
+        return len(trace["traceEvents"])
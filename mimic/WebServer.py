@@ -2,80 +2,277 @@
 HTTP webserver with WebRTC video stream capabilities.
 
 Only a single WebRTC video stream is allowed at a time. The video stream is
-forwarded to pyvirtualcam.
+forwarded to pyvirtualcam, and relayed as it was encoded by the client to up to
+`relay_max_viewers` WebRTC viewers that connect through `viewer.html`.
 
 After a ping message has not been sent for `_STALE_CONNECTION_TIMEOUT` seconds,
-connections are automatically closed.
+connections are automatically closed. Pings and stale connection deadlines of
+every connection are driven by a single `HeartbeatScheduler`.
 
 RTC data channels:
 - latency - Ping messages are sent between the client and server periodically
   every `_PING_INTERVAL` seconds to make sure the connection is still alive and
   record round time time in
-  milliseconds
+  milliseconds. The server sends its monotonic time and the client replies with
+  `<server time>,<client receive time>,<client send time>` so the offset between
+  the client and server clocks can be estimated NTP-style. A client streaming
+  the calibration pattern sends `calibrate` once after the channel opens
+- metadata - The client sends the upright size, screen orientation and facing
+  mode of its camera as JSON whenever they change, used to orient and scale
+  frames for the camera
+- stats - The client sends a summary of its sender statistics every second,
+  see `mimic.ClientStats`. It is merged with the latency measurements of the
+  server into the session timeline of /stats and the latency log records
+
+HTTP endpoints:
+- /viewer/offer - Signaling of WebRTC viewers of the incoming stream. Viewers
+  are sent the encoded frames of the client without re-encoding them, which
+  requires aiortc 1.4 or newer, 503 otherwise
+- /camera/profile - GET the active and available camera profiles, POST
+  `{"profile": <name>}` to switch profiles at runtime. The new virtual camera is
+  acquired in the background and swapped in between two frames. If a switch
+  released the camera and it cannot be reopened, GET reports the error while
+  reopening is retried
+- /camera/scaler - GET the scaler preset, interpolation and conversion time of
+  the active camera profile, POST `{"preset": <name>}` to change the preset of
+  the active profile at runtime, it is persisted for that profile
+- /constraints - `getUserMedia` constraints of the active camera profile, or of
+  the largest profile when the client sends simulcast
+- /preview - Live MJPEG preview of the frames sent to the camera for any number
+  of viewers, without taking the WebRTC connection. Frames are encoded once at
+  the preview frame rate and size and slow viewers skip frames
+- /snapshot - The frame currently sent to the camera, or the placeholder when
+  idle, as `?format=jpeg|png|webp` (defaults to JPEG). Encoded at most once per
+  frame and format no matter how many clients poll it
+- /stats - Round trip time, clock offset and capture-to-output frame delay
+  quantiles of the current session, frame buffer reuse counters, scaler preset
+  and conversion time, recording, frame capture, snapshot cache, preview, GUI
+  thumbnail, relay and heartbeat counters, the active simulcast layer and layer
+  switches, stalls with their freeze and time to recover, the latency profile
+  with the jitter buffer depth and stale frames dropped, session history
+  writes, supervisor restarts, the startup timeline, resident memory and its
+  growth, and event loop lag quantiles with the most recent callbacks that
+  blocked the loop as JSON
+- /health - Answers as soon as the server accepts connections, with whether
+  every startup step is ready. Clients poll it to reconnect after a restart
+- /startup - State, start and duration of every startup step. Certificates,
+  camera acquisition, asset warm-up and binding the socket run concurrently
+
+When `simulcast` is enabled in the configuration, the client sends its camera
+at several sizes and only the layer that best fits the camera profile and the
+CPU headroom of the server is decoded, see `mimic.Media.Simulcast`.
+
+When the video stalls or frames fail to decode, for example after packet loss
+on WiFi, a keyframe is requested from the client right away instead of
+waiting for its next periodic keyframe, see `mimic.Media.StallWatchdog`.
+
+The `latency_profile` in the configuration sets the depth of the jitter buffer
+of the video receiver and the age above which decoded frames are dropped
+instead of being sent to the camera, see `mimic.Media.LatencyProfile`.
+
+When `recording` is enabled in the configuration, the encoded video is written
+to `recordings` in Local AppData as it is received, without being decoded a
+second time, see `mimic.Media.Recorder`.
+
+Requests from the other end of the pipe, see `mimic.Pipeable.Channel`:
+- stats - Same as /stats
+- config/get - Every configuration value
+- config/set - Persist `{"key": <key>, "value": <value>}` to the configuration,
+  read by the server the next time the setting is used
+- profile/start, profile/stop - Same as the /debug/profile endpoints
+- capture/start, capture/stop - Same as the /debug/capture endpoints, start
+  takes `{"kind": <kind>, "frames": <max frames>}`
+- memory/objects, memory/trace/start, memory/snapshot, memory/trace/stop - Same
+  as the /debug/memory endpoints, trace/start takes `{"frames": <frames>}`
+- health - Whether every startup step is ready, answered from the main loop,
+  see `mimic.Supervisor`
+- supervisor/stats - Restart counters of the supervisor, included in /stats
+
+Debug endpoints:
+- /debug/profile/start - Start sampling the call stacks of the server process
+- /debug/profile/stop - Stop sampling and write the collapsed stacks to
+  `profiles` in Local AppData
+- /debug/trace - Write the per-stage timing spans of the media path as a Chrome
+  trace to `profiles` in Local AppData
+- /debug/startup-trace - The startup timeline as a Chrome trace
+- /debug/capture/start - Capture the incoming frames with their arrival times
+  to `traces` in Local AppData, `?kind=encoded` as they are handed to the
+  decoder or `?kind=decoded` (default) as yuv planes, for at most `?frames=`
+  frames. Traces are replayed by `.scripts/replay_trace.py`, see
+  `mimic.Media.FrameTrace`
+- /debug/capture/stop - Stop capturing and close the trace file
+- /debug/memory - Resident memory, its growth and the live peer connections,
+  tracks, data channels and tasks after a full garbage collection, see
+  `mimic.Utils.Memory`
+- /debug/memory/trace/start - Start tracing allocations with `?frames=` frames
+  of stack per allocation
+- /debug/memory/snapshot - Write the traced allocations and a report of what
+  grew since the previous snapshot to `memory` in Local AppData
+- /debug/memory/trace/stop - Stop tracing allocations
 """
 
 import asyncio
+import gc
+import itertools
 import json
 import logging
 import os
 import ssl
+import sys
+from collections import deque
+from datetime import datetime
 from json.decoder import JSONDecodeError
 from mimetypes import MimeTypes
 from multiprocessing.connection import Connection
 from threading import Event
-from typing import Awaitable, Callable, Optional
+from time import time
+from typing import Any, Awaitable, Callable, Optional
+from uuid import uuid4
 
-import numpy as np
-import pyvirtualcam
 from aiohttp import web
 from aiohttp.web_request import Request
 from aiohttp.web_response import StreamResponse
-from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc import (RTCPeerConnection, RTCRtpReceiver, RTCRtpSender,
+                    RTCSessionDescription)
 from aiortc.exceptions import InvalidStateError
 from aiortc.mediastreams import MediaStreamError
 from aiortc.rtcdatachannel import RTCDataChannel
 from aiortc.rtcpeerconnection import RemoteStreamTrack
 from av import VideoFrame
-from av.video.reformatter import VideoReformatter
-from PIL import Image
-from pyvirtualcam.camera import _WindowsCamera
 
+from mimic.ClientStats import ClientStats
 from mimic.Constants import SLEEP_INTERVAL
-from mimic.Pipeable import LogMessage
+from mimic.Media.CameraOutput import (CAMERA_PROFILES, CAMERA_SINK,
+                                      CameraOutput, CameraProfile,
+                                      acquire_camera, capture_constraints,
+                                      persist_placeholder_frames,
+                                      placeholder_frame)
+from mimic.Media.FrameTrace import (DECODED, ENCODED, TRACE_EXTENSION,
+                                    TRACE_KINDS, FrameTraceWriter)
+from mimic.Media.FrameTransform import FIT, SCALE_MODES
+from mimic.Media.LatencyProfile import LATENCY_PROFILES, StaleFrameFilter
+from mimic.Media.Preview import PREVIEW_BOUNDARY, PreviewBroadcaster
+from mimic.Media.ReceiverTap import (jitter_buffer_depth, request_full_intra,
+                                     request_keyframe, resize_jitter_buffer,
+                                     skip_to_keyframe, tap_encoded_frames)
+from mimic.Media.Recorder import PassthroughRecorder
+from mimic.Media.Relay import EncodedRelay, supports_encoded_tracks
+from mimic.Media.Scaler import AUTO as AUTO_SCALER_PRESET
+from mimic.Media.Scaler import SCALER_PRESETS, Scaler
+from mimic.Media.Simulcast import (SimulcastSelector, accept_simulcast,
+                                   offered_layers)
+from mimic.Media.Snapshot import JPEG, SNAPSHOT_FORMATS, SnapshotCache
+from mimic.Media.StallWatchdog import StallWatchdog
+from mimic.Media.Thumbnail import ThumbnailBuffer, ThumbnailWriter
+from mimic.MetaData import MetaData
+from mimic.Pipeable import Channel, LogMessage, MessageSink
 from mimic.Utils.AppData import mkdir_local_app_data, resolve_local_app_data
+from mimic.Utils.Calibration import read_timestamp_pattern
+from mimic.Utils.Config import Config
+from mimic.Utils.EventLoop import (AUTO, BlockedCallback, LoopLagMonitor,
+                                   new_event_loop)
+from mimic.Utils.Heartbeat import HeartbeatScheduler
+from mimic.Utils.History import SessionHistory, SessionSummary
 from mimic.Utils.Host import resolve_host
+from mimic.Utils.Memory import MemoryMonitor, count_live_objects
+from mimic.Utils.Profiler import SamplingProfiler
 from mimic.Utils.SSL import generate_ssl_certs, ssl_certs_generated
-from mimic.Utils.Time import RollingTimeout, latency, timestamp
+from mimic.Utils.Startup import StartupTimeline
+from mimic.Utils.Statistics import RollingQuantiles
+from mimic.Utils.Time import (ClockOffsetEstimator, FrameDelayEstimator,
+                              monotonic_timestamp)
+from mimic.Utils.Tracing import Tracer
 
 ROOT = "mimic/public"
-ASSETS_ROOT = "assets"
 
 _STALE_CONNECTION_TIMEOUT = 5.0
 _PING_INTERVAL = 1.0
 _MAX_CAMERA_RETRY_COUNT = 5
-_CAMERA_INIT_RETRY_INTERVAL = 1
+_CAMERA_INIT_RETRY_INTERVAL = 0.25
+_CAMERA_INIT_RETRY_BACKOFF = 2
+# Seconds between attempts to reopen the virtual camera after a failed profile
+# switch released it
+_CAMERA_RESTORE_INTERVAL = 5.0
+_DEFAULT_CAMERA_PROFILE = "720p"
+_DEFAULT_LATENCY_PROFILE = "balanced"
 
-_CAMERA_WIDTH = 1280
-_CAMERA_HEIGHT = 720
-_CAMERA_FPS = 30
-_CAMERA_DELAY = 0
+# Number of latency reports kept in the timeline of the current session, one
+# is made per ping
+_SESSION_TIMELINE_LENGTH = 120
+
+# Frames captured to a trace unless another limit is requested, a minute at
+# 30fps
+_DEFAULT_CAPTURE_FRAMES = 1800
+
+# Frames of stack stored per traced allocation unless another depth is
+# requested, enough to reach the handler that allocated from aiortc internals
+_DEFAULT_MEMORY_TRACE_FRAMES = 10
+
+# Stands in for the frame count in the keys of cached images while the
+# placeholder is shown, frame counts start at 0
+_PLACEHOLDER_FRAME = -1
+
+
+# Glass-to-glass delays measured from the calibration pattern above this are
+# considered misreads
+_MAX_GLASS_TO_GLASS_DELAY = 10_000
 
 _MIMETYPES = MimeTypes()
 
-cam: Optional[_WindowsCamera] = None
+# Virtual camera of the active camera profile, replaced as a whole when the
+# profile changes
+camera_output: Optional[CameraOutput] = None
 is_cam_idle = True
 
-# Store a global referece to the reformatter for performance
-# See https://pyav.org/docs/stable/api/video.html#av.video.reformatter.VideoReformatter
-_VIDEO_REFORMATTER = VideoReformatter()
+# Unhandled exception that stops the server process, which is then restarted
+# by the supervisor, see `mimic.Supervisor`
+_fatal_error: Optional[str] = None
+
+# Store a global referece to the scaler for performance, its output frames are
+# recycled between frames
+_SCALER = Scaler("rgba")
 
-_NO_CAMREA_IMAGE_BMP = Image.open(os.path.join(ASSETS_ROOT, "no_camera.bmp")).convert('RGB')
-_NO_CAMERA_IMAGE_FRAME = VideoFrame.from_ndarray(np.asanyarray(_NO_CAMREA_IMAGE_BMP, dtype=np.uint8), format="rgb24").reformat(
-    width=_CAMERA_WIDTH, height=_CAMERA_HEIGHT, format='rgba')
-_NO_CAMERA_IMAGE_NDARRAY = _NO_CAMERA_IMAGE_FRAME.to_ndarray()
+# Per-stage timing spans of the media path and the on-demand sampling profiler
+# for the server process. Both are written to `profiles` in Local AppData
+_TRACER = Tracer()
+_PROFILER = SamplingProfiler()
 
+# Contents of the public files by path, with the modification time they were
+# read at
+_public_files: dict[str, tuple[int, str]] = {}
+
+
+def read_public_file(path: str) -> str:
+    """
+    Read a public file, from memory unless it changed since it was last read.
+
+    Args:
+        path (str): Path of the file
 
-async def start_web_server(stop_event: Event, pipe: Connection) -> None:
+    Returns:
+        str: Content of the file
+    """
+    modified = os.stat(path).st_mtime_ns
+    cached = _public_files.get(path)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+
+    with open(path, "r") as file:
+        content = file.read()
+
+    _public_files[path] = (modified, content)
+    return content
+
+
+async def start_web_server(
+    stop_event: Event,
+    pipe: MessageSink,
+    host: Optional[str] = None,
+    port: int = 8080,
+    sink: str = CAMERA_SINK,
+    handle_signals: bool = True,
+    thumbnail: Optional[str] = None
+) -> None:
     """
     Set up and run the web server main loop.
 
@@ -83,11 +280,231 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
 
     Args:
         stop_event (Event): A flag that, when true, will graceully shut down the server
-        pipe (Connection): Pipe connection to receive information from server
+        pipe (MessageSink): Channel to send information from the server through, requests received on a
+                            `Channel` are answered
+        host (Optional[str], optional): Address to bind to. Defaults to the address of the active
+                                        network device.
+        port (int, optional): Port to bind to. Defaults to 8080.
+        sink (str, optional): Where frames are sent, see `mimic.Media.CameraOutput`. Defaults to CAMERA_SINK.
+        handle_signals (bool, optional): Let aiohttp exit on SIGINT and SIGTERM, disable when the caller
+                                         sets `stop_event` on signals itself. Defaults to True.
+        thumbnail (Optional[str], optional): Name of the shared memory of the GUI thumbnail, see
+                                             `mimic.Media.Thumbnail`. Defaults to None.
     """
     # All active RTC peer connections
     pcs: set[RTCPeerConnection] = set()
 
+    # Peer connections of viewers of the incoming stream, not counted towards
+    # the single stream limit
+    viewer_pcs: set[RTCPeerConnection] = set()
+
+    # Open metadata data channels, used to send new capture constraints to the
+    # client when the camera profile changes
+    metadata_channels: set[RTCDataChannel] = set()
+
+    # Latest metadata from the client, handed to every new camera output
+    client_metadata: Optional[MetaData] = None
+
+    # Readiness and timeline of the startup steps, which run concurrently
+    startup = StartupTimeline()
+
+    mkdir_local_app_data()
+    config = Config(resolve_local_app_data("config.json"))
+
+    # Scheduling delay of the event loop, callbacks that block the loop for
+    # longer than the threshold are logged with their stack
+    loop_monitor = LoopLagMonitor(threshold=float(config.get("loop_lag_threshold_ms")) / 1000)
+
+    # Camera profile that is currently being switched to
+    pending_profile: Optional[CameraProfile] = None
+
+    # Error of the last attempt to reopen the virtual camera after a failed
+    # profile switch released it, and the next attempt
+    camera_error: Optional[str] = None
+    camera_restore: Optional[asyncio.TimerHandle] = None
+
+    # Recorder of the current session, if recording is enabled
+    recorder: Optional[PassthroughRecorder] = None
+
+    # Capture of the incoming frames to a trace file, see `mimic.Media.FrameTrace`
+    frame_trace: Optional[FrameTraceWriter] = None
+
+    # Encoded snapshots of the latest frame
+    snapshots = SnapshotCache(max_width=int(config.get("snapshot_max_width")),
+                              quality=int(config.get("snapshot_quality")))
+
+    # Layer selection of the current session if the client sends simulcast
+    simulcast: Optional[SimulcastSelector] = None
+
+    # Keyframe requests when the video track of the current session stalls
+    stall_watchdog: Optional[StallWatchdog] = None
+
+    # Jitter buffer depth and frame age limit of the receive path, read once
+    # since the jitter buffer can only be resized before a session starts
+    latency_profile = LATENCY_PROFILES.get(config.get("latency_profile"), LATENCY_PROFILES[_DEFAULT_LATENCY_PROFILE])
+    stale_frames = StaleFrameFilter(latency_profile.max_frame_age_ms)
+    video_receiver: Optional[RTCRtpReceiver] = None
+    jitter_buffer_packets = RollingQuantiles()
+    jitter_buffer_spans = RollingQuantiles()
+
+    # Thumbnail of the frames sent to the camera for the GUI process, written
+    # only while the GUI shows it
+    thumbnail_writer: Optional[ThumbnailWriter] = None
+
+    # Relay of the incoming stream to WebRTC viewers
+    relay = EncodedRelay(max_viewers=int(config.get("relay_max_viewers")))
+
+    # MJPEG preview shared by every viewer
+    preview = PreviewBroadcaster(fps=float(config.get("preview_fps")),
+                                 max_width=int(config.get("preview_max_width")),
+                                 quality=int(config.get("preview_quality")))
+
+    # Latency measurements of the current session, reset when a new session
+    # starts
+    clock_offset = ClockOffsetEstimator()
+    frame_delay_estimator = FrameDelayEstimator()
+    round_trip_times = RollingQuantiles()
+    frame_delays = RollingQuantiles()
+    glass_to_glass_delays = RollingQuantiles()
+    is_calibrating = False
+
+    # Id of the current session in structured logs, and the frames shown since
+    # it started for the frame rate of each latency report
+    session_id: Optional[str] = None
+    frames_shown = 0
+    last_report = (monotonic_timestamp(), 0)
+
+    # Measurements of the current session that are only kept for its summary
+    # in the session history, `session_started_at` is `None` once the summary
+    # was written
+    session_started_at: Optional[float] = None
+    session_fps = RollingQuantiles()
+    session_frame_size: Optional[tuple[int, int]] = None
+    session_recorder_dropped = 0
+    session_codec: Optional[str] = None
+
+    # Latest sender statistics reported by the client, and the recent
+    # latency reports of the session merged with them
+    client_stats: Optional[ClientStats] = None
+    session_timeline: deque[dict[str, Any]] = deque(maxlen=_SESSION_TIMELINE_LENGTH)
+
+    def reset_latency_measurements() -> None:
+        """Discard the latency measurements of the previous session and start a new session."""
+        nonlocal is_calibrating, client_metadata, session_id, frames_shown, last_report
+        nonlocal session_started_at, session_frame_size, session_recorder_dropped, session_codec, client_stats
+        is_calibrating = False
+        client_metadata = None
+        session_id = uuid4().hex[:8]
+        frames_shown = 0
+        last_report = (monotonic_timestamp(), 0)
+
+        session_started_at = time()
+        session_fps.clear()
+        session_frame_size = None
+        session_recorder_dropped = 0
+        session_codec = None
+        client_stats = None
+        session_timeline.clear()
+
+        if camera_output is not None:
+            camera_output.update_metadata(None)
+
+        clock_offset.reset()
+        frame_delay_estimator.reset()
+        round_trip_times.clear()
+        frame_delays.clear()
+        glass_to_glass_delays.clear()
+        stale_frames.reset()
+        jitter_buffer_packets.clear()
+        jitter_buffer_spans.clear()
+
+    def report_latency(round_trip_time: float) -> None:
+        """
+        Log the latency measurements of the current session as a structured record.
+
+        The server measurements are merged with the latest statistics reported
+        by the client into one entry of the session timeline.
+
+        Args:
+            round_trip_time (float): Round trip time of the latest ping in milliseconds
+        """
+        nonlocal last_report, session_codec
+        now = monotonic_timestamp()
+        report_time, report_frames = last_report
+        fps = (frames_shown - report_frames) * 1000 / (now - report_time) if now > report_time else 0.0
+        last_report = (now, frames_shown)
+        session_fps.add(fps)
+
+        # The relay is detached before the session ends
+        session_codec = relay.mime_type or session_codec
+
+        if simulcast is not None and camera_output is not None:
+            profile = camera_output.profile
+            scaler_preset = camera_output.transform.scaler_preset
+            load = scaler_preset.average / scaler_preset.frame_budget if scaler_preset.average is not None else None
+            simulcast.update(min(profile.width, profile.height), load)
+
+        depth = jitter_buffer_depth(video_receiver) if video_receiver is not None else None
+        if depth is not None:
+            jitter_buffer_packets.add(depth.packets)
+            jitter_buffer_spans.add(depth.span_ms)
+
+        offset = clock_offset.offset
+        frame_delay = frame_delays.summary()
+        entry = {
+            "t_s": round(time() - session_started_at, 3) if session_started_at is not None else None,
+            "rtt_ms": round(round_trip_time, 3),
+            "clock_offset_ms": None if offset is None else round(offset, 3),
+            "frame_delay_p50_ms": frame_delay["p50"],
+            "frame_delay_p99_ms": frame_delay["p99"],
+            "fps": round(fps, 2),
+            "stages_ms": _TRACER.take_stage_timings(),
+            "layer": simulcast.active if simulcast is not None else None,
+            "stalls": stall_watchdog.stalls if stall_watchdog is not None else None,
+            "jitter_buffer_packets": depth.packets if depth is not None else None,
+            "stale_frames_dropped": stale_frames.dropped,
+            **(client_stats.as_dict("client_") if client_stats is not None else {}),
+        }
+        session_timeline.append(entry)
+
+        client = ""
+        if client_stats is not None:
+            client = (f", client {client_stats.fps}fps {client_stats.bitrate_kbps}kbps "
+                      f"limited by {client_stats.quality_limitation}")
+
+        def milliseconds(value: Optional[float]) -> str:
+            return "unknown" if value is None else f"{value:.1f}ms"
+
+        log(f"Latency {round_trip_time:.1f}ms, clock offset {milliseconds(offset)}, "
+            f"frame delay p50 {milliseconds(frame_delay['p50'])} p99 {milliseconds(frame_delay['p99'])}, "
+            f"{fps:.1f}fps{client}", logging.DEBUG,
+            session=session_id, **entry)
+
+    def record_frame_delay(frame: VideoFrame, output_time: float) -> None:
+        """
+        Record the capture-to-output delay of a frame that was just sent to the camera.
+
+        Args:
+            frame (VideoFrame): Decoded frame as it was received from the track
+            output_time (float): Monotonic timestamp when the frame was sent to the camera
+        """
+        if frame.pts is None or not frame.time_base:
+            return
+
+        media_time = float(frame.pts * frame.time_base) * 1000
+        frame_delay = frame_delay_estimator.add(media_time, output_time, clock_offset.round_trip_time)
+        if frame_delay is not None:
+            frame_delays.add(frame_delay)
+
+        if is_calibrating:
+            capture_time = read_timestamp_pattern(frame)
+            local_capture_time = clock_offset.to_local_time(capture_time) if capture_time is not None else None
+
+            # Frames that were not decoded cleanly produce timestamps that are
+            # nowhere near the current time
+            if local_capture_time is not None and 0 <= output_time - local_capture_time < _MAX_GLASS_TO_GLASS_DELAY:
+                glass_to_glass_delays.add(output_time - local_capture_time)
+
     async def show_frame(track: RemoteStreamTrack) -> None:
         """
         Get a frame from a `RemoteStreamTrack` and paint it to the pyvirtualcam video buffer.
@@ -95,13 +512,40 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
         Args:
             track (RemoteStreamTrack): Video track from WebRTC connection
         """
-        frame = await track.recv()
+        # @NOTE Frames are decoded by aiortc on its own decoder thread, so
+        # the time spent decoding is part of waiting on `recv`
+        with _TRACER.span("recv"):
+            frame = await track.recv()
+
+        # The track of a video receiver only returns video frames
+        assert isinstance(frame, VideoFrame)
+
+        if frame_trace is not None:
+            frame_trace.submit_decoded(frame)
+
+        if stall_watchdog is not None:
+            stall_watchdog.on_frame(frame)
 
-        # Format is a 2d array containing an RGBA tuples
-        # 640x480
-        if cam is not None:
-            frame = _VIDEO_REFORMATTER.reformat(frame=frame, width=_CAMERA_WIDTH, height=_CAMERA_HEIGHT, format="rgba")
-            cam.send(frame.to_ndarray())
+        # Late frames are dropped before the conversion, which is most of the
+        # cost of a frame
+        if stale_frames.is_stale(frame, monotonic_timestamp(), clock_offset.round_trip_time):
+            return
+
+        # Read the camera output once so that a profile change can only take
+        # effect between two frames
+        output = camera_output
+        if output is not None:
+            output.send_frame(frame)
+
+            nonlocal frames_shown, session_frame_size
+            frames_shown += 1
+            session_frame_size = (frame.width, frame.height)
+            record_frame_delay(frame, monotonic_timestamp())
+
+            if output.latest_image is not None:
+                preview.offer((output, output.frame_count), output.latest_image)
+                if thumbnail_writer is not None:
+                    thumbnail_writer.offer((output, output.frame_count), output.latest_image)
 
         # @NOTE Not sure if we need this but I'm going to leave it in case we
         # ever need a case for it
@@ -109,25 +553,301 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
 
     def show_static_frame() -> None:
         """Paint static image to camera frame buffer."""
-        if cam is None:
+        if camera_output is None:
             raise RuntimeError('Trying to send frame to camera before initialization')
 
-        cam.send(_NO_CAMERA_IMAGE_NDARRAY)
+        camera_output.send_placeholder()
+        preview.offer((camera_output, _PLACEHOLDER_FRAME), camera_output.placeholder)
+        if thumbnail_writer is not None:
+            thumbnail_writer.offer((camera_output, _PLACEHOLDER_FRAME), camera_output.placeholder)
+
+    def configured_camera_profile() -> CameraProfile:
+        """
+        Get the persisted camera profile.
+
+        Returns:
+            CameraProfile: Persisted profile, or the default profile if the persisted profile is unknown
+        """
+        return CAMERA_PROFILES.get(config.get("camera_profile"), CAMERA_PROFILES[_DEFAULT_CAMERA_PROFILE])
+
+    def configured_scaler_preset(profile: CameraProfile) -> str:
+        """
+        Get the persisted scaler preset of a camera profile.
+
+        Args:
+            profile (CameraProfile): Camera profile
+
+        Returns:
+            str: Preset of the profile, the default preset if the profile has none, or `AUTO` if the persisted
+                 preset is unknown
+        """
+        preset = config.get("scaler_preset_per_profile").get(profile.name, config.get("scaler_preset"))
+        return preset if preset in SCALER_PRESETS else AUTO_SCALER_PRESET
+
+    def open_camera_output(profile: CameraProfile, retry_count: int) -> CameraOutput:
+        """
+        Acquire the virtual camera and build the frame transform for a profile.
+
+        @NOTE Blocks, is run on a worker thread.
+
+        Args:
+            profile (CameraProfile): Output profile
+            retry_count (int): Maximum number of attempts to acquire the camera
+
+        Returns:
+            CameraOutput: Output that is ready to receive frames
+        """
+        camera = acquire_camera(profile, retry_count, _CAMERA_INIT_RETRY_INTERVAL,
+                                lambda attempt: log("Failed to acquire camera, retrying.", logging.WARN), sink,
+                                _CAMERA_INIT_RETRY_BACKOFF)
+
+        scale_mode = config.get("scale_mode") if config.get("scale_mode") in SCALE_MODES else FIT
+        output = CameraOutput(profile, camera, scale_mode=scale_mode,
+                              mirror_user_facing=bool(config.get("mirror_user_facing")), scaler=_SCALER, tracer=_TRACER,
+                              scaler_preset=configured_scaler_preset(profile))
+        output.update_metadata(client_metadata)
+
+        def on_scaler_preset_change(interpolation: str):
+            average = output.transform.scaler_preset.average
+            took = f"{average * 1000:.1f}ms" if average is not None else "an unknown time"
+            log(f"Scaling frames of {profile.name} with {interpolation} interpolation, conversion took {took}",
+                logging.DEBUG)
+
+        output.transform.scaler_preset.on_change = on_scaler_preset_change
+
+        return output
+
+    def client_capture_constraints(profile: CameraProfile) -> dict:
+        """
+        Get the `getUserMedia` constraints the client should capture with.
+
+        Args:
+            profile (CameraProfile): Active camera profile
+
+        Returns:
+            dict: Constraints of the profile, or of the largest profile when simulcast is enabled so that every
+                  profile has a layer that fits it
+        """
+        if config.get("simulcast"):
+            profile = max(CAMERA_PROFILES.values(), key=lambda profile: profile.width * profile.height)
+
+        return capture_constraints(profile)
+
+    def send_capture_constraints() -> None:
+        """Send the capture constraints of the active camera profile to every connected client."""
+        if camera_output is None:
+            return
+
+        message = json.dumps({"constraints": client_capture_constraints(camera_output.profile)})
+        for channel in metadata_channels.copy():
+            try:
+                channel.send(message)
+            except InvalidStateError:
+                metadata_channels.discard(channel)
 
-    def log(message: str, level: int = logging.INFO):
+    async def switch_camera_profile(profile: CameraProfile) -> None:
+        """
+        Replace the camera output with one for a new profile without interrupting the stream.
+
+        The new camera is acquired on a worker thread while frames keep being
+        sent to the old camera, then swapped in between two frames. If the
+        virtual camera cannot be opened a second time, the old camera is
+        released first and the placeholder is not shown until the new camera
+        is ready.
+
+        Args:
+            profile (CameraProfile): Profile to switch to
+        """
+        global camera_output
+        nonlocal pending_profile
+        loop = asyncio.get_event_loop()
+        previous_output = camera_output
+
+        try:
+            try:
+                new_output = await loop.run_in_executor(None, open_camera_output, profile, 1)
+            except RuntimeError:
+                if previous_output is None:
+                    raise
+
+                log("Releasing the current camera before switching profiles", logging.DEBUG)
+                camera_output = None
+                await loop.run_in_executor(None, previous_output.close)
+                previous_output = None
+
+                new_output = await loop.run_in_executor(None, open_camera_output, profile, _MAX_CAMERA_RETRY_COUNT)
+
+            # Swapping the reference is atomic with respect to `show_frame`,
+            # which only reads it once per frame
+            camera_output = new_output
+
+            if previous_output is not None:
+                await loop.run_in_executor(None, previous_output.close)
+
+            config.set("camera_profile", profile.name)
+            await loop.run_in_executor(None, config.save)
+
+            send_capture_constraints()
+            log(f"Camera profile switched to {profile.name} ({profile.width}x{profile.height}@{profile.fps})")
+
+        except RuntimeError as error:
+            log(f"Failed to switch camera profile to {profile.name}: {error}", logging.ERROR)
+
+            # Fall back to the previous profile if its camera was released
+            if camera_output is None and previous_output is None:
+                await restore_camera_output()
+
+        finally:
+            pending_profile = None
+
+    async def restore_camera_output() -> None:
+        """
+        Reopen the virtual camera with the persisted profile after a failed profile switch released it.
+
+        Failed attempts are reported by /camera/profile and retried every
+        `_CAMERA_RESTORE_INTERVAL` seconds until the camera is open.
+        """
+        global camera_output
+        nonlocal camera_error, camera_restore
+        profile = configured_camera_profile()
+        camera_restore = None
+
+        try:
+            camera_output = await asyncio.get_event_loop().run_in_executor(
+                None, open_camera_output, profile, _MAX_CAMERA_RETRY_COUNT)
+        except RuntimeError as error:
+            camera_error = str(error)
+            log(f"Failed to reopen the camera with profile {profile.name}, retrying in {_CAMERA_RESTORE_INTERVAL:g}s: "
+                f"{error}", logging.ERROR)
+            camera_restore = asyncio.get_event_loop().call_later(
+                _CAMERA_RESTORE_INTERVAL, lambda: asyncio.ensure_future(restore_camera_output()))
+            return
+
+        camera_error = None
+        send_capture_constraints()
+        log(f"Camera reopened with profile {profile.name} ({profile.width}x{profile.height}@{profile.fps})")
+
+    def start_recording(pc: RTCPeerConnection, track: RemoteStreamTrack) -> None:
+        """
+        Record the encoded frames of a video track if recording is enabled.
+
+        Args:
+            pc (RTCPeerConnection): Connection the track was received on
+            track (RemoteStreamTrack): Video track from WebRTC connection
+        """
+        nonlocal recorder
+
+        if not config.get("recording"):
+            return
+
+        receiver = next((receiver for receiver in pc.getReceivers() if receiver.track is track), None)
+        if receiver is None:
+            return
+
+        mkdir_local_app_data("recordings")
+        new_recorder = PassthroughRecorder(
+            resolve_local_app_data("recordings"),
+            segment_duration=float(config.get("recording_segment_duration")),
+            max_disk_usage=int(config.get("recording_max_disk_usage_mb")) * 1024 ** 2)
+
+        if not new_recorder.tap(receiver):
+            log("Recording is not supported by this version of aiortc", logging.WARN)
+            return
+
+        new_recorder.start()
+        recorder = new_recorder
+        log(f"Recording to {new_recorder.directory}")
+
+    async def stop_recording() -> None:
+        """Stop the recorder of the current session and close its last segment."""
+        nonlocal recorder, session_recorder_dropped
+
+        if recorder is None:
+            return
+
+        stopped_recorder, recorder = recorder, None
+        await asyncio.get_event_loop().run_in_executor(None, stopped_recorder.stop)
+
+        stats = stopped_recorder.stats()
+        session_recorder_dropped += stats["dropped"]
+        log(f"Recorded {stats['frames']} frame(s) in {stats['segments']} segment(s), "
+            f"dropped {stats['dropped']} frame(s)")
+
+    def log_blocked_callback(blocked: BlockedCallback) -> None:
+        """
+        Log a callback that blocked the event loop.
+
+        Args:
+            blocked (BlockedCallback): Blocked callback captured by the loop monitor
+        """
+        log(f"Event loop blocked for {blocked.duration * 1000:.0f}ms by {blocked.describe()}", logging.WARN)
+        log("".join(blocked.stack).rstrip(), logging.DEBUG)
+
+    def log(message: str, level: int = logging.INFO, **fields: Any):
         """
         Send a log message through communication pipe.
 
         Args:
             message (str): Log message content
             level (int, optional): Logging level. Defaults to logging.INFO.
+            **fields (Any): Structured fields of the record, only written by the JSON lines log format
+        """
+        pipe.send(LogMessage(message, level, fields or None))
+
+    async def end_session(pc: RTCPeerConnection, reason: str) -> None:
         """
-        pipe.send(LogMessage(message, level))
+        Write the summary of the current session to the session history, once per session.
 
-    async def close_all_connections() -> int:
+        @NOTE Must be called before the connection is closed, the packet loss
+        is read from its receivers
+
+        Args:
+            pc (RTCPeerConnection): Connection of the session
+            reason (str): Why the session ended, e.g. `closed` or `timeout`
+        """
+        nonlocal session_started_at
+        if session_started_at is None or session_id is None:
+            return
+
+        started_at, session_started_at = session_started_at, None
+
+        packets_lost: Optional[int] = None
+        for receiver in pc.getReceivers():
+            try:
+                report = await receiver.getStats()
+            except Exception:
+                continue
+
+            for stats in report.values():
+                if stats.type == "inbound-rtp" and stats.kind == "video":
+                    packets_lost = (packets_lost or 0) + stats.packetsLost
+
+        duration = time() - started_at
+        fps = session_fps.summary(0.01, 0.99)
+        round_trip_time = round_trip_times.summary()
+        frame_delay = frame_delays.summary()
+        width, height = session_frame_size or (None, None)
+
+        history.record(SessionSummary(
+            session_id=session_id, started_at=started_at, duration_s=round(duration, 3), end_reason=reason,
+            frames=frames_shown, fps_avg=round(frames_shown / duration, 2) if duration > 0 else None,
+            fps_p1=fps["p1"], fps_p99=fps["p99"],
+            rtt_p50_ms=round_trip_time["p50"], rtt_p99_ms=round_trip_time["p99"],
+            frame_delay_p50_ms=frame_delay["p50"], frame_delay_p99_ms=frame_delay["p99"],
+            packets_lost=packets_lost, recorder_dropped=session_recorder_dropped,
+            width=width, height=height, profile=camera_output.profile.name if camera_output is not None else None,
+            codec=relay.mime_type or session_codec))
+
+        log(f"Session {session_id} ended ({reason}) after {duration:.0f}s", session=session_id)
+
+    async def close_all_connections(reason: str = "closed") -> int:
         """
         Close all open WebRTC connections and media streams.
 
+        Args:
+            reason (str, optional): Why the connections are closed, recorded in the session history.
+                                    Defaults to `closed`.
+
         Returns:
             int: Number of connections that were closed
         """
@@ -135,6 +855,7 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
         is_cam_idle = True
 
         for pc in pcs.copy():
+            await end_session(pc, reason)
             await pc.close()
 
         num_pcs = len(pcs)
@@ -142,10 +863,31 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
 
         return num_pcs
 
-    # Rolling timeout that closes all peer connections after the client has not
-    # responded for some time
-    heartbeat_timeout = RollingTimeout(
-        _STALE_CONNECTION_TIMEOUT, close_all_connections)
+    # Pings the client and closes all peer connections after the client has
+    # not responded for some time
+    heartbeats = HeartbeatScheduler(_PING_INTERVAL, _STALE_CONNECTION_TIMEOUT)
+
+    # Summaries of ended sessions, written on a background thread
+    history = SessionHistory(resolve_local_app_data("history.sqlite3"))
+
+    # Restart counters of the supervisor, sent once this process has started
+    supervisor_stats: dict = {}
+
+    # Resident memory and the number of open connections, sampled to catch
+    # leaks across reconnects before the process runs out of memory
+    memory = MemoryMonitor(
+        interval=float(config.get("memory_sample_interval")),
+        gauges=lambda: {
+            "peer_connections": len(pcs),
+            "viewer_connections": len(viewer_pcs),
+            "metadata_channels": len(metadata_channels),
+            "heartbeat_sessions": heartbeats.session_count,
+            "tasks": len(asyncio.all_tasks()),
+        },
+        growth_warning=int(config.get("memory_growth_warning_mb")) * 1024 ** 2)
+    memory.on_growth = lambda rss, growth: log(
+        f"Memory grew by {growth / 1024 ** 2:.0f}MiB since startup to {rss / 1024 ** 2:.0f}MiB, "
+        "see /debug/memory", logging.WARN, rss_mb=round(rss / 1024 ** 2, 1), growth_mb=round(growth / 1024 ** 2, 1))
 
     @web.middleware
     async def logging_middleware(request: Request, handler: Callable[[Request], Awaitable[StreamResponse]]) -> StreamResponse:
@@ -163,7 +905,7 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
         return await handler(request)
 
     async def index(request: Request) -> StreamResponse:
-        content = open(os.path.join(ROOT, "index.html"), "r").read()
+        content = read_public_file(os.path.join(ROOT, "index.html"))
         return web.Response(content_type="text/html", text=content)
 
     async def static(request: Request) -> StreamResponse:
@@ -172,7 +914,7 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
         if not os.path.exists(filename):
             return web.Response(status=404)
 
-        content = open(filename, 'r').read()
+        content = read_public_file(filename)
         mime = _MIMETYPES.guess_type(filename)[0]
         return web.Response(text=content, content_type=mime)
 
@@ -180,6 +922,534 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
         num_connections = await close_all_connections()
         return web.Response(text=f"Closed {num_connections} connection(s)")
 
+    def resolve_profile_file(extension: str) -> str:
+        """
+        Resolve a new, timestamped file in the `profiles` directory of Local AppData.
+
+        Args:
+            extension (str): File extension without the leading dot
+
+        Returns:
+            str: Absolute path to the file
+        """
+        mkdir_local_app_data("profiles")
+        file_name = f"webserver-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+        return str(resolve_local_app_data("profiles", file_name))
+
+    def start_profiler() -> None:
+        """
+        Start sampling the call stacks of the server process.
+
+        Raises:
+            RuntimeError: The profiler is already running
+        """
+        if _PROFILER.running:
+            raise RuntimeError("Profiler is already running.")
+
+        _PROFILER.start()
+        log("Sampling profiler started")
+
+    async def stop_profiler() -> tuple[int, str]:
+        """
+        Stop sampling and write the collapsed stacks to `profiles` in Local AppData.
+
+        Raises:
+            RuntimeError: The profiler is not running
+
+        Returns:
+            tuple[int, str]: Number of samples and the file they were written to
+        """
+        if not _PROFILER.running:
+            raise RuntimeError("Profiler is not running.")
+
+        sample_count = _PROFILER.stop()
+        profile_file = resolve_profile_file("folded")
+        await asyncio.get_event_loop().run_in_executor(None, _PROFILER.write, profile_file)
+        log(f"Sampling profile written to {profile_file}")
+
+        return sample_count, profile_file
+
+    async def start_profile(request: Request) -> StreamResponse:
+        try:
+            start_profiler()
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text="Profiler started")
+
+    async def stop_profile(request: Request) -> StreamResponse:
+        try:
+            sample_count, profile_file = await stop_profiler()
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text=f"Wrote {sample_count} sample(s) to {profile_file}")
+
+    def live_objects() -> dict:
+        """
+        Count the live objects that are suspected to leak across reconnects, after a full garbage collection.
+
+        @NOTE Walks the whole heap and blocks the event loop, for up to a
+        second while allocations are traced, only called on demand.
+
+        Returns:
+            dict: Live instances of the aiortc classes and tasks, the connections the server still tracks, and
+                  the objects the garbage collector could not free
+        """
+        collected = gc.collect()
+        counts = count_live_objects({
+            "peer_connections": RTCPeerConnection,
+            "receivers": RTCRtpReceiver,
+            "senders": RTCRtpSender,
+            "remote_tracks": RemoteStreamTrack,
+            "data_channels": RTCDataChannel,
+            "tasks": asyncio.Task,
+        })
+
+        return {
+            **counts,
+            # Tasks that finished but are still referenced, e.g. by a closure
+            # of a closed connection
+            "finished_tasks": max(0, counts["tasks"] - len(asyncio.all_tasks())),
+            "tracked": memory.gauges() if memory.gauges is not None else {},
+            "collected": collected,
+            "uncollectable": len(gc.garbage),
+        }
+
+    def start_memory_tracing(frames: int) -> None:
+        """
+        Start tracing the allocations of the server process.
+
+        Args:
+            frames (int): Frames of the stack stored per allocation
+
+        Raises:
+            RuntimeError: Tracing is already running
+            ValueError: Less than one frame
+        """
+        if frames < 1:
+            raise ValueError("At least one frame must be stored per allocation.")
+
+        memory.start_tracing(frames)
+        log(f"Memory tracing started with {frames} frame(s) per allocation")
+
+    async def take_memory_snapshot() -> tuple[str, str]:
+        """
+        Write a snapshot of the traced allocations and its report to `memory` in Local AppData.
+
+        Raises:
+            RuntimeError: Tracing is not running
+
+        Returns:
+            tuple[str, str]: Snapshot file and report file
+        """
+        if not memory.tracing:
+            raise RuntimeError("Memory tracing is not running, start it with /debug/memory/trace/start.")
+
+        mkdir_local_app_data("memory")
+        snapshot_file, report_file = await asyncio.get_event_loop().run_in_executor(
+            None, memory.snapshot, resolve_local_app_data("memory"))
+        log(f"Memory snapshot written to {snapshot_file}, report written to {report_file}")
+
+        return snapshot_file, report_file
+
+    def stop_memory_tracing() -> None:
+        """
+        Stop tracing allocations and discard the traces.
+
+        Raises:
+            RuntimeError: Tracing is not running
+        """
+        if not memory.tracing:
+            raise RuntimeError("Memory tracing is not running.")
+
+        memory.stop_tracing()
+        log("Memory tracing stopped")
+
+    async def memory_state(request: Request) -> StreamResponse:
+        memory.sample()
+        return web.json_response({**memory.stats(), "objects": live_objects()})
+
+    async def start_memory_trace(request: Request) -> StreamResponse:
+        try:
+            start_memory_tracing(int(request.query.get("frames", _DEFAULT_MEMORY_TRACE_FRAMES)))
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text="Memory tracing started")
+
+    async def memory_snapshot(request: Request) -> StreamResponse:
+        try:
+            snapshot_file, report_file = await take_memory_snapshot()
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text=f"Wrote snapshot to {snapshot_file} and report to {report_file}")
+
+    async def stop_memory_trace(request: Request) -> StreamResponse:
+        try:
+            stop_memory_tracing()
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text="Memory tracing stopped")
+
+    async def start_frame_capture(kind: str, max_frames: int) -> str:
+        """
+        Capture the incoming frames to a new trace file in the `traces` directory of Local AppData.
+
+        Args:
+            kind (str): `ENCODED` or `DECODED`, see `mimic.Media.FrameTrace`
+            max_frames (int): Frames after which the capture stops by itself
+
+        Raises:
+            RuntimeError: A capture is already running
+            ValueError: Unknown kind
+
+        Returns:
+            str: Trace file
+        """
+        nonlocal frame_trace
+
+        if frame_trace is not None and frame_trace.running:
+            raise RuntimeError("Frame capture is already running.")
+
+        if kind not in TRACE_KINDS:
+            raise ValueError(f"Unknown capture kind `{kind}`, expected one of {list(TRACE_KINDS)}.")
+
+        # A capture that stopped by itself still has to close its file
+        if frame_trace is not None:
+            await stop_frame_capture()
+
+        # Everything the frame transform depends on, so that a replay converts
+        # frames exactly as they were converted during the capture
+        output = camera_output
+        metadata = client_metadata
+        header = {
+            "session": session_id,
+            "profile": output.profile.name if output is not None else configured_camera_profile().name,
+            "scale_mode": config.get("scale_mode"),
+            "mirror_user_facing": config.get("mirror_user_facing"),
+            "scaler_preset": output.transform.scaler_preset.preset if output is not None else None,
+            "metadata": {
+                "width": metadata.width,
+                "height": metadata.height,
+                "framerate": metadata.framerate,
+                "orientation": metadata.orientation,
+                "facingMode": metadata.facing_mode,
+            } if metadata is not None else None,
+        }
+
+        mkdir_local_app_data("traces")
+        file_name = f"webserver-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{kind}.{TRACE_EXTENSION}"
+        frame_trace = FrameTraceWriter(resolve_local_app_data("traces", file_name), kind, header, max_frames)
+        frame_trace.start()
+        log(f"Capturing up to {max_frames} {kind} frame(s) to {frame_trace.path}")
+
+        # Encoded frames can only be decoded from a keyframe on, the relay
+        # holds the receiver of the session and rate limits the request
+        if kind == ENCODED:
+            relay.request_keyframe()
+
+        return frame_trace.path
+
+    async def stop_frame_capture() -> dict:
+        """
+        Stop capturing frames and close the trace file.
+
+        Raises:
+            RuntimeError: No capture was started
+
+        Returns:
+            dict: Trace file, frames and bytes written and frames dropped
+        """
+        nonlocal frame_trace
+
+        if frame_trace is None:
+            raise RuntimeError("Frame capture is not running.")
+
+        stopped_trace, frame_trace = frame_trace, None
+        await asyncio.get_event_loop().run_in_executor(None, stopped_trace.stop)
+
+        stats = stopped_trace.stats()
+        log(f"Captured {stats['frames']} frame(s) to {stats['file']}, dropped {stats['dropped']} frame(s)")
+
+        return stats
+
+    def start_stall_watchdog(receiver: RTCRtpReceiver) -> None:
+        """
+        Watch the video track of a receiver for stalls and request keyframes to recover from them.
+
+        Args:
+            receiver (RTCRtpReceiver): Receiver of the video track of the current session
+        """
+        nonlocal stall_watchdog
+
+        fir_sequence = itertools.count()
+
+        def request_recovery_keyframe(full_intra: bool) -> bool:
+            # Only the decoded layer needs a keyframe when the client sends
+            # simulcast, the other layers are dropped before the decoder
+            active_ssrc = simulcast.active_ssrc if simulcast is not None else None
+            ssrcs = [active_ssrc] if active_ssrc is not None else None
+
+            if full_intra:
+                return request_full_intra(receiver, next(fir_sequence), ssrcs)
+            return request_keyframe(receiver, ssrcs)
+
+        if stall_watchdog is not None:
+            stall_watchdog.stop()
+
+        stall_watchdog = StallWatchdog(request_recovery_keyframe,
+                                       stall_timeout=float(config.get("stall_timeout_ms")) / 1000,
+                                       request_interval=float(config.get("keyframe_request_interval_ms")) / 1000,
+                                       skip_to_keyframe=lambda: skip_to_keyframe(receiver))
+        stall_watchdog.on_recover = lambda freeze, recovery: log(
+            f"Video recovered after a {freeze * 1000:.0f}ms freeze"
+            + (f", {recovery * 1000:.0f}ms after the first keyframe request" if recovery is not None else ""),
+            logging.DEBUG, session=session_id, freeze_ms=round(freeze * 1000, 1),
+            recover_ms=round(recovery * 1000, 1) if recovery is not None else None)
+
+        tap_encoded_frames(receiver, stall_watchdog.on_encoded_frame)
+        stall_watchdog.start(asyncio.get_event_loop())
+
+    def capture_encoded_frame(mime_type: str, data: bytes, timestamp: int) -> None:
+        """Hand an encoded frame of the incoming track to the running capture, if any."""
+        if frame_trace is not None:
+            frame_trace.submit_encoded(mime_type, data, timestamp)
+
+    async def start_capture(request: Request) -> StreamResponse:
+        try:
+            max_frames = int(request.query.get("frames", _DEFAULT_CAPTURE_FRAMES))
+            trace_file = await start_frame_capture(request.query.get("kind", DECODED), max_frames)
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text=f"Capturing frames to {trace_file}")
+
+    async def stop_capture(request: Request) -> StreamResponse:
+        try:
+            stats = await stop_frame_capture()
+        except RuntimeError as e:
+            return web.Response(status=409, text=str(e))
+
+        return web.Response(text=f"Wrote {stats['frames']} frame(s) to {stats['file']}")
+
+    async def dump_trace(request: Request) -> StreamResponse:
+        trace_file = resolve_profile_file("trace.json")
+        span_count = await asyncio.get_event_loop().run_in_executor(None, _TRACER.dump_chrome_trace, trace_file)
+        log(f"Trace written to {trace_file}")
+
+        return web.Response(text=f"Wrote {span_count} span(s) to {trace_file}")
+
+    def collect_stats() -> dict:
+        """
+        Collect the latency measurements and counters of the server.
+
+        Returns:
+            dict: JSON serializable stats
+        """
+        return {
+            "latency": {
+                "round_trip_time_ms": round_trip_times.summary(),
+                "clock_offset_ms": clock_offset.offset,
+                "frame_delay_ms": frame_delays.summary(),
+                "glass_to_glass_ms": glass_to_glass_delays.summary() if is_calibrating else None,
+            },
+            "frame_pool": camera_output.transform.stats() if camera_output is not None else None,
+            "scaler": camera_output.transform.scaler_preset.stats() if camera_output is not None else None,
+            "recording": recorder.stats() if recorder is not None else None,
+            "capture": frame_trace.stats() if frame_trace is not None else None,
+            "snapshot": snapshots.stats(),
+            "preview": preview.stats(),
+            "thumbnail": thumbnail_writer.stats() if thumbnail_writer is not None else None,
+            "relay": relay.stats(),
+            "simulcast": simulcast.stats() if simulcast is not None else None,
+            "stall": stall_watchdog.stats() if stall_watchdog is not None else None,
+            "latency_profile": {
+                "name": latency_profile.name,
+                "jitter_buffer": {
+                    "capacity": latency_profile.jitter_buffer_packets,
+                    "packets": jitter_buffer_packets.summary(),
+                    "span_ms": jitter_buffer_spans.summary(),
+                },
+                "stale_frames": stale_frames.stats(),
+            },
+            "heartbeat": heartbeats.stats(),
+            "supervisor": supervisor_stats or None,
+            "startup": startup.stats(),
+            "session": {
+                "id": session_id,
+                "client": client_stats.as_dict() if client_stats is not None else None,
+                "timeline": list(session_timeline),
+            },
+            "history": history.stats(),
+            "memory": memory.stats(),
+            "event_loop": {
+                "implementation": type(asyncio.get_event_loop()).__module__.split(".")[0],
+                **loop_monitor.stats(),
+            },
+        }
+
+    async def stats(request: Request) -> StreamResponse:
+        return web.json_response(collect_stats())
+
+    async def health(request: Request) -> StreamResponse:
+        """Answer as soon as the server accepts requests, clients poll it to reconnect after a restart."""
+        return web.json_response({"status": "ok", "ready": startup.ready})
+
+    async def startup_state(request: Request) -> StreamResponse:
+        return web.json_response(startup.stats())
+
+    async def startup_trace(request: Request) -> StreamResponse:
+        return web.json_response(startup.chrome_trace())
+
+    def set_config(params: dict) -> dict:
+        """
+        Persist a configuration value, requested through the channel.
+
+        Args:
+            params (dict): `{"key": <key>, "value": <value>}`
+
+        Raises:
+            KeyError: Unknown configuration key
+
+        Returns:
+            dict: Every configuration value
+        """
+        config.set(params["key"], params["value"])
+        config.save()
+        log(f"Configuration `{params['key']}` set to {params['value']!r}")
+
+        return config.as_dict()
+
+    async def stop_profiler_request(params: None) -> dict:
+        sample_count, profile_file = await stop_profiler()
+        return {"samples": sample_count, "file": profile_file}
+
+    async def preview_stream(request: Request) -> StreamResponse:
+        response = web.StreamResponse(headers={
+            "Content-Type": f"multipart/x-mixed-replace; boundary={PREVIEW_BOUNDARY}",
+            "Cache-Control": "no-store",
+        })
+        await response.prepare(request)
+
+        queue = preview.subscribe()
+        log(f"Preview viewer connected, {preview.viewer_count} viewer(s)", logging.DEBUG)
+
+        try:
+            while True:
+                image = await queue.get()
+                if image is None:
+                    break
+
+                await response.write(
+                    f"--{PREVIEW_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(image)}\r\n\r\n".encode()
+                    + image + b"\r\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            preview.unsubscribe(queue)
+            log(f"Preview viewer disconnected, {preview.viewer_count} viewer(s)", logging.DEBUG)
+
+        return response
+
+    async def snapshot(request: Request) -> StreamResponse:
+        format = request.query.get("format", JPEG).lower()
+        if format == "jpg":
+            format = JPEG
+
+        if format not in SNAPSHOT_FORMATS:
+            return web.Response(status=400, text=f"Unknown snapshot format, expected one of {list(SNAPSHOT_FORMATS)}.")
+
+        output = camera_output
+        if output is None:
+            return web.Response(status=503, text="Camera is not initialized.")
+
+        image = output.latest_image
+        if is_cam_idle or image is None:
+            key, image = (output, _PLACEHOLDER_FRAME), output.placeholder
+        else:
+            key = (output, output.frame_count)
+
+        data = await snapshots.get(key, image, format)
+        return web.Response(body=data, content_type=SNAPSHOT_FORMATS[format], headers={"Cache-Control": "no-store"})
+
+    async def get_camera_profile(request: Request) -> StreamResponse:
+        return web.json_response({
+            "active": camera_output.profile._asdict() if camera_output is not None else None,
+            "pending": pending_profile._asdict() if pending_profile is not None else None,
+            "error": camera_error,
+            "available": [profile._asdict() for profile in CAMERA_PROFILES.values()],
+        })
+
+    async def set_camera_profile(request: Request) -> StreamResponse:
+        nonlocal pending_profile
+
+        try:
+            params = await request.json()
+        except JSONDecodeError:
+            return web.Response(status=400, text="Request body must be JSON.")
+
+        profile = CAMERA_PROFILES.get(params.get("profile"))
+        if profile is None:
+            return web.Response(status=400, text=f"Unknown camera profile, expected one of {list(CAMERA_PROFILES)}.")
+
+        if pending_profile is not None:
+            return web.Response(status=409, text=f"Already switching to camera profile {pending_profile.name}.")
+
+        if camera_output is None:
+            return web.Response(status=503, text="Camera is not ready yet.")
+
+        if camera_output is not None and camera_output.profile == profile:
+            return web.Response(text=f"Camera profile is already {profile.name}")
+
+        pending_profile = profile
+        asyncio.ensure_future(switch_camera_profile(profile))
+
+        return web.Response(status=202, text=f"Switching camera profile to {profile.name}")
+
+    async def get_scaler_preset(request: Request) -> StreamResponse:
+        if camera_output is None:
+            return web.Response(status=503, text="Camera is not initialized.")
+
+        return web.json_response({
+            "profile": camera_output.profile.name,
+            **camera_output.transform.scaler_preset.stats(),
+            "available": list(SCALER_PRESETS),
+        })
+
+    async def set_scaler_preset(request: Request) -> StreamResponse:
+        try:
+            params = await request.json()
+        except JSONDecodeError:
+            return web.Response(status=400, text="Request body must be JSON.")
+
+        output = camera_output
+        if output is None:
+            return web.Response(status=503, text="Camera is not initialized.")
+
+        preset = params.get("preset")
+        if preset not in SCALER_PRESETS:
+            return web.Response(status=400, text=f"Unknown scaler preset, expected one of {list(SCALER_PRESETS)}.")
+
+        output.transform.scaler_preset.preset = preset
+
+        presets = {**config.get("scaler_preset_per_profile"), output.profile.name: preset}
+        config.set("scaler_preset_per_profile", presets)
+        await asyncio.get_event_loop().run_in_executor(None, config.save)
+        log(f"Scaler preset of {output.profile.name} set to {preset}")
+
+        return web.Response(text=f"Scaler preset of {output.profile.name} set to {preset}")
+
+    async def constraints(request: Request) -> StreamResponse:
+        profile = camera_output.profile if camera_output is not None else configured_camera_profile()
+        return web.json_response(client_capture_constraints(profile))
+
     async def offer(request: Request) -> StreamResponse:
         params = await request.json()
 
@@ -198,36 +1468,90 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
 
         @pc.on("datachannel")
         def on_datachannel(channel: RTCDataChannel):
+            if channel.label == 'metadata':
+                metadata_channels.add(channel)
+
+                @channel.on("close")
+                def on_close():
+                    metadata_channels.discard(channel)
+
+            def send_ping():
+                try:
+                    channel.send(f"{monotonic_timestamp():.3f}")
+                except InvalidStateError:
+                    # Theres a chance the server will try to send a
+                    # message after the connection is closed,
+                    # raising an `InvalidStateError`. We should just
+                    # ignore those.
+                    pass
+
             @channel.on("message")
             async def on_message(message):
                 if isinstance(message, str):
+                    if channel.label == 'metadata':
+                        try:
+                            metadata = MetaData(message)
+                        except (KeyError, ValueError) as error:
+                            log(f"Invalid metadata from client: {error}", logging.WARN)
+                            return
+
+                        nonlocal client_metadata
+                        client_metadata = metadata
+                        if camera_output is not None:
+                            camera_output.update_metadata(metadata)
+
+                        log(f"Client camera is {metadata.width}x{metadata.height}@{metadata.framerate}, "
+                            f"orientation {metadata.orientation}, facing {metadata.facing_mode}", logging.DEBUG)
+                        return
+
+                    if channel.label == 'stats':
+                        try:
+                            stats = ClientStats(message)
+                        except ValueError as error:
+                            log(f"Invalid stats from client: {error}", logging.WARN)
+                            return
+
+                        nonlocal client_stats
+                        client_stats = stats
+                        return
+
                     if channel.label == 'latency':
+                        received_at = monotonic_timestamp()
+
+                        if message == 'calibrate':
+                            nonlocal is_calibrating
+                            is_calibrating = True
+                            log("Client is streaming the calibration pattern")
+                            return
+
                         # If we recieve a -1, then it is the first message
-                        # and the rolling timout should be started
+                        # and the heartbeat should be started
                         if message == '-1':
-                            heartbeat_timeout.start()
+                            reset_latency_measurements()
+                            heartbeats.add(pc, send_ping, lambda: close_all_connections("timeout"))
+                            log(f"Session {session_id} started", session=session_id)
 
                             global is_cam_idle
                             is_cam_idle = False
                         else:
-                            round_trip_time = latency(int(message))
-                            log(f"Latency {round_trip_time}ms", logging.DEBUG)
-                            heartbeat_timeout.rollback()
-
-                        await asyncio.sleep(_PING_INTERVAL)
-                        try:
-                            channel.send(str(timestamp()))
-                        except InvalidStateError:
-                            # Theres a chance the server will try to send a
-                            # message after the connection is closed,
-                            # raising an `InvalidStateError`. We should just
-                            # ignore those.
-                            pass
+                            timestamps = [float(value) for value in message.split(',')]
+                            if len(timestamps) == 3:
+                                round_trip_time = clock_offset.add_sample(*timestamps, received_at)
+                            else:
+                                # Clients that only echo the ping cannot be
+                                # used to estimate the clock offset
+                                round_trip_time = received_at - timestamps[0]
+
+                            round_trip_times.add(round_trip_time)
+                            report_latency(round_trip_time)
+                            heartbeats.beat(pc)
 
         @pc.on("connectionstatechange")
         async def on_connectionstatechange():
-            log(f"Connection state is {pc.connectionState}")
+            log(f"Connection state is {pc.connectionState}", session=session_id)
             if pc.connectionState == "failed" or pc.connectionState == "closed":
+                heartbeats.remove(pc)
+                await end_session(pc, pc.connectionState)
                 await pc.close()
                 pcs.discard(pc)
 
@@ -239,13 +1563,43 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
                 track.stop()
                 return
 
+            # Encoded frames are copied to the recorder and viewers as they
+            # are handed to the decoder, the frames painted to the camera are
+            # unaffected
+            await stop_recording()
+            start_recording(pc, track)
+
+            receiver = next((receiver for receiver in pc.getReceivers() if receiver.track is track), None)
+            if receiver is not None and not relay.attach(receiver):
+                log("Relaying to viewers is not supported by this version of aiortc", logging.WARN)
+
+            nonlocal video_receiver
+            video_receiver = receiver
+
+            if receiver is not None:
+                if not resize_jitter_buffer(receiver, latency_profile.jitter_buffer_packets):
+                    log("Resizing the jitter buffer is not supported by this version of aiortc", logging.WARN)
+
+                tap_encoded_frames(receiver, capture_encoded_frame)
+                start_stall_watchdog(receiver)
+
             @track.on("ended")
             async def on_ended():
-                log(f"Track {track.kind} ended")
+                log(f"Track {track.kind} ended", session=session_id)
+
+                if stall_watchdog is not None:
+                    stall_watchdog.stop()
+
+                nonlocal video_receiver
+                if video_receiver is receiver:
+                    video_receiver = None
 
                 global is_cam_idle
                 is_cam_idle = True
 
+                relay.detach()
+                await stop_recording()
+
             while True:
                 if track.readyState != "live":
                     break
@@ -259,83 +1613,300 @@ async def start_web_server(stop_event: Event, pipe: Connection) -> None:
         # handle offer
         await pc.setRemoteDescription(offer)
 
+        # Layers are filtered in front of the jitter buffer of the video
+        # receiver, simulcast is only accepted if the filter is installed
+        # before the first packet arrives
+        nonlocal simulcast
+        simulcast = None
+        layers = offered_layers(offer.sdp) if config.get("simulcast") else None
+        if layers is not None:
+            selector = SimulcastSelector(layers)
+            receiver = next((transceiver.receiver for transceiver in pc.getTransceivers()
+                             if transceiver.kind == "video"), None)
+            if receiver is not None and selector.attach(receiver):
+                selector.on_switch = lambda rid, size: log(
+                    f"Decoding simulcast layer {rid}" + (f" ({size[0]}x{size[1]})" if size is not None else ""),
+                    logging.DEBUG, session=session_id, layer=rid)
+                simulcast = selector
+            else:
+                log("Simulcast is not supported by this version of aiortc", logging.WARN)
+
         # send answer
         answer = await pc.createAnswer()
         await pc.setLocalDescription(answer)
 
+        sdp = pc.localDescription.sdp
+        if simulcast is not None:
+            sdp = accept_simulcast(sdp, simulcast.offer)
+
         return web.Response(
             content_type="application/json",
             text=json.dumps(
-                {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+                {"sdp": sdp, "type": pc.localDescription.type}
             ),
         )
 
-    # Start HTTP server
-    ssl_context = ssl.SSLContext()
+    async def viewer_offer(request: Request) -> StreamResponse:
+        params = await request.json()
 
-    mkdir_local_app_data('certs')
-    cert_file = resolve_local_app_data('certs', 'selfsigned.cert')
-    key_file = resolve_local_app_data('certs', 'selfsigned.pem')
+        if params.get('sdp') is None or params.get('type') is None:
+            return web.Response(status=400, text="Required `sdp` and `type` are missing from request body.")
 
-    if not ssl_certs_generated(cert_file, key_file):
-        generate_ssl_certs(cert_file, key_file)
+        if not supports_encoded_tracks():
+            return web.Response(status=503, text="Relaying to viewers requires aiortc 1.4 or newer.")
 
-    ssl_context.load_cert_chain(cert_file, key_file)
+        try:
+            track = relay.subscribe()
+        except RuntimeError as error:
+            return web.Response(status=409 if not relay.is_live else 503, text=str(error))
 
-    app = web.Application(middlewares=[logging_middleware])
-    app.router.add_get("/", index)
-    app.router.add_get(r'/{filename:.+}', static)
-    app.router.add_post("/offer", offer)
-    app.router.add_get('/close', close)
+        pc = RTCPeerConnection()
+        viewer_pcs.add(pc)
 
-    runner = web.AppRunner(app, handle_signals=True)
-    await runner.setup()
+        log(f"Viewer connected from {request.remote}, {relay.viewer_count} viewer(s)")
 
-    site = web.TCPSite(runner, host=resolve_host(),
-                       port=8080, ssl_context=ssl_context)
-    await site.start()
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            if pc.connectionState == "failed" or pc.connectionState == "closed":
+                track.stop()
+                await pc.close()
+
+                if pc in viewer_pcs:
+                    viewer_pcs.discard(pc)
+                    log(f"Viewer disconnected, {relay.viewer_count} viewer(s)")
+
+        @track.on("ended")
+        async def on_ended():
+            await pc.close()
 
-    log(f"Server listening at https://{resolve_host()}:8080")
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=params["sdp"], type=params["type"]))
+        pc.addTrack(track)
 
-    # Acquire virtual camera
-    camera_init_sucess = False
-    for _ in range(_MAX_CAMERA_RETRY_COUNT):
-        global cam
+        # Frames are forwarded as they were encoded by the client, so viewers
+        # must receive the same codec
+        codecs = [codec for codec in RTCRtpSender.getCapabilities("video").codecs
+                  if codec.mimeType.lower() in (str(relay.mime_type).lower(), "video/rtx")]
+        for transceiver in pc.getTransceivers():
+            if transceiver.kind == "video":
+                transceiver.setCodecPreferences(codecs)
+
+        answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
+
+        return web.json_response({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type})
+
+    def load_ssl_context() -> ssl.SSLContext:
+        """
+        Load the self-signed certificate, generating it first if it does not exist.
+
+        @NOTE Blocks, is run on a worker thread.
+
+        Returns:
+            ssl.SSLContext: Server context with the certificate loaded
+        """
+        ssl_context = ssl.SSLContext()
+
+        mkdir_local_app_data('certs')
+        cert_file = resolve_local_app_data('certs', 'selfsigned.cert')
+        key_file = resolve_local_app_data('certs', 'selfsigned.pem')
+
+        if not ssl_certs_generated(cert_file, key_file):
+            generate_ssl_certs(cert_file, key_file)
+
+        ssl_context.load_cert_chain(cert_file, key_file)
+        return ssl_context
+
+    def warm_assets(profile: CameraProfile) -> None:
+        """
+        Load the public files and the placeholder frame of a profile into memory.
+
+        @NOTE Blocks, is run on a worker thread.
+
+        Args:
+            profile (CameraProfile): Profile the camera is opened with
+        """
+        placeholder_frame(profile.width, profile.height)
+
+        for file_name in os.listdir(ROOT):
+            path = os.path.join(ROOT, file_name)
+            if os.path.isfile(path):
+                read_public_file(path)
+
+    async def bind(ssl_context: "asyncio.Task[ssl.SSLContext]") -> None:
+        """
+        Start accepting connections once the certificate is loaded.
+
+        Args:
+            ssl_context (asyncio.Task[ssl.SSLContext]): Task of the certificate step
+        """
+        site = web.TCPSite(runner, host=host if host is not None else resolve_host(),
+                           port=port, ssl_context=await ssl_context)
+        await site.start()
+
+        log(f"Server listening at https://{host if host not in (None, '0.0.0.0', '::') else resolve_host()}:{port}")
+
+    async def acquire_camera_output(profile: CameraProfile) -> None:
+        """
+        Acquire the virtual camera.
+
+        Blocking calls are made on a worker thread so the server keeps
+        responding while retrying.
+
+        Args:
+            profile (CameraProfile): Profile to open the camera with
+        """
+        global camera_output
+        camera_output = await asyncio.get_event_loop().run_in_executor(
+            None, open_camera_output, profile, _MAX_CAMERA_RETRY_COUNT)
+        log(f"Camera profile is {profile.name} ({profile.width}x{profile.height}@{profile.fps})")
+
+    async def report_startup() -> None:
+        """Log how long each startup step took once every step finished, and stop the server if one failed."""
         try:
-            cam = pyvirtualcam.Camera(_CAMERA_WIDTH, _CAMERA_HEIGHT, _CAMERA_FPS, _CAMERA_DELAY)
-            camera_init_sucess = True
-            break
+            await startup.wait()
+        except Exception:
+            global _fatal_error
+            _fatal_error = f"Startup failed, {startup.failed}"
+            log(_fatal_error, logging.ERROR)
+            return
+
+        state = startup.stats()
+        log(f"Ready in {state['ready_ms']:.0f}ms ("
+            + ", ".join(f"{name} {step['duration_ms']:.0f}ms" for name, step in state["steps"].items()) + ")",
+            logging.DEBUG, **{f"{name}_ms": step["duration_ms"] for name, step in state["steps"].items()})
 
-        except RuntimeError as error:
-            if error.args[0] != 'error starting virtual camera output':
-                raise error
+    app = web.Application(middlewares=[logging_middleware])
+    app.router.add_get("/", index)
+    app.router.add_post("/offer", offer)
+    app.router.add_post("/viewer/offer", viewer_offer)
+    app.router.add_get('/close', close)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/health', health)
+    app.router.add_get('/startup', startup_state)
+    app.router.add_get('/snapshot', snapshot)
+    app.router.add_get('/preview', preview_stream)
+    app.router.add_get('/camera/profile', get_camera_profile)
+    app.router.add_post('/camera/profile', set_camera_profile)
+    app.router.add_get('/camera/scaler', get_scaler_preset)
+    app.router.add_post('/camera/scaler', set_scaler_preset)
+    app.router.add_get('/constraints', constraints)
+    app.router.add_get('/debug/profile/start', start_profile)
+    app.router.add_get('/debug/profile/stop', stop_profile)
+    app.router.add_get('/debug/trace', dump_trace)
+    app.router.add_get('/debug/startup-trace', startup_trace)
+    app.router.add_get('/debug/capture/start', start_capture)
+    app.router.add_get('/debug/capture/stop', stop_capture)
+    app.router.add_get('/debug/memory', memory_state)
+    app.router.add_get('/debug/memory/trace/start', start_memory_trace)
+    app.router.add_get('/debug/memory/snapshot', memory_snapshot)
+    app.router.add_get('/debug/memory/trace/stop', stop_memory_trace)
+
+    # @NOTE Must be registered last, routes are matched in the order they are
+    # added and this would otherwise shadow every other GET route
+    app.router.add_get(r'/{filename:.+}', static)
 
-            log("Failed to acquire camera, retrying.", logging.WARN)
-            await asyncio.sleep(_CAMERA_INIT_RETRY_INTERVAL)
+    runner = web.AppRunner(app, handle_signals=handle_signals)
+    await runner.setup()
 
-    if not camera_init_sucess:
-        raise RuntimeError("Failed to acquire camera.", logging.ERROR)
+    if isinstance(pipe, Channel):
+        pipe.on_request("stats", lambda params: collect_stats())
+        pipe.on_request("config/get", lambda params: config.as_dict())
+        pipe.on_request("config/set", set_config)
+        pipe.on_request("profile/start", lambda params: start_profiler())
+        pipe.on_request("profile/stop", stop_profiler_request)
+        pipe.on_request("capture/start", lambda params: start_frame_capture(
+            (params or {}).get("kind", DECODED), int((params or {}).get("frames", _DEFAULT_CAPTURE_FRAMES))))
+        pipe.on_request("capture/stop", lambda params: stop_frame_capture())
+        pipe.on_request("memory/objects", lambda params: {**memory.stats(), "objects": live_objects()})
+        pipe.on_request("memory/trace/start", lambda params: start_memory_tracing(
+            int((params or {}).get("frames", _DEFAULT_MEMORY_TRACE_FRAMES))))
+        pipe.on_request("memory/snapshot", lambda params: take_memory_snapshot())
+        pipe.on_request("memory/trace/stop", lambda params: stop_memory_tracing())
+        pipe.on_request("health", lambda params: startup.ready)
+        pipe.on_request("supervisor/stats", lambda params: supervisor_stats.update(params))
+
+    loop_monitor.on_blocked = log_blocked_callback
+    loop_monitor.start(asyncio.get_event_loop())
+    memory.start(asyncio.get_event_loop())
+    if config.get("memory_tracing"):
+        start_memory_tracing(_DEFAULT_MEMORY_TRACE_FRAMES)
+
+    # Scaled placeholder frames are reused by the next server process after a
+    # restart
+    mkdir_local_app_data('cache')
+    persist_placeholder_frames(str(resolve_local_app_data('cache')))
+
+    # Startup steps run concurrently, the main loop starts right away so
+    # requests are answered while the camera is acquired. Warming up the
+    # assets is not required, requests read what was not loaded yet
+    if thumbnail is not None:
+        try:
+            thumbnail_writer = ThumbnailWriter(ThumbnailBuffer.attach(thumbnail),
+                                               fps=float(config.get("thumbnail_fps")))
+        except OSError as error:
+            log(f"Could not attach to the thumbnail of the GUI: {error}", logging.WARN)
+
+    profile = configured_camera_profile()
+    ssl_context = startup.run_in_thread("certificates", load_ssl_context)
+    startup.run("bind", bind(ssl_context))
+    startup.run("camera", acquire_camera_output(profile))
+    startup.run_in_thread("assets", warm_assets, profile, required=False)
+    startup_report = asyncio.ensure_future(report_startup())
 
     # Main loop
-    while stop_event is None or not stop_event.is_set():
-        if is_cam_idle:
+    while (stop_event is None or not stop_event.is_set()) and _fatal_error is None:
+        if is_cam_idle and camera_output is not None:
             show_static_frame()
 
+        # Answer requests and send the messages of this iteration as a single
+        # batch
+        try:
+            if isinstance(pipe, Channel):
+                while pipe.poll():
+                    pipe.receive()
+
+            pipe.flush()
+        except (BrokenPipeError, EOFError):
+            break
+
         await asyncio.sleep(SLEEP_INTERVAL)
 
     # Clean up and close server
-    if cam is not None:
-        cam.close()
-
-    await close_all_connections()
-    await site.stop()
+    if _PROFILER.running:
+        _PROFILER.stop()
+
+    startup.cancel()
+    startup_report.cancel()
+    if camera_restore is not None:
+        camera_restore.cancel()
+    loop_monitor.stop()
+    memory.stop()
+    if stall_watchdog is not None:
+        stall_watchdog.stop()
+    heartbeats.close()
+
+    if camera_output is not None:
+        camera_output.close()
+
+    await stop_recording()
+    if frame_trace is not None:
+        await stop_frame_capture()
+    await close_all_connections("shutdown")
+    await asyncio.get_event_loop().run_in_executor(None, history.close)
+
+    relay.detach()
+    for pc in viewer_pcs.copy():
+        await pc.close()
+    preview.close()
+    if thumbnail_writer is not None:
+        thumbnail_writer.close()
     await runner.shutdown()
     await runner.cleanup()
     await app.shutdown()
     await app.cleanup()
 
 
-def webserver_thread_runner(stop_event: Event, pipe: Connection):
+def webserver_thread_runner(stop_event: Event, connection: Connection, thumbnail: Optional[str] = None):
     """
     Initialize asyncio event loop and start web server.
 
@@ -346,10 +1917,34 @@ def webserver_thread_runner(stop_event: Event, pipe: Connection):
 
     Args:
         stop_event (Event): A flag that, when true, will graceully shut down the server
-        pipe (Connection): Pipe connection to receive information from server
+        connection (Connection): End of a pipe, the other end is wrapped in a `Channel` to receive
+                                 information from the server and send requests to it
+        thumbnail (Optional[str], optional): Name of the shared memory of the GUI thumbnail. Defaults to None.
     """
-    loop = asyncio.new_event_loop()
+    pipe = Channel(connection)
+    config = Config(resolve_local_app_data("config.json"))
+
+    try:
+        loop, implementation = new_event_loop(config.get("event_loop"))
+    except (ValueError, RuntimeError) as e:
+        pipe.send(LogMessage(f"{e} Falling back to the default event loop.", logging.WARN))
+        loop, implementation = new_event_loop(AUTO)
+
+    pipe.send(LogMessage(f"Using {implementation} event loop", logging.DEBUG))
+
+    def handle_exception(loop: asyncio.AbstractEventLoop, context: dict):
+        # Only this process is stopped, the supervisor restarts it
+        global _fatal_error
+        _fatal_error = f"{context.get('message')} {context.get('exception', '')}"
+        pipe.send(LogMessage(f"Unhandled exception in event loop: {_fatal_error}", logging.ERROR))
+
     asyncio.set_event_loop(loop)
-    loop.set_exception_handler(lambda loop, context: stop_event.set())
+    loop.set_exception_handler(handle_exception)
+
+    try:
+        loop.run_until_complete(start_web_server(stop_event, pipe, thumbnail=thumbnail))
+    finally:
+        pipe.close()
 
-    loop.run_until_complete(start_web_server(stop_event, pipe))
+    if _fatal_error is not None:
+        sys.exit(1)
@@ -5,8 +5,36 @@ const REFRESH_TIMEOUT = 1000
 // dead
 const HEARTBEAT_TIMEOUT = 5000
 
-// Default video constraints
-CONSTRAINTS = {
+// Milliseconds between attempts to reach the server after the connection was
+// lost, e.g. while the server is restarted
+const RECONNECT_INTERVAL = 1000
+
+// Milliseconds between samples of the sender statistics reported to the server
+const STATS_INTERVAL = 1000
+
+// Stream a generated timestamp pattern instead of the camera to measure the
+// glass-to-glass delay, enabled by opening the page with `?calibrate`
+const CALIBRATE = new URLSearchParams(window.location.search).has('calibrate')
+
+// Layout of the calibration pattern, must be kept in sync with
+// `mimic/Utils/Calibration.py`
+const CALIBRATION_WIDTH = 640
+const CALIBRATION_HEIGHT = 480
+const CALIBRATION_BAND_HEIGHT = 40
+const CALIBRATION_BITS = 32
+
+// Simulcast layers offered to the server, which decodes only one of them, see
+// `mimic/Media/Simulcast.py`. The full size comes first, a server that does not
+// accept simulcast receives only the first layer
+const SIMULCAST_ENCODINGS = [
+    { rid: 'f', scaleResolutionDownBy: 1 },
+    { rid: 'h', scaleResolutionDownBy: 1.5 },
+    { rid: 'q', scaleResolutionDownBy: 3 }
+]
+
+// Default video constraints, replaced by the constraints of the server's camera
+// profile
+let CONSTRAINTS = {
     audio: false,
     video: {
         width: 640,
@@ -34,9 +62,67 @@ function enableSafariConsoleLog() {
  * @returns MediaStream
  */
 async function getMedia(constraints) {
+    if (CALIBRATE) {
+        const frameRate = constraints.video.frameRate
+        return getCalibrationMedia(
+            typeof frameRate === 'object' ? frameRate.ideal : frameRate
+        )
+    }
+
     return await navigator.mediaDevices.getUserMedia(constraints)
 }
 
+/**
+ * Gets a media stream of a canvas that continuously draws the current
+ * `performance.now()` as a pattern of black and white blocks
+ * @param {number} frameRate Frames per second to capture the canvas at
+ * @returns MediaStream
+ */
+function getCalibrationMedia(frameRate) {
+    const canvas = document.createElement('canvas')
+    canvas.width = CALIBRATION_WIDTH
+    canvas.height = CALIBRATION_HEIGHT
+
+    const context = canvas.getContext('2d')
+    const blockWidth = CALIBRATION_WIDTH / CALIBRATION_BITS
+
+    function draw() {
+        const now = Math.round(performance.now()) >>> 0
+
+        context.fillStyle = 'gray'
+        context.fillRect(0, 0, CALIBRATION_WIDTH, CALIBRATION_HEIGHT)
+
+        for (let bit = 0; bit < CALIBRATION_BITS; bit++) {
+            const isSet = (now >>> (CALIBRATION_BITS - 1 - bit)) & 1
+            context.fillStyle = isSet ? 'white' : 'black'
+            context.fillRect(bit * blockWidth, 0, blockWidth, CALIBRATION_BAND_HEIGHT)
+        }
+
+        requestAnimationFrame(draw)
+    }
+    draw()
+
+    return canvas.captureStream(frameRate)
+}
+
+/**
+ * Fetch the capture constraints of the server's camera profile, falling back to
+ * the default constraints
+ * @returns MediaStreamConstraints
+ */
+async function getConstraints() {
+    try {
+        const response = await fetch('/constraints')
+        if (response.ok) {
+            return await response.json()
+        }
+    } catch (error) {
+        console.warn('Could not fetch capture constraints', error)
+    }
+
+    return CONSTRAINTS
+}
+
 /**
  * Send a debug message to the console
  * @param {string} label Part of application that is making the call
@@ -191,6 +277,11 @@ class LatencyDataChannel {
         // the server. The server expects that the first message is a -1 and
         // will start the latency polling loop after it is received.
         this.dataChannel.send('-1')
+
+        if (CALIBRATE) {
+            debugLog('Latency Data Channel', '> calibrate')
+            this.dataChannel.send('calibrate')
+        }
     }
 
     onClose() {
@@ -202,9 +293,15 @@ class LatencyDataChannel {
     }
 
     onMessage(event) {
+        const receivedAt = performance.now()
         debugLog('Latency Data Channel', '> ' + event.data)
-        this.dataChannel.send(event.data)
-        debugLog('Latency Data Channel', '< ' + event.data)
+
+        // Reply with the server's timestamp and when the ping was received and
+        // answered on the client's clock so the server can estimate the offset
+        // between the clocks
+        const reply = `${event.data},${receivedAt.toFixed(3)},${performance.now().toFixed(3)}`
+        this.dataChannel.send(reply)
+        debugLog('Latency Data Channel', '< ' + reply)
 
         // If a message was received in the last `HEARTBEAT_TIMEOUT`
         // milliseconds, reset the timeout
@@ -226,6 +323,235 @@ class LatencyDataChannel {
     }
 }
 
+/**
+ * Data channel that reports the orientation of the camera to the server
+ */
+class MetaDataChannel {
+    /**
+     * Establish metadata data channel over RTC peer connection
+     * @param {RTCPeerConnection} peerConnection Instance of `RTCPeerConnection` that has already been negotiated
+     */
+    constructor(peerConnection) {
+        this.dataChannel = peerConnection.createDataChannel('metadata', {
+            ordered: true
+        })
+
+        this.dataChannel.onopen = this.onOpen.bind(this)
+        this.dataChannel.onmessage = this.onMessage.bind(this)
+
+        this.track = null
+    }
+
+    onMessage(event) {
+        debugLog('Metadata Data Channel', '> ' + event.data)
+        const message = JSON.parse(event.data)
+
+        // The server's camera profile changed, capture at the new size
+        if (message.constraints) {
+            CONSTRAINTS = message.constraints
+
+            if (this.track !== null) {
+                this.track
+                    .applyConstraints(CONSTRAINTS.video)
+                    .then(() => this.send())
+                    .catch(error => console.warn('Could not apply constraints', error))
+            }
+        }
+    }
+
+    onOpen() {
+        debugLog('Metadata Data Channel', '- open')
+        this.send()
+    }
+
+    /**
+     * Report the upright size, screen angle and facing mode of a video track
+     * @param {MediaStreamTrack} track Video track that is being sent
+     */
+    update(track) {
+        this.track = track
+        this.send()
+    }
+
+    send() {
+        if (this.track === null || this.dataChannel.readyState !== 'open') {
+            return
+        }
+
+        const settings = this.track.getSettings()
+        const orientation = screen.orientation
+            ? screen.orientation.angle
+            : window.orientation || 0
+
+        // `getSettings` reports the size of the sensor, which does not follow
+        // the orientation of the screen on all browsers
+        const isPortrait = orientation === 0 || orientation === 180
+        const width = isPortrait
+            ? Math.min(settings.width, settings.height)
+            : Math.max(settings.width, settings.height)
+        const height = isPortrait
+            ? Math.max(settings.width, settings.height)
+            : Math.min(settings.width, settings.height)
+
+        const metadata = JSON.stringify({
+            width: width,
+            height: height,
+            framerate: settings.frameRate,
+            orientation: orientation,
+            facingMode: settings.facingMode
+        })
+
+        this.dataChannel.send(metadata)
+        debugLog('Metadata Data Channel', '< ' + metadata)
+    }
+}
+
+/**
+ * Data channel that periodically reports the statistics of the video sender,
+ * so the server can tell a slow phone from a slow PC
+ */
+class StatsDataChannel {
+    /**
+     * Establish stats data channel over RTC peer connection
+     * @param {RTCPeerConnection} peerConnection Instance of `RTCPeerConnection` that has already been negotiated
+     */
+    constructor(peerConnection) {
+        // Late samples are worthless, they are not retransmitted
+        this.dataChannel = peerConnection.createDataChannel('stats', {
+            ordered: false,
+            maxRetransmits: 0
+        })
+
+        this.dataChannel.onopen = this.onOpen.bind(this)
+        this.dataChannel.onclose = this.onClose.bind(this)
+
+        this.peerConnection = peerConnection
+        this.interval = null
+
+        // Counters of the previous sample, rates are computed from the
+        // difference to it
+        this.previous = null
+    }
+
+    onOpen() {
+        debugLog('Stats Data Channel', '- open')
+        this.interval = setInterval(
+            () => this.sample().catch(error => console.warn('Could not sample stats', error)),
+            STATS_INTERVAL
+        )
+    }
+
+    onClose() {
+        if (this.interval) {
+            clearInterval(this.interval)
+            this.interval = null
+        }
+    }
+
+    async sample() {
+        if (this.dataChannel.readyState !== 'open') {
+            return
+        }
+
+        const report = await this.peerConnection.getStats()
+
+        let outbound = null
+        let source = null
+        let remoteInbound = null
+        report.forEach(stats => {
+            if (stats.kind !== 'video') {
+                return
+            }
+
+            // With simulcast there is one outbound stream per layer, the
+            // largest one is reported
+            if (
+                stats.type === 'outbound-rtp' &&
+                (outbound === null || (stats.frameWidth || 0) > (outbound.frameWidth || 0))
+            ) {
+                outbound = stats
+            } else if (stats.type === 'media-source') {
+                source = stats
+            } else if (stats.type === 'remote-inbound-rtp') {
+                remoteInbound = stats
+            }
+        })
+
+        if (outbound === null) {
+            return
+        }
+
+        const previous = this.previous
+        this.previous = outbound
+
+        let bitrateKbps = null
+        let encodeMs = null
+        if (previous !== null && previous.ssrc === outbound.ssrc) {
+            const seconds = (outbound.timestamp - previous.timestamp) / 1000
+            const frames = outbound.framesEncoded - previous.framesEncoded
+
+            if (seconds > 0) {
+                bitrateKbps = ((outbound.bytesSent - previous.bytesSent) * 8) / seconds / 1000
+            }
+
+            if (frames > 0 && outbound.totalEncodeTime !== undefined) {
+                encodeMs = ((outbound.totalEncodeTime - previous.totalEncodeTime) * 1000) / frames
+            }
+        }
+
+        // Frames captured but never encoded, e.g. while the encoder is busy
+        const framesDropped =
+            source !== null && source.frames !== undefined && outbound.framesEncoded !== undefined
+                ? Math.max(0, source.frames - outbound.framesEncoded)
+                : null
+
+        const stats = JSON.stringify({
+            fps: outbound.framesPerSecond !== undefined ? outbound.framesPerSecond : null,
+            captureFps: source !== null && source.framesPerSecond !== undefined ? source.framesPerSecond : null,
+            qualityLimitation: outbound.qualityLimitationReason || null,
+            framesEncoded: outbound.framesEncoded !== undefined ? outbound.framesEncoded : null,
+            framesDropped: framesDropped,
+            bitrateKbps: bitrateKbps,
+            encodeMs: encodeMs,
+            width: outbound.frameWidth || null,
+            height: outbound.frameHeight || null,
+            rttMs:
+                remoteInbound !== null && remoteInbound.roundTripTime !== undefined
+                    ? remoteInbound.roundTripTime * 1000
+                    : null
+        })
+
+        this.dataChannel.send(stats)
+        debugLog('Stats Data Channel', '< ' + stats)
+    }
+}
+
+/**
+ * Send a video track as simulcast layers, or as a single stream when
+ * calibrating or when the browser does not support simulcast
+ * @param {RTCPeerConnection} peerConnection Instance of `RTCPeerConnection`
+ * @param {MediaStreamTrack} track Video track to send
+ * @param {MediaStream} stream Stream the track belongs to
+ * @returns RTCRtpSender
+ */
+function addVideoTrack(peerConnection, track, stream) {
+    // The calibration pattern is only readable at full size
+    if (!CALIBRATE) {
+        try {
+            const transceiver = peerConnection.addTransceiver(track, {
+                direction: 'sendonly',
+                streams: [stream],
+                sendEncodings: SIMULCAST_ENCODINGS
+            })
+            return transceiver.sender
+        } catch (error) {
+            console.warn('Simulcast is not supported', error)
+        }
+    }
+
+    return peerConnection.addTrack(track, stream)
+}
+
 /**
  * Reuse existing RTP Sender to send a different video stream without the need
  * of renegotiation.
@@ -269,20 +595,46 @@ function displayError(error) {
     setTimeout(() => window.location.reload(), REFRESH_TIMEOUT)
 }
 
+/**
+ * Wait until the server answers again and reload the page to reconnect
+ *
+ * The server process is restarted when it crashes, so a lost connection is
+ * usually only interrupted for a moment.
+ */
+async function reconnect() {
+    document.getElementById('spinner').classList.add('show')
+
+    while (true) {
+        try {
+            // The server answers before it is ready, e.g. while the camera
+            // is acquired
+            const response = await fetch('/health', { cache: 'no-store' })
+            if (response.ok && (await response.json()).ready) {
+                window.location.reload()
+                return
+            }
+        } catch (error) {
+            debugLog('Reconnect', 'Server not reachable yet')
+        }
+
+        await new Promise((resolve) => setTimeout(resolve, RECONNECT_INTERVAL))
+    }
+}
+
 async function main() {
     enableSafariConsoleLog()
 
     const peerConnection = createPeerConnection()
     const latencyDataChannel = new LatencyDataChannel(peerConnection)
+    const metaDataChannel = new MetaDataChannel(peerConnection)
+    new StatsDataChannel(peerConnection)
 
     latencyDataChannel.onConnectionLost = () => {
-        displayError(
-            new Error(
-                'Connection to PC lost, make sure that Mimic is running on your PC'
-            )
-        )
+        console.warn('Connection to PC lost, reconnecting...')
+        reconnect()
     }
 
+    CONSTRAINTS = await getConstraints()
     const mediaDevices = await getMedia(CONSTRAINTS)
 
     // Render video preview to html video element
@@ -304,7 +656,12 @@ async function main() {
 
     // Bind video track to RTC connection
     const track = mediaDevices.getTracks()[0]
-    const sender = peerConnection.addTrack(track, mediaDevices)
+    const sender = addVideoTrack(peerConnection, track, mediaDevices)
+
+    // The calibration pattern is always drawn upright
+    if (!CALIBRATE) {
+        metaDataChannel.update(track)
+    }
 
     // Establish connection to server
     await negotiate(peerConnection)
@@ -319,14 +676,17 @@ async function main() {
     )
 
     // Update the video track to use new resolution on orientation change
-    window.addEventListener(
-        'orientationchange',
-        async() => {
-            const mediaDevices = await replaceVideoTrack(sender)
-            videoPreviewElement.srcObject = mediaDevices
-        },
-        false
-    )
+    if (!CALIBRATE) {
+        window.addEventListener(
+            'orientationchange',
+            async() => {
+                const mediaDevices = await replaceVideoTrack(sender)
+                videoPreviewElement.srcObject = mediaDevices
+                metaDataChannel.update(mediaDevices.getVideoTracks()[0])
+            },
+            false
+        )
+    }
 
     document.getElementById('spinner').classList.remove('show')
 }
@@ -0,0 +1,101 @@
+// Milliseconds to wait before reconnecting after the stream ended or failed
+const RECONNECT_TIMEOUT = 3000
+
+/**
+ * Asynchronously wait for ICE server gathering to complete
+ * @param {RTCPeerConnection} peerConnection Instance of `RTCPeerConnection`
+ * @returns Promise<void>
+ */
+function waitForIce(peerConnection) {
+    return new Promise(function(resolve) {
+        if (peerConnection.iceGatheringState === 'complete') {
+            resolve()
+        } else {
+            function checkState() {
+                if (peerConnection.iceGatheringState === 'complete') {
+                    peerConnection.removeEventListener(
+                        'icegatheringstatechange',
+                        checkState
+                    )
+                    resolve()
+                }
+            }
+            peerConnection.addEventListener(
+                'icegatheringstatechange',
+                checkState
+            )
+        }
+    })
+}
+
+/**
+ * Receive the stream that is sent to Mimic, the video is relayed by the server
+ * without being re-encoded
+ * @param {HTMLVideoElement} videoElement Element to play the stream in
+ * @returns RTCPeerConnection
+ */
+async function watch(videoElement) {
+    const peerConnection = new RTCPeerConnection({
+        sdpSemantics: 'unified-plan'
+    })
+    peerConnection.addTransceiver('video', { direction: 'recvonly' })
+
+    peerConnection.addEventListener('track', (event) => {
+        videoElement.srcObject = new MediaStream([event.track])
+        document.getElementById('spinner').classList.remove('show')
+    })
+
+    const offer = await peerConnection.createOffer()
+    await peerConnection.setLocalDescription(offer)
+    await waitForIce(peerConnection)
+
+    const response = await fetch('/viewer/offer', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            sdp: peerConnection.localDescription.sdp,
+            type: peerConnection.localDescription.type
+        })
+    })
+
+    if (!response.ok) {
+        peerConnection.close()
+        throw new Error(await response.text())
+    }
+
+    await peerConnection.setRemoteDescription(await response.json())
+    return peerConnection
+}
+
+/**
+ * Watch the stream and reconnect whenever it ends, e.g. when the phone
+ * reconnects to Mimic
+ */
+async function main() {
+    const videoElement = document.getElementById('video-preview')
+
+    function reconnect(reason) {
+        console.warn('Reconnecting viewer', reason)
+        document.getElementById('spinner').classList.add('show')
+        setTimeout(main, RECONNECT_TIMEOUT)
+    }
+
+    try {
+        const peerConnection = await watch(videoElement)
+
+        peerConnection.addEventListener('connectionstatechange', () => {
+            if (['failed', 'closed', 'disconnected'].includes(peerConnection.connectionState)) {
+                peerConnection.close()
+                reconnect(peerConnection.connectionState)
+            }
+        })
+
+        window.addEventListener('beforeunload', () => peerConnection.close(), false)
+    } catch (error) {
+        reconnect(error)
+    }
+}
+
+main()
@@ -0,0 +1,109 @@
+"""Tests for `mimic.Media.FrameTransform`."""
+import json
+
+import numpy as np
+import pytest
+from av import VideoFrame
+
+from mimic.Media.FrameTransform import (FILL, FIT, STRETCH, FrameTransform,
+                                        compute_geometry)
+from mimic.MetaData import MetaData
+
+
+def solid_frame(width: int, height: int, color: tuple[int, int, int], format: str = "yuv420p") -> VideoFrame:
+    """Create a frame of a single RGB color in `format`."""
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:, :] = color
+
+    return VideoFrame.from_ndarray(image, format="rgb24").reformat(format=format)
+
+
+def test_fit_letterboxes_a_wider_output():
+    geometry = compute_geometry(640, 480, 1280, 720, mode=FIT)
+
+    assert geometry.crop == (0, 0, 640, 480)
+    assert geometry.content == (160, 0, 960, 720)
+
+
+def test_fill_crops_the_edges():
+    geometry = compute_geometry(640, 480, 1280, 720, mode=FILL)
+
+    assert geometry.crop == (0, 60, 640, 360)
+    assert geometry.content == (0, 0, 1280, 720)
+
+
+def test_stretch_uses_the_whole_frame():
+    geometry = compute_geometry(640, 480, 1280, 720, mode=STRETCH)
+
+    assert geometry.crop == (0, 0, 640, 480)
+    assert geometry.content == (0, 0, 1280, 720)
+
+
+def test_sideways_frames_fit_their_rotated_size():
+    geometry = compute_geometry(480, 640, 1280, 720, rotation=90, mode=FIT)
+
+    assert geometry.crop == (0, 0, 480, 640)
+    assert geometry.content == (160, 0, 960, 720)
+
+
+def test_sideways_fill_crops_the_source_axis():
+    geometry = compute_geometry(480, 640, 1280, 720, rotation=270, mode=FILL)
+
+    assert geometry.crop == (60, 0, 360, 640)
+    assert geometry.content == (0, 0, 1280, 720)
+
+
+@pytest.mark.parametrize("mode, rotation", [("zoom", 0), (FIT, 45)])
+def test_invalid_geometry_is_rejected(mode, rotation):
+    with pytest.raises(ValueError):
+        compute_geometry(640, 480, 1280, 720, rotation=rotation, mode=mode)
+
+
+def test_convert_pads_with_black_bars():
+    transform = FrameTransform(320, 180, mode=FIT)
+
+    image = transform.convert(solid_frame(640, 480, (255, 255, 255)))
+
+    assert image.shape == (180, 320, 4)
+    assert image[90, 10, :3].max() < 20
+    assert image[90, 310, :3].max() < 20
+    assert image[90, 160, :3].min() > 235
+    transform.release(image)
+
+
+def test_convert_fills_the_output_from_packed_frames():
+    transform = FrameTransform(320, 180, format="rgb24", mode=FILL)
+
+    image = transform.convert(solid_frame(640, 480, (255, 0, 0), format="rgb24"))
+
+    assert image.shape == (180, 320, 3)
+    assert image[0, 0, 0] > 235 and image[0, 0, 1:].max() < 20
+    assert transform.stats()["planar"] is not None
+    transform.release(image)
+
+
+def test_convert_rotates_by_the_client_orientation():
+    transform = FrameTransform(180, 320, mode=STRETCH)
+    transform.update_metadata(MetaData(json.dumps({"width": 720, "height": 1280, "framerate": 30})))
+
+    # Left half white, right half black, as sent by a browser that does not
+    # rotate frames before encoding them
+    image = np.zeros((180, 320, 3), dtype=np.uint8)
+    image[:, :160] = 255
+    frame = VideoFrame.from_ndarray(image, format="rgb24").reformat(format="yuv420p")
+
+    rotated = transform.convert(frame)
+
+    # Turned clockwise, the left half of the frame is on top
+    assert rotated.shape == (320, 180, 4)
+    assert rotated[40, 90, :3].min() > 235
+    assert rotated[280, 90, :3].max() < 20
+    transform.release(rotated)
+
+
+def test_geometry_is_cached_per_frame_size():
+    transform = FrameTransform(320, 180)
+    frame = solid_frame(640, 480, (0, 0, 0))
+
+    assert transform.geometry(frame) is transform.geometry(frame)
+    assert transform.geometry(solid_frame(480, 640, (0, 0, 0))).content == (92, 0, 136, 180)
@@ -0,0 +1,90 @@
+"""Tests for `mimic.Utils.Heartbeat`."""
+import asyncio
+
+from mimic.Utils.Heartbeat import HeartbeatScheduler
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_silent_session_is_pinged_once_then_expires():
+    async def scenario():
+        heartbeats = HeartbeatScheduler(ping_interval=0.05, timeout=0.2, resolution=0.01)
+        events = []
+        heartbeats.add("pc", lambda: events.append("ping"), lambda: events.append("timeout"))
+
+        await asyncio.sleep(0.1)
+        assert events == ["ping"]
+
+        await asyncio.sleep(0.2)
+        assert events == ["ping", "timeout"]
+        assert heartbeats.session_count == 0
+        assert heartbeats.stats() == {"sessions": 0, "pings": 1, "timeouts": 1}
+
+    run(scenario())
+
+
+def test_answered_pings_keep_the_session_alive():
+    async def scenario():
+        heartbeats = HeartbeatScheduler(ping_interval=0.02, timeout=0.1, resolution=0.01)
+        timeouts = []
+        heartbeats.add("pc", lambda: heartbeats.beat("pc"), lambda: timeouts.append("pc"))
+
+        await asyncio.sleep(0.4)
+
+        assert timeouts == []
+        assert heartbeats.pings >= 5
+        heartbeats.close()
+
+    run(scenario())
+
+
+def test_removed_and_replaced_sessions_are_not_called():
+    async def scenario():
+        heartbeats = HeartbeatScheduler(ping_interval=0.02, timeout=0.05, resolution=0.01)
+        calls = []
+        heartbeats.add("removed", lambda: calls.append("removed"), lambda: calls.append("removed"))
+        heartbeats.add("replaced", lambda: calls.append("old"), lambda: calls.append("old"))
+        heartbeats.add("replaced", lambda: None, lambda: calls.append("new"))
+        heartbeats.remove("removed")
+
+        await asyncio.sleep(0.15)
+
+        assert calls == ["new"]
+        assert not heartbeats.beat("removed")
+
+    run(scenario())
+
+
+def test_awaitable_timeout_callbacks_are_scheduled():
+    async def scenario():
+        heartbeats = HeartbeatScheduler(ping_interval=0.01, timeout=0.03, resolution=0.01)
+        closed = asyncio.Event()
+
+        async def close_connection():
+            closed.set()
+
+        heartbeats.add("pc", lambda: None, close_connection)
+
+        await asyncio.wait_for(closed.wait(), 1.0)
+
+    run(scenario())
+
+
+def test_sessions_share_a_single_timer():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        timers = []
+        call_at = loop.call_at
+        loop.call_at = lambda *args: timers.append(args) or call_at(*args)
+
+        heartbeats = HeartbeatScheduler(ping_interval=1.0, timeout=5.0)
+        for index in range(100):
+            heartbeats.add(index, lambda: None, lambda: None)
+        heartbeats.close()
+
+        assert heartbeats.session_count == 0
+        assert len(timers) == 1
+
+    run(scenario())
@@ -0,0 +1,74 @@
+"""Tests for `mimic.Media.LatencyProfile`."""
+from fractions import Fraction
+from typing import Optional
+
+from av import VideoFrame
+
+from mimic.Media.LatencyProfile import LATENCY_PROFILES, StaleFrameFilter
+
+# Milliseconds between frames of a 30 fps stream
+INTERVAL = 33
+
+
+def frame(index: int) -> VideoFrame:
+    """Create the frame captured at `index` times `INTERVAL` milliseconds, with an RTP timestamp."""
+    decoded = VideoFrame(16, 16, "yuv420p")
+    decoded.pts = index * INTERVAL * 90
+    decoded.time_base = Fraction(1, 90000)
+    return decoded
+
+
+def feed(stale_frames: StaleFrameFilter, arrivals: list[tuple[int, float]],
+         round_trip_time: Optional[float] = 20.0) -> list[int]:
+    """Pass frames to the filter at their arrival time in milliseconds and get the indices of the dropped frames."""
+    return [index for index, now in arrivals if stale_frames.is_stale(frame(index), now, round_trip_time)]
+
+
+def on_time(count: int) -> list[tuple[int, float]]:
+    """Get the arrivals of the first `count` frames, each arriving when it was captured."""
+    return [(index, 1000.0 + index * INTERVAL) for index in range(count)]
+
+
+def test_late_burst_is_dropped_after_its_first_frame():
+    stale_frames = StaleFrameFilter(150)
+
+    # Frames 10 to 14 are held up for 400ms and arrive at once
+    burst = [(index, 1000.0 + 10 * INTERVAL + 400) for index in range(10, 15)]
+    dropped = feed(stale_frames, on_time(10) + burst + [(15, 1000.0 + 15 * INTERVAL + 10)])
+
+    assert dropped == [11, 12, 13, 14]
+    assert stale_frames.stats()["frames"] == 16
+    assert stale_frames.stats()["dropped"] == 4
+    assert stale_frames.stats()["age_ms"]["count"] == 16
+
+
+def test_frames_are_shown_while_every_frame_is_late():
+    stale_frames = StaleFrameFilter(150)
+
+    # After the delay jumps, the previous frame is always more than the
+    # maximum age ago, so the camera keeps moving
+    late = [(index, 1000.0 + index * INTERVAL * 6 + 400) for index in range(10, 15)]
+
+    assert feed(stale_frames, on_time(10) + late) == []
+
+
+def test_nothing_is_dropped_without_a_limit_or_a_round_trip_time():
+    burst = on_time(10) + [(index, 1000.0 + 10 * INTERVAL + 400) for index in range(10, 15)]
+
+    unlimited = StaleFrameFilter(LATENCY_PROFILES["smooth"].max_frame_age_ms)
+    assert feed(unlimited, burst) == []
+    assert unlimited.stats()["age_ms"]["count"] == 15
+
+    assert feed(StaleFrameFilter(150), burst, round_trip_time=None) == []
+
+
+def test_reset_forgets_the_previous_stream():
+    stale_frames = StaleFrameFilter(150)
+    feed(stale_frames, on_time(10))
+
+    stale_frames.reset()
+
+    # The new stream starts 5 seconds later at the same timestamps, its first
+    # frames are the new baseline rather than late
+    assert feed(stale_frames, [(index, 6000.0 + index * INTERVAL) for index in range(10)]) == []
+    assert stale_frames.stats()["frames"] == 10
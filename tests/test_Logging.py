@@ -0,0 +1,73 @@
+"""Tests for `mimic.Logging.Formatter` and `mimic.Logging.Reader`."""
+import gzip
+import json
+import logging
+import os
+import sys
+
+from mimic.Logging.Formatter import JsonLinesFormatter
+from mimic.Logging.Reader import log_files, read_records
+
+
+def format_record(message: str, level: int = logging.INFO, created: float = 100.0, **fields) -> str:
+    record = logging.LogRecord("mimic.webserver", level, __file__, 1, message, None, None)
+    record.created = created
+    if fields:
+        record.fields = fields
+
+    return JsonLinesFormatter().format(record)
+
+
+def test_records_are_single_line_objects_with_fields():
+    line = format_record('Latency 12.0ms\n"quoted"', logging.DEBUG, session="1f2e3d4c", rtt_ms=12.0, msg="ignored")
+
+    assert "\n" not in line
+    assert json.loads(line) == {
+        "ts": 100.0,
+        "level": "DEBUG",
+        "logger": "mimic.webserver",
+        "msg": 'Latency 12.0ms\n"quoted"',
+        "session": "1f2e3d4c",
+        "rtt_ms": 12.0,
+    }
+
+
+def test_exceptions_are_included():
+    try:
+        raise RuntimeError("camera busy")
+    except RuntimeError:
+        record = logging.LogRecord("mimic", logging.ERROR, __file__, 1, "failed", None, sys.exc_info())
+
+    assert "RuntimeError: camera busy" in json.loads(JsonLinesFormatter().format(record))["exc"]
+
+
+def test_rotations_are_found_oldest_first(tmp_path):
+    for name in ("webserver.jsonl", "webserver.jsonl.1", "webserver.jsonl.2.gz", "webserver.jsonl.10.gz",
+                 "webserver.jsonl.old", "other.jsonl.1"):
+        (tmp_path / name).write_text("")
+
+    assert [os.path.basename(file) for file in log_files(tmp_path / "webserver.jsonl")] == \
+        ["webserver.jsonl.10.gz", "webserver.jsonl.2.gz", "webserver.jsonl.1", "webserver.jsonl"]
+
+
+def test_records_are_filtered_across_compressed_rotations(tmp_path):
+    with gzip.open(tmp_path / "webserver.jsonl.1.gz", "wt", encoding="utf-8") as file:
+        file.write(format_record("Session started", created=10.0, session="a") + "\n")
+        file.write(format_record("Latency 5.0ms", logging.DEBUG, created=11.0, session="a", rtt_ms=5.0) + "\n")
+
+    (tmp_path / "webserver.jsonl").write_text("\n".join([
+        "[2021-06-01 12:00:00] INFO - Text line",
+        format_record("Latency 7.0ms", logging.DEBUG, created=20.0, session="b", rtt_ms=7.0),
+        format_record('Camera "OBS" busy', logging.WARNING, created=21.0, session="b"),
+    ]) + "\n", encoding="utf-8")
+
+    files = log_files(tmp_path / "webserver.jsonl")
+
+    assert [record["msg"] for record in read_records(files)] == [
+        "Session started", "Latency 5.0ms", "Latency 7.0ms", 'Camera "OBS" busy']
+    assert [record["ts"] for record in read_records(files, session="b")] == [20.0, 21.0]
+    assert [record["ts"] for record in read_records(files, min_level="info")] == [10.0, 21.0]
+    assert [record["ts"] for record in read_records(files, since=11.0, until=20.0)] == [11.0, 20.0]
+    assert [record["ts"] for record in read_records(files, where={"rtt_ms": 7.0})] == [20.0]
+    assert [record["ts"] for record in read_records(files, contains='"OBS"')] == [21.0]
+    assert list(read_records(files, session="c")) == []
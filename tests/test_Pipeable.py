@@ -0,0 +1,127 @@
+"""Tests for `mimic.Pipeable`."""
+import asyncio
+import logging
+from typing import Any
+
+import pytest
+
+from mimic.Pipeable import (Channel, CommandMessage, LogMessage, Message,
+                            RequestError)
+
+
+class SampleMessage(Message):
+    """Message with a field of every kind."""
+
+    TYPE_ID = 250
+
+    __slots__ = ("name", "count", "ratio", "flag", "data", "extra")
+    name: str
+    count: int
+    ratio: float
+    flag: bool
+    data: bytes
+    extra: Any
+
+    def __init__(self, name: str, count: int, ratio: float, flag: bool, data: bytes, extra: Any):
+        self.name = name
+        self.count = count
+        self.ratio = ratio
+        self.flag = flag
+        self.data = data
+        self.extra = extra
+
+
+def test_every_field_kind_round_trips_in_a_batch():
+    first = SampleMessage("ünïcode", -2 ** 40, 0.25, True, b"\x00\xff", {"nested": [1, None]})
+    second = LogMessage("Server started", logging.WARNING, {"session": "c35b81b3"})
+    batch = memoryview(first.encode() + second.encode())
+
+    decoded, offset = Message.decode(batch)
+    assert isinstance(decoded, SampleMessage)
+    assert (decoded.name, decoded.count, decoded.ratio, decoded.flag, decoded.data, decoded.extra) == \
+        ("ünïcode", -2 ** 40, 0.25, True, b"\x00\xff", {"nested": [1, None]})
+
+    decoded, offset = Message.decode(batch, offset)
+    assert isinstance(decoded, LogMessage)
+    assert (decoded.payload, decoded.level, decoded.fields) == ("Server started", logging.WARNING,
+                                                                {"session": "c35b81b3"})
+    assert offset == len(batch)
+
+
+def test_type_ids_are_unique():
+    with pytest.raises(ValueError):
+        class DuplicateMessage(Message):
+            TYPE_ID = LogMessage.TYPE_ID
+            __slots__ = ()
+
+
+def test_unknown_type_id_is_rejected():
+    with pytest.raises(ValueError):
+        Message.decode(memoryview(b"\xfe"))
+
+
+def test_messages_are_sent_in_batches():
+    sender, receiver = Channel.pair(batch_size=3)
+
+    sender.send(CommandMessage("show_qr_code"))
+    sender.send(CommandMessage("show_debug_logs"))
+    assert not receiver.poll()
+
+    sender.send(LogMessage("third"))
+    assert receiver.poll(1.0)
+    assert [type(message) for message in receiver.receive()] == [CommandMessage, CommandMessage, LogMessage]
+
+    sender.send(CommandMessage("flushed"))
+    sender.flush()
+    assert [message.name for message in receiver.receive()] == ["flushed"]
+
+
+def test_requests_are_answered_by_their_handler():
+    client, server = Channel.pair()
+    server.on_request("add", lambda params: params["a"] + params["b"])
+    server.on_request("fail", lambda params: 1 / 0)
+    server.on_request("unencodable", lambda params: object())
+
+    results = [client.request("add", {"a": 1, "b": 2}), client.request("fail"), client.request("missing"),
+               client.request("unencodable")]
+    while server.poll():
+        server.receive()
+    while client.poll():
+        client.receive()
+
+    assert results[0].result(timeout=0) == 3
+    with pytest.raises(RequestError, match="ZeroDivisionError"):
+        results[1].result(timeout=0)
+    with pytest.raises(RequestError, match="Unknown method"):
+        results[2].result(timeout=0)
+    with pytest.raises(RequestError, match="TypeError"):
+        results[3].result(timeout=0)
+
+
+def test_awaitable_handlers_respond_once_done():
+    client, server = Channel.pair()
+
+    async def health(params):
+        await asyncio.sleep(0)
+        return True
+
+    server.on_request("health", health)
+
+    async def exchange():
+        future = client.request("health")
+        server.receive()
+        await asyncio.sleep(0.01)
+        client.receive()
+        return future.result(timeout=0)
+
+    assert asyncio.run(exchange()) is True
+
+
+def test_close_fails_pending_requests():
+    client, _ = Channel.pair()
+    future = client.request("health")
+
+    client.close()
+
+    with pytest.raises(EOFError):
+        future.result(timeout=0)
@@ -0,0 +1,77 @@
+"""Tests for the simulcast negotiation of `mimic.Media.Simulcast`."""
+from mimic.Media.Simulcast import (REPAIRED_RID_URI, RID_URI, SimulcastOffer,
+                                   accept_simulcast, offered_layers)
+
+OFFER = "\r\n".join([
+    "v=0",
+    "o=- 4611731400430051336 2 IN IP4 127.0.0.1",
+    "s=-",
+    "t=0 0",
+    "m=audio 9 UDP/TLS/RTP/SAVPF 111",
+    "a=mid:0",
+    "a=rid:ignored send",
+    "m=video 9 UDP/TLS/RTP/SAVPF 96 97",
+    "a=mid:1",
+    "a=extmap:4 urn:ietf:params:rtp-hdrext:sdes:mid",
+    f"a=extmap:10 {RID_URI}",
+    f"a=extmap:11/sendonly {REPAIRED_RID_URI}",
+    "a=sendrecv",
+    "a=rtpmap:96 VP8/90000",
+    "a=rid:f send",
+    "a=rid:h send",
+    "a=rid:q send",
+    "a=rid:other recv",
+    "a=simulcast:send f;h;q",
+    "",
+])
+
+ANSWER = "\r\n".join([
+    "v=0",
+    "o=- 3832190547 3832190547 IN IP4 0.0.0.0",
+    "s=-",
+    "t=0 0",
+    "m=audio 9 UDP/TLS/RTP/SAVPF 111",
+    "a=mid:0",
+    "m=video 9 UDP/TLS/RTP/SAVPF 96 97",
+    "a=mid:1",
+    "a=extmap:4 urn:ietf:params:rtp-hdrext:sdes:mid",
+    "a=recvonly",
+    "a=rtpmap:96 VP8/90000",
+    "",
+])
+
+
+def test_layers_are_read_from_the_video_section():
+    assert offered_layers(OFFER) == SimulcastOffer(
+        mid="1", layers="f;h;q", rids=["f", "h", "q"], extensions={RID_URI: 10, REPAIRED_RID_URI: 11})
+
+
+def test_offers_without_simulcast_or_rids_are_ignored():
+    assert offered_layers(OFFER.replace("a=simulcast:send f;h;q\r\n", "")) is None
+    assert offered_layers(OFFER.replace(f"a=extmap:10 {RID_URI}\r\n", "")) is None
+    assert offered_layers(OFFER.replace("m=video", "m=application")) is None
+
+
+def test_answer_receives_every_layer():
+    offer = offered_layers(OFFER)
+    assert offer is not None
+
+    lines = accept_simulcast(ANSWER, offer).split("\r\n")
+    video = lines[lines.index("m=video 9 UDP/TLS/RTP/SAVPF 96 97"):]
+    audio = lines[lines.index("m=audio 9 UDP/TLS/RTP/SAVPF 111"):lines.index("m=video 9 UDP/TLS/RTP/SAVPF 96 97")]
+
+    # Extensions follow the existing ones, the layers end the video section
+    assert video[2:5] == ["a=extmap:4 urn:ietf:params:rtp-hdrext:sdes:mid", f"a=extmap:10 {RID_URI}",
+                          f"a=extmap:11 {REPAIRED_RID_URI}"]
+    assert video[-5:] == ["a=rid:f recv", "a=rid:h recv", "a=rid:q recv", "a=simulcast:recv f;h;q", ""]
+    assert not any(line.startswith(("a=rid", "a=simulcast", "a=extmap")) for line in audio)
+
+
+def test_negotiated_extensions_are_not_repeated():
+    offer = offered_layers(OFFER)
+    assert offer is not None
+
+    answer = accept_simulcast(ANSWER.replace("a=recvonly", f"a=extmap:10 {RID_URI}\r\na=recvonly"), offer)
+
+    assert answer.count(RID_URI) == 1
+    assert answer.count(REPAIRED_RID_URI) == 1
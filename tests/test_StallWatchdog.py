@@ -0,0 +1,98 @@
+"""Tests for `mimic.Media.StallWatchdog`."""
+import asyncio
+from typing import Optional
+
+from av import VideoFrame
+
+from mimic.Media.StallWatchdog import StallWatchdog
+
+
+def frame(pts: Optional[int] = None) -> VideoFrame:
+    decoded = VideoFrame(16, 16, "yuv420p")
+    decoded.pts = pts
+    return decoded
+
+
+def test_frames_that_never_decode_request_a_keyframe():
+    requests = []
+    watchdog = StallWatchdog(lambda full_intra: requests.append(full_intra) or True)
+
+    for timestamp in (3000, 6000, 9000, 12000):
+        watchdog.on_encoded_frame("video/VP8", b"", timestamp)
+    watchdog.on_frame(frame(9000))
+
+    assert watchdog.decode_errors == 2
+    assert requests == [False]
+    assert not watchdog.stalled
+
+    # The frame after a decoded frame is not an error
+    watchdog.on_frame(frame(12000))
+    assert watchdog.decode_errors == 2
+
+
+def test_stall_escalates_to_full_intra_requests_and_recovers():
+    async def scenario():
+        requests = []
+        recoveries = []
+        skips = []
+        watchdog = StallWatchdog(lambda full_intra: requests.append(full_intra) or True, stall_timeout=0.05,
+                                 request_interval=0.03, fir_after=2, check_interval=0.01,
+                                 skip_to_keyframe=lambda: skips.append(True) or True)
+        watchdog.on_recover = lambda freeze, recovery: recoveries.append((freeze, recovery))
+        watchdog.start(asyncio.get_running_loop())
+
+        watchdog.on_frame(frame())
+        await asyncio.sleep(0.2)
+
+        assert watchdog.stalled
+        assert requests[:3] == [False, False, True]
+        assert len(skips) > 0
+
+        watchdog.on_frame(frame())
+        watchdog.stop()
+
+        assert not watchdog.stalled
+        assert len(recoveries) == 1
+        freeze, recovery = recoveries[0]
+        assert recovery is not None and 0 < recovery < freeze
+
+        stats = watchdog.stats()
+        assert stats["stalls"] == 1
+        assert stats["keyframe_requests"]["pli"] == 2
+        assert stats["keyframe_requests"]["fir"] == len(requests) - 2
+        assert stats["keyframe_skips"] == len(skips)
+
+    asyncio.run(scenario())
+
+
+def test_no_stall_before_the_first_frame():
+    async def scenario():
+        watchdog = StallWatchdog(lambda full_intra: True, stall_timeout=0.01, check_interval=0.01)
+        watchdog.start(asyncio.get_running_loop())
+
+        await asyncio.sleep(0.05)
+        watchdog.stop()
+
+        assert not watchdog.stalled
+        assert watchdog.stats()["stalls"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_unsent_requests_are_retried():
+    calls = []
+
+    def request_keyframe(full_intra: bool) -> bool:
+        calls.append(full_intra)
+        return len(calls) > 1
+
+    watchdog = StallWatchdog(request_keyframe, request_interval=10.0)
+
+    for timestamp in (1, 2, 3):
+        watchdog.on_encoded_frame("video/VP8", b"", timestamp)
+    watchdog.on_frame(frame(3))
+
+    # A request that could not be sent does not hold back the next one
+    assert watchdog.decode_errors == 2
+    assert calls == [False, False]
+    assert watchdog.stats()["keyframe_requests"] == {"pli": 1, "fir": 0}
@@ -0,0 +1,131 @@
+"""Tests for `mimic.Supervisor`."""
+import json
+import logging
+import re
+from multiprocessing import Event
+from multiprocessing.connection import Connection
+from multiprocessing.synchronize import Event as EventType
+from time import monotonic, sleep
+from typing import Callable
+
+import pytest
+
+from mimic.Pipeable import Channel, LogMessage, Message
+from mimic.Supervisor import ServerSupervisor
+
+
+def exit_immediately(stop_event: EventType, connection: Connection):
+    pass
+
+
+def never_answer(stop_event: EventType, connection: Connection):
+    sleep(60)
+
+
+def answer_once(stop_event: EventType, connection: Connection):
+    """Report that the server is ready, then stop answering."""
+    channel = Channel(connection)
+    channel.on_request("health", lambda params: True)
+    channel.receive()
+    sleep(60)
+
+
+def answer_until(stop_event: EventType, connection: Connection, lifetime: float):
+    """Report that the server is ready and send back the stats of the supervisor, exit after `lifetime` seconds."""
+    channel = Channel(connection)
+    channel.on_request("health", lambda params: True)
+    channel.on_request("supervisor/stats", lambda params: channel.send(LogMessage(json.dumps(params))))
+
+    end = monotonic() + lifetime
+    while monotonic() < end:
+        if channel.poll(0.01):
+            channel.receive()
+        channel.flush()
+
+
+# Servers do not wait for `stop_event`, a process that is terminated while
+# waiting for a multiprocessing event deadlocks the next `set`. They are
+# terminated once the test ends instead
+@pytest.fixture
+def supervise():
+    stop_event = Event()
+    supervisors = []
+
+    def start(target: Callable, **kwargs) -> ServerSupervisor:
+        supervisor = ServerSupervisor(target, stop_event, logging.getLogger("mimic.supervisor"), **kwargs)
+        supervisor.start()
+        supervisors.append(supervisor)
+        return supervisor
+
+    yield start
+
+    stop_event.set()
+    for supervisor in supervisors:
+        supervisor.stop(timeout=0.0)
+
+
+def poll_until(supervisor: ServerSupervisor, condition: Callable[[], bool], timeout: float = 10.0) -> list[Message]:
+    """Poll the supervisor until `condition` holds and get the messages of the server."""
+    messages = []
+    end = monotonic() + timeout
+    while not condition():
+        assert monotonic() < end, f"Condition not met, {supervisor.stats()}"
+        messages.extend(supervisor.poll())
+        sleep(0.01)
+
+    return messages
+
+
+def restart_delays(caplog: pytest.LogCaptureFixture) -> list[str]:
+    return re.findall(r"restarting in (\S+)s", caplog.text)
+
+
+def test_crashes_back_off_exponentially_up_to_the_maximum(supervise, caplog):
+    supervisor = supervise(exit_immediately, min_backoff=0.1, max_backoff=0.3)
+    poll_until(supervisor, lambda: supervisor.restarts == 5)
+
+    # The first restart is immediate
+    assert restart_delays(caplog) == ["0.0", "0.1", "0.2", "0.3", "0.3"]
+    assert supervisor.stats() == {
+        "restarts": 5,
+        "crashes": 5,
+        "hangs": 0,
+        "last_failure": "exited with code 0",
+        "last_recovery_ms": None,
+    }
+
+
+def test_failures_after_a_stable_run_restart_immediately(supervise, caplog):
+    supervisor = supervise(answer_until, min_backoff=0.1, stable_after=0.1, target_args=(0.3,))
+    messages = poll_until(supervisor, lambda: supervisor.restarts == 3)
+
+    assert restart_delays(caplog) == ["0.0", "0.0", "0.0"]
+    assert supervisor.crashes == 3
+
+    # Recovered servers are sent the stats of the supervisor
+    recoveries = [json.loads(message.payload) for message in messages if isinstance(message, LogMessage)]
+    assert [stats["restarts"] for stats in recoveries] == [1, 2]
+    assert recoveries[0]["last_failure"] == "exited with code 0"
+    assert 0 < recoveries[-1]["last_recovery_ms"] < 300
+
+
+def test_servers_that_stop_answering_are_restarted(supervise):
+    supervisor = supervise(answer_once, health_interval=0.05, hang_timeout=0.2)
+    poll_until(supervisor, lambda: supervisor.restarts == 1)
+
+    assert supervisor.hangs == 1
+    assert supervisor.crashes == 0
+    assert supervisor.last_failure.startswith("did not respond for")
+
+    # The new server is ready as soon as it answers
+    poll_until(supervisor, lambda: supervisor.last_recovery_ms is not None)
+    assert supervisor.last_recovery_ms < 200
+
+
+def test_servers_that_never_become_ready_are_restarted(supervise):
+    supervisor = supervise(never_answer, startup_timeout=0.2)
+    poll_until(supervisor, lambda: supervisor.restarts == 1)
+
+    assert supervisor.hangs == 1
+    assert supervisor.last_failure.startswith("was not ready after")
+    assert supervisor.last_recovery_ms is None
@@ -0,0 +1,105 @@
+"""Tests for `mimic.Media.Thumbnail`."""
+import asyncio
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from mimic.Media.Thumbnail import ThumbnailBuffer, ThumbnailWriter
+
+
+@pytest.fixture
+def thumbnail():
+    buffer = ThumbnailBuffer.create(16)
+    yield buffer
+    buffer.close()
+
+
+def test_thumbnail_is_shared_through_its_name(thumbnail):
+    writer = ThumbnailBuffer.attach(thumbnail.name)
+    image = np.arange(8 * 4 * 3, dtype=np.uint8).reshape(4, 8, 3)
+
+    assert thumbnail.paused
+    writer.paused = False
+    assert not thumbnail.paused
+
+    assert thumbnail.read() is None
+    writer.write(image)
+
+    result = thumbnail.read()
+    assert result is not None
+    sequence, width, height, pixels = result
+    assert (width, height, pixels) == (8, 4, image.tobytes())
+
+    # Unchanged thumbnails are not copied again
+    assert thumbnail.read(sequence) is None
+    writer.write(image[:2])
+    assert thumbnail.read(sequence)[:3] == (sequence + 2, 8, 2)
+
+    writer.close()
+
+
+def test_thumbnail_is_not_read_while_it_is_written(thumbnail):
+    thumbnail.write(np.zeros((4, 4, 3), dtype=np.uint8))
+    sequence = thumbnail.read()[0]
+
+    memory = shared_memory.SharedMemory(name=thumbnail.name)
+    struct.pack_into("<I", memory.buf, 0, sequence + 1)
+
+    assert thumbnail.read() is None
+
+    struct.pack_into("<I", memory.buf, 0, sequence + 2)
+    assert thumbnail.read()[0] == sequence + 2
+    memory.close()
+
+
+def test_thumbnails_larger_than_the_buffer_are_rejected(thumbnail):
+    with pytest.raises(ValueError):
+        thumbnail.write(np.zeros((4, 17, 3), dtype=np.uint8))
+
+
+def test_writer_downscales_frames_only_while_unpaused(thumbnail):
+    async def scenario():
+        writer = ThumbnailWriter(ThumbnailBuffer.attach(thumbnail.name), fps=1000)
+        image = np.full((90, 160, 4), 200, dtype=np.uint8)
+
+        writer.offer(1, image)
+        await asyncio.sleep(0.05)
+        assert writer.writes == 0
+
+        thumbnail.paused = False
+        writer.offer(2, image)
+        # The image may be reused as soon as `offer` returns
+        image[:] = 0
+        await asyncio.sleep(0.05)
+
+        result = thumbnail.read()
+        assert result is not None
+        _, width, height, pixels = result
+        assert (width, height) == (16, 9)
+        assert set(pixels) == {200}
+
+        # The same frame is not written twice
+        writer.offer(2, image)
+        await asyncio.sleep(0.05)
+        assert writer.stats() == {"paused": False, "writes": 1}
+
+        writer.close()
+
+    asyncio.run(scenario())
+
+
+def test_writer_is_limited_to_its_frame_rate(thumbnail):
+    async def scenario():
+        writer = ThumbnailWriter(ThumbnailBuffer.attach(thumbnail.name), fps=1)
+        thumbnail.paused = False
+
+        for key in range(5):
+            writer.offer(key, np.zeros((32, 32, 4), dtype=np.uint8))
+            await asyncio.sleep(0.01)
+
+        assert writer.writes == 1
+        writer.close()
+
+    asyncio.run(scenario())
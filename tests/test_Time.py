@@ -0,0 +1,93 @@
+"""Tests for `mimic.Utils.Time`."""
+from typing import Optional
+
+from mimic.Utils.Time import ClockOffsetEstimator, FrameDelayEstimator
+
+# Milliseconds the remote clock is ahead of the local clock
+OFFSET = 1000.0
+
+# Milliseconds between frames of a 30 fps stream
+INTERVAL = 33.0
+
+
+def exchange(sent: float, outbound: float, inbound: float,
+             processing: float = 2.0) -> tuple[float, float, float, float]:
+    """Get the t0..t3 timestamps of a ping sent at `sent` with the given one-way delays in milliseconds."""
+    t1 = sent + outbound + OFFSET
+    t2 = t1 + processing
+    return sent, t1, t2, t2 - OFFSET + inbound
+
+
+def test_offset_is_unknown_before_the_first_sample():
+    estimator = ClockOffsetEstimator()
+
+    assert estimator.offset is None
+    assert estimator.round_trip_time is None
+    assert estimator.to_local_time(5000.0) is None
+
+
+def test_offset_is_remote_minus_local_time():
+    estimator = ClockOffsetEstimator()
+
+    # The time spent by the remote is not part of the round trip
+    assert estimator.add_sample(*exchange(0.0, 10.0, 10.0, processing=50.0)) == 20.0
+    assert estimator.offset == OFFSET
+    assert estimator.to_local_time(1500.0) == 500.0
+
+
+def test_sample_with_the_smallest_round_trip_time_is_used():
+    estimator = ClockOffsetEstimator()
+
+    estimator.add_sample(*exchange(0.0, 60.0, 10.0))
+    estimator.add_sample(*exchange(100.0, 10.0, 10.0))
+    # Queuing on the way out skews the offset of a sample by half of the delay
+    assert estimator.add_sample(*exchange(200.0, 110.0, 10.0)) == 120.0
+
+    assert estimator.round_trip_time == 20.0
+    assert estimator.offset == OFFSET
+
+
+def test_samples_leave_the_window():
+    estimator = ClockOffsetEstimator(window=2)
+
+    estimator.add_sample(*exchange(0.0, 10.0, 10.0))
+    estimator.add_sample(*exchange(100.0, 30.0, 10.0))
+    estimator.add_sample(*exchange(200.0, 50.0, 10.0))
+
+    assert estimator.round_trip_time == 40.0
+    assert estimator.offset == OFFSET + 10.0
+
+    estimator.reset()
+    assert estimator.offset is None
+
+
+def feed(estimator: FrameDelayEstimator, delays: list[float],
+         round_trip_time: Optional[float] = 20.0) -> list[Optional[float]]:
+    """Output a frame every `INTERVAL` milliseconds, each delayed by an extra number of milliseconds."""
+    # The media timestamps start at an arbitrary value
+    return [estimator.add(90000.0 + index * INTERVAL, index * INTERVAL + delay, round_trip_time)
+            for index, delay in enumerate(delays)]
+
+
+def test_frame_delay_is_measured_against_the_least_delayed_frame():
+    # The least delayed frame took half of the round trip time
+    assert feed(FrameDelayEstimator(), [30.0, 10.0, 25.0, 10.0, 60.0]) == [10.0, 10.0, 25.0, 10.0, 60.0]
+
+
+def test_frame_delay_is_unknown_before_the_round_trip_time():
+    estimator = FrameDelayEstimator()
+
+    assert feed(estimator, [10.0, 0.0], round_trip_time=None) == [None, None]
+
+    # Frames without a round trip time still count towards the minimum
+    assert estimator.add(90000.0 + 2 * INTERVAL, 2 * INTERVAL + 20.0, 20.0) == 30.0
+
+
+def test_least_delayed_frame_leaves_the_window():
+    estimator = FrameDelayEstimator(window=3)
+
+    assert feed(estimator, [0.0, 30.0, 20.0, 40.0, 50.0]) == [10.0, 40.0, 30.0, 30.0, 40.0]
+
+    # A new stream starts its own baseline
+    estimator.reset()
+    assert feed(estimator, [100.0]) == [10.0]
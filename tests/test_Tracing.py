@@ -0,0 +1,39 @@
+"""Tests for `mimic.Utils.Tracing`."""
+from mimic.Utils.Tracing import Tracer
+
+
+def test_span_is_recorded_and_averaged():
+    tracer = Tracer()
+    tracer.record("reformat", 0, 2_000_000)
+    tracer.record("reformat", 0, 4_000_000)
+    with tracer.span("send"):
+        pass
+
+    assert len(tracer) == 3
+    timings = tracer.take_stage_timings()
+    assert timings["reformat"] == 3.0
+    assert "send" in timings
+
+    # Timings are reset by every call, the spans are kept for the trace
+    assert tracer.take_stage_timings() == {}
+    assert len(tracer) == 3
+
+
+def test_ring_buffer_keeps_the_newest_spans():
+    tracer = Tracer(capacity=2)
+    for index in range(3):
+        tracer.record(f"span{index}", index, index + 1)
+
+    events = tracer.chrome_trace()["traceEvents"]
+    assert [event["name"] for event in events] == ["span1", "span2"]
+    assert all(event["ph"] == "X" for event in events)
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    with tracer.span("recv"):
+        pass
+    tracer.record("recv", 0, 1)
+
+    assert len(tracer) == 0
+    assert tracer.take_stage_timings() == {}